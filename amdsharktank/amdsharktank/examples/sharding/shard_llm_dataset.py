@@ -26,6 +26,12 @@ def main(raw_args=None):
         required=True,
         help="Number of shards to split",
     )
+    parser.add_argument(
+        "--max-io-workers",
+        type=int,
+        default=None,
+        help="Number of rank archives to write at the same time",
+    )
     args = cli.parse(parser, args=raw_args)
     dataset = cli.get_input_dataset(args)
 
@@ -46,7 +52,11 @@ def main(raw_args=None):
     sharded_theta.rename_tensors_to_paths()
     dataset.root_theta = sharded_theta
     dataset.properties = llama_config.to_properties()
-    dataset.save(args.output_irpa_file, io_report_callback=print)
+    dataset.save(
+        args.output_irpa_file,
+        io_report_callback=print,
+        max_io_workers=args.max_io_workers,
+    )
 
 
 if __name__ == "__main__":
@@ -39,3 +39,7 @@ from . import cpu_impls
 
 # This import should stay at the bottom for compatibility
 from . import sharded_impls
+
+from . import profiling
+
+profiling._enable_from_debug_flags()
@@ -42,6 +42,15 @@ _TargetOverride = collections.namedtuple(
     "salience, target, type_spec, auto_unbox, auto_dequant",
 )
 
+# Overrides to try in order for one (types, impl selection) key.
+# `lookup_error` is raised if none of the `targets` returned a result, see
+# `_matches_impl_selection`. `impl_selection` is the selection reported on
+# failure.
+_ResolvedOverrides = collections.namedtuple(
+    "_ResolvedOverrides",
+    "targets, has_sharded_args, impl_selection, lookup_error",
+)
+
 
 # Global registry of all registered operations
 _GLOBAL_OP_REGISTRY: dict[str, "SignatureDispatcher"] = {}
@@ -59,6 +68,17 @@ def get_all_registered_ops() -> dict[str, "SignatureDispatcher"]:
 _ENABLE_TEST_LAST_OP_DISPATCH = False
 _TEST_LAST_OP_DISPATCH = None
 
+# Active `amdsharktank.ops.profiling.OpProfiler`, if any.
+_OP_PROFILER = None
+
+
+def _set_op_profiler(profiler):
+    """Sets the active op profiler and returns the previous one."""
+    global _OP_PROFILER
+    previous = _OP_PROFILER
+    _OP_PROFILER = profiler
+    return previous
+
 
 def _test_enable_last_op_dispatch(en: bool = True):
     global _TEST_LAST_OP_DISPATCH
@@ -247,7 +267,9 @@ class SignatureDispatcher:
     When overrides are registered, the computed target cache is cleared but
     between registrations, it is maintained for quick lookup by a tuple of
     tensor types in the order of the formal tensor arguments of the original
-    function signature.
+    function signature. The default trampoline additionally caches the
+    overrides left after implementation selection, keyed by the type tuple
+    and the `impl` selection string.
     """
 
     __slot__ = [
@@ -255,11 +277,13 @@ class SignatureDispatcher:
         # "_tensor_names",
         "_overrides",
         "_target_cache",
+        "_resolved_cache",
         "_trampoline",
     ]
 
     def __init__(self, sigf: Callable, is_trivially_replicable: bool = True):
         self._target_cache = dict()
+        self._resolved_cache = dict()
         self._trampoline: Optional[Callable] = None
         self._overrides: list[_TargetOverride] = []
         self.is_trivially_replicable = is_trivially_replicable
@@ -267,7 +291,12 @@ class SignatureDispatcher:
     def __call__(self, *args, **kwargs):
         trampoline = self._trampoline
         assert trampoline is not None
-        selected_override, *results = trampoline(self, *args, **kwargs)
+        if _OP_PROFILER is not None:
+            selected_override, *results = _OP_PROFILER.dispatch(
+                self, trampoline, args, kwargs
+            )
+        else:
+            selected_override, *results = trampoline(self, *args, **kwargs)
         if _ENABLE_TEST_LAST_OP_DISPATCH:
             global _TEST_LAST_OP_DISPATCH
             _TEST_LAST_OP_DISPATCH = selected_override
@@ -301,7 +330,7 @@ class SignatureDispatcher:
                 )
             )
             self._overrides.sort(key=lambda v: v.salience)
-            self._target_cache.clear()  # Need to recompute all targets
+            self._clear_caches()  # Need to recompute all targets
             return f
 
         return decorator
@@ -309,12 +338,23 @@ class SignatureDispatcher:
     def find_overrides(self, tensors: tuple[Any, ...]) -> Iterable[Callable]:
         """Finds the most salient override for the given named tensors."""
         type_spec = tuple(type(t) for t in tensors)
-        found_targets = self._target_cache.get(type_spec)
-        if found_targets is None:
-            # Slow-path try to find it.
-            found_targets = self._match_targets(type_spec)
-            self._target_cache[type_spec] = found_targets
-        return reversed(found_targets)
+        return reversed(self._find_targets(type_spec))
+
+    def resolve_overrides(
+        self, tensors: Iterable[Any], impl_selection_str: str | None
+    ) -> _ResolvedOverrides:
+        """Finds the overrides to try for the given tensors and `impl` selection.
+
+        This is `find_overrides` with the implementation selection applied,
+        cached so that repeated calls with the same types only hash a tuple.
+        """
+        type_spec = tuple(type(t) for t in tensors)
+        key = (type_spec, impl_selection_str)
+        resolved = self._resolved_cache.get(key)
+        if resolved is None:
+            resolved = self._resolve_targets(type_spec, impl_selection_str)
+            self._resolved_cache[key] = resolved
+        return resolved
 
     def fail(self, tensors: tuple[Any, ...], impl_selection: str | None = None):
         spec = [type(t) for t in tensors]
@@ -332,12 +372,54 @@ class SignatureDispatcher:
         self._overrides = [
             o for o in self._overrides if o.target.__name__ != override_name
         ]
-        self._target_cache.clear()
+        self._clear_caches()
 
     def trampoline(self, trampoline: Callable):
         assert self._trampoline is None
         self._trampoline = trampoline
 
+    def _clear_caches(self):
+        self._target_cache.clear()
+        self._resolved_cache.clear()
+
+    def _find_targets(self, type_spec: tuple) -> list[Callable]:
+        found_targets = self._target_cache.get(type_spec)
+        if found_targets is None:
+            # Slow-path try to find it.
+            found_targets = self._match_targets(type_spec)
+            self._target_cache[type_spec] = found_targets
+        return found_targets
+
+    def _resolve_targets(
+        self, type_spec: tuple, impl_selection_str: str | None
+    ) -> _ResolvedOverrides:
+        # Sharded overrides are not filtered, they pass the selection on.
+        has_sharded_args = any(
+            _matches(t, (ReplicatedTensor, SplitPrimitiveTensor)) for t in type_spec
+        )
+        impl_selections = _parse_impl_selections(impl_selection_str)
+        found_targets = self._find_targets(type_spec)
+        targets = []
+        for impl_selection in impl_selections:
+            for target in reversed(found_targets):
+                if target in targets:
+                    # Already tried for a preceding selection.
+                    continue
+                if not has_sharded_args:
+                    impl_name = getattr(target, "_impl_name", None)
+                    try:
+                        if not _matches_impl_selection(impl_name, impl_selection):
+                            continue
+                    except LookupError as e:
+                        # Raised once the preceding targets declined.
+                        return _ResolvedOverrides(
+                            tuple(targets), has_sharded_args, impl_selection, str(e)
+                        )
+                targets.append(target)
+        return _ResolvedOverrides(
+            tuple(targets), has_sharded_args, impl_selections[-1], None
+        )
+
     def _is_type_expr_target(
         self, override_type_spec: Tuple[type, ...], type_spec: Tuple[type, ...]
     ) -> bool:
@@ -502,73 +584,131 @@ def _matches_impl_selection(impl_name: str | None, selection: str) -> bool:
     return True
 
 
-def make_default_trampoline(
-    f: Callable[..., Any], /, *, dispatch_args: Iterable[int | str]
-) -> Callable[..., Any]:
-    signature = inspect.signature(f)
-    signature_arg_names = list(signature.parameters.keys())
-    dispatch_args = [
-        a if isinstance(a, str) else signature_arg_names[a] for a in dispatch_args
-    ]
-
-    def trampoline(_signature_dispatcher_: SignatureDispatcher, *args, **kwargs) -> Any:
-        # We need the signature created here and not captured from the parent scope.
-        # Otherwise torch tracing fails.
-        impl_selection_str = kwargs.pop("impl", None)
-
-        signature = inspect.signature(f)
-        bound_args = signature.bind(*args, **kwargs)
+def _make_binder(
+    f: Callable[..., Any], dispatch_args: Iterable[int | str]
+) -> Callable[[tuple, dict], tuple[tuple, dict, list]]:
+    """Precompiles binding the arguments of a call to `f`.
 
-        # Workaround for PyTorch versions < 2.7.1 where apply_defaults() doesn't work
-        # correctly during tracing. Manually add missing default values.
-        for param_name, param in signature.parameters.items():
-            if (
-                param_name not in bound_args.arguments
-                and param.default is not inspect.Parameter.empty
-            ):
-                bound_args.arguments[param_name] = param.default
+    Returns `bind(args, kwargs) -> (call_args, call_kwargs, dispatch_arg_values)`.
+    The call arguments are `BoundArguments.args` and `BoundArguments.kwargs` of
+    `inspect.signature(f).bind(*args, **kwargs)` with the defaults applied.
+    The parameter layout is read once here, so a call does not go through
+    `inspect`. Only plain tuples are captured, which torch tracing handles.
+    """
+    empty = inspect.Parameter.empty
+    parameters = list(inspect.signature(f).parameters.values())
+    positional = tuple(
+        (p.name, p.default, p.kind == inspect.Parameter.POSITIONAL_ONLY)
+        for p in parameters
+        if p.kind
+        in (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD)
+    )
+    positional_count = len(positional)
+    keyword_names = frozenset(name for name, _, only in positional if not only)
+    keyword_only = tuple(
+        (p.name, p.default)
+        for p in parameters
+        if p.kind == inspect.Parameter.KEYWORD_ONLY
+    )
+    has_var_positional = any(
+        p.kind == inspect.Parameter.VAR_POSITIONAL for p in parameters
+    )
+    has_var_keyword = any(p.kind == inspect.Parameter.VAR_KEYWORD for p in parameters)
+
+    # Where each dispatch value is read from: a positional index, the variadic
+    # positional values, a keyword only name or the variadic keyword values.
+    dispatch_plan = []
+    for dispatch_arg in dispatch_args:
+        param = (
+            parameters[dispatch_arg]
+            if isinstance(dispatch_arg, int)
+            else next(p for p in parameters if p.name == dispatch_arg)
+        )
+        if param.kind == inspect.Parameter.KEYWORD_ONLY:
+            dispatch_plan.append((param.kind, param.name))
+        elif param.kind in (
+            inspect.Parameter.VAR_POSITIONAL,
+            inspect.Parameter.VAR_KEYWORD,
+        ):
+            dispatch_plan.append((param.kind, None))
+        else:
+            index = next(i for i, p in enumerate(positional) if p[0] == param.name)
+            dispatch_plan.append((param.kind, index))
+    dispatch_plan = tuple(dispatch_plan)
+
+    def bind(args: tuple, kwargs: dict) -> tuple[tuple, dict, list]:
+        if len(args) > positional_count and not has_var_positional:
+            raise TypeError(
+                f"{f.__name__}() takes {positional_count} positional arguments "
+                f"but {len(args)} were given"
+            )
+        call_args = list(args[:positional_count])
+        for name, default, positional_only in positional[len(call_args) :]:
+            if not positional_only and name in kwargs:
+                call_args.append(kwargs.pop(name))
+            elif default is not empty:
+                call_args.append(default)
+            else:
+                raise TypeError(f"missing a required argument: '{name}'")
+        call_args.extend(args[positional_count:])
+
+        call_kwargs = {}
+        for name, default in keyword_only:
+            if name in kwargs:
+                call_kwargs[name] = kwargs.pop(name)
+            elif default is not empty:
+                call_kwargs[name] = default
+            else:
+                raise TypeError(f"missing a required argument: '{name}'")
+        # What is left goes to the variadic keyword parameter.
+        if kwargs:
+            if not has_var_keyword:
+                raise TypeError(
+                    f"got an unexpected keyword argument '{next(iter(kwargs))}'"
+                )
+            if not keyword_names.isdisjoint(kwargs):
+                name = next(n for n in kwargs if n in keyword_names)
+                raise TypeError(f"multiple values for argument '{name}'")
+            call_kwargs.update(kwargs)
 
         dispatch_arg_values = []
-        for dispatch_arg in dispatch_args:
-            arg_value = bound_args.arguments[dispatch_arg]
-
-            if (
-                signature.parameters[dispatch_arg].kind
-                == inspect.Parameter.VAR_POSITIONAL
-            ):
-                dispatch_arg_values.extend(arg_value)
-            elif (
-                signature.parameters[dispatch_arg].kind == inspect.Parameter.VAR_KEYWORD
-            ):
-                dispatch_arg_values.extend(arg_value.values())
+        for kind, key in dispatch_plan:
+            if kind == inspect.Parameter.VAR_POSITIONAL:
+                dispatch_arg_values.extend(args[positional_count:])
+            elif kind == inspect.Parameter.VAR_KEYWORD:
+                dispatch_arg_values.extend(kwargs.values())
+            elif kind == inspect.Parameter.KEYWORD_ONLY:
+                dispatch_arg_values.append(call_kwargs[key])
             else:
-                dispatch_arg_values.append(arg_value)
+                dispatch_arg_values.append(call_args[key])
+        return tuple(call_args), call_kwargs, dispatch_arg_values
 
-        # Implementation selection logic with preference support
-        impl_selections = _parse_impl_selections(impl_selection_str)
+    return bind
 
-        for impl_selection in impl_selections:
-            for override in _signature_dispatcher_.find_overrides(dispatch_arg_values):
-                # TODO: Remove this workaround - sharded operations need impl parameter
-                # for recursive calls to non-sharded implementations
-                call_kwargs = bound_args.kwargs.copy()
-                has_sharded_args = any(
-                    isinstance(arg, (ReplicatedTensor, SplitPrimitiveTensor))
-                    for arg in dispatch_arg_values
-                )
-                if impl_selection_str is not None and has_sharded_args:
-                    call_kwargs["impl"] = impl_selection_str
 
-                impl_name = getattr(override, "_impl_name", None)
-                if not has_sharded_args and not _matches_impl_selection(
-                    impl_name, impl_selection
-                ):
-                    continue
+def make_default_trampoline(
+    f: Callable[..., Any], /, *, dispatch_args: Iterable[int | str]
+) -> Callable[..., Any]:
+    bind = _make_binder(f, dispatch_args)
 
-                result = override(*bound_args.args, **call_kwargs)
-                if result is not NotImplemented:
-                    return override, result
-        else:
-            _signature_dispatcher_.fail(dispatch_arg_values, impl_selection)
+    def trampoline(_signature_dispatcher_: SignatureDispatcher, *args, **kwargs) -> Any:
+        impl_selection_str = kwargs.pop("impl", None)
+        call_args, call_kwargs, dispatch_arg_values = bind(args, kwargs)
+
+        resolved = _signature_dispatcher_.resolve_overrides(
+            dispatch_arg_values, impl_selection_str
+        )
+        # TODO: Remove this workaround - sharded operations need impl parameter
+        # for recursive calls to non-sharded implementations
+        if impl_selection_str is not None and resolved.has_sharded_args:
+            call_kwargs["impl"] = impl_selection_str
+
+        for override in resolved.targets:
+            result = override(*call_args, **call_kwargs)
+            if result is not NotImplemented:
+                return override, result
+        if resolved.lookup_error is not None:
+            raise LookupError(resolved.lookup_error)
+        _signature_dispatcher_.fail(dispatch_arg_values, resolved.impl_selection)
 
     return trampoline
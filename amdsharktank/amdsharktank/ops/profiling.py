@@ -0,0 +1,307 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+"""Profiling of eager op dispatch.
+
+While an `OpProfiler` is active, every call of an overridable op records the
+selected override, its `_impl_name`, the types of the tensor arguments and the
+time spent. Calls are aggregated per (op, override, impl, argument types) and
+can be reported as a table or written as a Chrome trace for Perfetto or
+chrome://tracing.
+
+Self time excludes the time spent in nested op calls, so a sharded op that
+delegates to the unsharded op per shard, or a quantized op that falls back to
+dequantizing, shows up as separate rows.
+
+```python
+with profile_ops("/tmp/op_profile") as profiler:
+    model.prefill(...)
+print(profiler.table(sort_by="self_time"))
+```
+
+Profiling of a whole process can be enabled with the `op_profile_path` debug
+flag, e.g. `TURBINE_LLM_DEBUG=op_profile_path=/tmp/op_profile`. The report is
+then written at exit.
+"""
+
+from collections.abc import Iterable, Mapping
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional
+import atexit
+import json
+import os
+import threading
+import time
+
+from torch import Tensor
+
+from amdsharktank.types import InferenceTensor, QuantizedTensor
+from amdsharktank.utils.logging import get_logger
+from . import _registry
+
+__all__ = [
+    "OpProfiler",
+    "OpStats",
+    "profile_ops",
+]
+
+logger = get_logger(__name__)
+
+_SORT_KEYS = {
+    "self_time": lambda s: s.self_time,
+    "total_time": lambda s: s.total_time,
+    "calls": lambda s: s.calls,
+    "op": lambda s: (s.op, s.override),
+}
+
+
+def _describe_type(value: Any) -> Optional[str]:
+    if isinstance(value, QuantizedTensor):
+        return f"{type(value).__name__}[{value.layout_type.__name__}]"
+    if isinstance(value, (Tensor, InferenceTensor)):
+        return type(value).__name__
+    if isinstance(value, (list, tuple)) and value:
+        element_types = {_describe_type(v) for v in value}
+        if len(element_types) == 1 and None not in element_types:
+            return f"{type(value).__name__}[{element_types.pop()}]"
+    return None
+
+
+def _describe_arg_types(args: tuple, kwargs: Mapping[str, Any]) -> tuple[str, ...]:
+    """Names of the tensor argument types of a call, skipping other arguments."""
+    types = [_describe_type(arg) for arg in args]
+    types.extend(
+        f"{name}={description}"
+        for name, description in ((k, _describe_type(v)) for k, v in kwargs.items())
+        if description is not None
+    )
+    return tuple(t for t in types if t is not None)
+
+
+@dataclass
+class OpStats:
+    """Aggregated calls of one op with one override and argument types."""
+
+    op: str
+    override: str
+    impl_name: Optional[str]
+    arg_types: tuple[str, ...]
+    calls: int = 0
+    total_time: float = 0.0
+    self_time: float = 0.0
+
+
+class _Frame:
+    __slots__ = ["start", "child_time"]
+
+    def __init__(self, start: float):
+        self.start = start
+        self.child_time = 0.0
+
+
+class OpProfiler:
+    """Records calls of overridable ops. Activate with `profile_ops`.
+
+    Nested op calls are tracked per thread, so self times stay correct when
+    ops run on several threads.
+    """
+
+    def __init__(self, max_trace_events: int = 1_000_000):
+        self.stats: dict[tuple, OpStats] = {}
+        self.max_trace_events = max_trace_events
+        self._trace_events: list[dict] = []
+        self._dropped_trace_events = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+
+    def dispatch(
+        self,
+        dispatcher: "_registry.SignatureDispatcher",
+        trampoline: Callable[..., Any],
+        args: tuple,
+        kwargs: dict,
+    ):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        frame = _Frame(time.perf_counter())
+        stack.append(frame)
+        try:
+            selected_override, *results = trampoline(dispatcher, *args, **kwargs)
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            elapsed = end - frame.start
+            if stack:
+                stack[-1].child_time += elapsed
+        self._record(
+            dispatcher,
+            selected_override,
+            args,
+            kwargs,
+            frame.start,
+            elapsed,
+            elapsed - frame.child_time,
+        )
+        return selected_override, *results
+
+    def _record(
+        self,
+        dispatcher: "_registry.SignatureDispatcher",
+        override: Callable,
+        args: tuple,
+        kwargs: dict,
+        start: float,
+        elapsed: float,
+        self_time: float,
+    ):
+        op = dispatcher.__name__
+        # Sharded overrides are wrapped, report the wrapped function.
+        override_name = getattr(
+            getattr(override, "__wrapped__", override), "__name__", repr(override)
+        )
+        impl_name = getattr(override, "_impl_name", None)
+        arg_types = _describe_arg_types(args, kwargs)
+        key = (op, override_name, impl_name, arg_types)
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = OpStats(
+                    op, override_name, impl_name, arg_types
+                )
+            stats.calls += 1
+            stats.total_time += elapsed
+            stats.self_time += self_time
+            if len(self._trace_events) >= self.max_trace_events:
+                self._dropped_trace_events += 1
+                return
+            self._trace_events.append(
+                {
+                    "name": op,
+                    "ph": "X",
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "ts": (start - self._origin) * 1e6,
+                    "dur": elapsed * 1e6,
+                    "args": {
+                        "override": override_name,
+                        "impl_name": impl_name,
+                        "arg_types": list(arg_types),
+                    },
+                }
+            )
+
+    def sorted_stats(
+        self, sort_by: str = "self_time", descending: bool = True
+    ) -> list[OpStats]:
+        """Aggregated calls sorted by "self_time", "total_time", "calls" or "op"."""
+        if sort_by not in _SORT_KEYS:
+            raise ValueError(
+                f"Unknown sort key {sort_by!r}, expected one of {list(_SORT_KEYS)}"
+            )
+        with self._lock:
+            stats = list(self.stats.values())
+        return sorted(stats, key=_SORT_KEYS[sort_by], reverse=descending)
+
+    def table(
+        self,
+        sort_by: str = "self_time",
+        descending: bool = True,
+        limit: Optional[int] = None,
+    ) -> str:
+        """Plain text table of the aggregated calls, one row per key."""
+        stats = self.sorted_stats(sort_by, descending)
+        total_self_time = sum(s.self_time for s in stats) or 1.0
+        if limit is not None:
+            stats = stats[:limit]
+        header = (
+            "self_ms",
+            "self_%",
+            "total_ms",
+            "calls",
+            "us/call",
+            "op",
+            "override",
+            "impl",
+            "arg_types",
+        )
+        rows = [
+            (
+                f"{s.self_time * 1e3:.3f}",
+                f"{100 * s.self_time / total_self_time:.1f}",
+                f"{s.total_time * 1e3:.3f}",
+                str(s.calls),
+                f"{s.self_time * 1e6 / s.calls:.1f}",
+                s.op,
+                s.override,
+                s.impl_name or "-",
+                ", ".join(s.arg_types),
+            )
+            for s in stats
+        ]
+        widths = [
+            max(len(row[i]) for row in [header] + rows) for i in range(len(header))
+        ]
+        lines = [
+            "  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+            for row in [header] + rows
+        ]
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> list[dict]:
+        """Trace events of the calls, in the JSON array format."""
+        with self._lock:
+            if self._dropped_trace_events:
+                logger.warning(
+                    "Dropped %d op trace events beyond max_trace_events=%d",
+                    self._dropped_trace_events,
+                    self.max_trace_events,
+                )
+            return list(self._trace_events)
+
+    def save(self, path: Path | str, sort_by: str = "self_time"):
+        """Writes `<path>.txt` with the table and `<path>.json` with the trace."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table_path = path.with_name(path.name + ".txt")
+        trace_path = path.with_name(path.name + ".json")
+        table_path.write_text(self.table(sort_by=sort_by) + "\n")
+        with open(trace_path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        logger.info("Wrote op profile to %s and %s", table_path, trace_path)
+
+
+@contextmanager
+def profile_ops(
+    path: Path | str | None = None, *, max_trace_events: int = 1_000_000
+) -> Iterable[OpProfiler]:
+    """Profiles op calls in the `with` block.
+
+    If `path` is given the report is saved there on exit, see `OpProfiler.save`.
+    Profilers do not nest, an inner `profile_ops` takes over until it exits.
+    """
+    profiler = OpProfiler(max_trace_events=max_trace_events)
+    previous = _registry._set_op_profiler(profiler)
+    try:
+        yield profiler
+    finally:
+        _registry._set_op_profiler(previous)
+        if path is not None:
+            profiler.save(path)
+
+
+def _enable_from_debug_flags():
+    from amdsharktank.utils import debugging
+
+    path = debugging.flags.op_profile_path
+    if path is None:
+        return
+    profiler = OpProfiler()
+    _registry._set_op_profiler(profiler)
+    atexit.register(profiler.save, path)
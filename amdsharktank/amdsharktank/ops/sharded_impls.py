@@ -109,6 +109,7 @@ def sharded_wrap_override():
             return res
 
         func_wrapper._impl_name = getattr(f, "_impl_name", None)  # For impl selection
+        func_wrapper.__wrapped__ = f  # For reporting the override name
         return func_wrapper
 
     def wrap_override(signature_dispatcher_override):
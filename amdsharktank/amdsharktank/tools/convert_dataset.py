@@ -8,7 +8,7 @@ import argparse
 import functools
 import torch
 
-from amdsharktank.transforms.dataset import convert_dtype
+from amdsharktank.transforms.dataset import convert_dtype, stream_transform_dataset
 from amdsharktank.types import serialized_name_to_dtype
 from amdsharktank.utils import cli
 
@@ -26,11 +26,42 @@ def main(args: list[str] | None = None):
         default=[],
         help='Convert all tensors with dtype form one to another. E.g. "--dtype=float16->bfloat16"',
     )
+    parser.add_argument(
+        "--chunk-size-mb",
+        type=int,
+        default=1024,
+        help="Size of the source tensors converted and saved at a time, for IRPA inputs",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=None,
+        help="Number of threads converting tensors, for IRPA inputs",
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Discard the converted parts of an interrupted run instead of continuing it",
+    )
     args = cli.parse(parser, args=args)
 
-    dataset = cli.get_input_dataset(args)
     dtype_conversion_map = _construct_dtype_map(args)
-    dataset.transform(functools.partial(convert_dtype, dtype_map=dtype_conversion_map))
+    transform = functools.partial(convert_dtype, dtype_map=dtype_conversion_map)
+    if args.irpa_file is not None:
+        # Stream IRPA files, which can be memory mapped, to bound memory use.
+        stream_transform_dataset(
+            args.irpa_file,
+            args.output_irpa_file,
+            transform,
+            chunk_bytes=args.chunk_size_mb << 20,
+            max_workers=args.max_workers,
+            resume=not args.no_resume,
+            io_report_callback=print,
+        )
+        return
+
+    dataset = cli.get_input_dataset(args)
+    dataset.transform(transform)
     dataset.save(args.output_irpa_file)
 
 
@@ -6,3 +6,4 @@
 
 from .sharding import *
 from .dataset import *
+from .streaming import *
@@ -0,0 +1,209 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+"""Streaming transformation of IRPA datasets.
+
+`Dataset.transform` keeps every transformed tensor in memory until the dataset
+is saved. `stream_transform_dataset` instead transforms the tensors of a
+memory mapped source in chunks of about `chunk_bytes` and saves each chunk as a
+part archive next to the output. The parts are then combined into the output
+from their memory mapped files, so besides the page cache only a chunk of
+transformed tensors is held in memory at a time.
+
+A progress file in the parts directory records the finished parts. Running the
+same transformation again after an interruption continues with the first
+unfinished part. The progress is discarded if the source, its chunks or the
+transforms differ, see `_describe_transform`.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from os import PathLike
+from pathlib import Path
+from typing import Optional
+import functools
+import hashlib
+import json
+import os
+import shutil
+
+from amdsharktank.types import Dataset, InferenceTensor, LazyInferenceTensor, Theta
+from amdsharktank.types.theta import InferenceTensorTransform, IOReportCallback
+from amdsharktank.utils.io import DEFAULT_IO_WORKERS
+
+__all__ = [
+    "stream_transform_dataset",
+]
+
+DEFAULT_CHUNK_BYTES = 1 << 30
+
+
+def _nbytes(tensor: InferenceTensor | LazyInferenceTensor) -> int:
+    if isinstance(tensor, LazyInferenceTensor):
+        # From the archive index, the data is not read.
+        return tensor.nbytes
+    return sum(t.numel() * t.element_size() for t in tensor.subtensors.values())
+
+
+def _plan_chunks(
+    leaves: dict[str, InferenceTensor | LazyInferenceTensor], chunk_bytes: int
+) -> list[list[str]]:
+    """Groups tensor paths in order into chunks of about `chunk_bytes`.
+
+    Only depends on the source, so a resumed run gets the same chunks.
+    """
+    chunks = [[]]
+    size = 0
+    for path, leaf in leaves.items():
+        nbytes = _nbytes(leaf)
+        if chunks[-1] and size + nbytes > chunk_bytes:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(path)
+        size += nbytes
+    return [chunk for chunk in chunks if chunk]
+
+
+def _apply_transforms(
+    tensor: InferenceTensor | LazyInferenceTensor,
+    transforms: tuple[InferenceTensorTransform, ...],
+) -> list[InferenceTensor]:
+    # Same semantics as `Theta.transform`, for a single tensor.
+    if isinstance(tensor, LazyInferenceTensor):
+        tensor = tensor.materialize()
+    tensors = [tensor]
+    for transform in transforms:
+        transformed = []
+        for it in tensors:
+            results = transform(it)
+            if results is None:
+                continue
+            if isinstance(results, InferenceTensor):
+                transformed.append(results)
+            else:
+                transformed.extend(results)
+        tensors = transformed
+    return tensors
+
+
+def _describe_transform(transform: InferenceTensorTransform) -> str:
+    """Description of a transform that is stable across runs.
+
+    Functions are described by their qualified name and `functools.partial`
+    objects also by their bound arguments, e.g. the dtype map of
+    `convert_dtype`. State captured in closures is not part of it.
+    """
+    if isinstance(transform, functools.partial):
+        args = [repr(arg) for arg in transform.args]
+        args.extend(
+            f"{k}={transform.keywords[k]!r}" for k in sorted(transform.keywords)
+        )
+        return f"{_describe_transform(transform.func)}({', '.join(args)})"
+    qualname = getattr(transform, "__qualname__", None)
+    if qualname is not None:
+        return f"{transform.__module__}.{qualname}"
+    return repr(transform)
+
+
+def _fingerprint_transforms(transforms: tuple[InferenceTensorTransform, ...]) -> str:
+    description = json.dumps([_describe_transform(t) for t in transforms])
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+def _part_path(parts_dir: Path, index: int) -> Path:
+    return parts_dir / f"part{index}.irpa"
+
+
+def _write_progress(path: Path, progress: dict):
+    # Replace atomically, so an interruption leaves the previous progress.
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(progress))
+    os.replace(tmp_path, path)
+
+
+def _load_progress(path: Path, progress: dict) -> Optional[list[int]]:
+    """Finished parts of a previous run with the same source, chunks and transforms."""
+    try:
+        previous = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    if any(
+        previous.get(key) != progress[key] for key in ("source", "chunks", "transforms")
+    ):
+        return None
+    return previous.get("done", [])
+
+
+def stream_transform_dataset(
+    input_path: PathLike,
+    output_path: PathLike,
+    *transforms: InferenceTensorTransform,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    max_workers: Optional[int] = None,
+    resume: bool = True,
+    io_report_callback: Optional[IOReportCallback] = None,
+):
+    """Applies `transforms` to the tensors of an IRPA dataset and saves the result.
+
+    The transforms have the same semantics as for `Theta.transform` and are run
+    on up to `max_workers` threads. The parts are kept in
+    `<output_path>.parts` until the output is complete. Without `resume`, or
+    if the previous run used other transforms, the parts of a previous run are
+    discarded.
+    """
+    input_path = Path(input_path)
+    output_path = Path(output_path)
+    source = Dataset.load(input_path, mmap=True)
+    leaves = source.root_theta.flatten(materialize=False)
+    chunks = _plan_chunks(leaves, chunk_bytes)
+
+    parts_dir = output_path.with_name(output_path.name + ".parts")
+    progress_path = parts_dir / "progress.json"
+    progress = {
+        "source": str(input_path.resolve()),
+        "chunks": chunks,
+        "transforms": _fingerprint_transforms(transforms),
+        "done": [],
+    }
+    done = _load_progress(progress_path, progress) if resume else None
+    if done is None:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        parts_dir.mkdir(parents=True)
+    else:
+        progress["done"] = done
+        if io_report_callback:
+            io_report_callback(
+                f"Resuming with {len(done)} of {len(chunks)} parts done in {parts_dir}"
+            )
+
+    with ThreadPoolExecutor(
+        max_workers=max_workers or DEFAULT_IO_WORKERS,
+        thread_name_prefix="dataset_transform",
+    ) as executor:
+        for index, paths in enumerate(chunks):
+            if index in progress["done"]:
+                continue
+            results = executor.map(
+                lambda path: _apply_transforms(leaves[path], transforms), paths
+            )
+            tensors = [t for result in results for t in result]
+            Dataset(dict(source.properties), Theta(tensors)).save(
+                _part_path(parts_dir, index)
+            )
+            del tensors
+            progress["done"].append(index)
+            _write_progress(progress_path, progress)
+            if io_report_callback:
+                io_report_callback(f"Transformed part {index + 1}/{len(chunks)}")
+
+    # Combine the parts. Their tensors are memory mapped until written.
+    merged = {}
+    for index in range(len(chunks)):
+        part = Dataset.load(_part_path(parts_dir, index), mmap=True)
+        merged.update(part.root_theta.flatten(materialize=False))
+    Dataset(dict(source.properties), Theta(merged)).save(
+        output_path, io_report_callback=io_report_callback
+    )
+    shutil.rmtree(parts_dir)
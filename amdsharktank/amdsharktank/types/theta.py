@@ -21,7 +21,7 @@ from iree.turbine.aot import (
     ParameterArchiveEntry,
 )
 
-from amdsharktank.utils.io import ShardedArchiveBuilder
+from amdsharktank.utils.io import ShardedArchiveBuilder, load_rank_archives
 
 from .tensors import (
     InferenceTensor,
@@ -36,6 +36,7 @@ from .tensors import (
 __all__ = [
     "Dataset",
     "flat_to_nested_dict",
+    "LazyInferenceTensor",
     "load_properties",
     "PropertyValueType",
     "InferenceTensorTransforms",
@@ -80,18 +81,85 @@ class InferenceTensorTransforms:
         return InferenceTensorTransforms.identity()
 
 
+class LazyInferenceTensor:
+    """Placeholder for an `InferenceTensor` of a parameter archive.
+
+    `Dataset.load` puts these in the tree of the root theta instead of
+    deserializing every tensor up front. `Theta` creates the tensor on first
+    access and replaces the placeholder with it. The tensor is created only
+    once, even if the placeholder is shared by several thetas.
+    """
+
+    __slots__ = ["name", "_meta_obj", "_entries", "_tensor"]
+
+    def __init__(
+        self,
+        name: str,
+        meta_obj: dict,
+        entries: dict[str, ParameterArchiveEntry],
+    ):
+        self.name = name
+        self._meta_obj = meta_obj
+        self._entries = entries
+        self._tensor: Optional[InferenceTensor] = None
+
+    @property
+    def is_materialized(self) -> bool:
+        return self._tensor is not None
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the raw tensors in bytes, without materializing them."""
+        if self._tensor is not None:
+            return sum(
+                t.numel() * t.element_size() for t in self._tensor.subtensors.values()
+            )
+        tensor_meta = InferenceTensorMetadata.from_json(self._meta_obj)
+        try:
+            return sum(
+                self._entries[global_name].raw.length
+                for global_name in tensor_meta.raw_tensors.values()
+            )
+        except KeyError as e:
+            raise IOError(
+                f"InferenceTensor missing one of its tensor components"
+            ) from e
+
+    def materialize(self) -> InferenceTensor:
+        if self._tensor is None:
+            self._tensor = _create_inference_tensor(
+                self.name, self._meta_obj, self._entries
+            )
+            self._meta_obj = None
+            self._entries = None
+        return self._tensor
+
+    def __repr__(self):
+        state = "materialized" if self.is_materialized else "not materialized"
+        return f"LazyInferenceTensor({self.name}, {state})"
+
+
 class Theta:
-    """Subset of parameter tensors used for inference."""
+    """Subset of parameter tensors used for inference.
+
+    Leaves of the tree may be `LazyInferenceTensor` placeholders, which are
+    replaced by their tensor when accessed through the methods of the theta.
+    Selecting a sub-theta does not materialize anything.
+    """
 
     def __init__(
         self,
-        tensors: Union[Sequence[InferenceTensor], dict[str, dict | InferenceTensor]],
+        tensors: Union[
+            Sequence[InferenceTensor | LazyInferenceTensor],
+            dict[str, dict | InferenceTensor | LazyInferenceTensor],
+        ],
     ):
         if not isinstance(tensors, dict):
             tensors = {t.name: t for t in tensors}
         assert all(isinstance(k, str) for k in _all_keys(tensors))
         assert all(
-            v is None or isinstance(v, InferenceTensor) for v in _leaf_values(tensors)
+            v is None or isinstance(v, (InferenceTensor, LazyInferenceTensor))
+            for v in _leaf_values(tensors)
         )
         self._tree = flat_to_nested_dict(tensors)
 
@@ -121,7 +189,7 @@ class Theta:
     def pop(self, *name_path: str | int) -> "Theta":
         # prune a subtree from the tree and return it as a new Theta object
         name_path = ".".join(_norm_name_path(name_path))
-        flat = self.flatten()
+        flat = self.flatten(materialize=False)
         accum = {}
         key_list = list(flat.keys())
         for key in key_list:
@@ -138,7 +206,7 @@ class Theta:
             inplace: dictates if original theta is altered or not
         """
         name_path = ".".join(_norm_name_path(name_path))
-        flat = self.flatten()
+        flat = self.flatten(materialize=False)
         accum = {}
         key_list = list(flat.keys())
         for key in key_list:
@@ -149,7 +217,14 @@ class Theta:
             self._tree = flat_to_nested_dict(flat)
         return Theta(flat_to_nested_dict(accum))
 
-    def flatten(self) -> dict[str, InferenceTensor]:
+    def flatten(
+        self, *, materialize: bool = True
+    ) -> dict[str, InferenceTensor | LazyInferenceTensor]:
+        """Maps the path of each tensor to the tensor.
+
+        Without `materialize`, tensors that were not accessed yet are returned
+        as their `LazyInferenceTensor` placeholders.
+        """
         results = {}
 
         def accum(prefix, child):
@@ -157,8 +232,10 @@ class Theta:
                 new_prefix = f"{prefix}.{key}" if prefix else key
                 if isinstance(value, dict):
                     accum(new_prefix, value)
-                else:
-                    results[new_prefix] = value
+                    continue
+                if materialize and isinstance(value, LazyInferenceTensor):
+                    value = child[key] = value.materialize()
+                results[new_prefix] = value
 
         accum("", self._tree)
         return results
@@ -185,6 +262,8 @@ class Theta:
                 f"containing {self.keys})"
             )
         t = current_ts.get(str(last))
+        if isinstance(t, LazyInferenceTensor):
+            t = current_ts[str(last)] = t.materialize()
         return t
 
     @property
@@ -196,21 +275,31 @@ class Theta:
 
     @property
     def tensors(self) -> Collection[InferenceTensor]:
+        for key, value in self._tree.items():
+            if isinstance(value, LazyInferenceTensor):
+                self._tree[key] = value.materialize()
         return [v for v in self._tree.values() if isinstance(v, InferenceTensor)]
 
     @property
-    def tree(self) -> dict[str, dict | InferenceTensor]:
-        """The nested structure of named tensors."""
+    def tree(self) -> dict[str, dict | InferenceTensor | LazyInferenceTensor]:
+        """The nested structure of named tensors.
+
+        Leaves that were not accessed yet may be `LazyInferenceTensor`s.
+        """
         return self._tree
 
     def __call__(self, *name_path: str | int) -> Union["Theta", InferenceTensor]:
         name_path = _norm_name_path(name_path)
+        parent_ts = None
         current_ts = self._tree
         try:
             for part in name_path:
+                parent_ts = current_ts
                 current_ts = current_ts[str(part)]
         except KeyError:
             raise KeyError(f"Sub-theta {name_path} not found (of {self._tree.keys()})")
+        if isinstance(current_ts, LazyInferenceTensor):
+            current_ts = parent_ts[str(name_path[-1])] = current_ts.materialize()
         if isinstance(current_ts, InferenceTensor):
             return current_ts
         return Theta(current_ts)
@@ -387,6 +476,7 @@ class Dataset:
         *,
         file_type: Optional[str] = None,
         io_report_callback: Optional[IOReportCallback] = None,
+        max_io_workers: Optional[int] = None,
     ):
         """Saves a parameter archive consisting of properties and theta.
 
@@ -394,10 +484,15 @@ class Dataset:
         packed serialization are converted to a generic planar form.
 
         Sufficient metadata is stored such that `load()` can reconstitute the
-        Dataset.
+        Dataset. The archives of sharded tensor ranks are written by up to
+        `max_io_workers` threads.
         """
         _dataset_save_helper(
-            self, path, file_type=file_type, io_report_callback=io_report_callback
+            self,
+            path,
+            file_type=file_type,
+            io_report_callback=io_report_callback,
+            max_io_workers=max_io_workers,
         )
 
     @staticmethod
@@ -407,9 +502,28 @@ class Dataset:
         file_type: Optional[str] = None,
         mmap: bool = True,
         device: Optional[Union[str, torch.device]] = None,
+        lazy: bool = True,
+        max_io_workers: Optional[int] = None,
+        io_report_callback: Optional[IOReportCallback] = None,
     ) -> "Dataset":
-        """Loads a dataset from a parameter archive constructed with save."""
-        ds = _dataset_load_helper(path, file_type=file_type, mmap=mmap)
+        """Loads a dataset from a parameter archive constructed with save.
+
+        With `lazy`, tensors of IRPA files are only created when they are first
+        accessed through the root theta, so that loading a few blocks of a large
+        model does not deserialize all of them. Moving to a `device` accesses
+        all tensors.
+
+        The archives of sharded tensor ranks are loaded by up to
+        `max_io_workers` threads.
+        """
+        ds = _dataset_load_helper(
+            path,
+            file_type=file_type,
+            mmap=mmap,
+            lazy=lazy,
+            max_io_workers=max_io_workers,
+            io_report_callback=io_report_callback,
+        )
         if device is not None:
             ds.to(device=device)
         return ds
@@ -542,49 +656,23 @@ class DatasetMetadata:
 
     def load_tensors(self, entries: dict[str, ParameterArchiveEntry]):
         # Load inference tensors.
-        try:
-            inference_tensors_entry = entries["__SHARK_INFERENCE_TENSORS__"]
-        except KeyError:
-            raise IOError(
-                f"Parameter archive does not contains __SHARK_INFERENCE_TENSORS__. Was it produced by this tool?"
+        inference_tensors = self.inference_tensors
+        for tensor_name, tensor_meta_obj in _load_inference_tensors_obj(
+            entries
+        ).items():
+            inference_tensors[tensor_name] = _create_inference_tensor(
+                tensor_name, tensor_meta_obj, entries
             )
-        inference_tensors_obj = json.loads(bytes(inference_tensors_entry.raw.file_view))
-        assert isinstance(inference_tensors_obj, dict)
 
+    def load_lazy_tensors(self, entries: dict[str, ParameterArchiveEntry]):
+        """Like `load_tensors` but with `LazyInferenceTensor` placeholders."""
         inference_tensors = self.inference_tensors
-        for tensor_name, tensor_meta_obj in inference_tensors_obj.items():
-            tensor_meta = InferenceTensorMetadata.from_json(tensor_meta_obj)
-            # Map the raw_tensors dict to tensors from the archive.
-            raw_tensors = {}
-            for local_name, global_name in tensor_meta.raw_tensors.items():
-                try:
-                    raw_entry = entries[global_name]
-                except KeyError as e:
-                    raise IOError(
-                        f"InferenceTensor missing one of its tensor components"
-                    ) from e
-                raw_tensor = raw_entry.as_tensor()
-                # Tag the tensor as originating from external storage. This will
-                # make any subsequent compilation with it expect to load it from
-                # the same parameter archive.
-                ExternalTensorTrait(external_name=global_name, external_scope="").set(
-                    raw_tensor
-                )
-                raw_tensors[local_name] = raw_tensor
-
-            # Instantiate the tensor.
-            try:
-                tensor_clazz = REGISTERED_INFERENCE_TENSOR_CLASSES[
-                    tensor_meta.type_name
-                ]
-            except KeyError as e:
-                raise IOError(
-                    f"Unregistered InferenceTensor deserialization type"
-                ) from e
-            inference_tensor = tensor_clazz.create(
-                tensor_name, raw_tensors, tensor_meta.extra_properties
+        for tensor_name, tensor_meta_obj in _load_inference_tensors_obj(
+            entries
+        ).items():
+            inference_tensors[tensor_name] = LazyInferenceTensor(
+                tensor_name, tensor_meta_obj, entries
             )
-            inference_tensors[tensor_name] = inference_tensor
 
     def load_tensors_from_dict(self, meta: dict):
         inference_tensors_obj = meta["__SHARK_INFERENCE_TENSORS__"]
@@ -634,17 +722,65 @@ class DatasetMetadata:
             inference_tensors[tensor_name] = inference_tensor
 
 
+def _load_inference_tensors_obj(entries: dict[str, ParameterArchiveEntry]) -> dict:
+    try:
+        inference_tensors_entry = entries["__SHARK_INFERENCE_TENSORS__"]
+    except KeyError:
+        raise IOError(
+            f"Parameter archive does not contains __SHARK_INFERENCE_TENSORS__. Was it produced by this tool?"
+        )
+    inference_tensors_obj = json.loads(bytes(inference_tensors_entry.raw.file_view))
+    assert isinstance(inference_tensors_obj, dict)
+    return inference_tensors_obj
+
+
+def _create_inference_tensor(
+    tensor_name: str, tensor_meta_obj: dict, entries: dict[str, ParameterArchiveEntry]
+) -> InferenceTensor:
+    tensor_meta = InferenceTensorMetadata.from_json(tensor_meta_obj)
+    # Map the raw_tensors dict to tensors from the archive.
+    raw_tensors = {}
+    for local_name, global_name in tensor_meta.raw_tensors.items():
+        try:
+            raw_entry = entries[global_name]
+        except KeyError as e:
+            raise IOError(
+                f"InferenceTensor missing one of its tensor components"
+            ) from e
+        raw_tensor = raw_entry.as_tensor()
+        # Tag the tensor as originating from external storage. This will
+        # make any subsequent compilation with it expect to load it from
+        # the same parameter archive.
+        ExternalTensorTrait(external_name=global_name, external_scope="").set(
+            raw_tensor
+        )
+        raw_tensors[local_name] = raw_tensor
+
+    # Instantiate the tensor.
+    try:
+        tensor_clazz = REGISTERED_INFERENCE_TENSOR_CLASSES[tensor_meta.type_name]
+    except KeyError as e:
+        raise IOError(f"Unregistered InferenceTensor deserialization type") from e
+    return tensor_clazz.create(tensor_name, raw_tensors, tensor_meta.extra_properties)
+
+
 def _dataset_save_helper(
     dataset: Dataset,
     path: Union[str, Path],
     *,
     file_type: Optional[str] = None,
     io_report_callback: Optional[IOReportCallback] = None,
+    max_io_workers: Optional[int] = None,
 ):
     path = Path(path)
     suffixes = path.suffixes
     if file_type == "irpa" or suffixes[-1] == ".irpa":
-        return _dataset_save_irpa(dataset, path, io_report_callback=io_report_callback)
+        return _dataset_save_irpa(
+            dataset,
+            path,
+            io_report_callback=io_report_callback,
+            max_io_workers=max_io_workers,
+        )
     elif file_type == "json" or suffixes[-1] == ".json":
         return _dataset_save_json(dataset, path, io_report_callback=io_report_callback)
     else:
@@ -658,6 +794,9 @@ def _dataset_load_helper(
     *,
     file_type: Optional[str] = None,
     mmap: bool = True,
+    lazy: bool = True,
+    max_io_workers: Optional[int] = None,
+    io_report_callback: Optional[IOReportCallback] = None,
 ) -> Dataset:
     path = Path(path)
     suffixes = path.suffixes
@@ -666,7 +805,13 @@ def _dataset_load_helper(
 
         return gguf_interop.load_file(path)
     elif file_type == "irpa" or suffixes[-1] == ".irpa":
-        return _dataset_load_irpa(path, mmap=mmap)
+        return _dataset_load_irpa(
+            path,
+            mmap=mmap,
+            lazy=lazy,
+            max_io_workers=max_io_workers,
+            io_report_callback=io_report_callback,
+        )
     elif file_type == "json" or suffixes[-1] == ".json":
         return _dataset_load_json(path, mmap=mmap)
     else:
@@ -692,7 +837,11 @@ def _dataset_save_json(
 
 
 def _dataset_save_irpa(
-    dataset: Dataset, path: Path, *, io_report_callback: Optional[IOReportCallback]
+    dataset: Dataset,
+    path: Path,
+    *,
+    io_report_callback: Optional[IOReportCallback],
+    max_io_workers: Optional[int] = None,
 ):
     builder = ShardedArchiveBuilder(Path(path))
     ds_meta = DatasetMetadata(dict(dataset.properties), {})
@@ -709,7 +858,7 @@ def _dataset_save_irpa(
 
     if io_report_callback:
         io_report_callback("Saving file")
-    builder.commit()
+    builder.commit(max_workers=max_io_workers, io_report_callback=io_report_callback)
 
 
 def _dataset_load_json(path: Path, mmap: bool) -> Dataset:
@@ -723,7 +872,13 @@ def _dataset_load_json(path: Path, mmap: bool) -> Dataset:
     return dataset
 
 
-def _dataset_load_irpa(path: Path, mmap: bool) -> Dataset:
+def _dataset_load_irpa(
+    path: Path,
+    mmap: bool,
+    lazy: bool = True,
+    max_io_workers: Optional[int] = None,
+    io_report_callback: Optional[IOReportCallback] = None,
+) -> Dataset:
     # Need to load in two phases: first read metadata from the root archive.
     meta = DatasetMetadata(properties={}, inference_tensors={})
     archive = ParameterArchive(path, mmap=mmap)
@@ -731,13 +886,22 @@ def _dataset_load_irpa(path: Path, mmap: bool) -> Dataset:
     meta.load(entries)
 
     # Then we know what side-car rank archives should exist, so load those.
-    for rank in meta.shard_ranks:
-        rank_path = ShardedArchiveBuilder.path_for_rank(path, rank)
-        archive.load(rank_path, mmap=mmap)
+    # Entries of later archives win, as if they were loaded into one index.
+    rank_archives = load_rank_archives(
+        path,
+        meta.shard_ranks,
+        mmap=mmap,
+        max_workers=max_io_workers,
+        io_report_callback=io_report_callback,
+    )
+    for rank_archive in rank_archives:
+        entries.update(rank_archive.items())
 
     # Finally, load all inference tensors.
-    entries = {k: v for k, v in archive.items()}
-    meta.load_tensors(entries)
+    if lazy:
+        meta.load_lazy_tensors(entries)
+    else:
+        meta.load_tensors(entries)
 
     # Note that there may be duplicates. Last wins.
     dataset = Dataset(meta.properties, Theta(meta.inference_tensors))
@@ -34,6 +34,11 @@ class DebugFlags:
 
     See: amdsharktank.utils.debugging.trace_tensor_to_safetensors_callback
     """
+    op_profile_path: Optional[Path] = None
+    """Path prefix of the op dispatch profile written at exit.
+
+    See: amdsharktank.ops.profiling
+    """
 
     # Feature flags.
     # Enables use of custom IREE kernels in lieu of PyTorch general
@@ -57,6 +62,8 @@ class DebugFlags:
             self.enable_nan_checks = logical_sense
         elif name == "trace_path":
             self.trace_path = Path(value)
+        elif name == "op_profile_path":
+            self.op_profile_path = Path(value)
         elif name == "use_custom_iree_kernels":
             self.use_custom_iree_kernels = logical_sense
         else:
@@ -4,14 +4,53 @@
 # See https://llvm.org/LICENSE.txt for license information.
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import torch
 from os import PathLike
 from contextlib import closing
+import os
 import socket
+from typing import Callable, Optional, Sequence
 
 from iree.turbine.aot import ParameterArchiveBuilder, ParameterArchive
 
+# Archives read or written at the same time by default. This limits the
+# number of concurrent file operations, not memory: every loaded archive is
+# kept, so loading without mmap still holds all rank archives in memory.
+DEFAULT_IO_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def _run_io_tasks(
+    tasks: Sequence[tuple[Path, Callable[[], object]]],
+    *,
+    max_workers: Optional[int],
+    verb: str,
+    io_report_callback: Optional[Callable[[str], None]],
+) -> list:
+    """Runs `(path, fn)` tasks on a thread pool, returning results in order."""
+    if max_workers is None:
+        max_workers = DEFAULT_IO_WORKERS
+    max_workers = max(1, min(max_workers, len(tasks)))
+    results = [None] * len(tasks)
+    if max_workers == 1:
+        for i, (path, fn) in enumerate(tasks):
+            results[i] = fn()
+            if io_report_callback:
+                io_report_callback(f"{verb} {path} ({i + 1}/{len(tasks)})")
+        return results
+
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="irpa_io"
+    ) as executor:
+        futures = {executor.submit(fn): i for i, (_, fn) in enumerate(tasks)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            results[i] = future.result()
+            if io_report_callback:
+                io_report_callback(f"{verb} {tasks[i][0]} ({done}/{len(tasks)})")
+    return results
+
 
 class ShardedArchiveBuilder(ParameterArchiveBuilder):
     """A ParameterArchiveBuilder that can contain subordinate builders for each rank.
@@ -34,11 +73,27 @@ class ShardedArchiveBuilder(ParameterArchiveBuilder):
         self._rank_builders[rank] = b
         return b
 
-    def commit(self):
-        """Performs final commit of all builders to disk."""
-        self.save(self.save_path)
+    def commit(
+        self,
+        *,
+        max_workers: Optional[int] = None,
+        io_report_callback: Optional[Callable[[str], None]] = None,
+    ):
+        """Performs final commit of all builders to disk.
+
+        The root and rank archives are written concurrently by up to
+        `max_workers` threads.
+        """
+        tasks = [(self.save_path, lambda: self.save(self.save_path))]
         for i, rank_builder in self._rank_builders.items():
-            rank_builder.save(ShardedArchiveBuilder.path_for_rank(self.save_path, i))
+            rank_path = ShardedArchiveBuilder.path_for_rank(self.save_path, i)
+            tasks.append((rank_path, lambda b=rank_builder, p=rank_path: b.save(p)))
+        _run_io_tasks(
+            tasks,
+            max_workers=max_workers,
+            verb="Saved",
+            io_report_callback=io_report_callback,
+        )
 
     @staticmethod
     def path_for_rank(path: Path, rank: int):
@@ -53,6 +108,29 @@ class ShardedArchiveBuilder(ParameterArchiveBuilder):
         return path.with_suffix(f".rank{rank}{path.suffix}")
 
 
+def load_rank_archives(
+    path: Path,
+    ranks: Sequence[int],
+    *,
+    mmap: bool = True,
+    max_workers: Optional[int] = None,
+    io_report_callback: Optional[Callable[[str], None]] = None,
+) -> list[ParameterArchive]:
+    """Loads the side-car archives of a `ShardedArchiveBuilder` concurrently.
+
+    Returns one archive per rank, in the order of `ranks`. All of them are
+    returned at once, so without `mmap` the contents of every rank are in
+    memory together regardless of `max_workers`.
+    """
+    rank_paths = [ShardedArchiveBuilder.path_for_rank(path, rank) for rank in ranks]
+    return _run_io_tasks(
+        [(p, lambda p=p: ParameterArchive(p, mmap=mmap)) for p in rank_paths],
+        max_workers=max_workers,
+        verb="Loaded",
+        io_report_callback=io_report_callback,
+    )
+
+
 def save_tensor_as_irpa(tensor: torch.Tensor, path: PathLike):
     """Save a single tensor into an IRPA file."""
     param_builder = ParameterArchiveBuilder()
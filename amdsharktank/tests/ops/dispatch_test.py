@@ -0,0 +1,181 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import functools
+import inspect
+import logging
+import time
+import unittest
+from unittest.mock import patch
+
+import pytest
+import torch
+
+from amdsharktank import ops
+from amdsharktank.ops._registry import SignatureDispatcher, make_default_trampoline
+from amdsharktank.types import DefaultPrimitiveTensor
+
+logger = logging.getLogger(__name__)
+
+
+def _make_op(f, dispatch_args):
+    # Like `overridable`, without adding the op to the global registry.
+    dispatcher = SignatureDispatcher(f)
+    functools.update_wrapper(dispatcher, f)
+    dispatcher.trampoline(make_default_trampoline(f, dispatch_args=dispatch_args))
+    return dispatcher
+
+
+class DefaultTrampolineTest(unittest.TestCase):
+    def testBindsLikeSignatureBind(self):
+        def f(a, b=2, /, c=3, *rest, d, e=5, **kw):
+            ...
+
+        op = _make_op(f, dispatch_args=(0, "c", "rest", "d", "kw"))
+        calls = []
+
+        @op.override(int, int, int, int, int, int)
+        def f_int(*args, **kwargs):
+            calls.append((args, kwargs))
+            return args[0]
+
+        self.assertEqual(op(1, 2, 3, 4, 5, d=6, x=7), 1)
+        bound = inspect.signature(f).bind(1, 2, 3, 4, 5, d=6, x=7)
+        bound.apply_defaults()
+        self.assertEqual(calls[-1], (bound.args, bound.kwargs))
+
+        with self.assertRaises(TypeError):
+            op(1, 2, 3, 4, 5, c=1, d=6)
+        with self.assertRaises(TypeError):
+            op(1)
+
+    def testDefaultsAreDispatched(self):
+        def f(x, y=None, *, z=1.0):
+            ...
+
+        op = _make_op(f, dispatch_args=("x", "y", "z"))
+
+        @op.override(int, type(None), float)
+        def f_no_y(x, y, *, z):
+            return "no_y"
+
+        @op.override(int, int, float)
+        def f_y(x, y, *, z):
+            return "y"
+
+        self.assertEqual(op(1), "no_y")
+        self.assertEqual(op(1, y=2), "y")
+        with self.assertRaises(NotImplementedError):
+            op(1, z=2)
+
+    def testImplSelectionIsCached(self):
+        def f(x):
+            ...
+
+        op = _make_op(f, dispatch_args=(0,))
+
+        @op.override(int, impl_name="amdsharktank.a")
+        def f_a(x):
+            return "a"
+
+        @op.override(int, impl_name="amdsharktank.b")
+        def f_b(x):
+            return "b"
+
+        self.assertEqual(op(1), "b")
+        self.assertEqual(op(1, impl="amdsharktank.a"), "a")
+        self.assertEqual(op(1, impl="amdsharktank.c;amdsharktank.a"), "a")
+        with self.assertRaisesRegex(NotImplementedError, "amdsharktank.c"):
+            op(1, impl="amdsharktank.c")
+        self.assertEqual(len(op._resolved_cache), 4)
+
+        # Registering an override invalidates the resolved overrides.
+        @op.override(int, salience=1, impl_name="amdsharktank.c")
+        def f_c(x):
+            return "c"
+
+        self.assertEqual(len(op._resolved_cache), 0)
+        self.assertEqual(op(1, impl="amdsharktank.c"), "c")
+        op.remove_override("f_c")
+        self.assertEqual(op(1), "b")
+
+    def testDeclinedOverridesFallThrough(self):
+        def f(x):
+            ...
+
+        op = _make_op(f, dispatch_args=(0,))
+
+        @op.override(int)
+        def f_any(x):
+            return "any"
+
+        @op.override(int, salience=1)
+        def f_even(x):
+            return "even" if x % 2 == 0 else NotImplemented
+
+        self.assertEqual(op(2), "even")
+        self.assertEqual(op(3), "any")
+
+    def testDispatchDoesNotInspectSignature(self):
+        t = torch.rand(2, 3)
+        ops.transpose(t, 0, 1)
+        with patch.object(inspect, "signature", side_effect=AssertionError):
+            ops.transpose(t, 0, 1)
+            ops.softmax(t, dim=1)
+
+
+@pytest.mark.expensive
+class DispatchOverheadBenchmark(unittest.TestCase):
+    """Measures the Python cost of eager op dispatch on small tensors.
+
+    The overhead is the time per op call minus the time of the torch call
+    the override makes. It is only logged, wall clock times are too noisy on
+    shared machines to fail on. Run with `-m expensive --log-cli-level=INFO`.
+    """
+
+    iterations = 2000
+
+    def _time_per_call(self, fn) -> float:
+        fn()
+        start = time.perf_counter()
+        for _ in range(self.iterations):
+            fn()
+        return (time.perf_counter() - start) / self.iterations
+
+    def _log_overhead(self, name, op_call, torch_call):
+        overhead_us = (
+            self._time_per_call(op_call) - self._time_per_call(torch_call)
+        ) * 1e6
+        logger.info("%s dispatch overhead: %.2f us per call", name, overhead_us)
+
+    def testTranspose(self):
+        t = torch.rand(4, 8)
+        self._log_overhead(
+            "transpose",
+            lambda: ops.transpose(t, 0, 1),
+            lambda: torch.transpose(t, 0, 1),
+        )
+
+    def testMatmul(self):
+        lhs = torch.rand(4, 8)
+        rhs = DefaultPrimitiveTensor(data=torch.rand(8, 4))
+        self._log_overhead(
+            "matmul",
+            lambda: ops.matmul(lhs, rhs),
+            lambda: torch.matmul(lhs, rhs.as_torch()),
+        )
+
+    def testSoftmaxWithImplSelection(self):
+        t = torch.rand(4, 8)
+        self._log_overhead(
+            "softmax",
+            lambda: ops.softmax(t, dim=1, impl="*"),
+            lambda: torch.softmax(t, dim=1),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import torch
+
+from amdsharktank import ops
+from amdsharktank.ops import _registry
+from amdsharktank.ops.profiling import profile_ops
+from amdsharktank.types import SplitPrimitiveTensor
+
+
+class OpProfilerTest(unittest.TestCase):
+    def testRecordsOverridesAndArgTypes(self):
+        t = torch.rand(3, 4)
+        with profile_ops() as profiler:
+            for _ in range(3):
+                ops.transpose(t, 0, 1)
+            ops.softmax(t, dim=1)
+        self.assertIsNone(_registry._OP_PROFILER)
+
+        by_op = {s.op: s for s in profiler.sorted_stats(sort_by="op")}
+        self.assertEqual(set(by_op), {"transpose", "softmax"})
+        self.assertEqual(by_op["transpose"].calls, 3)
+        self.assertEqual(by_op["transpose"].arg_types, ("Tensor",))
+        self.assertNotEqual(by_op["transpose"].override, "func_wrapper")
+        for stats in by_op.values():
+            self.assertGreaterEqual(stats.total_time, stats.self_time)
+
+        ops.transpose(t, 0, 1)
+        self.assertEqual(by_op["transpose"].calls, 3)
+
+    def testNestedCallsAreExcludedFromSelfTime(self):
+        t = SplitPrimitiveTensor(shard_dim=1, ts=torch.rand(3, 4), shard_count=2)
+        with profile_ops() as profiler:
+            ops.transpose(t, 0, 1)
+
+        stats = profiler.sorted_stats(sort_by="op")
+        (sharded,) = [s for s in stats if s.arg_types == ("SplitPrimitiveTensor",)]
+        self.assertEqual(sharded.override, "transpose_split")
+        self.assertEqual(sharded.calls, 1)
+        # The transpose of each shard is a nested call.
+        (shard,) = [s for s in stats if s.arg_types == ("DefaultPrimitiveTensor",)]
+        self.assertEqual(shard.calls, 2)
+        self.assertLess(sharded.self_time, sharded.total_time)
+
+    def testSavesTableAndChromeTrace(self):
+        t = torch.rand(3, 4)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "profile"
+            with profile_ops(path) as profiler:
+                ops.transpose(t, 0, 1)
+                ops.softmax(t, dim=1)
+
+            table = (Path(temp_dir) / "profile.txt").read_text().splitlines()
+            self.assertTrue(table[0].startswith("self_ms"))
+            self.assertEqual(len(table), 3)
+            with open(Path(temp_dir) / "profile.json") as f:
+                events = json.load(f)
+        self.assertEqual([e["name"] for e in events], ["transpose", "softmax"])
+        self.assertTrue(all(e["ph"] == "X" and e["dur"] >= 0 for e in events))
+        with self.assertRaises(ValueError):
+            profiler.table(sort_by="unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
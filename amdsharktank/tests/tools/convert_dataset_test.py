@@ -5,9 +5,12 @@
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
 from pathlib import Path
+import functools
+import pytest
 import torch
 
 from amdsharktank.tools import convert_dataset
+from amdsharktank.transforms.dataset import convert_dtype, stream_transform_dataset
 from amdsharktank.types import (
     Dataset,
     Theta,
@@ -80,3 +83,89 @@ def test_convert_dataset_dtypes(tmp_path: Path):
         unbox_tensor(tgt_dataset.root_theta("c")),
         unbox_tensor(src_dataset.root_theta("c")),
     )
+
+
+def test_stream_transform_dataset_resumes(tmp_path: Path):
+    src_tensors = {
+        f"blk.{i}.weight": DefaultPrimitiveTensor(
+            data=torch.full([4], float(i), dtype=torch.float16),
+            name=f"blk.{i}.weight",
+        )
+        for i in range(4)
+    }
+    src_dataset_path = tmp_path / "src_dataset.irpa"
+    Dataset({"foo": "bar"}, Theta(src_tensors)).save(src_dataset_path)
+    tgt_dataset_path = tmp_path / "tgt_dataset.irpa"
+
+    converted = []
+    fail_on = {"blk.2.weight"}
+
+    def transform(tensor):
+        if tensor.name in fail_on:
+            raise RuntimeError("Interrupted")
+        converted.append(tensor.name)
+        return convert_dtype(tensor, {torch.float16: torch.float32})
+
+    # Each chunk holds one 8 byte tensor.
+    with pytest.raises(RuntimeError, match="Interrupted"):
+        stream_transform_dataset(
+            src_dataset_path, tgt_dataset_path, transform, chunk_bytes=8
+        )
+    assert not tgt_dataset_path.exists()
+    assert converted == ["blk.0.weight", "blk.1.weight"]
+
+    fail_on.clear()
+    stream_transform_dataset(
+        src_dataset_path, tgt_dataset_path, transform, chunk_bytes=8
+    )
+    assert converted[2:] == ["blk.2.weight", "blk.3.weight"]
+    assert not tgt_dataset_path.with_name(tgt_dataset_path.name + ".parts").exists()
+
+    tgt_dataset = Dataset.load(tgt_dataset_path)
+    assert tgt_dataset.properties["foo"] == "bar"
+    for i in range(4):
+        tensor = tgt_dataset.root_theta("blk", i, "weight")
+        assert tensor.dtype == torch.float32
+        torch.testing.assert_close(
+            unbox_tensor(tensor), torch.full([4], float(i), dtype=torch.float32)
+        )
+
+
+def test_stream_transform_dataset_discards_parts_of_other_transforms(tmp_path: Path):
+    src_tensors = {
+        f"blk.{i}.weight": DefaultPrimitiveTensor(
+            data=torch.full([4], float(i), dtype=torch.float16),
+            name=f"blk.{i}.weight",
+        )
+        for i in range(2)
+    }
+    src_dataset_path = tmp_path / "src_dataset.irpa"
+    Dataset({}, Theta(src_tensors)).save(src_dataset_path)
+    tgt_dataset_path = tmp_path / "tgt_dataset.irpa"
+
+    fail_on = {"blk.1.weight"}
+
+    def interrupted(tensor):
+        if tensor.name in fail_on:
+            raise RuntimeError("Interrupted")
+        return tensor
+
+    to_float32 = functools.partial(
+        convert_dtype, dtype_map={torch.float16: torch.float32}
+    )
+    with pytest.raises(RuntimeError, match="Interrupted"):
+        stream_transform_dataset(
+            src_dataset_path, tgt_dataset_path, to_float32, interrupted, chunk_bytes=8
+        )
+
+    # Resuming with another dtype map must not reuse the float32 part.
+    fail_on.clear()
+    to_bfloat16 = functools.partial(
+        convert_dtype, dtype_map={torch.float16: torch.bfloat16}
+    )
+    stream_transform_dataset(
+        src_dataset_path, tgt_dataset_path, to_bfloat16, interrupted, chunk_bytes=8
+    )
+    tgt_dataset = Dataset.load(tgt_dataset_path)
+    for i in range(2):
+        assert tgt_dataset.root_theta("blk", i, "weight").dtype == torch.bfloat16
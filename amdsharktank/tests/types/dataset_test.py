@@ -148,6 +148,47 @@ class DatasetTest(unittest.TestCase):
             "a.c.d", ExternalTensorTrait.get(t_acd.as_torch()).external_name
         )
 
+    def testLazyLoad(self):
+        theta = Theta(
+            _flat_t_dict(
+                _t("blk.0.attn.weight", 1, 2),
+                _t("blk.1.attn.weight", 3, 4),
+                _t("blk.1.ffn.weight", 5, 6),
+            )
+        )
+        Dataset({}, theta).save(self.temp_dir / "lazy.irpa")
+
+        ds_load = Dataset.load(self.temp_dir / "lazy.irpa", mmap=False)
+        tree = ds_load.root_theta.tree
+        blk_1 = ds_load.root_theta("blk", 1)
+        self.assertIsInstance(tree["blk"]["1"]["attn"]["weight"], LazyInferenceTensor)
+
+        t_attn = blk_1.tensor("attn", "weight")
+        self.assertEqual([3, 4], list(t_attn.shape))
+        self.assertEqual(
+            "blk.1.attn.weight",
+            ExternalTensorTrait.get(t_attn.as_torch()).external_name,
+        )
+        # Only the accessed tensor was created, through the shared subtree.
+        self.assertIs(tree["blk"]["1"]["attn"]["weight"], t_attn)
+        self.assertIsInstance(tree["blk"]["1"]["ffn"]["weight"], LazyInferenceTensor)
+        self.assertIsInstance(tree["blk"]["0"]["attn"]["weight"], LazyInferenceTensor)
+        self.assertIs(ds_load.root_theta.tensor("blk", 1, "attn", "weight"), t_attn)
+
+        # The size is known from the archive index.
+        lazy_ffn = tree["blk"]["1"]["ffn"]["weight"]
+        self.assertEqual(lazy_ffn.nbytes, 5 * 6 * 4)
+        self.assertFalse(lazy_ffn.is_materialized)
+
+        flat = ds_load.root_theta.flatten()
+        self.assertTrue(all(isinstance(t, InferenceTensor) for t in flat.values()))
+
+        ds_eager = Dataset.load(self.temp_dir / "lazy.irpa", mmap=False, lazy=False)
+        self.assertIsInstance(
+            ds_eager.root_theta.tree["blk"]["0"]["attn"]["weight"],
+            DefaultPrimitiveTensor,
+        )
+
     def testRoundTripDefaultPrimitiveTensor(self):
         t_orig = DefaultPrimitiveTensor(
             name="primitive", data=torch.Tensor([1.0, 2.0, 3.0])
@@ -189,6 +230,31 @@ class DatasetTest(unittest.TestCase):
         self.assertEqual(t_load.shard_count, t_replicated.shard_count)
         assert_tensor_close(t_load, t_replicated, atol=0, rtol=0)
 
+    def testRoundTripSplitTensorConcurrentIO(self):
+        shard_count = 4
+        shards = [torch.rand(2, 3) for _ in range(shard_count)]
+        t_split = SplitPrimitiveTensor(name="st", ts=shards, shard_dim=1)
+        ds_orig = Dataset({}, Theta({t_split.name: t_split}))
+        path = self.temp_dir / "cs_ds.irpa"
+        saved = []
+        ds_orig.save(
+            path,
+            max_io_workers=2,
+            io_report_callback=saved.append,
+        )
+        saved = [m for m in saved if m.startswith("Saved ")]
+        self.assertEqual(len(saved), shard_count + 1)
+        self.assertTrue(saved[-1].endswith(f"({shard_count + 1}/{shard_count + 1})"))
+
+        loaded = []
+        ds_load = Dataset.load(
+            path, mmap=False, max_io_workers=2, io_report_callback=loaded.append
+        )
+        self.assertEqual(len(loaded), shard_count)
+        t_load = ds_load.root_theta.tensor(t_split.name)
+        self.assertEqual(t_load.shard_count, shard_count)
+        assert_tensor_close(t_load, t_split, atol=0, rtol=0)
+
     def testRoundTripUnreducedTensor(self):
         shard_count = 4
         shards = [torch.Tensor([[1.0, 2.0, 3.0]])] * shard_count
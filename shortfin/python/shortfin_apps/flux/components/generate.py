@@ -5,6 +5,7 @@
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
 import asyncio
+import json
 import logging
 
 from typing import (
@@ -16,7 +17,7 @@ from fastapi.responses import JSONResponse
 from shortfin_apps.types.Base64CharacterEncodedByteSequence import (
     Base64CharacterEncodedByteSequence,
 )
-from shortfin_apps.utilities.image import png_from
+from shortfin_apps.utilities.image import encoded_from, encoder_pool
 from shortfin_apps.text_to_image.TextToImageInferenceOutput import (
     TextToImageInferenceOutput,
 )
@@ -30,6 +31,7 @@ from .io_struct import GenerateReqInput
 from .messages import FluxInferenceExecRequest
 from .service import FluxGenerateService
 from .metrics import measure
+from ...utils import run_in_executor
 
 logger = logging.getLogger("shortfin-flux.generate")
 
@@ -101,36 +103,56 @@ class ClientGenerateBatchProcess(sf.Process):
     async def run(self):
         logger.debug("Started ClientBatchGenerateProcess: %r", self)
         try:
-            # Launch all individual generate processes and wait for them to finish.
+            # Launch all individual generate processes.
             gen_processes: list[GenerateImageProcess] = []
             for index in range(self.gen_req.num_output_images):
                 gen_process = GenerateImageProcess(self, self.gen_req, index)
                 gen_processes.append(gen_process)
                 gen_process.launch()
 
-            await asyncio.gather(*gen_processes)
+            if self.gen_req.stream:
+                self.responder.stream_start(media_type="text/event-stream")
 
-            # TODO: stream image outputs
-            logging.debug("Responding to one shot batch")
-
-            png_images: list[Base64CharacterEncodedByteSequence] = []
-
-            for index_of_each_process, each_process in enumerate(gen_processes):
-                if each_process.output is None:
-                    raise Exception(
-                        f"Expected output for process {index_of_each_process} but got `None`"
-                    )
+            # Encode each image as soon as its process finishes.
+            images: list[Base64CharacterEncodedByteSequence] = await asyncio.gather(
+                *[
+                    self.encode_output(index, gen_process)
+                    for index, gen_process in enumerate(gen_processes)
+                ]
+            )
 
-                each_png_image = png_from(each_process.output.image)
-                png_images.append(each_png_image)
+            if self.gen_req.stream:
+                self.responder.stream_part(b"data: [DONE]\n\n")
+                self.responder.stream_part(None)
+                return
 
+            logging.debug("Responding to one shot batch")
             self.responder.send_response(
                 JSONResponse(
                     content={
-                        "images": png_images,
+                        "images": images,
                     },
                     media_type="application/json",
                 )
             )
         finally:
             self.responder.ensure_response()
+
+    async def encode_output(
+        self, index: int, gen_process: GenerateImageProcess
+    ) -> Base64CharacterEncodedByteSequence:
+        """Waits for `gen_process` and encodes its image off the fiber thread."""
+        await gen_process
+        if gen_process.output is None:
+            raise Exception(f"Expected output for process {index} but got `None`")
+
+        image = await run_in_executor(
+            encoder_pool(),
+            encoded_from,
+            gen_process.output.image,
+            self.gen_req.output_format,
+        )
+        if self.gen_req.stream:
+            chunk = {"index": index, "image": image}
+            self.responder.stream_part(f"data: {json.dumps(chunk)}\n\n".encode())
+        return image
@@ -8,6 +8,8 @@ from typing import List, Optional, Union
 from dataclasses import dataclass
 import uuid
 
+from shortfin_apps.utilities.image import IMAGE_FORMATS
+
 
 @dataclass
 class GenerateReqInput:
@@ -30,6 +32,10 @@ class GenerateReqInput:
     neg_input_ids: Optional[Union[List[List[int]], List[int]]] = None
     # Output image format. Defaults to base64. One string ("PIL", "base64")
     output_type: Optional[List[str]] = None
+    # Encoding of base64 output images: "png", "jpeg" or "webp".
+    output_format: str = "png"
+    # Whether to stream each image back as a server-sent event once it is ready.
+    stream: bool = False
     # The request id.
     rid: Optional[Union[List[str], str]] = None
 
@@ -70,6 +76,10 @@ class GenerateReqInput:
                 raise ValueError("The rid should be a list.")
         if self.output_type is None:
             self.output_type = ["base64"] * self.num_output_images
+        if self.output_format.lower() not in IMAGE_FORMATS:
+            raise ValueError(
+                f"Unsupported output format {self.output_format!r}, expected one of {list(IMAGE_FORMATS)}."
+            )
         # Temporary restrictions
         heights = [self.height] if not isinstance(self.height, list) else self.height
         widths = [self.width] if not isinstance(self.width, list) else self.width
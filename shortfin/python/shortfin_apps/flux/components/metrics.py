@@ -9,10 +9,61 @@ import time
 from typing import Any
 import functools
 
+from shortfin_apps.utilities.metrics import REGISTRY
+
 logger = logging.getLogger("shortfin-sd.metrics")
 
+TASK_SECONDS = REGISTRY.histogram(
+    "shortfin_flux_task_seconds",
+    "Time spent in a measured task, like a whole batch or one of its phases.",
+    ["task"],
+)
+IDLE_FIBERS = REGISTRY.gauge(
+    "shortfin_flux_idle_fibers",
+    "Fibers waiting for a batch.",
+    ["service"],
+)
+COMMAND_BUFFERS_IN_USE = REGISTRY.gauge(
+    "shortfin_flux_command_buffers_in_use",
+    "Command buffers of a fiber leased to a batch.",
+    ["service", "fiber"],
+)
+COMMAND_BUFFERS_IDLE = REGISTRY.gauge(
+    "shortfin_flux_command_buffers_idle",
+    "Command buffers of a fiber waiting for a batch.",
+    ["service", "fiber"],
+)
+COMMAND_BUFFER_WAITS = REGISTRY.gauge(
+    "shortfin_flux_command_buffer_waits",
+    "Leases that waited for a command buffer of a fiber to be released.",
+    ["service", "fiber"],
+)
+COMMAND_BUFFER_ALLOCATIONS = REGISTRY.gauge(
+    "shortfin_flux_command_buffer_allocations",
+    "Command buffers built for a fiber.",
+    ["service", "fiber"],
+)
+
+
+def export_command_buffer_stats(stats, service: str, fiber: int):
+    """Read the gauges of `fiber` from its `CommandBufferPoolStats`."""
+    for field, gauge in (
+        ("in_use", COMMAND_BUFFERS_IN_USE),
+        ("idle", COMMAND_BUFFERS_IDLE),
+        ("waits", COMMAND_BUFFER_WAITS),
+        ("allocations", COMMAND_BUFFER_ALLOCATIONS),
+    ):
+        gauge.set_function(
+            functools.partial(getattr, stats, field), service=service, fiber=fiber
+        )
+
 
 def measure(fn=None, type="exec", task=None, num_items=None, freq=1, label="items"):
+    """Time a coroutine function.
+
+    "exec" and "phase" durations are recorded in `TASK_SECONDS`, "exec" ones are
+    also logged. "throughput" logs items per second.
+    """
     assert callable(fn) or fn is None
 
     def _decorator(func):
@@ -21,6 +72,8 @@ def measure(fn=None, type="exec", task=None, num_items=None, freq=1, label="item
             start = time.time()
             ret = await func(*args, **kwargs)
             duration = time.time() - start
+            if type in ("exec", "phase"):
+                TASK_SECONDS.observe(duration, task=task)
             if type == "exec":
                 batch_size = len(getattr(args[0], "exec_requests", []))
                 log_duration_str(duration, task=task, batch_size=batch_size)
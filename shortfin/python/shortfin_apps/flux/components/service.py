@@ -17,16 +17,33 @@ from PIL import Image
 import shortfin as sf
 import shortfin.array as sfnp
 
-from ...utils import GenerateService, BatcherProcess
+from ...utils import (
+    GenerateService,
+    BatcherProcess,
+    HostStagingBuffers,
+    StagePipeline,
+    StepScheduler,
+    CommandBufferPool,
+    copy_to_host,
+)
+
+from shortfin_apps.utilities.embedding_cache import EmbeddingCache
 
 from .config_struct import ModelParams
 from .manager import FluxSystemManager
 from .messages import FluxInferenceExecRequest, InferencePhase
 from .tokenizer import Tokenizer
-from .metrics import measure
+from .metrics import IDLE_FIBERS, export_command_buffer_stats, measure
 
 logger = logging.getLogger("shortfin-flux.service")
 
+# Stages of a pipelined batch, in order, and the phases each of them runs.
+PIPELINE_STAGES = {
+    InferencePhase.ENCODE: (InferencePhase.PREPARE, InferencePhase.ENCODE),
+    InferencePhase.DENOISE: (InferencePhase.DENOISE,),
+    InferencePhase.DECODE: (InferencePhase.DECODE, InferencePhase.POSTPROCESS),
+}
+
 
 def time_shift(mu: float, sigma: float, t: torch.Tensor):
     return math.exp(mu) / (math.exp(mu) + (1 / t - 1) ** sigma)
@@ -75,6 +92,11 @@ class FluxGenerateService(GenerateService):
         prog_isolation: str = "per_fiber",
         show_progress: bool = False,
         trace_execution: bool = False,
+        pipeline_stages: bool = False,
+        prompt_cache_bytes: int = 0,
+        prompt_cache_host_bytes: int = 0,
+        denoise_slots: int = 1,
+        command_buffers_per_shape: int = 4,
     ):
         super().__init__(sysman, fibers_per_device, workers_per_device)
         self.name = name
@@ -83,6 +105,34 @@ class FluxGenerateService(GenerateService):
         self.model_params = model_params
         self.trace_execution = trace_execution
         self.show_progress = show_progress
+        # Image readback buffers by fiber and image batch shape.
+        self.host_staging: dict[tuple, HostStagingBuffers] = {}
+        # Batches that can share a fiber, joining at denoise step boundaries.
+        self.denoise_slots = denoise_slots
+        self.step_schedulers: dict[sf.Fiber, StepScheduler] = {}
+        # Sampler inputs by fiber, for each batch size and output size.
+        self.command_buffers_per_shape = command_buffers_per_shape
+        self.command_buffer_pools: dict[sf.Fiber, CommandBufferPool] = {}
+        # CLIP and T5-XXL outputs of recently seen prompts, by device index.
+        # Executors only reuse entries of their own device, so that cached
+        # arrays are never copied across devices.
+        self.prompt_caches: dict[int, EmbeddingCache] = {}
+        if prompt_cache_bytes > 0:
+            self.prompt_caches = {
+                device_index: EmbeddingCache(
+                    prompt_cache_bytes, max_host_bytes=prompt_cache_host_bytes
+                )
+                for device_index in range(len(sysman.ls.devices))
+            }
+        # With pipeline stages, every fiber runs one stage of each batch, so
+        # that encode, denoise and decode of different batches overlap.
+        self.pipeline: StagePipeline | None = None
+        if pipeline_stages:
+            self.pipeline = StagePipeline(
+                list(PIPELINE_STAGES),
+                launch=self.launch_stage,
+                on_first_stage_idle=lambda: self.batcher.wakeup(),
+            )
 
         # Finish initialization
         self.set_isolation(prog_isolation)
@@ -93,6 +143,7 @@ class FluxGenerateService(GenerateService):
         self.workers = []
         self.fibers = []
         self.idle_fibers = set()
+        IDLE_FIBERS.set_function(lambda: len(self.idle_fibers), service=self.name)
 
         # Create workers
         for i in range(self.workers_per_device):
@@ -100,13 +151,30 @@ class FluxGenerateService(GenerateService):
                 worker = self.create_worker(device, i)
                 self.workers.append(worker)
 
+        if self.pipeline is not None and self.fibers_per_device < len(PIPELINE_STAGES):
+            raise ValueError(
+                f"Pipeline stages need at least {len(PIPELINE_STAGES)} fibers per device, "
+                f"got {self.fibers_per_device}."
+            )
+
         # Create fibers
         for idx, device in enumerate(self.sysman.ls.devices):
             for i in range(self.fibers_per_device):
                 tgt_worker = self.workers[i % len(self.workers)]
                 fiber = self.sysman.ls.create_fiber(tgt_worker, devices=[device])
                 self.fibers.append(fiber)
-                self.idle_fibers.add(fiber)
+                self.step_schedulers[fiber] = StepScheduler(self.denoise_slots)
+                self.command_buffer_pools[fiber] = self.equip_command_buffers(fiber)
+                export_command_buffer_stats(
+                    self.command_buffer_pools[fiber].stats,
+                    service=self.name,
+                    fiber=len(self.fibers) - 1,
+                )
+                if self.pipeline is not None:
+                    stage = self.pipeline.stages[i % len(self.pipeline.stages)]
+                    self.pipeline.add_fiber(stage, fiber, idx)
+                else:
+                    self.idle_fibers.add(fiber)
 
         # Initialize inference containers
         for idx in range(len(self.workers)):
@@ -118,6 +186,26 @@ class FluxGenerateService(GenerateService):
                 "decode": {},
             }
 
+    def equip_command_buffers(self, fiber) -> CommandBufferPool:
+        """Pool of sampler inputs for `fiber`, built up front for every output size."""
+        pool = CommandBufferPool(
+            lambda key: initialize_denoise_inputs(fiber, self.model_params, *key),
+            max_per_key=self.command_buffers_per_shape,
+        )
+        for batch_size in self.model_params.sampler_batch_sizes:
+            for height, width in self.model_params.dims:
+                pool.preallocate(
+                    (batch_size, self.model_params.cfg_mult, height, width)
+                )
+        return pool
+
+    def launch_stage(self, batch: "InferenceExecutorProcess", stage, fiber):
+        """Continue `batch` at pipeline `stage` on `fiber`."""
+        exec_process = InferenceExecutorProcess(self, fiber, stage=stage)
+        exec_process.exec_requests = batch.exec_requests
+        exec_process.device_index = batch.device_index
+        exec_process.launch()
+
     def get_worker_index(self, fiber):
         if fiber not in self.fibers:
             raise ValueError("A worker was requested from a rogue fiber.")
@@ -198,8 +286,7 @@ class FluxGenerateService(GenerateService):
 
 
 class FluxBatcherProcess(BatcherProcess):
-    STROBE_SHORT_DELAY = 0.5
-    STROBE_LONG_DELAY = 1
+    MAX_BATCH_WAIT = 1.0
 
     def __init__(self, service: FluxGenerateService):
         super().__init__(fiber=service.fibers[0])
@@ -217,28 +304,49 @@ class FluxBatcherProcess(BatcherProcess):
         waiting_count = len(self.pending_requests)
         if waiting_count == 0:
             return
-        if waiting_count < self.ideal_batch_size and self.strobes < 2:
+        if waiting_count < self.ideal_batch_size and not self.deadline_expired():
             logger.info("Waiting a bit longer to fill flight")
             return
-        self.strobes = 0
         batches = self.sort_batches()
         for batch in batches.values():
             # Assign the batch to the next idle fiber.
-            if len(self.service.idle_fibers) == 0:
+            pipeline = self.service.pipeline
+            if pipeline is not None:
+                stage = pipeline.stages[0]
+                acquired = pipeline.acquire(stage)
+            elif self.service.idle_fibers:
+                stage = None
+                fiber = self.service.idle_fibers.pop()
+                device_index = (
+                    self.service.fibers.index(fiber) // self.service.fibers_per_device
+                )
+                acquired = (device_index, fiber)
+                self.service.step_schedulers[fiber].join()
+            else:
+                acquired = None
+            if acquired is None:
                 return
-            fiber = self.service.idle_fibers.pop()
+            device_index, fiber = acquired
             fiber_idx = self.service.fibers.index(fiber)
             worker_idx = self.service.get_worker_index(fiber)
             logger.debug(f"Sending batch to fiber {fiber_idx} (worker {worker_idx})")
-            self.board(batch["reqs"], fiber=fiber)
-            if self.service.prog_isolation != sf.ProgramIsolation.PER_FIBER:
+            self.board(
+                batch["reqs"], fiber=fiber, stage=stage, device_index=device_index
+            )
+            if (
+                pipeline is None
+                and self.service.prog_isolation != sf.ProgramIsolation.PER_FIBER
+            ):
                 self.service.idle_fibers.add(fiber)
+        if not self.pending_requests:
+            self.clear_deadline()
 
-    def board(self, request_bundle, fiber):
+    def board(self, request_bundle, fiber, stage=None, device_index: int = 0):
         pending = request_bundle
         if len(pending) == 0:
             return
-        exec_process = InferenceExecutorProcess(self.service, fiber)
+        exec_process = InferenceExecutorProcess(self.service, fiber, stage=stage)
+        exec_process.device_index = device_index
         for req in pending:
             if len(exec_process.exec_requests) >= self.ideal_batch_size:
                 break
@@ -255,17 +363,27 @@ class FluxBatcherProcess(BatcherProcess):
 
 
 class InferenceExecutorProcess(sf.Process):
-    """Executes a stable diffusion inference batch"""
+    """Executes a stable diffusion inference batch.
+
+    With a `stage`, only the phases of that pipeline stage run here, and the
+    batch is then handed to the service pipeline for its next stage.
+    """
 
     def __init__(
         self,
         service: FluxGenerateService,
         fiber,
+        stage: InferencePhase | None = None,
     ):
         super().__init__(fiber=fiber)
         self.service = service
         self.worker_index = self.service.get_worker_index(fiber)
+        self.stage = stage
+        self.device_index = 0
         self.exec_requests: list[FluxInferenceExecRequest] = []
+        self._fiber_released = False
+        # Staging buffer holding the decoded images until postprocessing.
+        self._staged_images = None
 
     @measure(type="exec", task="inference process")
     async def run(self):
@@ -279,30 +397,83 @@ class InferenceExecutorProcess(sf.Process):
             phases = self.exec_requests[0].phases
             req_count = len(self.exec_requests)
             device0 = self.fiber.device(0)
-            if phases[InferencePhase.PREPARE]["required"]:
+            if self._required(InferencePhase.PREPARE):
                 await self._prepare(device=device0, requests=self.exec_requests)
-            if phases[InferencePhase.ENCODE]["required"]:
+            if self._required(InferencePhase.ENCODE):
                 await self._clip(device=device0, requests=self.exec_requests)
                 await self._t5xxl(device=device0, requests=self.exec_requests)
-            if phases[InferencePhase.DENOISE]["required"]:
+            if self._required(InferencePhase.DENOISE):
                 await self._denoise(device=device0, requests=self.exec_requests)
-            if phases[InferencePhase.DECODE]["required"]:
+            if self._required(InferencePhase.DECODE):
                 await self._decode(device=device0, requests=self.exec_requests)
-            if phases[InferencePhase.POSTPROCESS]["required"]:
+            if self._required(InferencePhase.POSTPROCESS):
                 await self._postprocess(device=device0, requests=self.exec_requests)
-            await device0
+            if not self._fiber_released:
+                await device0
+
+            next_stage = None
+            if self.stage is not None:
+                next_stage = self.service.pipeline.next_stage(self.stage)
+            if next_stage is not None:
+                # The next stage reads this one's results from another fiber.
+                self._release_fiber()
+                self.service.pipeline.handoff(next_stage, self, self.device_index)
+                return
             for i in range(req_count):
                 req = self.exec_requests[i]
                 req.done.set_success()
-            if self.service.prog_isolation == sf.ProgramIsolation.PER_FIBER:
-                self.service.idle_fibers.add(self.fiber)
+            self._release_fiber()
 
         except Exception:
             logger.exception("Fatal error in image generation")
             # TODO: Cancel and set error correctly
+            if self._staged_images is not None:
+                staging, images_host = self._staged_images
+                staging.release(images_host)
+                self._staged_images = None
             for req in self.exec_requests:
                 req.done.set_success()
+            self._release_fiber()
+
+    def _required(self, phase: InferencePhase) -> bool:
+        if self.stage is not None and phase not in PIPELINE_STAGES[self.stage]:
+            return False
+        return self.exec_requests[0].phases[phase]["required"]
+
+    def _release_fiber(self):
+        """Return the fiber once no more device work is queued for this batch."""
+        if self._fiber_released:
+            return
+        self._fiber_released = True
+        if self.stage is not None:
+            self.service.pipeline.release(self.stage, self.fiber, self.device_index)
+            return
+        offer = self.service.step_schedulers[self.fiber].leave()
+        if offer and self.service.prog_isolation == sf.ProgramIsolation.PER_FIBER:
+            self.service.idle_fibers.add(self.fiber)
+            self.service.batcher.wakeup()
+
+    def _offer_fiber(self):
+        """Let the batcher board another batch here if the fiber has a free slot."""
+        if self.stage is not None:
+            return
+        if self.service.prog_isolation != sf.ProgramIsolation.PER_FIBER:
+            return
+        if self.service.step_schedulers[self.fiber].offer():
+            self.service.idle_fibers.add(self.fiber)
+            self.service.batcher.wakeup()
+
+    def _host_staging(self, shape) -> HostStagingBuffers:
+        key = (self.fiber, tuple(shape))
+        staging = self.service.host_staging.get(key)
+        if staging is None:
+            staging = HostStagingBuffers(
+                self.fiber.device(0), shape, self.service.model_params.vae_dtype
+            )
+            self.service.host_staging[key] = staging
+        return staging
 
+    @measure(type="phase", task="prepare")
     async def _prepare(self, device, requests):
         for request in requests:
             # Tokenize prompts and negative prompts. We tokenize in bs1 for now and join later.
@@ -370,6 +541,7 @@ class InferenceExecutorProcess(sf.Process):
             )
         return
 
+    @measure(type="phase", task="clip")
     async def _clip(self, device, requests):
         req_bs = len(requests)
         entrypoints = self.service.inference_functions[self.worker_index]["clip"]
@@ -381,6 +553,18 @@ class InferenceExecutorProcess(sf.Process):
             if bs == req_bs:
                 break
 
+        cache = self.service.prompt_caches.get(self.device_index)
+        if cache is not None:
+            keys = [
+                EmbeddingCache.key("clip", request.clip_input_ids[0].input_ids)
+                for request in requests
+            ]
+            cached = cache.get_all(keys)
+            if cached is not None:
+                for request, (vec,) in zip(requests, cached):
+                    request.vec = vec
+                return
+
         # Prepare tokenized input ids for CLIP inference
         clip_inputs = [
             sfnp.device_array.for_device(
@@ -419,8 +603,13 @@ class InferenceExecutorProcess(sf.Process):
         a.copy_from(vec)
         await device
 
+        if cache is not None:
+            await cache.insert(
+                {key: (request.vec,) for key, request in zip(keys, requests)}, device
+            )
         return
 
+    @measure(type="phase", task="t5xxl")
     async def _t5xxl(self, device, requests):
         req_bs = len(requests)
         entrypoints = self.service.inference_functions[self.worker_index]["t5xxl"]
@@ -432,6 +621,19 @@ class InferenceExecutorProcess(sf.Process):
             if bs == req_bs:
                 break
 
+        # T5-XXL is by far the most expensive encoder, skip it for known prompts.
+        cache = self.service.prompt_caches.get(self.device_index)
+        if cache is not None:
+            keys = [
+                EmbeddingCache.key("t5xxl", request.t5xxl_input_ids[0].input_ids)
+                for request in requests
+            ]
+            cached = cache.get_all(keys)
+            if cached is not None:
+                for request, (txt,) in zip(requests, cached):
+                    request.txt = txt
+                return
+
         # Prepare tokenized input ids for t5xxl inference
         t5xxl_inputs = [
             sfnp.device_array.for_device(
@@ -460,8 +662,13 @@ class InferenceExecutorProcess(sf.Process):
             cfg_mult = requests[i].cfg_mult
             requests[i].txt = txt.view(slice(i * cfg_mult, (i + 1) * cfg_mult))
 
+        if cache is not None:
+            await cache.insert(
+                {key: (request.txt,) for key, request in zip(keys, requests)}, device
+            )
         return
 
+    @measure(type="phase", task="denoise")
     async def _denoise(self, device, requests):
         req_bs = len(requests)
         step_count = requests[0].steps
@@ -495,172 +702,175 @@ class InferenceExecutorProcess(sf.Process):
             req_bs * cfg_mult,
             self.service.model_params.clip_out_dim,
         ]
-        denoise_inputs = {
-            "img": sfnp.device_array.for_device(
-                device, img_shape, self.service.model_params.sampler_dtype
-            ),
-            "txt": sfnp.device_array.for_device(
-                device, txt_shape, self.service.model_params.sampler_dtype
-            ),
-            "vec": sfnp.device_array.for_device(
-                device, vec_shape, self.service.model_params.sampler_dtype
-            ),
-            "step": sfnp.device_array.for_device(device, [1], sfnp.int64),
-            "timesteps": sfnp.device_array.for_device(
-                device, [100], self.service.model_params.sampler_dtype
-            ),
-            "guidance_scale": sfnp.device_array.for_device(
-                device, [req_bs], self.service.model_params.sampler_dtype
-            ),
-        }
-        # Send guidance scale to device.
-        gs_host = denoise_inputs["guidance_scale"].for_transfer()
-        sample_host = sfnp.device_array.for_host(
-            device, img_shape, self.service.model_params.sampler_dtype
+        pool = self.service.command_buffer_pools[self.fiber]
+        denoise_inputs = await pool.lease(
+            (req_bs, cfg_mult, requests[0].height, requests[0].width)
         )
-        guidance_float = sfnp.device_array.for_host(device, [req_bs], sfnp.float32)
-
-        for i in range(req_bs):
-            guidance_float.view(i).items = [requests[i].guidance_scale]
-            cfg_dim = i * cfg_mult
-
-            # Reshape and batch sample latent inputs on device.
-            # Currently we just generate random latents in the desired shape. Rework for img2img.
-            req_samp = requests[i].sample
-            for rep in range(cfg_mult):
-                sample_host.view(slice(cfg_dim + rep, cfg_dim + rep + 1)).copy_from(
-                    req_samp
-                )
-            denoise_inputs["img"].view(slice(cfg_dim, cfg_dim + cfg_mult)).copy_from(
-                sample_host
+        try:
+            # Send guidance scale to device.
+            gs_host = denoise_inputs["guidance_scale"].for_transfer()
+            sample_host = sfnp.device_array.for_host(
+                device, img_shape, self.service.model_params.sampler_dtype
             )
+            guidance_float = sfnp.device_array.for_host(device, [req_bs], sfnp.float32)
 
-            # Batch t5xxl hidden states.
-            txt = requests[i].txt
-            if (
-                self.service.model_params.t5xxl_dtype
-                != self.service.model_params.sampler_dtype
-            ):
-                inter = sfnp.device_array.for_host(
-                    device, txt_shape, dtype=self.service.model_params.sampler_dtype
-                )
-                host = sfnp.device_array.for_host(
-                    device, txt_shape, dtype=self.service.model_params.t5xxl_dtype
-                )
-                host.view(slice(cfg_dim, cfg_dim + cfg_mult)).copy_from(txt)
-                await device
-                sfnp.convert(
-                    host,
-                    dtype=self.service.model_params.sampler_dtype,
-                    out=inter,
-                )
-                denoise_inputs["txt"].view(
-                    slice(cfg_dim, cfg_dim + cfg_mult)
-                ).copy_from(inter)
-            else:
-                denoise_inputs["txt"].view(
+            for i in range(req_bs):
+                guidance_float.view(i).items = [requests[i].guidance_scale]
+                cfg_dim = i * cfg_mult
+
+                # Reshape and batch sample latent inputs on device.
+                # Currently we just generate random latents in the desired shape. Rework for img2img.
+                req_samp = requests[i].sample
+                for rep in range(cfg_mult):
+                    sample_host.view(slice(cfg_dim + rep, cfg_dim + rep + 1)).copy_from(
+                        req_samp
+                    )
+                denoise_inputs["img"].view(
                     slice(cfg_dim, cfg_dim + cfg_mult)
-                ).copy_from(txt)
-
-            # Batch CLIP projections.
-            vec = requests[i].vec
-            if (
-                self.service.model_params.t5xxl_dtype
-                != self.service.model_params.sampler_dtype
-            ):
-                for nc in range(cfg_mult):
+                ).copy_from(sample_host)
+
+                # Batch t5xxl hidden states.
+                txt = requests[i].txt
+                if (
+                    self.service.model_params.t5xxl_dtype
+                    != self.service.model_params.sampler_dtype
+                ):
                     inter = sfnp.device_array.for_host(
-                        device, vec_shape, dtype=self.service.model_params.sampler_dtype
+                        device, txt_shape, dtype=self.service.model_params.sampler_dtype
                     )
                     host = sfnp.device_array.for_host(
-                        device, vec_shape, dtype=self.service.model_params.clip_dtype
+                        device, txt_shape, dtype=self.service.model_params.t5xxl_dtype
                     )
-                    host.view(slice(nc, nc + 1)).copy_from(vec)
+                    host.view(slice(cfg_dim, cfg_dim + cfg_mult)).copy_from(txt)
                     await device
                     sfnp.convert(
                         host,
                         dtype=self.service.model_params.sampler_dtype,
                         out=inter,
                     )
-                    denoise_inputs["vec"].view(slice(nc, nc + 1)).copy_from(inter)
-            else:
-                for nc in range(cfg_mult):
-                    denoise_inputs["vec"].view(slice(nc, nc + 1)).copy_from(vec)
-        sfnp.convert(
-            guidance_float, dtype=self.service.model_params.sampler_dtype, out=gs_host
-        )
-        denoise_inputs["guidance_scale"].copy_from(gs_host)
-        await device
-        ts_host = denoise_inputs["timesteps"].for_transfer()
-        ts_float = sfnp.device_array.for_host(
-            device, denoise_inputs["timesteps"].shape, dtype=sfnp.float32
-        )
-        with ts_float.map(write=True) as m:
-            m.fill(float(1))
-        for tstep in range(len(requests[0].timesteps)):
-            with ts_float.view(tstep).map(write=True, discard=True) as m:
-                m.fill(np.asarray(requests[0].timesteps[tstep], dtype="float32"))
-
-        sfnp.convert(
-            ts_float, dtype=self.service.model_params.sampler_dtype, out=ts_host
-        )
-        denoise_inputs["timesteps"].copy_from(ts_host)
-        await device
-
-        for i, t in tqdm(
-            enumerate(range(step_count)),
-            disable=(not self.service.show_progress),
-            desc=f"DENOISE (bs{req_bs})",
-        ):
-            s_host = denoise_inputs["step"].for_transfer()
-            with s_host.map(write=True) as m:
-                s_host.items = [i]
-            denoise_inputs["step"].copy_from(s_host)
-
-            logger.info(
-                "INVOKE %r",
-                fns["sampler"],
+                    denoise_inputs["txt"].view(
+                        slice(cfg_dim, cfg_dim + cfg_mult)
+                    ).copy_from(inter)
+                else:
+                    denoise_inputs["txt"].view(
+                        slice(cfg_dim, cfg_dim + cfg_mult)
+                    ).copy_from(txt)
+
+                # Batch CLIP projections.
+                vec = requests[i].vec
+                if (
+                    self.service.model_params.t5xxl_dtype
+                    != self.service.model_params.sampler_dtype
+                ):
+                    for nc in range(cfg_mult):
+                        inter = sfnp.device_array.for_host(
+                            device,
+                            vec_shape,
+                            dtype=self.service.model_params.sampler_dtype,
+                        )
+                        host = sfnp.device_array.for_host(
+                            device,
+                            vec_shape,
+                            dtype=self.service.model_params.clip_dtype,
+                        )
+                        host.view(slice(nc, nc + 1)).copy_from(vec)
+                        await device
+                        sfnp.convert(
+                            host,
+                            dtype=self.service.model_params.sampler_dtype,
+                            out=inter,
+                        )
+                        denoise_inputs["vec"].view(slice(nc, nc + 1)).copy_from(inter)
+                else:
+                    for nc in range(cfg_mult):
+                        denoise_inputs["vec"].view(slice(nc, nc + 1)).copy_from(vec)
+            sfnp.convert(
+                guidance_float,
+                dtype=self.service.model_params.sampler_dtype,
+                out=gs_host,
             )
+            denoise_inputs["guidance_scale"].copy_from(gs_host)
             await device
-            (noise_pred,) = await fns["sampler"](
-                *denoise_inputs.values(), fiber=self.fiber
+            ts_host = denoise_inputs["timesteps"].for_transfer()
+            ts_float = sfnp.device_array.for_host(
+                device, denoise_inputs["timesteps"].shape, dtype=sfnp.float32
+            )
+            with ts_float.map(write=True) as m:
+                m.fill(float(1))
+            for tstep in range(len(requests[0].timesteps)):
+                with ts_float.view(tstep).map(write=True, discard=True) as m:
+                    m.fill(np.asarray(requests[0].timesteps[tstep], dtype="float32"))
+
+            sfnp.convert(
+                ts_float, dtype=self.service.model_params.sampler_dtype, out=ts_host
             )
+            denoise_inputs["timesteps"].copy_from(ts_host)
             await device
-            denoise_inputs["img"].copy_from(noise_pred)
 
-        for idx, req in enumerate(requests):
-            req.denoised_latents = sfnp.device_array.for_device(
-                device, img_shape, self.service.model_params.vae_dtype
-            )
-            if (
-                self.service.model_params.vae_dtype
-                != self.service.model_params.sampler_dtype
+            scheduler = self.service.step_schedulers[self.fiber]
+            for i, t in tqdm(
+                enumerate(range(step_count)),
+                disable=(not self.service.show_progress),
+                desc=f"DENOISE (bs{req_bs})",
             ):
-                pred_shape = [
-                    1,
-                    (requests[0].height) * (requests[0].width) // 256,
-                    64,
-                ]
-                denoised_inter = sfnp.device_array.for_host(
-                    device, pred_shape, dtype=self.service.model_params.vae_dtype
-                )
-                denoised_host = sfnp.device_array.for_host(
-                    device, pred_shape, dtype=self.service.model_params.sampler_dtype
-                )
-                denoised_host.copy_from(denoise_inputs["img"].view(idx * cfg_mult))
-                await device
-                sfnp.convert(
-                    denoised_host,
-                    dtype=self.service.model_params.vae_dtype,
-                    out=denoised_inter,
-                )
-                req.denoised_latents.copy_from(denoised_inter)
-            else:
-                req.denoised_latents.copy_from(
-                    denoise_inputs["img"].view(idx * cfg_mult)
+                # Steps of all batches on this fiber take turns.
+                async with scheduler.turn():
+                    s_host = denoise_inputs["step"].for_transfer()
+                    with s_host.map(write=True) as m:
+                        s_host.items = [i]
+                    denoise_inputs["step"].copy_from(s_host)
+
+                    logger.info(
+                        "INVOKE %r",
+                        fns["sampler"],
+                    )
+                    await device
+                    (noise_pred,) = await fns["sampler"](
+                        *denoise_inputs.values(), fiber=self.fiber
+                    )
+                    await device
+                    denoise_inputs["img"].copy_from(noise_pred)
+                self._offer_fiber()
+
+            for idx, req in enumerate(requests):
+                req.denoised_latents = sfnp.device_array.for_device(
+                    device, img_shape, self.service.model_params.vae_dtype
                 )
+                if (
+                    self.service.model_params.vae_dtype
+                    != self.service.model_params.sampler_dtype
+                ):
+                    pred_shape = [
+                        1,
+                        (requests[0].height) * (requests[0].width) // 256,
+                        64,
+                    ]
+                    denoised_inter = sfnp.device_array.for_host(
+                        device, pred_shape, dtype=self.service.model_params.vae_dtype
+                    )
+                    denoised_host = sfnp.device_array.for_host(
+                        device,
+                        pred_shape,
+                        dtype=self.service.model_params.sampler_dtype,
+                    )
+                    denoised_host.copy_from(denoise_inputs["img"].view(idx * cfg_mult))
+                    await device
+                    sfnp.convert(
+                        denoised_host,
+                        dtype=self.service.model_params.vae_dtype,
+                        out=denoised_inter,
+                    )
+                    req.denoised_latents.copy_from(denoised_inter)
+                else:
+                    req.denoised_latents.copy_from(
+                        denoise_inputs["img"].view(idx * cfg_mult)
+                    )
+        finally:
+            # Later batches on this fiber are queued after the reads above.
+            pool.release(denoise_inputs)
         return
 
+    @measure(type="phase", task="decode")
     async def _decode(self, device, requests):
         req_bs = len(requests)
         # Decode latents to images
@@ -699,15 +909,27 @@ class InferenceExecutorProcess(sf.Process):
             requests[0].height,
             requests[0].width,
         ]
-        images_host = sfnp.device_array.for_host(
-            device, images_shape, self.service.model_params.vae_dtype
-        )
-        images_host.copy_from(image)
-        await device
+        staging = self._host_staging(images_shape)
+        images_host = await staging.acquire()
+        transfer = copy_to_host(images_host, image)
+        # Nothing else is queued on the device for this batch, so the next one
+        # can start while the images are read back and postprocessed.
+        self._release_fiber()
+        try:
+            await transfer
+        except Exception:
+            staging.release(images_host)
+            raise
         for idx, req in enumerate(requests):
             req.image_array = images_host.view(idx)
+        if requests[0].phases[InferencePhase.POSTPROCESS]["required"]:
+            # `_postprocess` returns the buffer once it has read the images.
+            self._staged_images = (staging, images_host)
+        else:
+            staging.detach(images_host)
         return
 
+    @measure(type="phase", task="postprocess")
     async def _postprocess(self, device, requests):
         # Process output images
         for req in requests:
@@ -717,11 +939,13 @@ class InferenceExecutorProcess(sf.Process):
                 req.width,
             ]
             out_shape = [req.height, req.width, 3]
-            images_planar = sfnp.device_array.for_host(
-                device, image_shape, self.service.model_params.vae_dtype
+            # Read the staged image in place rather than with a device queue
+            # copy, which would wait behind the next batch.
+            images_planar = sfnp.device_array(
+                req.image_array.storage,
+                image_shape,
+                self.service.model_params.vae_dtype,
             )
-            images_planar.copy_from(req.image_array)
-            await device
             permuted = sfnp.device_array.for_host(
                 device, out_shape, self.service.model_params.vae_dtype
             )
@@ -734,4 +958,40 @@ class InferenceExecutorProcess(sf.Process):
                 mode="RGB", size=out.shape[:2], data=out_bytes
             )
             req.response_image = processed_image
+        if self._staged_images is not None:
+            staging, images_host = self._staged_images
+            staging.release(images_host)
+            self._staged_images = None
         return
+
+
+def initialize_denoise_inputs(
+    fiber, model_params: ModelParams, bs: int, cfg_mult: int, height: int, width: int
+) -> dict[str, sfnp.device_array]:
+    """Device inputs of the sampler for a batch of `bs` requests."""
+    device = fiber.device(0)
+    img_shape = [bs * cfg_mult, height * width // 256, 64]
+    txt_shape = [
+        bs * cfg_mult,
+        model_params.t5xxl_max_seq_len,
+        model_params.t5xxl_out_dim,
+    ]
+    vec_shape = [bs * cfg_mult, model_params.clip_out_dim]
+    return {
+        "img": sfnp.device_array.for_device(
+            device, img_shape, model_params.sampler_dtype
+        ),
+        "txt": sfnp.device_array.for_device(
+            device, txt_shape, model_params.sampler_dtype
+        ),
+        "vec": sfnp.device_array.for_device(
+            device, vec_shape, model_params.sampler_dtype
+        ),
+        "step": sfnp.device_array.for_device(device, [1], sfnp.int64),
+        "timesteps": sfnp.device_array.for_device(
+            device, [100], model_params.sampler_dtype
+        ),
+        "guidance_scale": sfnp.device_array.for_device(
+            device, [bs], model_params.sampler_dtype
+        ),
+    }
@@ -28,6 +28,7 @@ from .components.io_struct import GenerateReqInput
 from .components.manager import FluxSystemManager
 from .components.service import FluxGenerateService
 from .components.tokenizer import Tokenizer
+from shortfin_apps.utilities.metrics import CONTENT_TYPE, REGISTRY
 
 
 logger = logging.getLogger("shortfin-flux")
@@ -94,6 +95,11 @@ async def health() -> Response:
     return Response(status_code=200)
 
 
+@app.get("/metrics")
+async def metrics() -> Response:
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
 async def generate_request(gen_req: GenerateReqInput, request: Request):
     service = services["flux"]
     gen_req.post_init()
@@ -146,6 +152,11 @@ def configure_service(args, sysman, model_config, flagfile, tuning_spec):
         prog_isolation=args.isolation,
         show_progress=args.show_progress,
         trace_execution=args.trace_execution,
+        pipeline_stages=args.pipeline_stages,
+        prompt_cache_bytes=args.prompt_cache_mb << 20,
+        prompt_cache_host_bytes=args.prompt_cache_host_mb << 20,
+        denoise_slots=args.denoise_slots,
+        command_buffers_per_shape=args.command_buffers_per_shape,
     )
     for key, vmfblist in vmfbs.items():
         for vmfb in vmfblist:
@@ -342,6 +353,35 @@ def main(argv, log_config=UVICORN_LOG_CONFIG):
         choices=["per_fiber", "per_call", "none"],
         help="Concurrency control -- How to isolate programs.",
     )
+    parser.add_argument(
+        "--pipeline_stages",
+        action="store_true",
+        help="Run encode, denoise and decode of a batch on separate fibers, so that stages of consecutive batches overlap. Needs at least 3 fibers per device.",
+    )
+    parser.add_argument(
+        "--denoise_slots",
+        type=int,
+        default=1,
+        help="Batches that may share a fiber. New batches join at denoise step boundaries and steps of the batches on a fiber take turns.",
+    )
+    parser.add_argument(
+        "--command_buffers_per_shape",
+        type=int,
+        default=4,
+        help="Most command buffers a fiber keeps for each batch size and output size. Batches wait for a free one beyond that.",
+    )
+    parser.add_argument(
+        "--prompt_cache_mb",
+        type=int,
+        default=0,
+        help="Device memory on each device for caching text encoder outputs of repeated prompts, in MiB. 0 (the default) disables the cache.",
+    )
+    parser.add_argument(
+        "--prompt_cache_host_mb",
+        type=int,
+        default=0,
+        help="Host memory per device that cached text encoder outputs are spilled to once that device's cache is full, in MiB.",
+    )
     parser.add_argument(
         "--show_progress",
         action="store_true",
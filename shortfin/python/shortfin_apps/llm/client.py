@@ -72,8 +72,12 @@ def main() -> None:
         response.raise_for_status()
 
         if response.text.startswith("data: "):
-            text = response.text[6:].rstrip("\n")
-            print("Generated text:", text)
+            chunks = []
+            for line in response.text.splitlines():
+                if not line.startswith("data: ") or line == "data: [DONE]":
+                    continue
+                chunks.append(json.loads(line[6:]).get("text", ""))
+            print("Generated text:", "".join(chunks))
             print("\nTest passed")
         else:
             print("\nTest failed: unexpected response format")
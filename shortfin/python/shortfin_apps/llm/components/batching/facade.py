@@ -8,6 +8,8 @@
 Implements a unified facade to handle batching.
 """
 
+import time
+
 import shortfin as sf
 
 from typing import Callable
@@ -23,6 +25,9 @@ class BatchingFacade:
         self._impl = impl
 
     def submit(self, exec_request: LlmInferenceExecRequest):
+        exec_request.submit_time = time.monotonic()
+        if exec_request.trace is not None:
+            exec_request.trace.instant("enqueue", phase=exec_request.phase.name.lower())
         self._impl.submit(request=exec_request)
 
     def launch(self):
@@ -16,6 +16,7 @@ from .config import BatchConfig, BatchMode
 from ..kvcache.base_attention_cache import BasePagedAttentionCache
 from .batching_trait import BatchingTrait
 from .modes.default import DefaultBatchingEngine
+from .modes.token_budget import TokenBudgetBatchingEngine
 from ..messages import LlmInferenceExecRequest
 
 
@@ -62,4 +63,15 @@ def _create_impl(batch_cfg: BatchConfig, page_cache: BasePagedAttentionCache, pr
             page_cache=page_cache,
         )
 
+    if batch_cfg.mode == BatchMode.TOKEN_BUDGET:
+        return _BatchingEngineImpl(
+            TokenBudgetBatchingEngine.create(
+                batch_cfg=batch_cfg,
+                page_cache=page_cache,
+                prefill_fiber=prefill_fiber,
+                decode_fiber=decode_fiber,
+            ),
+            page_cache=page_cache,
+        )
+
     raise ValueError(f"Unsupported Batching Mode: {batch_cfg.mode}")
@@ -4,6 +4,7 @@
 # See https://llvm.org/LICENSE.txt for license information.
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
+import functools
 import logging
 import traceback
 from typing import List, Optional
@@ -30,6 +31,12 @@ from ...invocation import (
 from ...kvcache.base_attention_cache import (
     BasePagedAttentionCache,
 )
+from ...metrics import (
+    ARRAY_CACHE_HITS,
+    ARRAY_CACHE_MISSES,
+    ARRAY_CACHE_RESIDENT_BYTES,
+    ARRAY_CACHE_STAGING_RING_MISSES,
+)
 from ...messages import InferencePhase, LlmInferenceExecRequest
 from ...scheduler import AbstractScheduler, ChunkScheduler, Scheduler
 
@@ -38,6 +45,18 @@ from .....utils import BatcherProcess
 
 logger = logging.getLogger(__name__)
 
+# Host staging space for invocation arguments. Arguments of in flight
+# invocations that do not fit fall back to per buffer host staging.
+STAGING_RING_BYTES = 8 * 1024 * 1024
+
+# Device array cache stats exported as gauges, by stats field.
+ARRAY_CACHE_GAUGES = {
+    "hits": ARRAY_CACHE_HITS,
+    "misses": ARRAY_CACHE_MISSES,
+    "resident_bytes": ARRAY_CACHE_RESIDENT_BYTES,
+    "staging_ring_misses": ARRAY_CACHE_STAGING_RING_MISSES,
+}
+
 
 ########################################################################################
 # Task Responders
@@ -68,14 +87,14 @@ class PrefillTaskResponder(LlmTaskResponder):
             task_input = task_inputs[i]
             sl = len(task_input.input_tokens) - 1
 
-            if logits.shape[1] == 1:
+            if logits.shape[1] == 1 or req.return_all_logits:
                 logits_item = logits.view(i)
             else:
                 logits_item = logits.view(i, sl)
 
             index_item = None
             if indices is not None:
-                if indices.shape[1] == 1:
+                if indices.shape[1] == 1 or req.return_all_logits:
                     index_item = indices.view(i)
                 else:
                     index_item = indices.view(i, sl)
@@ -83,10 +102,23 @@ class PrefillTaskResponder(LlmTaskResponder):
             req.result_logits = logits_item
             req.result_indices = index_item
 
+        self._select_candidates(
+            exec_requests,
+            logits,
+            indices,
+            positions=[len(task_input.input_tokens) - 1 for task_input in task_inputs],
+        )
+
+        has_next_chunk = False
         for req in exec_requests:
             if self._scheduler.handle_completed(req.orig_instance_id):
                 req.done.set_success()
                 self._remove_request(req.instance_id)
+            else:
+                has_next_chunk = True
+
+        if has_next_chunk:
+            self._notify_ready()
 
     def set_failure(self, llm_task: LlmTask):
         logger.error(
@@ -126,6 +158,8 @@ class DecodeTaskResponder(LlmTaskResponder):
             req.result_logits = logits_item
             req.result_indices = index_item
 
+        self._select_candidates(exec_requests, logits, indices)
+
         for req in exec_requests:
             if self._scheduler.handle_completed(req.orig_instance_id):
                 req.done.set_success()
@@ -151,11 +185,26 @@ class DecodeTaskResponder(LlmTaskResponder):
 ########################################################################################
 
 
+def make_decode_task_inputs(
+    exec_request: LlmInferenceExecRequest,
+) -> List[LlmTaskInput]:
+    return [
+        LlmTaskInput(
+            rid=exec_request.orig_instance_id,
+            instance_id=exec_request.instance_id,
+            block_count=exec_request.block_count,
+            seq_len=exec_request.start_position + 1,
+            input_tokens=tuple(exec_request.input_token_ids),
+            page_ids=tuple(exec_request.page_ids),
+            start_position=exec_request.start_position,
+        )
+    ]
+
+
 class LlmBatcherProcess(BatcherProcess):
     """This batcher provides a high-level mechanism for dispatching LLM tasks."""
 
-    STROBE_SHORT_DELAY = 0.065
-    STROBE_LONG_DELAY = 0.065
+    MAX_BATCH_WAIT = 0.13
 
     def __init__(
         self,
@@ -179,12 +228,20 @@ class LlmBatcherProcess(BatcherProcess):
         # batching in the scheduling algo.
         self.ideal_batch_size: int = ideal_batch_size
         self.page_seq_stride = self.model_params.paged_kv_cache.block_seq_stride
-        self.array_cache: DeviceArrayCache = DeviceArrayCache(fiber.device(0))
+        self.array_cache: DeviceArrayCache = DeviceArrayCache(
+            fiber.device(0), staging_ring_bytes=STAGING_RING_BYTES
+        )
+        stats = self.array_cache.stats
+        for field, gauge in ARRAY_CACHE_GAUGES.items():
+            gauge.set_function(
+                functools.partial(getattr, stats, field), batcher=self.name
+            )
 
         self.program_isolation = program_isolation
 
         self.scheduler = scheduler
         self._llm_task_responder = llm_task_responder
+        self._llm_task_responder.set_wakeup(functools.partial(self.wakeup, ready=True))
 
     def handle_inference_request(self, request: LlmInferenceExecRequest):
         """Handle an inference request."""
@@ -197,6 +254,8 @@ class LlmBatcherProcess(BatcherProcess):
         """Shutdown the batcher process."""
         super().shutdown()
         self.array_cache.free()
+        for gauge in ARRAY_CACHE_GAUGES.values():
+            gauge.set_function(None, batcher=self.name)
 
     async def process_batches(self):
         """Process batches of requests."""
@@ -213,7 +272,12 @@ class LlmBatcherProcess(BatcherProcess):
 
     async def board_flights(self):
         """Make, schedule, and launch a batch of pending requests."""
-        to_schedule = self.scheduler.should_execute(self.strobes)
+        flush = self.deadline_expired()
+        to_schedule = self.scheduler.should_execute(self.strobes, flush=flush)
+        # Once nothing is left waiting, a deadline of earlier arrivals would
+        # only flush the next arrival early.
+        if flush or (to_schedule and not self.scheduler.has_ready_jobs()):
+            self.clear_deadline()
 
         if not to_schedule:
             return
@@ -292,8 +356,7 @@ class PrefillBatcherProcess(LlmBatcherProcess):
     committed cache state).
     """
 
-    STROBE_SHORT_DELAY = 0.065
-    STROBE_LONG_DELAY = 0.065
+    MAX_BATCH_WAIT = 0.13
 
     def __init__(
         self,
@@ -303,11 +366,12 @@ class PrefillBatcherProcess(LlmBatcherProcess):
         prefill_functions: dict[int, sf.ProgramFunction],
         program_isolation: str,
         chunk_block_size: Optional[int],
+        scheduler: Optional[AbstractScheduler] = None,
     ):
         ideal_batch_size = max(model_params.prefill_batch_sizes)
-        if chunk_block_size is not None:
+        if scheduler is None and chunk_block_size is not None:
             scheduler = ChunkScheduler(ideal_batch_size=ideal_batch_size)
-        else:
+        elif scheduler is None:
             scheduler = Scheduler(ideal_batch_size=ideal_batch_size)
 
         llm_task_responder = PrefillTaskResponder(scheduler=scheduler)
@@ -429,8 +493,7 @@ class DecodeBatcherProcess(LlmBatcherProcess):
     committed cache state).
     """
 
-    STROBE_SHORT_DELAY = 0.0006
-    STROBE_LONG_DELAY = 0.0006
+    MAX_BATCH_WAIT = 0.0012
 
     def __init__(
         self,
@@ -457,17 +520,7 @@ class DecodeBatcherProcess(LlmBatcherProcess):
     def make_task_inputs(
         self, exec_request: LlmInferenceExecRequest
     ) -> List[LlmTaskInput]:
-        return [
-            LlmTaskInput(
-                rid=exec_request.orig_instance_id,
-                instance_id=exec_request.instance_id,
-                block_count=exec_request.block_count,
-                seq_len=exec_request.start_position + 1,
-                input_tokens=tuple(exec_request.input_token_ids),
-                page_ids=tuple(exec_request.page_ids),
-                start_position=exec_request.start_position,
-            )
-        ]
+        return make_decode_task_inputs(exec_request)
 
     def make_task(
         self,
@@ -0,0 +1,198 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+"""
+Continuous batching under a per-step token budget.
+
+A single batcher owns both the prefill and decode entry points. Each step it
+asks `TokenBudgetScheduler` for the in-flight decode tokens plus as many
+prefill chunks as fit in the remaining budget, launches both invocations back
+to back on its fiber and waits for them before building the next step. Long
+prompts are split into chunks (see `chunk_block_size`) and fed in over several
+steps, so they never hold up decode for other requests for longer than one
+bounded step.
+"""
+
+import asyncio
+import logging
+from typing import List
+
+import shortfin as sf
+
+from shortfin import Fiber
+
+from ..batching_trait import BatchingTrait
+from ..config import BatchConfig
+from .default import (
+    DecodeTaskResponder,
+    PrefillBatcherProcess,
+    make_decode_task_inputs,
+)
+
+from ...config_struct import ModelParams
+from ...invocation import DecodeTask, LlmInvocationProcess, LlmTaskInput
+from ...kvcache.base_attention_cache import BasePagedAttentionCache
+from ...messages import InferencePhase, LlmInferenceExecRequest
+from ...scheduler import TokenBudgetScheduler
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBudgetBatcherProcess(PrefillBatcherProcess):
+    """Batcher that runs prefill chunks and decode steps together under a token budget."""
+
+    # Steps are built from whatever is ready; nothing waits for a batch to fill.
+    MAX_BATCH_WAIT = 0.0
+
+    def __init__(
+        self,
+        fiber: Fiber,
+        page_cache: BasePagedAttentionCache,
+        model_params: ModelParams,
+        prefill_functions: dict[int, sf.ProgramFunction],
+        decode_functions: dict[int, sf.ProgramFunction],
+        program_isolation: str,
+        chunk_block_size: int | None,
+        token_budget: int,
+    ):
+        scheduler = TokenBudgetScheduler(
+            token_budget=token_budget,
+            decode_batch_size=max(model_params.decode_batch_sizes),
+            prefill_batch_size=max(model_params.prefill_batch_sizes),
+        )
+        super().__init__(
+            fiber=fiber,
+            page_cache=page_cache,
+            model_params=model_params,
+            prefill_functions=prefill_functions,
+            program_isolation=program_isolation,
+            chunk_block_size=chunk_block_size,
+            scheduler=scheduler,
+        )
+        self.name = "token_budget"
+        self.decode_functions = decode_functions
+        self._decode_task_responder = DecodeTaskResponder(scheduler=scheduler)
+
+    def handle_inference_request(self, request: LlmInferenceExecRequest):
+        if request.phase != InferencePhase.DECODE:
+            super().handle_inference_request(request)
+            return
+
+        self._decode_task_responder.add_request(request)
+        for task_input in make_decode_task_inputs(request):
+            self.scheduler.schedule_decode(task_input)
+
+    def make_decode_invoker(
+        self,
+        page_cache: BasePagedAttentionCache,
+        fiber: Fiber,
+        task_inputs: List[LlmTaskInput],
+    ) -> LlmInvocationProcess:
+        return LlmInvocationProcess(
+            name="decode_invocation",
+            fiber=fiber,
+            llm_task=DecodeTask(
+                task_inputs=task_inputs,
+                array_cache=self.array_cache,
+                page_tables=page_cache.page_pool.page_tables,
+                seq_stride=self.page_seq_stride,
+            ),
+            functions=self.decode_functions,
+            program_isolation=self.program_isolation,
+            responder=self._decode_task_responder,
+        )
+
+    async def board_flights(self):
+        """Launch one step of decode and prefill work and wait for it to finish.
+
+        Work submitted while the step runs queues up in the batcher infeed and
+        is picked up by the next step, which is started as soon as this one ends.
+        """
+        step = self.scheduler.should_execute(self.strobes)
+        if step.is_empty():
+            return
+
+        logger.debug(
+            "Boarding step: %d decode, %d prefill, %d tokens",
+            len(step.decode),
+            len(step.prefill),
+            step.token_count,
+        )
+        invocations = []
+        if step.decode:
+            invocations.append(
+                self.make_decode_invoker(self.page_cache, self.fiber, step.decode)
+            )
+        if step.prefill:
+            invocations.append(
+                self.make_invoker(self.page_cache, self.fiber, step.prefill)
+            )
+        for invocation in invocations:
+            invocation.launch()
+        await asyncio.gather(*invocations)
+        # Work left over from this step does not generate a message of its own.
+        self.wakeup()
+
+
+class TokenBudgetBatchingEngine(BatchingTrait):
+    def __init__(self, batcher: TokenBudgetBatcherProcess):
+        self.batcher = batcher
+
+    def submit(self, request: LlmInferenceExecRequest):
+        self.batcher.submit(request)
+
+    def launch(self):
+        self.batcher.launch()
+
+    def shutdown(self):
+        self.batcher.shutdown()
+
+    def reserve_workload(self, rid: str, count: int):
+        self.batcher.reserve_workload(rid=rid, count=count)
+
+    def get_model_params(self) -> ModelParams:
+        return self.batcher.model_params
+
+    @staticmethod
+    def create(
+        batch_cfg: BatchConfig, page_cache: BasePagedAttentionCache, prefill_fiber: sf.Fiber, decode_fiber: sf.Fiber | None = None  # type: ignore
+    ):
+        token_budget = batch_cfg.token_budget
+        if token_budget is None:
+            raise ValueError("Token budget batching requires `token_budget` to be set")
+
+        if batch_cfg.chunk_block_size is not None:
+            chunk_tokens = (
+                batch_cfg.chunk_block_size
+                * batch_cfg.model_params.paged_kv_cache.block_seq_stride
+            )
+            if chunk_tokens > token_budget:
+                logger.warning(
+                    "Prefill chunks of %d tokens exceed the token budget of %d. "
+                    "Each step will run at most one chunk.",
+                    chunk_tokens,
+                    token_budget,
+                )
+        else:
+            logger.warning(
+                "Token budget batching without `chunk_block_size` runs each prompt "
+                "in a single step; long prompts will still stall decode."
+            )
+
+        # Decode shares the prefill fiber so both run in one stream of steps.
+        return TokenBudgetBatchingEngine(
+            TokenBudgetBatcherProcess(
+                fiber=prefill_fiber,
+                page_cache=page_cache,
+                model_params=batch_cfg.model_params,
+                prefill_functions=batch_cfg.prefill_functions,
+                decode_functions=batch_cfg.decode_functions,
+                program_isolation=batch_cfg.prog_isolation,
+                chunk_block_size=batch_cfg.chunk_block_size,
+                token_budget=token_budget,
+            )
+        )
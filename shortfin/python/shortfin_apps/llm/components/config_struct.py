@@ -239,6 +239,17 @@ class ServerParams:
     # KV cache configuration
     prefix_sharing_algorithm: str = "none"  # none or trie
 
+    # Number of pages in the host memory tier that evicted trie pages are
+    # copied to. 0 disables the tier. Only used with the `trie` algorithm.
+    host_spill_page_count: int = 0
+
+    # File the trie prefix cache is saved to at shutdown and restored from at
+    # start up. Only used with the `trie` algorithm.
+    prefix_cache_snapshot: Optional[str] = None
+
+    # Prompts run through prefill at start up to pre-populate the prefix cache.
+    prefix_cache_warmup_prompts: list[str] = field(default_factory=list)
+
     # Program isolation configuration
     program_isolation: str = "per_call"
 
@@ -248,6 +259,22 @@ class ServerParams:
 
     chunk_block_size: Optional[int] = None
 
+    # Tokens proposed by the draft model per step of speculative decoding.
+    # Only used when a draft model is loaded.
+    num_speculative_tokens: int = 4
+
+    # Admit requests without reserving pages for their whole completion and
+    # preempt the newest greedy request when the KV cache runs out of pages.
+    enable_preemption: bool = False
+
+    # Maximum number of tokens per model step. When set, prefill chunks and
+    # decode steps are scheduled together, decode first, under this budget.
+    token_budget: Optional[int] = None
+
+    # File that request traces are written to, in the Chrome trace event
+    # format. Tracing is off when unset.
+    trace_file: Optional[str] = None
+
     # Device configuration
     device_ids: list[str] = field(default_factory=list)
     amdgpu_async_allocations: bool = False
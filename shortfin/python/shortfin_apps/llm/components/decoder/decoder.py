@@ -9,6 +9,7 @@ import itertools
 import logging
 import numpy as np
 import threading
+import time
 
 from typing import Callable, Dict, List, Optional, Tuple, Union
 
@@ -19,6 +20,10 @@ from shortfin_apps.llm.components.decode_config import (
     DecodeConfig,
     LogitsNormalization,
 )
+from shortfin_apps.llm.components.decoder.sampling import (
+    SelectionParams,
+    TokenCandidates,
+)
 from shortfin_apps.llm.components.kvcache.attention_cache_abstract import CacheInfo
 from shortfin_apps.llm.components.kvcache.base_attention_cache import (
     CacheAllocationFailure,
@@ -29,7 +34,13 @@ from shortfin_apps.llm.components.messages import (
     LlmInferenceExecRequest,
     InferencePhase,
 )
+from shortfin_apps.llm.components.metrics import (
+    INTER_TOKEN_LATENCY_SECONDS,
+    TIME_TO_FIRST_TOKEN_SECONDS,
+)
+from shortfin_apps.llm.components.preemption import PreemptionManager
 from shortfin_apps.llm.components.prefill_config import PrefillConfig
+from shortfin_apps.llm.components.tracing import SpanContext, maybe_span
 
 logger = logging.getLogger(__name__)
 
@@ -89,6 +100,13 @@ _score_functions = {
     LogitsNormalization.LOG_SOFTMAX: combine_scores_log_softmax,
 }
 
+# Candidates from `select_candidates` are already tempered and normalized.
+_candidate_score_functions = {
+    LogitsNormalization.NONE: combine_scores_log_softmax,
+    LogitsNormalization.SOFTMAX: combine_scores_softmax,
+    LogitsNormalization.LOG_SOFTMAX: combine_scores_log_softmax,
+}
+
 
 def select_greedy(scores: np.ndarray, decode_config: DecodeConfig):
     assert len(scores.shape) == 2
@@ -153,11 +171,21 @@ class PageManager:
                 acquire_count = count
 
             # do not lookup published tokens as the major performance improvement comes from re-using partially filled pages in prefill phase
-            acquired_cache_info = self._page_cache.allocate(
-                input_token_ids,
-                req_allocated_cache_info,
-                acquire_count,
-            )
+            try:
+                acquired_cache_info = self._page_cache.allocate(
+                    input_token_ids,
+                    req_allocated_cache_info,
+                    acquire_count,
+                )
+            except CacheAllocationFailure:
+                if acquire_count == count:
+                    raise
+                # Take only what is needed before anything gets preempted.
+                acquired_cache_info = self._page_cache.allocate(
+                    input_token_ids,
+                    req_allocated_cache_info,
+                    count,
+                )
 
             acquired = acquired_cache_info.pages[len(req_allocated_cache_info.pages) :]
             self._free_pages.extend([p.index for p in acquired])
@@ -311,10 +339,12 @@ class TokenSelector:
         )
 
         self._score_function = _score_functions[decode_config.logits_normalization]
+        self._candidate_score_function = _candidate_score_functions[
+            decode_config.logits_normalization
+        ]
 
     def _select(self, logits: List[np.ndarray], indices: List[Optional[np.ndarray]]):
         # Setup next steps:
-        step = len(self._selected_beams)
         max_score = max(self._scores)
 
         logits = [
@@ -335,6 +365,29 @@ class TokenSelector:
             beams = tokens // token_options
             tokens = tokens % token_options
 
+        return self._record(tokens, beams, scores)
+
+    def _select_candidates(self, candidates: List[TokenCandidates]):
+        max_score = max(self._scores)
+        scores = np.concatenate(
+            [
+                self._candidate_score_function(
+                    c.scores, s, max_score, self._decode_config
+                )
+                for c, s in zip(candidates, self._scores)
+            ]
+        )
+        tokens = np.concatenate([c.tokens for c in candidates])
+        beams = np.concatenate(
+            [np.full(len(c.tokens), beam) for beam, c in enumerate(candidates)]
+        )
+
+        selected, scores = self._select_function(scores[None, :], self._decode_config)
+        return self._record(tokens[selected], beams[selected], scores)
+
+    def _record(self, tokens: np.ndarray, beams: np.ndarray, scores: np.ndarray):
+        step = len(self._selected_beams)
+
         # Filter out eos cases
         eos = self._eos_token_id
         next_tokens = [token for token in tokens if token != eos]
@@ -356,9 +409,17 @@ class TokenSelector:
 
         return beams, tokens
 
+    def step_candidates(self, candidates: List[TokenCandidates]):
+        """Like `step`, from the candidates `select_candidates` found for each beam."""
+        return self._select_candidates(candidates)
+
     def done(self):
         return len(self._completed) >= self._hypothesis
 
+    def sequence(self, beam: int) -> List[int]:
+        """Tokens selected so far for the in flight `beam`."""
+        return self._build_response(beam, len(self._selected_beams))
+
     def _build_response(self, beam, end_step):
         tokens = []
         for step in range(end_step - 1, -1, -1):
@@ -397,6 +458,9 @@ class LlmDecoder:
         results_callback: Callable[[Union[int, List[int]]], None],
         rid,
         use_native_impls: bool = False,
+        token_callback: Optional[Callable[[List[int]], None]] = None,
+        preemption_manager: Optional[PreemptionManager] = None,
+        trace: Optional[SpanContext] = None,
     ):
         self._prefill_config = prefill_config
         self._decode_config = decode_config
@@ -407,10 +471,17 @@ class LlmDecoder:
         self._tokens_per_page = self._page_cache.tokens_per_page
         self._page_pool = self._page_cache.page_pool
         self._results_callback = results_callback
+        self._token_callback = token_callback
         self._rid = rid
         self._lock = threading.Lock()
         self._cancelled = False
         self._allocated_cach_recs: Dict[str, CacheInfo] = {}
+        self._preemption_manager = preemption_manager
+        self._trace = trace
+        self._selection_params = SelectionParams.from_decode_config(decode_config)
+        # Start of `run` and time of the last selected token, for latency metrics.
+        self._start_time: Optional[float] = None
+        self._last_token_time: Optional[float] = None
 
         if use_native_impls:
             self._select_function = self._native_select
@@ -429,6 +500,30 @@ class LlmDecoder:
         )
         return np.array(tokens), np.array(scores)
 
+    def is_streamable(self) -> bool:
+        """Whether selected tokens are final as soon as they are selected.
+
+        With beam search a later step can reorder or drop beams, so tokens are
+        only known once decoding finishes.
+        """
+        return self._token_callback is not None and self._decode_config.num_beams == 1
+
+    def _observe_token_latency(self):
+        now = time.monotonic()
+        if self._last_token_time is not None:
+            INTER_TOKEN_LATENCY_SECONDS.observe(now - self._last_token_time)
+        elif self._start_time is not None:
+            TIME_TO_FIRST_TOKEN_SECONDS.observe(now - self._start_time)
+            if self._trace is not None:
+                self._trace.instant("first_token")
+        self._last_token_time = now
+
+    def _emit_tokens(self, tokens: List[int]):
+        if tokens:
+            self._observe_token_latency()
+        if tokens and self.is_streamable():
+            self._token_callback([int(t) for t in tokens])
+
     def cancel(self):
         """Cancel inproceess work."""
         with self._lock:
@@ -453,6 +548,8 @@ class LlmDecoder:
 
         for req in decode_reqs:
             req.start_position = len(prefill_req.input_token_ids)
+            req.selection_params = self._selection_params
+            req.trace = self._trace
             self._allocated_cach_recs[req.instance_id] = self._allocated_cach_recs[
                 prefill_req.instance_id
             ]
@@ -463,6 +560,8 @@ class LlmDecoder:
         prefill_req = LlmInferenceExecRequest(
             phase=InferencePhase.PREFILL, input_token_ids=input_ids, rid=self._rid
         )
+        prefill_req.selection_params = self._selection_params
+        prefill_req.trace = self._trace
 
         cached_allocation = self._page_cache.lookup(input_ids[: -self._tokens_per_page])
         if self._prefill_config.has_prefill_position:
@@ -498,15 +597,56 @@ class LlmDecoder:
         req.page_ids = []
         self._allocated_cach_recs[req.instance_id] = None
 
-    async def run(self, input_ids):
-        input_length = len(input_ids)
-        prefill_req = self.create_prefill_req(input_ids)
-        # Run Prefill:
-        self._unified_batcher.submit(prefill_req)
-        await prefill_req.done
+    def _select_tokens(
+        self, token_selector: TokenSelector, reqs: List[LlmInferenceExecRequest]
+    ):
+        if all(req.result_candidates is not None for req in reqs):
+            return token_selector.step_candidates(
+                [req.result_candidates for req in reqs]
+            )
+        return token_selector.step(
+            [req.result_logits for req in reqs], [req.result_indices for req in reqs]
+        )
+
+    def _is_preemptible(self) -> bool:
+        # Beams share pages with each other, so only greedy requests can give
+        # theirs up and rebuild them from the selected tokens.
+        return self._decode_config.num_beams == 1
+
+    async def _acquire_prefill_req(self, input_ids) -> LlmInferenceExecRequest:
+        """Create a prefill request, waiting for pages if the cache is full.
+
+        Without a preemption manager allocation failures are raised as is. With
+        one, a lower priority request is asked to give up its pages and the
+        allocation is retried once pages are released.
+        """
+        manager = self._preemption_manager
+        while True:
+            generation = manager.generation if manager is not None else 0
+            try:
+                prefill_req = self.create_prefill_req(input_ids)
+            except CacheAllocationFailure:
+                if manager is None or not manager.has_running_peers(self):
+                    raise
+                manager.select_victim(self, include_self=False)
+                await manager.wait_for_pages(generation)
+                continue
+
+            if manager is not None:
+                manager.mark_running(self, preemptible=self._is_preemptible())
+            return prefill_req
+
+    async def _prefill(self, prefill_req: LlmInferenceExecRequest):
+        with maybe_span(
+            self._trace, "prefill", tokens=len(prefill_req.input_token_ids)
+        ):
+            self._unified_batcher.submit(prefill_req)
+            await prefill_req.done
         self.publish_request(prefill_req, publish_incomplete_page=False)
 
-        token_selector = TokenSelector(self._decode_config)
+    def _start_decode(
+        self, prefill_req: LlmInferenceExecRequest
+    ) -> Tuple[PageManager, List[LlmInferenceExecRequest]]:
         prefill_req_cache_info = self._allocated_cach_recs.get(
             prefill_req.instance_id, None
         )
@@ -525,23 +665,128 @@ class LlmDecoder:
             tokens_per_page=self._tokens_per_page,
         )
 
-        # Run token selection and send to emitter:
-        beams, tokens = token_selector.step(
-            [prefill_req.result_logits], [prefill_req.result_indices]
-        )
-
         # Setup decode requests:
         decode_reqs = self.create_decode_reqs(prefill_req)
+        return page_manager, decode_reqs
+
+    def _release(
+        self,
+        orig_instance_id: str,
+        decode_reqs: List[LlmInferenceExecRequest],
+        page_manager: PageManager,
+    ):
+        # Remove the reservation:
+        self._unified_batcher.reserve_workload(rid=orig_instance_id, count=0)
+
+        # The trailing partial page is published too, otherwise the trie
+        # cache would not return it to the pool on release.
+        for req in decode_reqs:
+            self.publish_request(req, publish_incomplete_page=True)
+            self.free_req_cache(req)
+        page_manager.release_pages()
+
+    async def _preempt_and_resume(
+        self,
+        input_ids: List[int],
+        token_selector: TokenSelector,
+        prefill_req: LlmInferenceExecRequest,
+        decode_reqs: List[LlmInferenceExecRequest],
+        page_manager: PageManager,
+    ):
+        """Give up all pages, wait for pages to free up, then pick up where we left off.
+
+        Full pages are published before they are released, so the resuming
+        prefill only recomputes whatever the prefix cache evicted meanwhile.
+        Its logits stand in for the decode step that was preempted.
+        """
+        manager = self._preemption_manager
+        self._release(
+            prefill_req.orig_instance_id,
+            decode_reqs,
+            page_manager,
+        )
+        manager.mark_preempted(self)
+
+        resume_ids = input_ids + token_selector.sequence(0)
+        prefill_req = await self._acquire_prefill_req(resume_ids)
+        await self._prefill(prefill_req)
+        page_manager, decode_reqs = self._start_decode(prefill_req)
+
+        beams, tokens = self._select_tokens(token_selector, [prefill_req])
+        self._emit_tokens(tokens)
+        return prefill_req, decode_reqs, page_manager, beams, tokens
+
+    async def run(self, input_ids):
+        self._start_time = time.monotonic()
+        self._last_token_time = None
+        with maybe_span(self._trace, "decoder", input_tokens=len(input_ids)):
+            manager = self._preemption_manager
+            if manager is None:
+                await self._run(input_ids)
+                return
+
+            manager.register(self)
+            try:
+                await self._run(input_ids)
+            finally:
+                manager.unregister(self)
+
+    async def _run(self, input_ids):
+        manager = self._preemption_manager
+        input_length = len(input_ids)
+        prefill_req = await self._acquire_prefill_req(input_ids)
+        # Run Prefill:
+        await self._prefill(prefill_req)
+
+        token_selector = TokenSelector(self._decode_config)
+        page_manager, decode_reqs = self._start_decode(prefill_req)
+
+        # Run token selection and send to emitter:
+        beams, tokens = self._select_tokens(token_selector, [prefill_req])
+        self._emit_tokens(tokens)
 
         # Run Decoder:
-        for _ in range(self._decode_config.max_completion_tokens - 1):
+        remaining_steps = self._decode_config.max_completion_tokens - 1
+        while remaining_steps > 0:
             if token_selector.done() or self._cancelled or len(beams) == 0:
                 break
 
-            # Update the reqs:
-            to_run = page_manager.update_decode_reqs(
-                beams, decode_reqs, self._allocated_cach_recs, tokens, input_length
-            )
+            preempt = manager is not None and manager.preemption_requested(self)
+            if not preempt:
+                generation = manager.generation if manager is not None else 0
+                try:
+                    # Update the reqs:
+                    to_run = page_manager.update_decode_reqs(
+                        beams,
+                        decode_reqs,
+                        self._allocated_cach_recs,
+                        tokens,
+                        input_length,
+                    )
+                except CacheAllocationFailure:
+                    if manager is None or not self._is_preemptible():
+                        raise
+                    victim = manager.select_victim(self, include_self=True)
+                    if victim is None:
+                        raise
+                    if victim is not self:
+                        await manager.wait_for_pages(generation)
+                        continue
+                    preempt = True
+
+            if preempt:
+                (
+                    prefill_req,
+                    decode_reqs,
+                    page_manager,
+                    beams,
+                    tokens,
+                ) = await self._preempt_and_resume(
+                    input_ids, token_selector, prefill_req, decode_reqs, page_manager
+                )
+                input_length = len(prefill_req.input_token_ids)
+                remaining_steps -= 1
+                continue
 
             input_length = input_length + 1
 
@@ -556,15 +801,9 @@ class LlmDecoder:
             gathered = asyncio.gather(*[req.done for req in to_run])
             await gathered
 
-            beams, tokens = token_selector.step(
-                [req.result_logits for req in to_run],
-                [req.result_indices for req in to_run],
-            )
-
-        # Remove the reservation:
-        self._unified_batcher.reserve_workload(
-            rid=prefill_req.orig_instance_id, count=0
-        )
+            beams, tokens = self._select_tokens(token_selector, to_run)
+            self._emit_tokens(tokens)
+            remaining_steps -= 1
 
         # Grab responses:
         completed = token_selector.results()
@@ -572,7 +811,8 @@ class LlmDecoder:
         # Return Results:
         self._results_callback(completed)
 
-        for req in decode_reqs:
-            self.publish_request(req, publish_incomplete_page=True)
-            self.free_req_cache(req)
-        page_manager.release_pages()
+        self._release(
+            prefill_req.orig_instance_id,
+            decode_reqs,
+            page_manager,
+        )
@@ -0,0 +1,109 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+"""
+Batched token candidate selection for a whole invocation.
+
+Every request in a batch only ever needs its best `num_beams` tokens: greedy
+decoding takes the single best one, and beam search's next beams are always
+among the best `num_beams` tokens of each current beam. The responders use
+`select_candidates` to find these for every row of an invocation's logits in
+one vectorized pass, so `TokenSelector` only has to combine a handful of
+candidates per beam with the running beam scores instead of whole vocabularies.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from ..decode_config import DecodeConfig, LogitsNormalization
+
+
+@dataclass(frozen=True)
+class SelectionParams:
+    """Per request settings for `select_candidates`."""
+
+    # Number of candidates to keep, `num_beams` of the request.
+    num_candidates: int = 1
+
+    # Logits are divided by this before normalization.
+    temperature: Optional[float] = None
+
+    # Whether to log softmax the row. Needed when the model returns raw logits.
+    log_softmax: bool = False
+
+    @staticmethod
+    def from_decode_config(decode_config: DecodeConfig) -> "SelectionParams":
+        # Only raw logits are tempered and normalized here, as in
+        # `combine_scores_null`; models exported with a normalization return
+        # scores that are used as is.
+        raw = decode_config.logits_normalization == LogitsNormalization.NONE
+        return SelectionParams(
+            num_candidates=decode_config.num_beams,
+            temperature=decode_config.temperature if raw else None,
+            log_softmax=raw,
+        )
+
+
+@dataclass
+class TokenCandidates:
+    """Best tokens of a single row, highest score first."""
+
+    tokens: np.ndarray
+    scores: np.ndarray
+
+
+def select_candidates(
+    logits: np.ndarray,
+    indices: Optional[np.ndarray],
+    params: List[SelectionParams],
+) -> List[TokenCandidates]:
+    """Select the best tokens of every row of `logits`.
+
+    Args:
+        logits: `[n, d]` scores, one row per request.
+        indices: Optional `[n, d]` token ids for the scores, for models
+            exported with `top_k`. Otherwise columns are token ids.
+        params: Selection settings of each row.
+
+    Returns:
+        The candidates of each row, in row order.
+    """
+    assert logits.ndim == 2 and len(params) == logits.shape[0]
+    scores = logits.astype(np.float32)
+
+    temperatures = np.array(
+        [p.temperature if p.temperature else 1.0 for p in params], dtype=np.float32
+    )
+    if np.any(temperatures != 1.0):
+        scores = scores / temperatures[:, None]
+
+    normalize = np.array([p.log_softmax for p in params])
+    if np.any(normalize):
+        rows = scores[normalize]
+        row_max = rows.max(axis=1, keepdims=True)
+        log_sum = np.log(np.exp(rows - row_max).sum(axis=1, keepdims=True))
+        scores[normalize] = rows - row_max - log_sum
+
+    num_candidates = min(max(p.num_candidates for p in params), scores.shape[1])
+    if num_candidates == 1:
+        best = np.argmax(scores, axis=1)[:, None]
+    else:
+        best = np.argpartition(scores, -num_candidates, axis=1)[:, -num_candidates:]
+        order = np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    tokens = best if indices is None else np.take_along_axis(indices, best, axis=1)
+
+    return [
+        TokenCandidates(
+            tokens=tokens[i, : p.num_candidates],
+            scores=best_scores[i, : p.num_candidates],
+        )
+        for i, p in enumerate(params)
+    ]
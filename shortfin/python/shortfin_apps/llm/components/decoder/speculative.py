@@ -0,0 +1,302 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+"""
+Greedy speculative decoding with a draft model.
+
+Each step the draft model proposes up to `num_speculative_tokens` tokens, one
+decode invocation at a time. The target model then runs a single prefill
+invocation over the last committed token and all proposals, starting at the
+current position, and picks its own greedy token at every position. Proposals
+are accepted up to the first mismatch, and the target's token at that position
+is committed after them, so every step commits at least one token and the
+output is the same as plain greedy decoding with the target model.
+
+KV cache entries written for rejected proposals are simply overwritten by the
+next step. Pages that only hold rejected proposals are returned to the pool,
+and full pages of committed tokens are published to the prefix cache as they
+fill up.
+"""
+
+import asyncio
+import logging
+import math
+from typing import List, Optional
+
+import numpy as np
+
+from shortfin_apps.llm.components.batching.facade import BatchingFacade
+from shortfin_apps.llm.components.decoder.decoder import LlmDecoder, TokenSelector
+from shortfin_apps.llm.components.decoder.sampling import (
+    SelectionParams,
+    TokenCandidates,
+    select_candidates,
+)
+from shortfin_apps.llm.components.kvcache.attention_cache_abstract import CacheInfo
+from shortfin_apps.llm.components.kvcache.base_attention_cache import (
+    BasePagedAttentionCache,
+)
+from shortfin_apps.llm.components.messages import (
+    InferencePhase,
+    LlmInferenceExecRequest,
+)
+from shortfin_apps.llm.components.tracing import maybe_span
+
+logger = logging.getLogger(__name__)
+
+
+def count_accepted(proposals: List[int], target_tokens: List[int]) -> int:
+    """Number of leading proposals that match the target model's tokens."""
+    accepted = 0
+    for proposal, token in zip(proposals, target_tokens):
+        if proposal != token:
+            break
+        accepted += 1
+    return accepted
+
+
+def _extend_pages(
+    page_cache: BasePagedAttentionCache, cache_info: CacheInfo, length: int
+) -> CacheInfo:
+    """Make sure `cache_info` has pages for the first `length` positions."""
+    missing = math.ceil(length / page_cache.tokens_per_page) - len(cache_info.pages)
+    if missing <= 0:
+        return cache_info
+
+    extended = page_cache.allocate([], cache_info, allocation_block_size=missing)
+    extended.tokens = list(cache_info.tokens)
+    extended.num_tokens = cache_info.num_tokens
+    return extended
+
+
+def _trim_pages(
+    page_cache: BasePagedAttentionCache, cache_info: CacheInfo, length: int
+):
+    """Return pages past the first `length` positions to the pool."""
+    keep = math.ceil(length / page_cache.tokens_per_page)
+    extra = cache_info.pages[keep:]
+    if extra:
+        page_cache.free_allocated_pages([page.index for page in extra])
+        cache_info.pages = cache_info.pages[:keep]
+
+
+class DraftSequence:
+    """The draft model's view of one request.
+
+    Tracks which tokens have KV cache entries in the draft model's cache, so
+    that each proposal round only feeds the tokens the draft has not seen yet
+    and rewinds past proposals that the target rejected.
+    """
+
+    def __init__(self, batcher: BatchingFacade, rid, trace=None):
+        self._batcher = batcher
+        self._page_cache = batcher.get_page_cache()
+        self._rid = rid
+        self._trace = trace
+        self._cache_info: Optional[CacheInfo] = None
+        self._orig_instance_id: Optional[str] = None
+        self._decode_req: Optional[LlmInferenceExecRequest] = None
+        # Tokens with KV cache entries, by position.
+        self._tokens: List[int] = []
+
+    async def prefill(self, input_ids: List[int]):
+        self._cache_info = self._page_cache.allocate(input_ids)
+        prefill_req = LlmInferenceExecRequest(
+            phase=InferencePhase.PREFILL, input_token_ids=input_ids, rid=self._rid
+        )
+        prefill_req.page_ids = [p.index for p in self._cache_info.pages]
+        prefill_req.trace = self._trace
+        self._batcher.submit(prefill_req)
+        await prefill_req.done
+        if prefill_req.result_logits is None:
+            raise RuntimeError("Draft model prefill failed")
+
+        self._orig_instance_id = prefill_req.orig_instance_id
+        self._decode_req = LlmInferenceExecRequest(
+            phase=InferencePhase.DECODE,
+            input_token_ids=[],
+            rid=self._rid,
+            orig_instance_id=self._orig_instance_id,
+        )
+        self._decode_req.selection_params = SelectionParams()
+        self._decode_req.trace = self._trace
+        self._tokens = list(input_ids)
+
+    async def _step(self, token: int) -> int:
+        position = len(self._tokens)
+        self._cache_info = _extend_pages(
+            self._page_cache, self._cache_info, position + 1
+        )
+
+        req = self._decode_req
+        req.reset(InferencePhase.DECODE)
+        req.input_token_ids = [token]
+        req.start_position = position
+        req.page_ids = [p.index for p in self._cache_info.pages]
+        self._batcher.submit(req)
+        await req.done
+        if req.result_candidates is None:
+            raise RuntimeError("Draft model decode failed")
+
+        self._tokens.append(token)
+        return int(req.result_candidates.tokens[0])
+
+    async def propose(self, sequence: List[int], count: int) -> List[int]:
+        """Propose `count` tokens to follow `sequence`."""
+        common = count_accepted(self._tokens, sequence)
+        # The last token is always fed, its logits give the first proposal.
+        common = min(common, len(sequence) - 1)
+        del self._tokens[common:]
+
+        self._batcher.reserve_workload(rid=self._orig_instance_id, count=1)
+        try:
+            for token in sequence[common:-1]:
+                await self._step(token)
+            proposals = [await self._step(sequence[-1])]
+            while len(proposals) < count:
+                proposals.append(await self._step(proposals[-1]))
+        finally:
+            self._batcher.reserve_workload(rid=self._orig_instance_id, count=0)
+        return proposals
+
+    def release(self):
+        if self._cache_info is not None:
+            self._page_cache.release_pages(self._cache_info)
+            self._cache_info = None
+
+
+class SpeculativeDecoder(LlmDecoder):
+    """`LlmDecoder` for greedy requests that verifies draft model proposals.
+
+    Requires a target model exported with `has_prefill_position` and with
+    logits for every prefill position, i.e. without `--prefill-final-logits`.
+    """
+
+    def __init__(
+        self,
+        *args,
+        draft_batcher: BatchingFacade,
+        num_speculative_tokens: int,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        if self._decode_config.num_beams != 1:
+            raise ValueError("Speculative decoding only supports greedy decoding")
+
+        self._draft_batcher = draft_batcher
+        self._num_speculative_tokens = num_speculative_tokens
+        self._max_seq_len = min(
+            self._unified_batcher.model_params().max_seq_len,
+            draft_batcher.model_params().max_seq_len,
+        )
+
+    def _is_preemptible(self) -> bool:
+        # A preempted request would also have to give up its draft pages.
+        return False
+
+    async def _verify(
+        self, cache_info: CacheInfo, sequence: List[int], proposals: List[int]
+    ) -> List[TokenCandidates]:
+        """Run the target model over the proposals and return its token at each position."""
+        verify_req = LlmInferenceExecRequest(
+            phase=InferencePhase.PREFILL,
+            input_token_ids=sequence + proposals,
+            rid=self._rid,
+        )
+        verify_req.start_position = len(sequence) - 1
+        verify_req.page_ids = [p.index for p in cache_info.pages]
+        verify_req.return_all_logits = True
+        verify_req.trace = self._trace
+        self._unified_batcher.submit(verify_req)
+        await verify_req.done
+        if verify_req.result_logits is None:
+            raise RuntimeError("Target model verification failed")
+
+        positions = len(proposals) + 1
+        logits = np.asarray(verify_req.result_logits)[0]
+        if logits.shape[0] < positions:
+            raise RuntimeError(
+                "Speculative decoding needs logits for every prefill position. "
+                "Export the target model without `--prefill-final-logits`."
+            )
+        indices = None
+        if verify_req.result_indices is not None:
+            indices = np.asarray(verify_req.result_indices)[0, :positions]
+        return select_candidates(
+            logits[:positions], indices, [self._selection_params] * positions
+        )
+
+    async def _run(self, input_ids):
+        prefill_req = await self._acquire_prefill_req(input_ids)
+        draft = DraftSequence(self._draft_batcher, self._rid, self._trace)
+        try:
+            await asyncio.gather(self._prefill(prefill_req), draft.prefill(input_ids))
+            await self._decode(prefill_req, draft, input_ids)
+        finally:
+            draft.release()
+
+    async def _decode(
+        self,
+        prefill_req: LlmInferenceExecRequest,
+        draft: DraftSequence,
+        input_ids: List[int],
+    ):
+        token_selector = TokenSelector(self._decode_config)
+        beams, tokens = self._select_tokens(token_selector, [prefill_req])
+        self._emit_tokens(tokens)
+
+        page_cache = self._page_cache
+        cache_info = self._allocated_cach_recs[prefill_req.instance_id]
+        # Tokens whose KV cache entries are in `cache_info`. The last selected
+        # token is not among them until the next verification feeds it.
+        committed = list(input_ids)
+
+        remaining_steps = self._decode_config.max_completion_tokens - 1
+        while remaining_steps > 0:
+            if token_selector.done() or self._cancelled or len(beams) == 0:
+                break
+
+            sequence = committed + [int(tokens[0])]
+            count = min(
+                self._num_speculative_tokens,
+                remaining_steps - 1,
+                self._max_seq_len - len(sequence),
+            )
+            with maybe_span(self._trace, "propose", count=count):
+                proposals = await draft.propose(sequence, count) if count > 0 else []
+
+            cache_info = _extend_pages(
+                page_cache, cache_info, len(sequence) + len(proposals)
+            )
+            candidates = await self._verify(cache_info, sequence, proposals)
+            accepted = count_accepted(proposals, [int(c.tokens[0]) for c in candidates])
+            logger.debug(
+                "Accepted %d of %d proposals for %s",
+                accepted,
+                len(proposals),
+                self._rid,
+            )
+
+            # The fed token and accepted proposals now have valid KV entries.
+            committed = sequence + proposals[:accepted]
+            _trim_pages(page_cache, cache_info, len(committed))
+            cache_info.tokens = list(committed)
+            cache_info.num_tokens = len(committed)
+            cache_info = page_cache.publish_pages_for_tokens(cache_info)
+
+            for step_candidates in candidates[: accepted + 1]:
+                beams, tokens = token_selector.step_candidates([step_candidates])
+                self._emit_tokens(tokens)
+                remaining_steps -= 1
+                if remaining_steps == 0 or token_selector.done() or len(beams) == 0:
+                    break
+
+        self._results_callback(token_selector.results())
+
+        cache_info = page_cache.publish_pages_for_tokens(
+            cache_info, publish_incomplete_page=True
+        )
+        page_cache.release_pages(cache_info)
@@ -4,22 +4,177 @@
 # See https://llvm.org/LICENSE.txt for license information.
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
+"""
+Reusable argument buffers for program invocations.
+
+Device buffers are pooled by size class rather than by exact shape: a request
+for any shape is served by a flat buffer of the next power of two elements of
+the same dtype, viewed with the requested shape. Prefill arguments change shape
+with every batch sequence length, so this turns most allocations on the
+invocation path into pool hits.
+
+Host staging data can optionally come from a ring over one preallocated,
+device visible host buffer instead of a host buffer per device buffer. Staging
+space is handed out in allocation order and reclaimed once the allocations
+using it are released, which is after their invocation has completed.
+"""
+
+from collections import deque
+from dataclasses import dataclass
+import logging
+import math
 import threading
+from typing import Deque, Dict, List, Optional, Tuple
 
 import shortfin.array as sfnp
 
+logger = logging.getLogger(__name__)
+
+# Smallest size class, in elements.
+MIN_SIZE_CLASS = 64
+
+# Byte alignment of staging ring slices.
+STAGING_ALIGNMENT = 64
+
+
+@dataclass
+class DeviceArrayCacheStats:
+    """Counters for `DeviceArrayCache`."""
+
+    # Allocations served from a cached buffer.
+    hits: int = 0
+    # Allocations that needed a new device buffer.
+    misses: int = 0
+    # Bytes of device buffers allocated, including ones since evicted.
+    allocated_bytes: int = 0
+    # Bytes of device buffers currently held by the cache or in use.
+    resident_bytes: int = 0
+    # Host staging served from the staging ring.
+    staging_ring_hits: int = 0
+    # Host staging that did not fit in the staging ring.
+    staging_ring_misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        allocations = self.hits + self.misses
+        return self.hits / allocations if allocations else 0.0
+
+
+def _size_class(element_count: int) -> int:
+    return max(MIN_SIZE_CLASS, 1 << max(0, element_count - 1).bit_length())
+
+
+def _view(array: sfnp.device_array, shape, dtype) -> sfnp.device_array:
+    """View the leading elements of a flat `array` with `shape`."""
+    element_count = math.prod(shape)
+    storage = array.view(slice(0, element_count)).storage
+    return sfnp.device_array(storage, shape, dtype)
+
+
+class _Buffer:
+    """A flat, size class device buffer and its views."""
+
+    def __init__(self, device, size_class: int, dtype):
+        self.device = sfnp.device_array.for_device(device, [size_class], dtype)
+        self.dtype = dtype
+        self.nbytes = len(self.device.storage)
+        self._host: Optional[sfnp.device_array] = None
+        self._views: Dict[Tuple[int, ...], sfnp.device_array] = {}
+        self._host_views: Dict[Tuple[int, ...], sfnp.device_array] = {}
+
+    def device_view(self, shape: Tuple[int, ...]) -> sfnp.device_array:
+        # Views are kept so that reusing a buffer with the same shape returns
+        # the same arrays.
+        view = self._views.get(shape)
+        if view is None:
+            view = self._views[shape] = _view(self.device, shape, self.dtype)
+        return view
+
+    def host_view(self, shape: Tuple[int, ...]) -> sfnp.device_array:
+        if self._host is None:
+            self._host = self.device.for_transfer()
+        view = self._host_views.get(shape)
+        if view is None:
+            view = self._host_views[shape] = _view(self._host, shape, self.dtype)
+        return view
+
+
+class _StagingSlice:
+    def __init__(self, start: int, end: int):
+        self.start = start
+        self.end = end
+        self.released = False
+
+
+class StagingRing:
+    """Ring allocator over a single device visible host buffer.
+
+    Slices are handed out in order and must be released, in any order; space
+    is reclaimed from the oldest slice once it and everything before it has
+    been released.
+    """
+
+    def __init__(self, device, nbytes: int):
+        self.nbytes = nbytes
+        self._host = sfnp.device_array.for_host(device, [nbytes], sfnp.uint8)
+        self._head = 0
+        self._live: Deque[_StagingSlice] = deque()
+
+    def _reserve(self, nbytes: int) -> Optional[int]:
+        if not self._live:
+            self._head = 0
+            return 0 if nbytes <= self.nbytes else None
+
+        head = self._head
+        tail = self._live[0].start
+        if head >= tail:
+            if head + nbytes <= self.nbytes:
+                return head
+            # Wrap around, leaving the end of the buffer unused.
+            return 0 if nbytes < tail else None
+        return head if head + nbytes < tail else None
+
+    def allocate(self, shape, dtype) -> Optional[Tuple[sfnp.device_array, object]]:
+        """Stage an array of `shape`, or return None if the ring is full."""
+        nbytes = dtype.compute_dense_nd_size(shape)
+        aligned = -(-nbytes // STAGING_ALIGNMENT) * STAGING_ALIGNMENT
+        start = self._reserve(aligned)
+        if start is None:
+            return None
+
+        staging = _StagingSlice(start, start + aligned)
+        self._live.append(staging)
+        self._head = staging.end
+        storage = self._host.view(slice(start, start + nbytes)).storage
+        return sfnp.device_array(storage, shape, dtype), staging
+
+    def release(self, staging: _StagingSlice):
+        staging.released = True
+        while self._live and self._live[0].released:
+            self._live.popleft()
+
 
 class Allocation:
-    def __init__(self, *, device, host, cache, key):
+    def __init__(self, *, device, host, cache, key, buffer=None, staging=None):
         self._device = device
         self._host = host
         self._cache = cache
         self._key = key
+        self._buffer = buffer
+        self._staging = staging
 
     @property
     def key(self):
         return self._key
 
+    @property
+    def buffer(self):
+        return self._buffer
+
+    @property
+    def staging(self):
+        return self._staging
+
     @property
     def device(self):
         return self._device
@@ -94,47 +249,101 @@ def _shape_matches(a, b):
 
 
 class DeviceArrayCache:
-    def __init__(self, device, *, max_allocations=100):
+    """Pool of device argument buffers, bucketed by dtype and size class.
+
+    Args:
+        device: Device to allocate buffers on.
+        max_allocations: Number of free buffers kept. When exceeded, the least
+            recently released buffers are dropped on the next miss.
+        staging_ring_bytes: Size of the host staging ring. When zero, each
+            device buffer gets its own host staging buffer.
+    """
+
+    def __init__(self, device, *, max_allocations=100, staging_ring_bytes=0):
         self._device = device
         self._max_allocations = max_allocations
         self._cache_lock = threading.Lock()
+        self.stats = DeviceArrayCacheStats()
 
         self._id = 0
-        self._shape_table = {}
-        self._cache = {}
+        self._shape_table: Dict[str, List[int]] = {}
+        self._cache: Dict[int, _Buffer] = {}
+
+        self._staging_ring: Optional[StagingRing] = None
+        if staging_ring_bytes > 0:
+            self._staging_ring = StagingRing(device, staging_ring_bytes)
 
     def allocate(self, shape, dtype) -> Allocation:
+        shape = tuple(shape)
         with self._cache_lock:
             key = self.create_key(shape=shape, dtype=dtype)
+            buffer = self._acquire(key)
+            if buffer is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+
+            staging = None
+            host = None
+            if self._staging_ring is not None:
+                staged = self._staging_ring.allocate(shape, dtype)
+                if staged is None:
+                    self.stats.staging_ring_misses += 1
+                else:
+                    self.stats.staging_ring_hits += 1
+                    host, staging = staged
+
+        if buffer is None:
+            buffer = _Buffer(self._device, _size_class(math.prod(shape)), dtype)
+            with self._cache_lock:
+                self.stats.allocated_bytes += buffer.nbytes
+                self.stats.resident_bytes += buffer.nbytes
+
+        if host is None:
+            host = buffer.host_view(shape)
+
+        return Allocation(
+            device=buffer.device_view(shape),
+            host=host,
+            cache=self,
+            key=key,
+            buffer=buffer,
+            staging=staging,
+        )
+
+    def _acquire(self, key: str) -> Optional[_Buffer]:
+        # If we already have a buffer of this size class, take the most recently
+        # released one:
+        if key in self._shape_table:
+            idx = self._shape_table[key].pop()
+            if len(self._shape_table[key]) == 0:
+                del self._shape_table[key]
+            return self._cache.pop(idx)
+
+        # If we are exceeding the recommended cache size use this as an opportunity to clean up:
+        if len(self._cache) > self._max_allocations:
+            # Grab the keys that should be cleaned up:
+            release_count = len(self._cache) - self._max_allocations
+            keys = sorted(self._cache.keys())
+            for idx in keys[:release_count]:
+                self.stats.resident_bytes -= self._cache[idx].nbytes
+            to_keep = set(keys[release_count:])
+            new_cache = {idx: self._cache[idx] for idx in to_keep}
+            new_table = {}
+            for idx in sorted(to_keep):
+                buffer = self._cache[idx]
+                new_key = self._bucket_key(len(buffer.device.storage), buffer.dtype)
+                if new_key not in new_table:
+                    new_table[new_key] = []
+                new_table[new_key].append(idx)
+
+            self._cache = new_cache
+            self._shape_table = new_table
+        return None
 
-            # If we already have it allocated find the entry, possibly clear the list and return the allocation:
-            if key in self._shape_table:
-                idx = self._shape_table[key].pop()
-                if len(self._shape_table[key]) == 0:
-                    del self._shape_table[key]
-                return self._cache.pop(idx)
-
-            # If we are exceeding the recommended cache size use this as an opportunity to clean up:
-            if len(self._cache) > self._max_allocations:
-                # Grab the keys that should be cleaned up:
-                release_count = len(self._cache) - self._max_allocations
-                keys = sorted(self._cache.keys())
-                to_keep = set(keys[release_count:])
-                new_cache = {idx: self._cache[idx] for idx in to_keep}
-                new_table = {}
-                for idx in to_keep:
-                    new_key = self.create_key(allocation=self._cache[idx])
-                    if new_key not in new_table:
-                        new_table[new_key] = []
-                    new_table[new_key].append(idx)
-
-                self._cache = new_cache
-                self._shape_table = new_table
-
-        device = sfnp.device_array.for_device(self._device, shape, dtype)
-        host = device.for_transfer()
-
-        return Allocation(device=device, host=host, cache=self, key=key)
+    @staticmethod
+    def _bucket_key(size_class_bytes: int, dtype) -> str:
+        return f"{size_class_bytes}B, {dtype}"
 
     def create_key(self, *, allocation=None, shape=None, dtype=None):
         if allocation is not None:
@@ -143,11 +352,15 @@ class DeviceArrayCache:
 
             return allocation.key
 
-        shape = "x".join([str(d) for d in shape])
-        return f"{shape}, {dtype}"
+        element_count = math.prod(shape)
+        size_class = _size_class(element_count)
+        return self._bucket_key(dtype.compute_dense_nd_size([size_class]), dtype)
 
     def release(self, allocation):
         with self._cache_lock:
+            if allocation.staging is not None:
+                self._staging_ring.release(allocation.staging)
+
             idx = self._id
             key = self.create_key(allocation=allocation)
 
@@ -155,10 +368,18 @@ class DeviceArrayCache:
                 self._shape_table[key] = []
 
             self._shape_table[key].append(idx)
-            self._cache[idx] = allocation
+            self._cache[idx] = allocation.buffer
             self._id += 1
 
     def free(self):
         with self._cache_lock:
+            logger.info(
+                "Device array cache at shutdown: %r (hit rate %.1f%%)",
+                self.stats,
+                100.0 * self.stats.hit_rate,
+            )
             del self._cache
             self._cache = {}
+            self._shape_table = {}
+            self.stats.resident_bytes = 0
+            self._staging_ring = None
@@ -13,6 +13,7 @@ import shortfin as sf
 from threading import Lock
 
 from .manager import LlmSystemManager
+from .metrics import FIBER_POOL_IN_USE, FIBER_POOL_SIZE
 
 
 logger = logging.getLogger(__name__)
@@ -53,6 +54,8 @@ class FiberPool:
         # same name as existing ones.
         self.__lock = Lock()
         self.__initialize_pool()
+        FIBER_POOL_SIZE.set_function(self.size, pool=name)
+        FIBER_POOL_IN_USE.set_function(self.in_use, pool=name)
 
     async def get(self) -> tuple[int, sf.Fiber]:
         try:
@@ -105,3 +108,7 @@ class FiberPool:
 
     def size(self) -> int:
         return len(self.__fiber_pool)
+
+    def in_use(self) -> int:
+        """Number of fibers handed out and not yet returned."""
+        return self.size() - self.__index_queue.qsize()
@@ -6,20 +6,23 @@
 
 import asyncio
 import dataclasses
+import functools
 import io
 import json
 import logging
 import traceback
 
 from copy import deepcopy
-from typing import List
+from typing import Callable, List, Optional
 
 import shortfin as sf
 import threading
 
 # TODO: Have a generic "Responder" interface vs just the concrete impl.
 from shortfin.support.responder import AbstractResponder, ResponderErrorCodes
+from shortfin_apps.llm.components.batching.facade import BatchingFacade
 from shortfin_apps.llm.components.decoder.decoder import LlmDecoder, LogitsNormalization
+from shortfin_apps.llm.components.decoder.speculative import SpeculativeDecoder
 
 from .config_struct import DecodeConfig
 from .io_struct import (
@@ -28,10 +31,12 @@ from .io_struct import (
     GenerateReqOutput,
     PromptResponse,
 )
+from .preemption import PreemptionManager
 from .prefill_config import PrefillConfig
 from .service import LlmGenerateService
 
-from .tokenizer import Encoding
+from .tokenizer import Encoding, IncrementalDetokenizer
+from .tracing import SpanContext, maybe_span
 
 logger = logging.getLogger(__name__)
 
@@ -49,23 +54,39 @@ class GenerateItemProcess(sf.Process):
         decode_config: DecodeConfig,
         fiber: sf.Fiber,
         use_native_impls: bool = False,
+        token_callback: Optional[Callable[[List[int]], None]] = None,
+        preemption_manager: Optional[PreemptionManager] = None,
+        draft_batcher: Optional[BatchingFacade] = None,
+        num_speculative_tokens: int = 0,
     ):
         super().__init__(fiber=fiber)
         self.rid = rid
+        self.trace = SpanContext.start(f"request {rid}")
         self.input_text = input_text
         self.input_token_ids = input_token_ids
         self.result_token_ids: list[int] = []
         self._prefill_config = prefill_config
         self.decode_config = decode_config
         self.cache = page_cache
-        self.decoder = LlmDecoder(
+        decoder_kwargs = dict(
             prefill_config=prefill_config,
             decode_config=decode_config,
             unified_batcher=unified_batcher,
             results_callback=self.results_callback,
             rid=self.rid,
             use_native_impls=use_native_impls,
+            token_callback=token_callback,
+            preemption_manager=preemption_manager,
+            trace=self.trace,
         )
+        if draft_batcher is not None and decode_config.num_beams == 1:
+            self.decoder = SpeculativeDecoder(
+                **decoder_kwargs,
+                draft_batcher=draft_batcher,
+                num_speculative_tokens=num_speculative_tokens,
+            )
+        else:
+            self.decoder = LlmDecoder(**decoder_kwargs)
 
     def cancel(self):
         self.decoder.cancel()
@@ -81,6 +102,48 @@ class GenerateItemProcess(sf.Process):
     def results_callback(self, result: list[list[int]]):
         self.result_token_ids = result
 
+    def is_streamable(self) -> bool:
+        return self.decoder.is_streamable()
+
+
+async def warm_prefix_cache(service: LlmGenerateService, prompts: List[str]):
+    """Prefill each of `prompts` so that their pages are published to the cache.
+
+    Each prompt generates a single token; the results are discarded.
+    """
+    prefill_config = PrefillConfig(
+        has_prefill_position=service.model_params.has_prefill_position,
+    )
+    decode_config = service.server_params.decode_config.copy()
+    decode_config.eos_token_id = service.tokenizer.eos_token_id
+    decode_config.num_beams = 1
+    decode_config.max_completion_tokens = 1
+
+    indices = []
+    gen_processes = []
+    try:
+        for index, encoding in enumerate(service.tokenizer.encode(prompts)):
+            idx, fiber = await service.main_fiber_pool.get()
+            indices.append(idx)
+            gen_process = GenerateItemProcess(
+                unified_batcher=service.unified_batcher,
+                page_cache=service.page_cache,
+                rid=f"prefix-cache-warmup-{index}",
+                input_text=prompts[index],
+                input_token_ids=encoding.ids,
+                prefill_config=prefill_config,
+                decode_config=decode_config,
+                fiber=fiber,
+                use_native_impls=service.server_params.use_native_impls,
+                preemption_manager=service.preemption_manager,
+            )
+            gen_processes.append(gen_process)
+            gen_process.launch()
+        await asyncio.gather(*gen_processes)
+    finally:
+        service.main_fiber_pool.return_fiber(indices)
+    logger.info("Warmed prefix cache with %d prompts", len(prompts))
+
 
 class ClientGenerateBatchProcess(sf.Process):
     """Process instantiated for handling a batch from a client.
@@ -88,12 +151,14 @@ class ClientGenerateBatchProcess(sf.Process):
     This takes care of several responsibilities:
 
     * Tokenization / Detokenization
+    * Streaming tokens back to the client as they are generated
     """
 
     __slots__ = [
         "active_processes",
         "cancelled",
         "complete_infeed",
+        "detokenizers",
         "gen_req",
         "lock",
         "unified_batcher",
@@ -118,6 +183,7 @@ class ClientGenerateBatchProcess(sf.Process):
         self.unified_batcher = self.service.unified_batcher
         self.complete_infeed = self.system.create_queue()
         self.active_processes = []
+        self.detokenizers: List[Optional[IncrementalDetokenizer]] = []
         self.cancelled = False
         self.lock = threading.Lock()
 
@@ -168,7 +234,11 @@ class ClientGenerateBatchProcess(sf.Process):
 
     async def run(self):
         logger.debug("Started ClientBatchGenerateProcess: %r", self)
+        trace = SpanContext.start(f"generate_request {self.gen_req.rid}")
+        with maybe_span(trace, "generate_request"):
+            await self._run(trace)
 
+    async def _run(self, trace: Optional[SpanContext]):
         prefill_config = self.get_prefill_config()
         decode_configs = self.get_decode_configs()
 
@@ -178,7 +248,8 @@ class ClientGenerateBatchProcess(sf.Process):
         if is_pretokenized:
             input_batch = [input_ids] if self.gen_req.is_single else input_ids
         else:
-            input_batch = self.tokenize()
+            with maybe_span(trace, "tokenize"):
+                input_batch = self.tokenize()
 
         for config in decode_configs:
             if not self.validate_decode_config(self.responder, config):
@@ -195,6 +266,9 @@ class ClientGenerateBatchProcess(sf.Process):
         if run_request is None:
             return
 
+        if self.gen_req.stream:
+            self.responder.stream_start(media_type="text/event-stream")
+
         try:
             indices = []
             # Launch all individual generate processes and wait for them to finish.
@@ -217,6 +291,19 @@ class ClientGenerateBatchProcess(sf.Process):
                 )
 
                 input_tokens = input_tokens if is_pretokenized else input_tokens.ids
+                token_callback = None
+                if self.gen_req.stream:
+                    # Token ids are streamed as they are, without detokenizing.
+                    detokenizer = (
+                        None
+                        if self.gen_req.return_input_ids
+                        else IncrementalDetokenizer(self.tokenizer)
+                    )
+                    self.detokenizers.append(detokenizer)
+                    token_callback = functools.partial(
+                        self.stream_tokens, index, detokenizer
+                    )
+
                 gen_process = GenerateItemProcess(
                     unified_batcher=self.service.unified_batcher,
                     page_cache=self.service.page_cache,
@@ -227,6 +314,10 @@ class ClientGenerateBatchProcess(sf.Process):
                     decode_config=decode_config,
                     fiber=fiber,
                     use_native_impls=self.service.server_params.use_native_impls,
+                    token_callback=token_callback,
+                    preemption_manager=self.service.preemption_manager,
+                    draft_batcher=self.service.draft_batcher,
+                    num_speculative_tokens=self.service.server_params.num_speculative_tokens,
                 )
 
                 gen_processes.append(gen_process)
@@ -239,15 +330,19 @@ class ClientGenerateBatchProcess(sf.Process):
                         p.cancel()
                 self.active_processes = gen_processes
 
-            await asyncio.gather(*gen_processes)
-            if self.cancelled:
-                self.responder.send_error(
-                    error_message="Request cancelled",
-                    code=ResponderErrorCodes.CANCELLED,
-                    extra_fields={},
-                )
-            else:
-                self.generate_response(gen_processes)
+            with maybe_span(trace, "generate", items=len(gen_processes)):
+                await asyncio.gather(*gen_processes)
+            with maybe_span(trace, "respond"):
+                if self.gen_req.stream:
+                    self.finish_stream(gen_processes)
+                elif self.cancelled:
+                    self.responder.send_error(
+                        error_message="Request cancelled",
+                        code=ResponderErrorCodes.CANCELLED,
+                        extra_fields={},
+                    )
+                else:
+                    self.generate_response(gen_processes)
         except Exception:
             logger.error(traceback.format_exc())
         finally:
@@ -255,6 +350,59 @@ class ClientGenerateBatchProcess(sf.Process):
             self.responder.ensure_response()
             self.service.queue_manager.remove_from_queue(run_request)
 
+    def _send_stream_chunk(self, chunk: dict):
+        self.responder.stream_part(f"data: {json.dumps(chunk)}\n\n".encode())
+
+    def stream_tokens(
+        self,
+        index: int,
+        detokenizer: Optional[IncrementalDetokenizer],
+        tokens: List[int],
+    ):
+        """Sends the tokens selected by one decode step as a server-sent event.
+
+        Called from the `GenerateItemProcess` fiber after each token selection.
+        """
+        if self.cancelled:
+            return
+
+        if detokenizer is None:
+            self._send_stream_chunk({"index": index, "token_ids": tokens})
+            return
+
+        text = detokenizer.add_tokens(tokens)
+        if text:
+            self._send_stream_chunk({"index": index, "text": text})
+
+    def finish_stream(self, gen_processes: List[GenerateItemProcess]):
+        """Flushes pending text and terminates the event stream.
+
+        Beam search results only become final once decoding completes, so
+        those are sent as a single chunk per beam here.
+        """
+        if not self.cancelled:
+            for index, p in enumerate(gen_processes):
+                detokenizer = self.detokenizers[index]
+                if p.is_streamable():
+                    if detokenizer is not None:
+                        text = detokenizer.flush()
+                        if text:
+                            self._send_stream_chunk({"index": index, "text": text})
+                    continue
+
+                for result in p.result_token_ids:
+                    if self.gen_req.return_input_ids:
+                        chunk = {"index": index, "token_ids": result}
+                    else:
+                        chunk = {
+                            "index": index,
+                            "text": self.tokenizer.decode_one(result),
+                        }
+                    self._send_stream_chunk(chunk)
+
+        self.responder.stream_part(b"data: [DONE]\n\n")
+        self.responder.stream_part(None)
+
     def generate_response(
         self,
         gen_processes: List[GenerateItemProcess],
@@ -1,5 +1,8 @@
 import logging
 import math
+import time
+
+import numpy as np
 
 import shortfin as sf
 import shortfin.array as sfnp
@@ -7,11 +10,14 @@ import shortfin.array as sfnp
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from itertools import chain
-from typing import List, Optional, Tuple, Union
+from typing import Callable, List, Optional, Tuple, Union
 
 from .buffers import copy_buffers_to_host, create_argument_buffers
+from .decoder.sampling import select_candidates
 from .device_array_cache import Allocation, DeviceArrayCache, WrappedAllocation
 from .messages import LlmInferenceExecRequest
+from .metrics import INVOCATION_BATCH_SIZE, INVOCATION_SECONDS, QUEUE_WAIT_SECONDS
+from .tracing import BatchTrace
 
 
 logger = logging.getLogger(__name__)
@@ -31,6 +37,15 @@ class LlmTaskInput:
 class LlmTaskResponder(ABC):
     def __init__(self):
         self._exec_requests: dict[str, LlmInferenceExecRequest] = {}
+        self._wakeup: Optional[Callable[[], None]] = None
+
+    def set_wakeup(self, wakeup: Callable[[], None]):
+        """Register a callback that wakes the batcher when follow-up work is ready."""
+        self._wakeup = wakeup
+
+    def _notify_ready(self):
+        if self._wakeup is not None:
+            self._wakeup()
 
     @abstractmethod
     def set_success(
@@ -52,6 +67,15 @@ class LlmTaskResponder(ABC):
         if instance_id in self._exec_requests:
             del self._exec_requests[instance_id]
 
+    def get_requests(self, llm_task: "LlmTask") -> List[LlmInferenceExecRequest]:
+        """Requests of `llm_task` that are still waiting for their results."""
+        requests = []
+        for task_input in llm_task.task_inputs:
+            request = self._exec_requests.get(task_input.instance_id)
+            if request is not None:
+                requests.append(request)
+        return requests
+
     def _get_requests_from_task(
         self, llm_task: "LlmTask"
     ) -> List[LlmInferenceExecRequest]:
@@ -60,6 +84,42 @@ class LlmTaskResponder(ABC):
             for task_input in llm_task._task_inputs
         ]
 
+    def _select_candidates(
+        self,
+        exec_requests: List[LlmInferenceExecRequest],
+        logits: sfnp.device_array,
+        indices: Optional[sfnp.device_array],
+        positions: Optional[List[int]] = None,
+    ):
+        """Select token candidates for every request that asked for them.
+
+        Args:
+            exec_requests: Requests of the invocation, in batch order.
+            logits: `[bs, sl, d]` host logits of the invocation.
+            indices: Optional `[bs, sl, d]` host token ids for `logits`.
+            positions: Sequence position each request samples from. Defaults
+                to the first.
+        """
+        rows = [
+            i for i, req in enumerate(exec_requests) if req.selection_params is not None
+        ]
+        if not rows:
+            return
+
+        def gather(array: sfnp.device_array) -> np.ndarray:
+            array = np.asarray(array)
+            if positions is None or array.shape[1] == 1:
+                return array[rows, 0]
+            return array[rows, [positions[i] for i in rows]]
+
+        candidates = select_candidates(
+            gather(logits),
+            None if indices is None else gather(indices),
+            [exec_requests[i].selection_params for i in rows],
+        )
+        for i, row_candidates in zip(rows, candidates):
+            exec_requests[i].result_candidates = row_candidates
+
 
 class LlmTask:
     """Handles the transfer and preparation of data for VMFB invocation."""
@@ -401,6 +461,24 @@ class LlmInvocationProcess(sf.Process):
         self._device0 = fiber.device(0)
         self._llm_task = llm_task
         self._responder = responder
+        # Processes are created when their batch is boarded.
+        self._boarded = time.monotonic()
+
+    def _observe_queue_wait(
+        self, requests: List[LlmInferenceExecRequest], start: float
+    ):
+        """Record how long requests waited since they were submitted.
+
+        Only the first invocation of a request counts, later chunks of a
+        chunked prefill were not queued behind other work.
+        """
+        for request in requests:
+            if request.submit_time is None:
+                continue
+            QUEUE_WAIT_SECONDS.observe(
+                start - request.submit_time, invocation=self._name
+            )
+            request.submit_time = None
 
     async def run(self):
         """Invoke `prefill` or `decode` function, with IREE, on a batch of requests.
@@ -410,6 +488,11 @@ class LlmInvocationProcess(sf.Process):
         """
         try:
             req_count = self._llm_task.req_count
+            start = time.monotonic()
+            requests = self._responder.get_requests(self._llm_task)
+            trace = BatchTrace(self._name, requests, self._boarded)
+            self._observe_queue_wait(requests, start)
+            INVOCATION_BATCH_SIZE.observe(req_count, invocation=self._name)
 
             # Select an entrypoint for the batch.
             entrypoints = self._functions
@@ -419,25 +502,31 @@ class LlmInvocationProcess(sf.Process):
             else:
                 raise RuntimeError(f"No available entry point for bs {req_count}")
 
-            args = await self._llm_task.prepare_args(bs)
+            with trace.step("prepare_args"):
+                args = await self._llm_task.prepare_args(bs)
             args_device = [arg.device for arg in args]
 
             # Invoke VMFB. Logits are of shape [bs, bsl, d].
-            results = await fn(*args_device, fiber=self.fiber)
+            with trace.step("invoke"):
+                results = await fn(*args_device, fiber=self.fiber)
 
             indices = None
             logits = results[0]
             if len(results) > 1:
                 indices = results[1]
 
-            logits, indices = await self._llm_task.process_results(
-                args,
-                logits,
-                indices,
-                self._device0,
-            )
+            with trace.step("copy_buffers_to_host"):
+                logits, indices = await self._llm_task.process_results(
+                    args,
+                    logits,
+                    indices,
+                    self._device0,
+                )
 
-            self._responder.set_success(self._llm_task, logits, indices)
+            INVOCATION_SECONDS.observe(time.monotonic() - start, invocation=self._name)
+            with trace.step("respond"):
+                self._responder.set_success(self._llm_task, logits, indices)
+            trace.finish()
 
         except Exception:
             self._responder.set_failure(self._llm_task)
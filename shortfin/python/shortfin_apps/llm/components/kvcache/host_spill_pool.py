@@ -0,0 +1,141 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+"""
+Host memory tier for KV cache pages evicted from the device page pool.
+
+When the trie cache evicts a full page it can copy the page contents here
+instead of discarding them. A later lookup that walks off the end of the
+resident trie checks this pool and copies matching pages back to the device,
+which is much cheaper than re-running prefill over the same tokens.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Hashable, List, Optional, Tuple
+import logging
+
+import shortfin.array as sfnp
+
+from .page_pool import PageInfo, PagePool, human_size
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class HostSpillStats:
+    """Counters for the host spill tier."""
+
+    # Pages copied from the device to host memory on eviction.
+    spilled_pages: int = 0
+    # Pages copied back to the device on a lookup hit.
+    restored_pages: int = 0
+    # Lookups that walked past the resident trie and found nothing on the host.
+    misses: int = 0
+    # Host pages dropped to make room for newer spills.
+    dropped_pages: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.restored_pages + self.misses
+        return self.restored_pages / lookups if lookups else 0.0
+
+
+class HostSpillPool:
+    """Bounded, LRU host-memory copy of evicted KV cache pages.
+
+    One host table of `page_count` pages is allocated per device of the page
+    pool, mirroring the layout of `PagePool.page_tables`. Entries are keyed by
+    an opaque hashable that identifies the page's position in the trie; the
+    pool itself knows nothing about tokens. Keys are matched by equality, so
+    they must identify the page exactly rather than by a hash of it. Each
+    entry can carry a value, e.g. the identity of the spilled trie node, that
+    is handed back on restore.
+    """
+
+    def __init__(self, page_pool: PagePool, page_count: int):
+        if page_count <= 0:
+            raise ValueError("page_count must be positive")
+
+        self.page_pool = page_pool
+        self.page_count = page_count
+        self.stats = HostSpillStats()
+        self._free_slots: List[int] = list(range(page_count))
+        self._entries: OrderedDict[Hashable, Tuple[int, Hashable]] = OrderedDict()
+
+        config = page_pool.config
+        self.host_tables: List[sfnp.device_array] = []
+        for device, paged_kv_block_size_elements in zip(
+            page_pool.devices, config.paged_kv_block_size_elements_per_device
+        ):
+            host_table_shape = [page_count, paged_kv_block_size_elements]
+            logger.info(
+                "Allocating host spill table (shape=%r, dtype=%r, size=%s) for %r",
+                host_table_shape,
+                config.dtype,
+                human_size(config.dtype.compute_dense_nd_size(host_table_shape)),
+                device,
+            )
+            self.host_tables.append(
+                sfnp.device_array.for_host(device, host_table_shape, config.dtype)
+            )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def touch(self, key: Hashable) -> None:
+        """Mark `key` as most recently used."""
+        self._entries.move_to_end(key)
+
+    def spill(self, key: Hashable, page: PageInfo, value: Hashable = True) -> None:
+        """Copy `page` to host memory under `key`, dropping the LRU entry if full.
+
+        `value` is returned by `restore` and must not be None.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            slot = entry[0]
+        else:
+            if not self._free_slots:
+                _, (dropped_slot, _) = self._entries.popitem(last=False)
+                self._free_slots.append(dropped_slot)
+                self.stats.dropped_pages += 1
+            slot = self._free_slots.pop()
+
+        for host_table, page_table in zip(self.host_tables, self.page_pool.page_tables):
+            host_table.view(slot).copy_from(page_table.view(page.index))
+        self._entries[key] = (slot, value)
+        self.stats.spilled_pages += 1
+
+    def restore(self, key: Hashable, page: PageInfo) -> Optional[Hashable]:
+        """Copy the host page for `key` into `page` and release its host slot.
+
+        Returns the value the page was spilled with, or None if `key` is not
+        held by the pool.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        slot, value = entry
+
+        for host_table, page_table in zip(self.host_tables, self.page_pool.page_tables):
+            page_table.view(page.index).copy_from(host_table.view(slot))
+        self._free_slots.append(slot)
+        self.stats.restored_pages += 1
+        return value
+
+    def clear(self) -> None:
+        self._free_slots.extend(slot for slot, _ in self._entries.values())
+        self._entries.clear()
+
+    def __repr__(self):
+        return (
+            f"HostSpillPool({len(self._entries)}/{self.page_count} pages in use, "
+            f"hit_rate={100.0 * self.stats.hit_rate:.1f}%)"
+        )
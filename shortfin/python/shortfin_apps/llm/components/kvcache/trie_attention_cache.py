@@ -1,21 +1,26 @@
 from typing import Dict, Set, List, Tuple, Optional
 from dataclasses import dataclass
 from threading import Lock
+import itertools
 import time
 import math
-import heapq
-from copy import deepcopy
 from .page_pool import PagePool, PageInfo
 from .base_attention_cache import BasePagedAttentionCache, CacheAllocationFailure
-from .kvcache_utils import RefCount
 from .attention_cache_abstract import CacheInfo
+from .host_spill_pool import HostSpillPool
+from ..metrics import (
+    PREFIX_CACHE_EVICTED_PAGES,
+    PREFIX_CACHE_HIT_PAGES,
+    PREFIX_CACHE_LOOKUP_PAGES,
+)
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+_node_ids = itertools.count()
+
 
-@dataclass
 class TrieNode:
     """Node of the block trie for paged attention cache.
 
@@ -23,6 +28,9 @@ class TrieNode:
     token sequences that can follow. This allows prefix sharing between sequences
     that have common prefixes.
 
+    Nodes use `__slots__` and a plain integer reference count since a full cache
+    holds one node per page and they are touched on every lookup.
+
     Attributes:
         tokens: Tuple of tokens stored in this node's page
         page: PageInfo object containing the actual cache page
@@ -30,50 +38,85 @@ class TrieNode:
         parent: Parent node in the trie (None for root)
         ref_count: Number of active references to this node
         access_time: Last access timestamp for LRU eviction
+        node_id: Identity of this node's prefix, kept when its page is spilled
+            and restored so that spilled descendants can still be found
+        lru_prev: Previous node in the eviction list, if linked
+        lru_next: Next node in the eviction list, if linked
     """
 
-    tokens: Tuple[int, ...]
-    page: PageInfo
-    children: Optional[Dict[Tuple[int, ...], "TrieNode"]] = None
-    parent: Optional["TrieNode"] = None
-    ref_count: RefCount = None
-    access_time: float = 0.0
-
-    def __post_init__(self) -> None:
-        """Initialize children dict and access time if not provided."""
-        if self.children is None:
-            self.children = {}
+    __slots__ = (
+        "tokens",
+        "page",
+        "children",
+        "parent",
+        "ref_count",
+        "access_time",
+        "node_id",
+        "lru_prev",
+        "lru_next",
+    )
+
+    def __init__(
+        self,
+        tokens: Tuple[int, ...],
+        page: PageInfo,
+        parent: Optional["TrieNode"] = None,
+        node_id: Optional[int] = None,
+    ):
+        self.tokens = tokens
+        self.page = page
+        self.children: Dict[Tuple[int, ...], "TrieNode"] = {}
+        self.parent = parent
+        self.ref_count = 0
         self.access_time = time.monotonic()
-        self.ref_count = RefCount()
+        self.node_id = next(_node_ids) if node_id is None else node_id
+        self.lru_prev: Optional["TrieNode"] = None
+        self.lru_next: Optional["TrieNode"] = None
 
-    def create_child(self, tokens: Tuple[int, ...], page: PageInfo) -> "TrieNode":
+    def create_child(
+        self,
+        tokens: Tuple[int, ...],
+        page: PageInfo,
+        node_id: Optional[int] = None,
+    ) -> "TrieNode":
         """Create a new child node with the given tokens and page.
 
         Args:
             tokens: Sequence of tokens for the new node
             page: PageInfo for the new node's cache page
+            node_id: Identity of a spilled node being restored, if any
 
         Returns:
             The newly created child node
         """
-        new_node = None
-        if tokens in self.children:
-            # If the child already exists, return it
-            new_node = self.children[tokens]
-        else:
-            new_node = TrieNode(tokens=tokens, page=page, parent=self)
+        new_node = self.children.get(tokens)
+        if new_node is None:
+            new_node = TrieNode(tokens=tokens, page=page, parent=self, node_id=node_id)
             self.children[tokens] = new_node
         return new_node
 
     def register_allocation(self):
         """Increment the reference count for this node to register that more following pages have been allocated."""
-        self.ref_count.increment()
+        self.ref_count += 1
 
     def publish_descendant(self, descendant: "TrieNode") -> None:
         """Because ref_count is used to track allocations that depend on this node, if we have already created descendant nodes for the allocation, we need to decrease the ref_count of this node and increase the ref_count of the descendant node to reflect that the allocations have already been recorded as the descends of this node, and the new allocation depends on the descendant node."""
-        if not self.ref_count.is_empty():
-            self.ref_count.decrement()
-        descendant.ref_count.increment()
+        if self.ref_count > 0:
+            self.ref_count -= 1
+        descendant.ref_count += 1
+
+    @property
+    def spill_key(self) -> Tuple[int, Tuple[int, ...]]:
+        """Key identifying this node's page in a `HostSpillPool`.
+
+        Node ids are unique, so the parent's id and this node's tokens
+        identify the whole prefix exactly without walking to the root.
+        """
+        return (self.parent.node_id, self.tokens)
+
+    def is_evictable(self) -> bool:
+        """Whether this node is an unreferenced leaf below the root."""
+        return self.parent is not None and not self.children and self.ref_count <= 0
 
     def unlink(self) -> None:
         """Remove this node from its parent's children."""
@@ -81,17 +124,81 @@ class TrieNode:
             del self.parent.children[self.tokens]
             self.parent = None
 
-    def __hash__(self) -> int:
-        """Nodes are uniquely identified by their memory address."""
-        return id(self)
+    def __repr__(self) -> str:
+        return (
+            f"TrieNode(tokens={self.tokens}, page={self.page.index if self.page else None}, "
+            f"ref_count={self.ref_count})"
+        )
+
+
+class EvictionList:
+    """Intrusive doubly linked list of evictable trie leaves.
 
-    def __eq__(self, other: object) -> bool:
-        """Nodes are equal only if they are the same object."""
-        return self is other
+    Nodes are kept ordered by `access_time`, least recently used first, so
+    eviction pops from the head in O(1). Nodes are almost always linked with
+    the current time and go straight to the tail; a parent that becomes a leaf
+    after its child was evicted is no newer than that child and goes to the
+    head. Only the remaining cases need to walk the list.
+    """
 
-    def __lt__(self, other):
-        """Sort nodes by their memory address."""
-        return id(self) < id(other)
+    __slots__ = ("_sentinel", "_size")
+
+    def __init__(self):
+        self._sentinel = TrieNode(tokens=tuple(), page=None)
+        self._sentinel.lru_prev = self._sentinel
+        self._sentinel.lru_next = self._sentinel
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, node: TrieNode) -> bool:
+        return node.lru_next is not None
+
+    def __iter__(self):
+        node = self._sentinel.lru_next
+        while node is not self._sentinel:
+            yield node
+            node = node.lru_next
+
+    def first(self) -> Optional[TrieNode]:
+        """Return the least recently used node, if any."""
+        node = self._sentinel.lru_next
+        return None if node is self._sentinel else node
+
+    def insert(self, node: TrieNode) -> None:
+        """Link `node` at the position given by its access time."""
+        sentinel = self._sentinel
+        first = sentinel.lru_next
+        if first is sentinel or node.access_time <= first.access_time:
+            prev = sentinel
+        else:
+            prev = sentinel.lru_prev
+            while node.access_time < prev.access_time:
+                prev = prev.lru_prev
+
+        node.lru_prev = prev
+        node.lru_next = prev.lru_next
+        prev.lru_next.lru_prev = node
+        prev.lru_next = node
+        self._size += 1
+
+    def remove(self, node: TrieNode) -> None:
+        node.lru_prev.lru_next = node.lru_next
+        node.lru_next.lru_prev = node.lru_prev
+        node.lru_prev = None
+        node.lru_next = None
+        self._size -= 1
+
+    def move_to_end(self, node: TrieNode) -> None:
+        """Mark a linked node as most recently used."""
+        self.remove(node)
+        sentinel = self._sentinel
+        node.lru_prev = sentinel.lru_prev
+        node.lru_next = sentinel
+        sentinel.lru_prev.lru_next = node
+        sentinel.lru_prev = node
+        self._size += 1
 
 
 @dataclass
@@ -118,17 +225,25 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
 
     Attributes:
         root: Root node of the trie
-        leaves: Set of leaf nodes for efficient eviction
+        leaves: Set of leaf nodes
+        evictable: Unreferenced leaves in LRU order
         page_pool: Pool providing page allocations
+        spill_pool: Optional host tier that evicted full pages are copied to
         tokens_per_page: Number of tokens that fit in each page
     """
 
-    def __init__(self, page_pool: PagePool, tokens_per_page: int):
+    def __init__(
+        self,
+        page_pool: PagePool,
+        tokens_per_page: int,
+        spill_pool: Optional[HostSpillPool] = None,
+    ):
         """Initialize the trie cache.
 
         Args:
             page_pool: Pool to allocate pages from
             tokens_per_page: Number of tokens per page
+            spill_pool: Host tier to keep evicted pages in, if any
 
         Raises:
             ValueError: If tokens_per_page <= 0
@@ -145,6 +260,8 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
         )
         self.root = TrieNode(tokens=tuple(), page=dummy_page)
         self.leaves: Set[TrieNode] = set()
+        self.evictable = EvictionList()
+        self.spill_pool = spill_pool
         self._lock: Lock = Lock()
         self._duplicated_pages: List[
             PageInfo
@@ -157,7 +274,9 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
         Find the longest prefix match in the trie.
 
         Walks the trie following the token sequence as far as possible,
-        collecting matched pages along the way.
+        collecting matched pages along the way. Token blocks are only sliced
+        and hashed as the walk reaches them, so a miss on an early page does
+        not pay for the rest of the sequence.
 
         Args:
             tokens: Sequence of tokens to match
@@ -165,21 +284,70 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
         Returns:
             Tuple of (last matched node, list of matched pages, length of last matched token block)
         """
-        tokens = tuple(tokens)
         matched_pages = []
         cur = self.root
+        tokens_per_page = self.tokens_per_page
+        now = time.monotonic()
 
-        for i in range(0, len(tokens), self.tokens_per_page):
-            token_block = tokens[i : i + self.tokens_per_page]
-
-            if token_block not in cur.children:
+        for i in range(0, len(tokens), tokens_per_page):
+            child = cur.children.get(tuple(tokens[i : i + tokens_per_page]))
+            if child is None:
                 break
-            cur = cur.children[token_block]
-            cur.access_time = time.monotonic()
+            cur = child
+            cur.access_time = now
             matched_pages.append(cur.page)
 
+        # Only the last node on the path can be a leaf.
+        if cur in self.evictable:
+            self.evictable.move_to_end(cur)
+
         return cur, matched_pages
 
+    def _update_evictable(self, node: TrieNode) -> None:
+        """Link or unlink `node` from the eviction list to match its state."""
+        if node.is_evictable():
+            if node not in self.evictable:
+                self.evictable.insert(node)
+        elif node in self.evictable:
+            self.evictable.remove(node)
+
+    def _evict_lru_leaves(
+        self, max_pages: Optional[int] = None, spill: bool = True
+    ) -> List[PageInfo]:
+        """Unlink least recently used unreferenced leaves and return their pages.
+
+        Parents that become childless are considered in turn, so whole unused
+        branches are evicted from the bottom up. Full pages are copied to the
+        spill pool first when one is configured and `spill` is set.
+        """
+        evicted_pages = []
+        evicted_page_indices = set()
+        while max_pages is None or len(evicted_pages) < max_pages:
+            leaf = self.evictable.first()
+            if leaf is None:
+                break
+
+            self.evictable.remove(leaf)
+            parent = leaf.parent
+            if (
+                spill
+                and self.spill_pool is not None
+                and len(leaf.tokens) == self.tokens_per_page
+            ):
+                self.spill_pool.spill(leaf.spill_key, leaf.page, leaf.node_id)
+            leaf.unlink()
+            self.leaves.discard(leaf)
+            if leaf.page.index not in evicted_page_indices:
+                evicted_page_indices.add(leaf.page.index)
+                evicted_pages.append(leaf.page)
+
+            # If parent becomes childless, it becomes a leaf
+            if parent is not self.root and not parent.children:
+                self.leaves.add(parent)
+                self._update_evictable(parent)
+
+        return evicted_pages
+
     def lookup(self, tokens: List[int]) -> TrieCacheInfo:
         """Lookup the cache for the given token sequence. It only returns fully matched pages.
 
@@ -193,6 +361,14 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
             ) * self.tokens_per_page
             page_aligned_tokens = tokens[:page_aligned_token_len]
             cur_node, matched_pages = self.match(page_aligned_tokens)
+            if self.spill_pool is not None:
+                cur_node = self._restore_spilled(
+                    cur_node, page_aligned_tokens, matched_pages
+                )
+            PREFIX_CACHE_LOOKUP_PAGES.inc(
+                page_aligned_token_len // self.tokens_per_page
+            )
+            PREFIX_CACHE_HIT_PAGES.inc(len(matched_pages))
             num_matched_tokens = len(matched_pages) * self.tokens_per_page
             matched_tokens = page_aligned_tokens[:num_matched_tokens]
             return TrieCacheInfo(
@@ -204,11 +380,103 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
                 pool=self.page_pool,
             )
 
+    def _restore_spilled(
+        self, cur: TrieNode, tokens: List[int], matched_pages: List[PageInfo]
+    ) -> TrieNode:
+        """Extend a match with pages copied back from the spill pool.
+
+        `tokens` must be page aligned. Restored pages are appended to
+        `matched_pages` and re-inserted into the trie as unreferenced nodes,
+        exactly as if they had been published. Returns the last matched node.
+        """
+        tokens_per_page = self.tokens_per_page
+        for i in range(
+            len(matched_pages) * tokens_per_page, len(tokens), tokens_per_page
+        ):
+            token_block = tuple(tokens[i : i + tokens_per_page])
+            key = (cur.node_id, token_block)
+            if key not in self.spill_pool:
+                self.spill_pool.stats.misses += 1
+                break
+
+            # Pin the current node and entry so that making room for the
+            # restored page cannot evict the branch being extended.
+            self.spill_pool.touch(key)
+            cur.ref_count += 1
+            self._update_evictable(cur)
+            pages = self.page_pool.acquire_free_pages(1)
+            if pages is None:
+                evicted_pages = self._evict_lru_leaves(1)
+                PREFIX_CACHE_EVICTED_PAGES.inc(len(evicted_pages))
+                self.page_pool.free_pages(evicted_pages)
+                pages = self.page_pool.acquire_free_pages(1)
+            cur.ref_count -= 1
+
+            node_id = None
+            if pages is not None:
+                node_id = self.spill_pool.restore(key, pages[0])
+            if node_id is None:
+                if pages is not None:
+                    self.page_pool.free_pages(pages)
+                self._update_evictable(cur)
+                break
+
+            self.leaves.discard(cur)
+            # Keep the spilled identity, the keys of spilled children use it.
+            cur = cur.create_child(token_block, pages[0], node_id=node_id)
+            self.leaves.add(cur)
+            self._update_evictable(cur.parent)
+            self._update_evictable(cur)
+            matched_pages.append(cur.page)
+
+        return cur
+
+    def cached_nodes(self) -> List[Tuple[int, TrieNode]]:
+        """Return all full-page nodes as (parent position, node), parents first.
+
+        Parent positions index into the returned list, with -1 for the root.
+        Partially filled pages can never be matched by `lookup` and are skipped.
+        """
+        with self._lock:
+            nodes = []
+            positions = {id(self.root): -1}
+            stack = [self.root]
+            while stack:
+                node = stack.pop()
+                for child in node.children.values():
+                    if len(child.tokens) != self.tokens_per_page:
+                        continue
+                    positions[id(child)] = len(nodes)
+                    nodes.append((positions[id(node)], child))
+                    stack.append(child)
+            return nodes
+
+    def insert_cached_page(
+        self, parent: TrieNode, tokens: Tuple[int, ...], page: PageInfo
+    ) -> TrieNode:
+        """Insert an unreferenced node whose page already holds KV data for `tokens`.
+
+        Used to warm the cache from a snapshot. If the node already exists,
+        `page` is returned to the pool and the existing node is returned.
+        """
+        with self._lock:
+            node = parent.create_child(tuple(tokens), page)
+            if node.page is not page:
+                self.page_pool.free_pages([page])
+                return node
+            if parent is not self.root:
+                self.leaves.discard(parent)
+                self._update_evictable(parent)
+            self.leaves.add(node)
+            self._update_evictable(node)
+            return node
+
     def evict_pages(self, max_pages: int) -> int:
         """Evict up to max_pages pages using LRU strategy.
 
         Evicts from unreferenced leaf nodes first, working up the trie
-        as nodes become childless.
+        as nodes become childless. Costs O(pages evicted) since evictable
+        leaves are kept in LRU order as the trie changes.
 
         Args:
             max_pages: Maximum number of pages to evict
@@ -216,37 +484,9 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
         Returns:
             Number of pages actually evicted
         """
-        pages_to_evict = []
-        # Initialize heap with unreferenced leaves
-        unused_leaf_heap = [
-            (leaf.access_time, leaf)
-            for leaf in self.leaves
-            if leaf.ref_count.is_empty()
-        ]
-        heapq.heapify(unused_leaf_heap)
-
-        # Evict least recently used nodes
-        while unused_leaf_heap and len(pages_to_evict) < max_pages:
-            _, leaf = heapq.heappop(unused_leaf_heap)
-            if leaf.page in pages_to_evict:
-                continue
-            pages_to_evict.append(leaf.page)
-            parent = leaf.parent
-
-            leaf.unlink()
-            self.leaves.remove(leaf)
-
-            # If parent becomes childless, it becomes a leaf
-            if (
-                parent is not self.root
-                and not parent.children
-                and parent not in self.leaves
-            ):
-                self.leaves.add(parent)
-                if parent.ref_count.is_empty():
-                    heapq.heappush(unused_leaf_heap, (parent.access_time, parent))
-
+        pages_to_evict = self._evict_lru_leaves(max_pages)
         if pages_to_evict:
+            PREFIX_CACHE_EVICTED_PAGES.inc(len(pages_to_evict))
             self.page_pool.free_pages(pages_to_evict)
 
         return len(pages_to_evict)
@@ -317,6 +557,7 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
                     and cur_node.page.index == cache_info.pages[-1].index
                 ):
                     cur_node.register_allocation()
+                    self._update_evictable(cur_node)
 
             self._allocated_pages.extend(new_pages)
             pages = cache_info.pages + new_pages
@@ -350,7 +591,7 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
             # If incoming has more tokens, replace our tokens with incoming tokens and publish pages up to the incoming tokens.
             if not cache_info:
                 raise ValueError("cache_info cannot be None")
-            updated_tokens = deepcopy(cache_info.tokens)
+            updated_tokens = list(cache_info.tokens)
             tokens_per_page = self.tokens_per_page
             number_of_pages_to_publish = len(updated_tokens) // tokens_per_page
             matched_node, matched_pages = self.match(
@@ -408,6 +649,7 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
                 # No need to delete if it was deleted earlier.
                 if cur_node in self.leaves:
                     self.leaves.remove(cur_node)
+                self._update_evictable(cur_node)
                 cur_node = new_node
 
                 if cur_node is not self.root and cur_node not in self.leaves:
@@ -421,11 +663,17 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
             # Update reference counts only when we have unpublished tokens
             if unpublished_tokens:
                 cache_info.last_cached_node.publish_descendant(last_cached_node)
+                self._update_evictable(cache_info.last_cached_node)
+                self._update_evictable(last_cached_node)
+            self._update_evictable(cur_node)
 
             # Remove published pages from _allocated_pages
-            for page in pages:
-                if page in self._allocated_pages:
-                    self._allocated_pages.remove(page)
+            published_page_indices = {page.index for page in pages}
+            self._allocated_pages = [
+                page
+                for page in self._allocated_pages
+                if page.index not in published_page_indices
+            ]
             # if we don't publish the last incomplete page, and len(pages) < len(cache_info.pages), we should return cache_info.pages to avoid losing the reference to the last incomplete page.
             if not publish_incomplete_page and len(pages) < len(cache_info.pages):
                 pages = pages + cache_info.pages[len(pages) :]
@@ -443,32 +691,9 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
 
         """Free all pages that have zero references."""
 
-        pages_to_free = []
-        # Initialize heap with unreferenced leaves
-        unused_leaf_heap = [
-            (leaf.access_time, leaf)
-            for leaf in self.leaves
-            if leaf.ref_count.is_empty()
-        ]
-
-        # Evict least recently used nodes
-        while unused_leaf_heap:
-            _, leaf = heapq.heappop(unused_leaf_heap)
-            pages_to_free.append(leaf.page)
-            parent = leaf.parent
-
-            leaf.unlink()
-            self.leaves.remove(leaf)
-
-            # If parent becomes childless, it becomes a leaf
-            if (
-                parent is not self.root
-                and not parent.children
-                and parent not in self.leaves
-            ):
-                self.leaves.add(parent)
-                if parent.ref_count.is_empty():
-                    heapq.heappush(unused_leaf_heap, (parent.access_time, parent))
+        pages_to_free = self._evict_lru_leaves(spill=False)
+        if self.spill_pool is not None:
+            self.spill_pool.clear()
 
         if pages_to_free:
             self.page_pool.free_pages(pages_to_free)
@@ -487,17 +712,21 @@ class TriePagedAttentionCache(BasePagedAttentionCache):
         """Release the allocation's reference to its pages.
 
         Decrements reference count of the last cached node. When count
-        reaches zero, the node becomes eligible for eviction.
+        reaches zero, the node becomes eligible for eviction, and counts as
+        used at the time of release.
         """
         if cache_info is None:
             return
-        last_cached_node = cache_info.last_cached_node
-        if not last_cached_node.ref_count.is_empty():
-            last_cached_node.ref_count.decrement()
-
-        # free duplicated pages
-        self.page_pool.free_pages(self._duplicated_pages)
-        self._duplicated_pages = []
+        with self._lock:
+            last_cached_node = cache_info.last_cached_node
+            if last_cached_node.ref_count > 0:
+                last_cached_node.ref_count -= 1
+                last_cached_node.access_time = time.monotonic()
+                self._update_evictable(last_cached_node)
+
+            # free duplicated pages
+            self.page_pool.free_pages(self._duplicated_pages)
+            self._duplicated_pages = []
 
     def shutdown(self):
         self.free_cache_pages()
@@ -0,0 +1,237 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+"""
+Snapshots of a `TriePagedAttentionCache` that survive server restarts.
+
+A snapshot is a single file laid out as:
+
+    magic (8 bytes) | header length (u64, little endian) | JSON header | pages
+
+The header records the cache geometry, an optional model fingerprint, and the
+trie as a parent-first list of `[parent position, token block]` entries. Page
+contents follow at 64 byte aligned offsets, one dense `[num_nodes, page_bytes]`
+block per device, with row `i` holding the KV data of node `i`.
+
+Loading memory-maps the file so that only the pages being copied to the device
+are ever resident on the host.
+"""
+
+from pathlib import Path
+from typing import Iterable, List, Optional
+import hashlib
+import json
+import logging
+import os
+import struct
+
+import numpy as np
+
+import shortfin.array as sfnp
+
+from .page_pool import PagePool
+from .trie_attention_cache import TriePagedAttentionCache, TrieNode
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"SFKVTRIE"
+SNAPSHOT_VERSION = 1
+_ALIGNMENT = 64
+_HEADER_PREFIX = struct.Struct("<8sQ")
+
+
+class SnapshotMismatch(Exception):
+    """The snapshot was written for a different model or cache layout."""
+
+    pass
+
+
+def model_fingerprint(model_config_json: str, paths: Iterable[Path | str]) -> str:
+    """Fingerprint a model from its config and the identity of its files.
+
+    Files are identified by resolved path, size and modification time so
+    that fingerprinting a multi-GB parameter archive stays cheap.
+    """
+    digest = hashlib.sha256(model_config_json.encode())
+    for path in paths:
+        path = Path(path).resolve()
+        stat = path.stat()
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _page_bytes(page_pool: PagePool) -> List[int]:
+    dtype = page_pool.config.dtype
+    return [
+        dtype.compute_dense_nd_size([elements])
+        for elements in page_pool.config.paged_kv_block_size_elements_per_device
+    ]
+
+
+def _geometry(cache: TriePagedAttentionCache, fingerprint: str) -> dict:
+    return {
+        "tokens_per_page": cache.tokens_per_page,
+        "dtype": cache.page_pool.config.dtype.name,
+        "page_bytes_per_device": _page_bytes(cache.page_pool),
+        "fingerprint": fingerprint,
+    }
+
+
+def _staging_tables(page_pool: PagePool, staging_pages: int) -> List[sfnp.device_array]:
+    return [
+        sfnp.device_array.for_host(
+            device, [staging_pages, elements], page_pool.config.dtype
+        )
+        for device, elements in zip(
+            page_pool.devices, page_pool.config.paged_kv_block_size_elements_per_device
+        )
+    ]
+
+
+async def _wait_for_devices(page_pool: PagePool):
+    for device in page_pool.devices:
+        await device
+
+
+async def save_trie_snapshot(
+    cache: TriePagedAttentionCache,
+    path: Path | str,
+    *,
+    fingerprint: str = "",
+    staging_pages: int = 64,
+) -> int:
+    """Write every full page in `cache` to `path`. Returns the number of pages.
+
+    Pages are read back from the device `staging_pages` at a time, so host
+    memory use is bounded regardless of the cache size.
+    """
+    path = Path(path)
+    page_pool = cache.page_pool
+    cached_nodes = cache.cached_nodes()
+    header = _geometry(cache, fingerprint)
+    header["version"] = SNAPSHOT_VERSION
+    header["nodes"] = [[parent, list(node.tokens)] for parent, node in cached_nodes]
+
+    page_bytes = header["page_bytes_per_device"]
+    header_bytes = json.dumps(header).encode()
+    offset = _align(_HEADER_PREFIX.size + len(header_bytes))
+    device_offsets = []
+    for nbytes in page_bytes:
+        device_offsets.append(offset)
+        offset = _align(offset + nbytes * len(cached_nodes))
+
+    staging = _staging_tables(page_pool, staging_pages)
+    page_indices = [node.page.index for _, node in cached_nodes]
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER_PREFIX.pack(SNAPSHOT_MAGIC, len(header_bytes)))
+        f.write(header_bytes)
+        for page_table, staging_table, device_offset, nbytes in zip(
+            page_pool.page_tables, staging, device_offsets, page_bytes
+        ):
+            f.seek(device_offset)
+            for start in range(0, len(page_indices), staging_pages):
+                chunk = page_indices[start : start + staging_pages]
+                for row, page_index in enumerate(chunk):
+                    staging_table.view(row).copy_from(page_table.view(page_index))
+                await _wait_for_devices(page_pool)
+                with staging_table.map(read=True) as m:
+                    f.write(np.asarray(m)[: len(chunk) * nbytes])
+        f.truncate(offset)
+    os.replace(tmp_path, path)
+
+    logger.info("Saved %d prefix cache pages to %s", len(cached_nodes), path)
+    return len(cached_nodes)
+
+
+async def load_trie_snapshot(
+    cache: TriePagedAttentionCache,
+    path: Path | str,
+    *,
+    fingerprint: str = "",
+    staging_pages: int = 64,
+) -> int:
+    """Warm `cache` from a snapshot written by `save_trie_snapshot`.
+
+    Nodes are restored parents first until the snapshot or the free pages in
+    the pool run out. Returns the number of pages restored.
+
+    Raises:
+        SnapshotMismatch: If the snapshot does not match this cache and model.
+        ValueError: If the file is not a snapshot.
+    """
+    path = Path(path)
+    page_pool = cache.page_pool
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    magic, header_len = _HEADER_PREFIX.unpack_from(data, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a prefix cache snapshot")
+    header_start = _HEADER_PREFIX.size
+    header = json.loads(bytes(data[header_start : header_start + header_len]))
+    if header.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotMismatch(f"Unsupported snapshot version {header.get('version')}")
+
+    expected = _geometry(cache, fingerprint)
+    for key, value in expected.items():
+        if header.get(key) != value:
+            raise SnapshotMismatch(
+                f"Snapshot {key} is {header.get(key)!r}, expected {value!r}"
+            )
+
+    nodes = header["nodes"]
+    page_bytes = header["page_bytes_per_device"]
+    device_offsets = []
+    offset = _align(header_start + header_len)
+    for nbytes in page_bytes:
+        device_offsets.append(offset)
+        offset = _align(offset + nbytes * len(nodes))
+
+    staging = _staging_tables(page_pool, staging_pages)
+    trie_nodes: List[TrieNode] = []
+    restored = 0
+    for start in range(0, len(nodes), staging_pages):
+        chunk = nodes[start : start + staging_pages]
+        pages = page_pool.acquire_free_pages(len(chunk))
+        pool_full = pages is None
+        if pool_full:
+            pages = page_pool.acquire_free_pages(page_pool.available_page_count())
+            chunk = chunk[: len(pages)]
+
+        for staging_table, device_offset, nbytes in zip(
+            staging, device_offsets, page_bytes
+        ):
+            rows = data[
+                device_offset
+                + start * nbytes : device_offset
+                + (start + len(chunk)) * nbytes
+            ]
+            with staging_table.map(discard=True) as m:
+                np.asarray(m)[: len(rows)] = rows
+        for page_table, staging_table in zip(page_pool.page_tables, staging):
+            for row, page in enumerate(pages):
+                page_table.view(page.index).copy_from(staging_table.view(row))
+        await _wait_for_devices(page_pool)
+
+        for (parent, tokens), page in zip(chunk, pages):
+            parent_node = cache.root if parent < 0 else trie_nodes[parent]
+            trie_nodes.append(cache.insert_cached_page(parent_node, tokens, page))
+            restored += 1
+
+        if pool_full:
+            logger.warning(
+                "Page pool full after restoring %d of %d prefix cache pages",
+                restored,
+                len(nodes),
+            )
+            break
+
+    logger.info("Restored %d prefix cache pages from %s", restored, path)
+    return restored
@@ -20,9 +20,14 @@ from contextlib import asynccontextmanager
 
 from .config_struct import ModelParams, ServerParams
 from .decode_config import DecodeConfig
+from .generate import warm_prefix_cache
+from .kvcache.trie_attention_cache import TriePagedAttentionCache
+from .kvcache.trie_snapshot import model_fingerprint
 from .manager import LlmSystemManager
 from .service import LlmGenerateService
 from .tokenizer import Tokenizer
+from .tracing import disable_tracing, enable_tracing
+from ...utils import run_on_fiber
 from typing import TYPE_CHECKING
 from fastapi import FastAPI
 
@@ -83,7 +88,7 @@ class ShortfinLlmLifecycleManager:
             )
             server_params.decode_config = decode_config
 
-        self._validate_initialization_args(server_params, model_params)
+        self._validate_initialization_args(server_params, model_params, args)
 
         # Setup system (configure devices, etc).
         sysman = LlmSystemManager(
@@ -110,14 +115,35 @@ class ShortfinLlmLifecycleManager:
         )
         service.load_inference_module(args.vmfb)
         service.load_inference_parameters(*args.parameters, parameter_scope="model")
+        draft_model_config = getattr(args, "draft_model_config", None)
+        if draft_model_config is not None:
+            service.load_draft_model(
+                ModelParams.load_json(draft_model_config),
+                args.draft_vmfb,
+                *args.draft_parameters,
+            )
+        if server_params.prefix_cache_snapshot is not None:
+            service.prefix_cache_fingerprint = model_fingerprint(
+                model_params.to_json(), [args.vmfb, *args.parameters]
+            )
         self.sysman = sysman
         self.services = {"default": service}
 
     def __enter__(self):
         self.sysman.start()
+        for service in self.services.values():
+            if service.server_params.trace_file is not None:
+                enable_tracing(service.server_params.trace_file)
         for service_name, service in self.services.items():
             logger.info("Initializing service '%s': %r", service_name, service)
             service.start()
+            warmup_prompts = service.server_params.prefix_cache_warmup_prompts
+            if warmup_prompts and isinstance(
+                service.page_cache, TriePagedAttentionCache
+            ):
+                run_on_fiber(
+                    service.main_fiber, warm_prefix_cache, service, warmup_prompts
+                )
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
@@ -125,10 +151,11 @@ class ShortfinLlmLifecycleManager:
             logger.info("Shutting down service '%s'", service_name)
             service.shutdown()
         self.sysman.shutdown()
+        disable_tracing()
         return False
 
     def _validate_initialization_args(
-        self, server_params: ServerParams, model_params: ModelParams
+        self, server_params: ServerParams, model_params: ModelParams, args
     ):
         chunk_block_size = server_params.chunk_block_size
         has_prefill_position = model_params.has_prefill_position
@@ -143,6 +170,17 @@ class ShortfinLlmLifecycleManager:
                 "Chunked prefill requested, but model not exported with `--has-prefill-position`."
             )
 
+        if getattr(args, "draft_model_config", None) is not None:
+            if args.draft_vmfb is None:
+                raise ValueError("`draft_model_config` requires `draft_vmfb`.")
+            if not has_prefill_position:
+                raise ValueError(
+                    "Incompatible server configuration. "
+                    "Speculative decoding requested, but model not exported with `--has-prefill-position`."
+                )
+            if server_params.num_speculative_tokens < 1:
+                raise ValueError("`num_speculative_tokens` must be at least 1.")
+
         prefix_sharing_algorithm = server_params.prefix_sharing_algorithm
         if prefix_sharing_algorithm == "trie" and not has_prefill_position:
             logger.warning(
@@ -151,6 +189,24 @@ class ShortfinLlmLifecycleManager:
                 "Export from `amdsharktank` with `--has-prefill-position` for full trie prefix sharing benefits."
             )
 
+        if (
+            server_params.host_spill_page_count > 0
+            and prefix_sharing_algorithm != "trie"
+        ):
+            logger.warning(
+                "`host_spill_page_count` is set, but the host spill tier is only used with "
+                "prefix sharing algorithm 'trie'. It will be ignored."
+            )
+
+        if prefix_sharing_algorithm != "trie" and (
+            server_params.prefix_cache_snapshot is not None
+            or server_params.prefix_cache_warmup_prompts
+        ):
+            logger.warning(
+                "`prefix_cache_snapshot` and `prefix_cache_warmup_prompts` are only used with "
+                "prefix sharing algorithm 'trie'. They will be ignored."
+            )
+
     @asynccontextmanager
     async def fastapi_lifespan(self, app: FastAPI):
         """
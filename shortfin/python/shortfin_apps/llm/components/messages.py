@@ -12,6 +12,8 @@ import shortfin.array as sfnp
 from shortfin.interop.fastapi import RequestStatusTracker
 
 from ...utils import InferenceExecRequest
+from .decoder.sampling import SelectionParams, TokenCandidates
+from .tracing import SpanContext
 
 
 class InferencePhase(Enum):
@@ -37,6 +39,10 @@ class LlmInferenceExecRequest(InferenceExecRequest):
         self.prompt_length = len(input_token_ids)
         self.done = sf.VoidFuture()
         self.rid = rid
+        # Set by the batching facade, for queue wait metrics and tracing.
+        self.submit_time: float | None = None
+        # Trace track of the request this execution is part of, if traced.
+        self.trace: SpanContext | None = None
         # Unique `instance_id` for token selection strategies that may need
         # to differentiate between an original req and a copy of a req.
         self.instance_id = str(uuid4())
@@ -50,11 +56,20 @@ class LlmInferenceExecRequest(InferenceExecRequest):
         # available.
         self.return_host_array: bool = True
 
+        # Return prefill logits for every input position instead of only the
+        # last one.
+        self.return_all_logits: bool = False
+
         # Result logits as [1, sl, d] where 1 is the preserved batch dim,
         # sl is either 1 (not return_all_logits) or >=1 (return_all_logits).
         self.result_logits: sfnp.device_array | None = None
         self.result_indices: sfnp.device_array | None = None
 
+        # When set, responders also select this request's best tokens from
+        # its logits, batched with the rest of the invocation.
+        self.selection_params: SelectionParams | None = None
+        self.result_candidates: TokenCandidates | None = None
+
         # Current running score of the decode req
         self.score: float = 0.0
 
@@ -74,6 +89,7 @@ class LlmInferenceExecRequest(InferenceExecRequest):
         self.done = sf.VoidFuture()
         self.return_host_array = True
         self.result_logits = None
+        self.result_candidates = None
 
     def cache_page_indices(self, max_len: int) -> list[int]:
         if self.page_ids:
@@ -0,0 +1,110 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+"""Metrics of the LLM server, rendered by the `/metrics` route."""
+
+from shortfin_apps.utilities.metrics import REGISTRY
+
+# Decode steps take milliseconds, long prompts can queue for seconds.
+TOKEN_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.02,
+    0.04,
+    0.08,
+    0.16,
+    0.32,
+    0.64,
+    1.28,
+    2.56,
+    5.12,
+    10.24,
+)
+
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "shortfin_llm_queue_wait_seconds",
+    "Time from submitting a request to a batcher until its invocation starts.",
+    ["invocation"],
+    buckets=TOKEN_BUCKETS,
+)
+INVOCATION_SECONDS = REGISTRY.histogram(
+    "shortfin_llm_invocation_seconds",
+    "Time to prepare, run and read back one batched invocation.",
+    ["invocation"],
+    buckets=TOKEN_BUCKETS,
+)
+INVOCATION_BATCH_SIZE = REGISTRY.histogram(
+    "shortfin_llm_invocation_batch_size",
+    "Requests per invocation.",
+    ["invocation"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+TIME_TO_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "shortfin_llm_time_to_first_token_seconds",
+    "Time from the start of decoding a prompt until its first token.",
+    buckets=TOKEN_BUCKETS,
+)
+INTER_TOKEN_LATENCY_SECONDS = REGISTRY.histogram(
+    "shortfin_llm_inter_token_latency_seconds",
+    "Time between consecutive tokens of a response.",
+    buckets=TOKEN_BUCKETS,
+)
+
+PREFIX_CACHE_LOOKUP_PAGES = REGISTRY.counter(
+    "shortfin_llm_prefix_cache_lookup_pages",
+    "Full prompt pages looked up in the prefix cache.",
+)
+PREFIX_CACHE_HIT_PAGES = REGISTRY.counter(
+    "shortfin_llm_prefix_cache_hit_pages",
+    "Prompt pages found in the prefix cache, including pages restored from the host.",
+)
+PREFIX_CACHE_EVICTED_PAGES = REGISTRY.counter(
+    "shortfin_llm_prefix_cache_evicted_pages",
+    "Pages evicted from the prefix cache to make room.",
+)
+REJECTED_REQUESTS = REGISTRY.counter(
+    "shortfin_llm_rejected_requests",
+    "Requests turned away by the request queue.",
+    ["reason"],
+)
+
+FREE_KV_PAGES = REGISTRY.gauge(
+    "shortfin_llm_free_kv_pages",
+    "KV cache pages in the free list of the page pool.",
+    ["service"],
+)
+FIBER_POOL_IN_USE = REGISTRY.gauge(
+    "shortfin_llm_fiber_pool_in_use",
+    "Fibers of a fiber pool that are handed out.",
+    ["pool"],
+)
+FIBER_POOL_SIZE = REGISTRY.gauge(
+    "shortfin_llm_fiber_pool_size",
+    "Fibers in a fiber pool.",
+    ["pool"],
+)
+ARRAY_CACHE_HITS = REGISTRY.gauge(
+    "shortfin_llm_array_cache_hits",
+    "Invocation argument buffers served from a batcher's device array cache.",
+    ["batcher"],
+)
+ARRAY_CACHE_MISSES = REGISTRY.gauge(
+    "shortfin_llm_array_cache_misses",
+    "Invocation argument buffers a batcher had to allocate on the device.",
+    ["batcher"],
+)
+ARRAY_CACHE_RESIDENT_BYTES = REGISTRY.gauge(
+    "shortfin_llm_array_cache_resident_bytes",
+    "Bytes of device buffers held by a batcher's device array cache or in use.",
+    ["batcher"],
+)
+ARRAY_CACHE_STAGING_RING_MISSES = REGISTRY.gauge(
+    "shortfin_llm_array_cache_staging_ring_misses",
+    "Host staging of a batcher that did not fit in its staging ring.",
+    ["batcher"],
+)
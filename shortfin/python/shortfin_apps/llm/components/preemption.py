@@ -0,0 +1,176 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+"""
+Preemption of running requests when the KV cache runs out of pages.
+
+Requests are admitted optimistically, without reserving pages for their whole
+completion. When a decode step cannot get a page, the lowest priority running
+request (the most recently admitted one) gives up its pages and waits. Full
+pages are published to the prefix cache before they are released, so with the
+trie cache, and its host spill tier, most of a preempted request's KV data
+survives and is found again when it resumes; anything that was evicted is
+recomputed by a prefill over the request's tokens so far.
+
+Preemption is cooperative. A request is only ever preempted by itself, at the
+boundary between two decode steps; other requests can only ask it to.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Set
+import logging
+import threading
+
+import shortfin as sf
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PreemptionStats:
+    """Counters for request preemption."""
+
+    # Requests that gave up their pages.
+    preemptions: int = 0
+    # Preempted requests that got their pages back and continued.
+    resumptions: int = 0
+
+
+class PreemptionManager:
+    """Tracks running requests by priority and hands out preemption requests.
+
+    Requests are identified by an opaque hashable, usually their decoder.
+    Priority is admission order: requests registered earlier have higher
+    priority and are never preempted in favour of later ones.
+
+    Methods may be called from any worker; waiting is done on `sf.VoidFuture`s
+    so that a request blocked on one fiber can be woken from another.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_priority = 0
+        self._priorities: Dict[Hashable, int] = {}
+        self._running: Set[Hashable] = set()
+        self._preemptible: Set[Hashable] = set()
+        self._preempted: Set[Hashable] = set()
+        self._requested: Set[Hashable] = set()
+        self._waiters: List[sf.VoidFuture] = []
+        self._generation = 0
+        self.stats = PreemptionStats()
+
+    @property
+    def generation(self) -> int:
+        """Incremented every time pages are released.
+
+        Read this before attempting an allocation and pass it to
+        `wait_for_pages` so that a release in between is not missed.
+        """
+        with self._lock:
+            return self._generation
+
+    def register(self, request: Hashable) -> None:
+        """Add a newly admitted request at the lowest priority."""
+        with self._lock:
+            self._priorities[request] = self._next_priority
+            self._next_priority += 1
+
+    def unregister(self, request: Hashable) -> None:
+        """Remove a finished request. Its pages are assumed to be released."""
+        with self._lock:
+            self._priorities.pop(request, None)
+            self._running.discard(request)
+            self._preemptible.discard(request)
+            self._preempted.discard(request)
+            self._requested.discard(request)
+        self._notify()
+
+    def mark_running(self, request: Hashable, *, preemptible: bool) -> None:
+        """Record that `request` holds pages, either for the first time or again
+        after being preempted."""
+        with self._lock:
+            self._running.add(request)
+            if preemptible:
+                self._preemptible.add(request)
+            if request in self._preempted:
+                self._preempted.remove(request)
+                self.stats.resumptions += 1
+
+    def mark_preempted(self, request: Hashable) -> None:
+        """Record that `request` has released all of its pages."""
+        with self._lock:
+            self._running.discard(request)
+            self._requested.discard(request)
+            self._preempted.add(request)
+            self.stats.preemptions += 1
+        logger.debug("Preempted request %r", request)
+        self._notify()
+
+    def has_preempted(self) -> bool:
+        """Whether any request is waiting to get its pages back."""
+        with self._lock:
+            return len(self._preempted) > 0
+
+    def has_running_peers(self, request: Hashable) -> bool:
+        """Whether any other request holds pages that it will eventually release."""
+        with self._lock:
+            return any(other is not request for other in self._running)
+
+    def preemption_requested(self, request: Hashable) -> bool:
+        with self._lock:
+            return request in self._requested
+
+    def select_victim(
+        self, request: Hashable, *, include_self: bool
+    ) -> Optional[Hashable]:
+        """Pick the lowest priority running request to give up its pages.
+
+        Only requests with lower priority than `request` are considered, plus
+        `request` itself if `include_self`. If another request is selected it
+        is asked to preempt itself at its next step.
+
+        Returns:
+            The selected request, or None if there is nothing to preempt.
+        """
+        with self._lock:
+            priority = self._priorities[request]
+            candidates = [
+                other
+                for other in self._running & self._preemptible
+                if self._priorities[other] > priority
+                or (include_self and other is request)
+            ]
+            if not candidates:
+                return None
+
+            victim = max(candidates, key=self._priorities.__getitem__)
+            if victim is not request:
+                self._requested.add(victim)
+            return victim
+
+    async def wait_for_pages(self, generation: int) -> None:
+        """Wait until pages have been released since `generation`."""
+        future = sf.VoidFuture()
+        with self._lock:
+            if self._generation != generation:
+                return
+            self._waiters.append(future)
+        await future
+
+    def _notify(self) -> None:
+        with self._lock:
+            self._generation += 1
+            waiters = self._waiters
+            self._waiters = []
+        for waiter in waiters:
+            waiter.set_success()
+
+    def __repr__(self):
+        with self._lock:
+            return (
+                f"PreemptionManager(running={len(self._running)}, "
+                f"preempted={len(self._preempted)}, stats={self.stats})"
+            )
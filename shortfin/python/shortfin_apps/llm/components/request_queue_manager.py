@@ -10,6 +10,8 @@ import math
 from .config_struct import ModelParams, PagedKVCacheParams
 from typing import Optional
 from .decode_config import DecodeConfig
+from .metrics import REJECTED_REQUESTS
+from .preemption import PreemptionManager
 from shortfin.interop.fastapi import FastAPIResponder
 from shortfin.support.responder import ResponderErrorCodes
 from .tokenizer import Encoding
@@ -29,6 +31,7 @@ class RequestQueueManager:
         *,
         model_params: ModelParams,
         max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+        preemption_manager: Optional[PreemptionManager] = None,
     ):
         # Use model_params.decode_batch_sizes to decide actual _max_queue_size
         self._max_queue_size = (
@@ -41,6 +44,9 @@ class RequestQueueManager:
         self._current_id = 0
         self._current_tasks = {}
         self._request_pages = {}
+        # With preemption, greedy requests only reserve pages for their prompt
+        # plus one page of headroom, and running out is handled by preempting.
+        self._preemption_manager = preemption_manager
 
         self.model_params = model_params
         self.available_page_count = self.model_params.paged_kv_cache.device_block_count
@@ -78,6 +84,7 @@ class RequestQueueManager:
                     f"Requested top-k of {requested_topk} larger than exported top-k of {exported_topk}"
                 )
 
+                REJECTED_REQUESTS.inc(reason="top_k")
                 responder.send_error(
                     error_message="Requested top-k larger than exported top-k",
                     code=ResponderErrorCodes.INVALID_REQUEST_ARGS,
@@ -105,9 +112,12 @@ class RequestQueueManager:
 
             input_pages = math.ceil(len(input_token_ids) / stride)
             copy_pages = decode_config.num_beams - 1
-            output_pages = decode_config.num_beams * math.ceil(
-                decode_config.max_completion_tokens / stride
-            )
+            if self._preemption_manager is not None and decode_config.num_beams == 1:
+                output_pages = 1
+            else:
+                output_pages = decode_config.num_beams * math.ceil(
+                    decode_config.max_completion_tokens / stride
+                )
 
             total_needed_pages += input_pages + copy_pages + output_pages
 
@@ -136,7 +146,22 @@ class RequestQueueManager:
 
         # Check if total memory fits
         with self._lock:
+            if (
+                self._preemption_manager is not None
+                and self._preemption_manager.has_preempted()
+            ):
+                # Preempted requests get their pages back before new work starts.
+                REJECTED_REQUESTS.inc(reason="preempted")
+                responder.send_error(
+                    error_message="Not enough memory pages available.",
+                    code=ResponderErrorCodes.KVCACHE_PAGES_FULL,
+                    extra_fields={"preempted": True},
+                )
+                logger.debug("Request rejected: preempted requests are waiting.")
+                return None
+
             if total_needed_pages > self.available_page_count:
+                REJECTED_REQUESTS.inc(reason="kv_pages")
                 responder.send_error(
                     error_message="Not enough memory pages available.",
                     code=ResponderErrorCodes.KVCACHE_PAGES_FULL,
@@ -152,6 +177,7 @@ class RequestQueueManager:
 
             request_size = sum(config.num_beams for config in decode_configs)
             if self._current_queue_size + request_size > self._max_queue_size:
+                REJECTED_REQUESTS.inc(reason="queue_full")
                 responder.send_error(
                     error_message="Server queue is full. Please try again later.",
                     code=ResponderErrorCodes.QUEUE_FULL,
@@ -5,6 +5,7 @@
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
 from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
 import itertools
 import logging
 from typing import Dict, List
@@ -145,6 +146,11 @@ class AbstractScheduler(ABC):
     def should_execute(self, *args, **kwargs) -> List[List[LlmTaskInput]]:
         pass
 
+    @abstractmethod
+    def has_ready_jobs(self) -> bool:
+        """Whether jobs are ready to run but were not returned by `should_execute`."""
+        pass
+
     @abstractmethod
     def handle_scheduler(self, msg) -> bool:
         pass
@@ -158,7 +164,7 @@ class AbstractScheduler(ABC):
         pass
 
     def _group_jobs(
-        self, rid_map: Dict[str, List[LlmTaskInput]], strobe
+        self, rid_map: Dict[str, List[LlmTaskInput]], strobe, flush: bool = False
     ) -> WorkloadBuilder:
         workload_builder = WorkloadBuilder(ideal_batch_size=self._ideal_batch_size)
 
@@ -198,8 +204,12 @@ class AbstractScheduler(ABC):
 
         # If we have remaining unreserved jobs
         if len(unreserved) > 0:
+            # The batcher's wait deadline expired, dispatch what we have:
+            if flush:
+                self._unreserved_strobe = None
+                workload_builder.add_work(unreserved)
             # Schedule the strobe for a future follow up:
-            if self._unreserved_strobe is None:
+            elif self._unreserved_strobe is None:
                 self._unreserved_strobe = strobe
             # If we strobed previously we should add the remaining work:
             elif strobe - self._unreserved_strobe > 1:
@@ -281,7 +291,7 @@ class Scheduler(AbstractScheduler):
     def schedule_job(self, task: LlmTaskInput):
         self._ready.append(task)
 
-    def should_execute(self, strobe) -> List[List[LlmTaskInput]]:
+    def should_execute(self, strobe, flush: bool = False) -> List[List[LlmTaskInput]]:
         pending = self._ready
         self._ready = []
         if len(pending) == 0:
@@ -295,7 +305,7 @@ class Scheduler(AbstractScheduler):
         for j in pending:
             rid_map[j.rid].append(j)
 
-        workload_builder = self._group_jobs(rid_map=rid_map, strobe=strobe)
+        workload_builder = self._group_jobs(rid_map=rid_map, strobe=strobe, flush=flush)
 
         pending = [
             item for item in pending if item not in workload_builder.get_scheduled()
@@ -304,6 +314,9 @@ class Scheduler(AbstractScheduler):
 
         return workload_builder.get_jobs()
 
+    def has_ready_jobs(self) -> bool:
+        return bool(self._ready)
+
     def handle_scheduler(self, msg) -> bool:
         if isinstance(msg, UpdateWorkload):
             if msg.count == 0:
@@ -335,7 +348,7 @@ class ChunkScheduler(AbstractScheduler):
         else:
             self._pending[task.rid].append(task)
 
-    def should_execute(self, strobe) -> List[List[LlmTaskInput]]:
+    def should_execute(self, strobe, flush: bool = False) -> List[List[LlmTaskInput]]:
         jobs = self._ready
         self._ready = []
         if len(jobs) == 0:
@@ -349,13 +362,16 @@ class ChunkScheduler(AbstractScheduler):
         for j in jobs:
             rid_map[j.rid].append(j)
 
-        workload_builder = self._group_jobs(rid_map=rid_map, strobe=strobe)
+        workload_builder = self._group_jobs(rid_map=rid_map, strobe=strobe, flush=flush)
 
         jobs = [item for item in jobs if item not in workload_builder.get_scheduled()]
         self._ready = jobs
 
         return workload_builder.get_jobs()
 
+    def has_ready_jobs(self) -> bool:
+        return bool(self._ready)
+
     def handle_scheduler(self, msg) -> bool:
         if isinstance(msg, UpdateWorkload):
             if msg.count == 0:
@@ -378,3 +394,103 @@ class ChunkScheduler(AbstractScheduler):
         next_chunk = self._pending[rid].pop(0)
         self._ready.append(next_chunk)
         return False
+
+
+@dataclass
+class TokenBudgetStep:
+    """Work selected by `TokenBudgetScheduler` for one model step."""
+
+    decode: List[LlmTaskInput] = field(default_factory=list)
+    prefill: List[LlmTaskInput] = field(default_factory=list)
+
+    @property
+    def token_count(self) -> int:
+        return len(self.decode) + sum(len(task.input_tokens) for task in self.prefill)
+
+    def is_empty(self) -> bool:
+        return not self.decode and not self.prefill
+
+
+class TokenBudgetScheduler(AbstractScheduler):
+    """Builds each step under a budget of tokens, decode first.
+
+    Every ready decode task costs one token and is admitted first, up to the
+    decode batch size. The rest of the budget is filled with prefill chunks in
+    arrival order, one chunk in flight per request so a prompt's chunks run in
+    sequence. A chunk larger than the remaining budget waits for a later step,
+    unless no prefill has been admitted yet, so that a chunk bigger than the
+    whole budget still makes progress.
+
+    Decode reservations are not needed: whatever decode work is ready when a
+    step is built goes into that step.
+    """
+
+    def __init__(
+        self, *, token_budget: int, decode_batch_size: int, prefill_batch_size: int
+    ):
+        if token_budget <= 0:
+            raise ValueError(f"token_budget must be positive, got {token_budget}")
+        self._token_budget = token_budget
+        self._decode_batch_size = decode_batch_size
+        self._prefill_batch_size = prefill_batch_size
+        self._decode_ready: List[LlmTaskInput] = []
+        self._prefill_ready: List[LlmTaskInput] = []
+        self._prefill_pending: Dict[str, List[LlmTaskInput]] = {}
+        super().__init__(ideal_batch_size=decode_batch_size)
+
+    @property
+    def token_budget(self) -> int:
+        return self._token_budget
+
+    def schedule_job(self, task: LlmTaskInput):
+        """Schedule a prefill chunk."""
+        if self._prefill_pending.get(task.rid) is None:
+            self._prefill_ready.append(task)
+            self._prefill_pending[task.rid] = []
+        else:
+            self._prefill_pending[task.rid].append(task)
+
+    def schedule_decode(self, task: LlmTaskInput):
+        self._decode_ready.append(task)
+
+    def should_execute(self, strobe=None, flush: bool = False) -> TokenBudgetStep:
+        decode = self._decode_ready[: self._decode_batch_size]
+        self._decode_ready = self._decode_ready[self._decode_batch_size :]
+
+        budget = self._token_budget - len(decode)
+        prefill = []
+        waiting = []
+        for task in self._prefill_ready:
+            cost = len(task.input_tokens)
+            if len(prefill) < self._prefill_batch_size and (
+                cost <= budget or not prefill
+            ):
+                prefill.append(task)
+                budget -= cost
+            else:
+                waiting.append(task)
+        self._prefill_ready = waiting
+
+        return TokenBudgetStep(decode=decode, prefill=prefill)
+
+    def has_ready_jobs(self) -> bool:
+        return bool(self._decode_ready or self._prefill_ready)
+
+    def handle_scheduler(self, msg) -> bool:
+        return isinstance(msg, UpdateWorkload)
+
+    def reserve_workload(self, *, batcher, count, rid):
+        pass
+
+    def handle_completed(self, rid: str) -> bool:
+        pending = self._prefill_pending.get(rid)
+        if pending is None:
+            # Decode step.
+            return True
+
+        if len(pending) == 0:
+            del self._prefill_pending[rid]
+            return True
+
+        self._prefill_ready.append(pending.pop(0))
+        return False
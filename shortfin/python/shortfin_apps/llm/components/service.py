@@ -7,6 +7,8 @@
 import logging
 import shortfin as sf
 
+from pathlib import Path
+
 
 from .batching.facade import BatchingFacade
 from .batching.config import BatchConfig, BatchMode
@@ -14,12 +16,20 @@ from .config_struct import ModelParams, ServerParams
 from .kvcache.base_attention_cache import (
     BasePagedAttentionCache,
 )
+from .kvcache.host_spill_pool import HostSpillPool
+from .kvcache.trie_snapshot import (
+    SnapshotMismatch,
+    load_trie_snapshot,
+    save_trie_snapshot,
+)
 from .kvcache.trie_attention_cache import TriePagedAttentionCache
 from .kvcache.page_pool import PagePoolConfig, PagePool
 from .manager import LlmSystemManager
+from .metrics import FREE_KV_PAGES
+from .preemption import PreemptionManager
 from .tokenizer import Tokenizer
 
-from ...utils import GenerateService
+from ...utils import GenerateService, run_on_fiber
 from .request_queue_manager import RequestQueueManager
 from .fiber_pool import FiberPool
 
@@ -49,16 +59,53 @@ class LlmGenerateService(GenerateService):
 
         self.model_params = model_params
         self.server_params = server_params
+        # Identifies the model a prefix cache snapshot was taken with. Set by
+        # the lifecycle manager once the model files are known.
+        self.prefix_cache_fingerprint = ""
 
         self.set_isolation(program_isolation)
         self._initialize_worker_and_fiber()
         self._initialize_page_cache()
-        self.queue_manager = RequestQueueManager(model_params=self.model_params)
+        self.preemption_manager = (
+            PreemptionManager() if self.server_params.enable_preemption else None
+        )
+        self.queue_manager = RequestQueueManager(
+            model_params=self.model_params,
+            preemption_manager=self.preemption_manager,
+        )
 
         self.main_fiber_pool = FiberPool(
             self.sysman, self.queue_manager.get_max_queue_size(), resizable=True
         )
 
+        # Draft model for speculative decoding, see `load_draft_model`.
+        self.draft_model_params: ModelParams | None = None
+        self.draft_page_cache: BasePagedAttentionCache | None = None
+        self.draft_program: sf.Program | None = None
+        self.draft_batcher: BatchingFacade | None = None
+
+    def load_draft_model(
+        self, model_params: ModelParams, vmfb_path: Path, *parameter_paths: Path
+    ):
+        """Load a draft model to propose tokens for speculative decoding.
+
+        The draft model runs on its own fiber with its own KV cache, and must
+        share the target model's tokenizer.
+        """
+        self.draft_model_params = model_params
+        self.load_inference_module(vmfb_path, component="draft")
+        self.load_inference_parameters(
+            *parameter_paths, parameter_scope="model", component="draft"
+        )
+        self.draft_worker = self.sysman.ls.create_worker(
+            f"{self.name}-inference-draft-0"
+        )
+        self.draft_fiber = self.sysman.ls.create_fiber(self.draft_worker)
+        self.draft_page_cache = BasePagedAttentionCache(
+            page_pool=self._create_page_pool(model_params),
+            tokens_per_page=model_params.paged_kv_cache.block_seq_stride,
+        )
+
     def _initialize_worker_and_fiber(self):
         self.main_worker = self.sysman.ls.create_worker(f"{self.name}-inference-main-0")
         self.main_fiber = self.sysman.ls.create_fiber(self.main_worker)
@@ -75,14 +122,13 @@ class LlmGenerateService(GenerateService):
 
         self.devices = self.prefill_fiber.devices_dict.values()
 
-    def _initialize_page_cache(self):
-        """Initialize page pool and attention cache."""
+    def _create_page_pool(self, model_params: ModelParams) -> PagePool:
         paged_kv_block_size_elements_per_device = (
-            self.model_params.paged_kv_cache.paged_kv_block_size_elements_per_device
+            model_params.paged_kv_cache.paged_kv_block_size_elements_per_device
         )
         if paged_kv_block_size_elements_per_device is None:
             paged_kv_block_size_elements_per_device = [
-                self.model_params.paged_kv_block_size_elements // len(self.devices)
+                model_params.paged_kv_block_size_elements // len(self.devices)
             ] * len(self.devices)
             logger.warning(
                 "Using an old model exported without `paged_kv_block_size_elements_per_device`."
@@ -90,16 +136,27 @@ class LlmGenerateService(GenerateService):
                 "Please re-export the model as support for old models without this field is deprecated and will be removed in future releases."
             )
         page_pool_config = PagePoolConfig(
-            dtype=self.model_params.paged_kv_cache.kv_cache_dtype,
-            alloc_page_count=self.model_params.paged_kv_cache.device_block_count,
+            dtype=model_params.paged_kv_cache.kv_cache_dtype,
+            alloc_page_count=model_params.paged_kv_cache.device_block_count,
             paged_kv_block_size_elements_per_device=paged_kv_block_size_elements_per_device,
         )
-        page_pool = PagePool(devices=self.devices, config=page_pool_config)
+        return PagePool(devices=self.devices, config=page_pool_config)
+
+    def _initialize_page_cache(self):
+        """Initialize page pool and attention cache."""
+        page_pool = self._create_page_pool(self.model_params)
+        FREE_KV_PAGES.set_function(page_pool.available_page_count, service=self.name)
 
         if self.server_params.prefix_sharing_algorithm == "trie":
+            spill_pool = None
+            if self.server_params.host_spill_page_count > 0:
+                spill_pool = HostSpillPool(
+                    page_pool, self.server_params.host_spill_page_count
+                )
             self.page_cache = TriePagedAttentionCache(
                 page_pool=page_pool,
                 tokens_per_page=self.model_params.paged_kv_cache.block_seq_stride,
+                spill_pool=spill_pool,
             )
         elif self.server_params.prefix_sharing_algorithm == "none":
             self.page_cache = BasePagedAttentionCache(
@@ -117,23 +174,99 @@ class LlmGenerateService(GenerateService):
             modules=component_modules, devices=self.sysman.ls.devices
         )
         self.initialize_function_references()
+        token_budget = self.server_params.token_budget
         batch_cfg = BatchConfig(
-            BatchMode.DEFAULT,
+            BatchMode.DEFAULT if token_budget is None else BatchMode.TOKEN_BUDGET,
             self.model_params,
             self.prefill_functions,
             self.decode_functions,
             self.prog_isolation,
             self.server_params.chunk_block_size,
+            token_budget,
         )
         self.unified_batcher = BatchingFacade.build_batcher(
             batch_cfg, self.page_cache, self.prefill_fiber, self.decode_fiber
         )
         self.unified_batcher.launch()
+        if self.draft_model_params is not None:
+            self._start_draft_model()
+        self._load_prefix_cache_snapshot()
+
+    def _start_draft_model(self):
+        self.draft_program = self.create_program(
+            modules=self.initialize_program_modules("draft"),
+            devices=self.sysman.ls.devices,
+        )
+        module_name = self.draft_model_params.module_name
+        batch_cfg = BatchConfig(
+            BatchMode.DEFAULT,
+            self.draft_model_params,
+            {
+                bs: self.draft_program[f"{module_name}.prefill_bs{bs}"]
+                for bs in self.draft_model_params.prefill_batch_sizes
+            },
+            {
+                bs: self.draft_program[f"{module_name}.decode_bs{bs}"]
+                for bs in self.draft_model_params.decode_batch_sizes
+            },
+            self.prog_isolation,
+        )
+        self.draft_batcher = BatchingFacade.build_batcher(
+            batch_cfg, self.draft_page_cache, self.draft_fiber, self.draft_fiber
+        )
+        self.draft_batcher.launch()
 
     def shutdown(self):
         super().shutdown()
         self.unified_batcher.shutdown()
+        FREE_KV_PAGES.set_function(None, service=self.name)
+        spill_pool = getattr(self.page_cache, "spill_pool", None)
+        if spill_pool is not None:
+            logger.info(
+                "Host spill tier at shutdown: %r %r", spill_pool, spill_pool.stats
+            )
+        self._save_prefix_cache_snapshot()
         self.page_cache.shutdown()
+        if self.draft_batcher is not None:
+            self.draft_batcher.shutdown()
+            self.draft_page_cache.shutdown()
+
+    def _prefix_cache_snapshot_enabled(self) -> bool:
+        return self.server_params.prefix_cache_snapshot is not None and isinstance(
+            self.page_cache, TriePagedAttentionCache
+        )
+
+    def _load_prefix_cache_snapshot(self):
+        if not self._prefix_cache_snapshot_enabled():
+            return
+        path = self.server_params.prefix_cache_snapshot
+        try:
+            run_on_fiber(
+                self.prefill_fiber,
+                load_trie_snapshot,
+                self.page_cache,
+                path,
+                fingerprint=self.prefix_cache_fingerprint,
+            )
+        except FileNotFoundError:
+            logger.info("No prefix cache snapshot at %s, starting cold", path)
+        except (SnapshotMismatch, ValueError) as e:
+            logger.warning("Ignoring prefix cache snapshot %s: %s", path, e)
+
+    def _save_prefix_cache_snapshot(self):
+        if not self._prefix_cache_snapshot_enabled():
+            return
+        path = self.server_params.prefix_cache_snapshot
+        try:
+            run_on_fiber(
+                self.prefill_fiber,
+                save_trie_snapshot,
+                self.page_cache,
+                path,
+                fingerprint=self.prefix_cache_fingerprint,
+            )
+        except OSError as e:
+            logger.warning("Failed to save prefix cache snapshot to %s: %s", path, e)
 
     def initialize_function_references(self):
         self.prefill_functions = {}
@@ -48,6 +48,10 @@ class Tokenizer:
         """Decodes a batch of sequences to text."""
         return self._raw.decode_batch(sequences)
 
+    def decode_one(self, ids: list[int]) -> str:
+        """Decodes a single sequence to text."""
+        return self._raw.decode(ids)
+
     def encoding_length(self, enc: tokenizers.Encoding) -> int:
         """Gets the length of an encoding."""
         return len(enc.ids)
@@ -90,3 +94,47 @@ class Tokenizer:
         for i, enc in enumerate(encs):
             ary.view(i).items = enc.attention_mask
         return ary
+
+
+class IncrementalDetokenizer:
+    """Detokenizes a growing token sequence, emitting only newly finalized text.
+
+    Decoding token-by-token is not generally correct: byte-level tokenizers may
+    split a single character across several tokens, and some tokenizers only
+    emit leading whitespace relative to the previous token. This keeps a small
+    window of already emitted tokens as decode context and withholds text that
+    ends in an incomplete character until the following token arrives.
+    """
+
+    def __init__(self, tokenizer: Tokenizer):
+        self._tokenizer = tokenizer
+        self._token_ids: list[int] = []
+        self._prefix_offset = 0
+        self._read_offset = 0
+
+    @property
+    def token_ids(self) -> list[int]:
+        return self._token_ids
+
+    def add_tokens(self, ids: list[int]) -> str:
+        """Appends `ids` and returns any newly decodable text."""
+        self._token_ids.extend(ids)
+        prefix_text = self._tokenizer.decode_one(
+            self._token_ids[self._prefix_offset : self._read_offset]
+        )
+        new_text = self._tokenizer.decode_one(self._token_ids[self._prefix_offset :])
+        if len(new_text) <= len(prefix_text) or new_text.endswith("\ufffd"):
+            return ""
+
+        self._prefix_offset = self._read_offset
+        self._read_offset = len(self._token_ids)
+        return new_text[len(prefix_text) :]
+
+    def flush(self) -> str:
+        """Returns any text withheld while waiting for more tokens."""
+        prefix_text = self._tokenizer.decode_one(
+            self._token_ids[self._prefix_offset : self._read_offset]
+        )
+        new_text = self._tokenizer.decode_one(self._token_ids[self._prefix_offset :])
+        self._prefix_offset = self._read_offset = len(self._token_ids)
+        return new_text[len(prefix_text) :]
@@ -0,0 +1,253 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+"""
+Request tracing in the Chrome trace event format.
+
+When enabled with `enable_tracing`, spans are appended to a JSON file that
+can be opened in Perfetto or chrome://tracing. Every request gets its own
+track with a `SpanContext`, which is carried on its `LlmInferenceExecRequest`s
+so that batchers and invocations can add the time each request spent queued
+and in flight. Work done once per batch, like preparing arguments, invoking
+the model and copying results to the host, goes on one track per invocation
+kind, with the request ids in the span arguments.
+
+Timestamps come from `time.monotonic()`, the same clock as the metrics, so
+submit times recorded on requests can be used directly.
+"""
+
+from contextlib import contextmanager, nullcontext
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def now() -> float:
+    return time.monotonic()
+
+
+def _us(seconds: float) -> float:
+    return round(seconds * 1e6, 3)
+
+
+class Tracer:
+    """Appends trace events to a file in the JSON array format.
+
+    The array is closed by `close`. Trace viewers also load files that were
+    not closed, e.g. after a crash.
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self._file = open(self.path, "w")
+        self._file.write("[\n")
+        self._first = True
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._lanes: dict[str, int] = {}
+        self._lane_ids = itertools.count(1)
+
+    def _emit(self, event: dict):
+        line = json.dumps(event, default=str)
+        with self._lock:
+            if self._file is None:
+                return
+            if not self._first:
+                self._file.write(",\n")
+            self._first = False
+            self._file.write(line)
+
+    def lane(self, name: str) -> int:
+        """Id of the shared track called `name`, created on first use."""
+        with self._lock:
+            lane = self._lanes.get(name)
+            if lane is not None:
+                return lane
+            lane = self._lanes[name] = next(self._lane_ids)
+        self._name_lane(lane, name)
+        return lane
+
+    def new_lane(self, name: str) -> int:
+        """Id of a new track called `name`, e.g. for a single request.
+
+        The track is not remembered, so a long running server does not hold
+        on to one entry per request.
+        """
+        with self._lock:
+            lane = next(self._lane_ids)
+        self._name_lane(lane, name)
+        return lane
+
+    def _name_lane(self, lane: int, name: str):
+        self._emit(
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self._pid,
+                "tid": lane,
+                "args": {"name": name},
+            }
+        )
+
+    def complete(self, name: str, lane: int, start: float, end: float, **args):
+        """Record a span from `start` to `end`, in `time.monotonic()` seconds."""
+        event = {
+            "name": name,
+            "ph": "X",
+            "pid": self._pid,
+            "tid": lane,
+            "ts": _us(start),
+            "dur": _us(max(end - start, 0.0)),
+        }
+        if args:
+            event["args"] = args
+        self._emit(event)
+
+    def instant(self, name: str, lane: int, ts: Optional[float] = None, **args):
+        event = {
+            "name": name,
+            "ph": "i",
+            "s": "t",
+            "pid": self._pid,
+            "tid": lane,
+            "ts": _us(now() if ts is None else ts),
+        }
+        if args:
+            event["args"] = args
+        self._emit(event)
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write("\n]\n")
+            self._file.close()
+            self._file = None
+
+
+_tracer: Optional[Tracer] = None
+
+
+def enable_tracing(path: Path | str) -> Tracer:
+    """Start writing trace events to `path`, replacing any earlier tracer."""
+    global _tracer
+    disable_tracing()
+    _tracer = Tracer(path)
+    logger.info("Writing request traces to %s", path)
+    return _tracer
+
+
+def disable_tracing():
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+class SpanContext:
+    """The trace track of one request.
+
+    Use `SpanContext.start`, which returns None while tracing is disabled, and
+    `maybe_span` to trace a block only for traced requests.
+    """
+
+    def __init__(self, tracer: Tracer, name: str):
+        self.tracer = tracer
+        self.name = name
+        self.lane = tracer.new_lane(name)
+
+    @staticmethod
+    def start(name: str) -> Optional["SpanContext"]:
+        tracer = get_tracer()
+        if tracer is None:
+            return None
+        return SpanContext(tracer, name)
+
+    def record(self, name: str, start: float, end: Optional[float] = None, **args):
+        self.tracer.complete(
+            name, self.lane, start, now() if end is None else end, **args
+        )
+
+    def instant(self, name: str, **args):
+        self.tracer.instant(name, self.lane, **args)
+
+    @contextmanager
+    def span(self, name: str, **args):
+        start = now()
+        try:
+            yield
+        finally:
+            self.record(name, start, **args)
+
+
+def maybe_span(context: Optional[SpanContext], name: str, **args):
+    """`context.span(...)`, or a no-op if the request is not traced."""
+    if context is None:
+        return nullcontext()
+    return context.span(name, **args)
+
+
+_batch_ids = itertools.count()
+
+
+class BatchTrace:
+    """Spans of one batched invocation.
+
+    Steps go on the track of the invocation kind. Each traced request also
+    gets a `queued` span from its submission until the batch was boarded,
+    and a span for its time in the batch. All methods are no-ops while
+    tracing is disabled.
+    """
+
+    def __init__(self, name: str, requests, boarded: float):
+        self.tracer = get_tracer()
+        if self.tracer is None:
+            return
+        self.name = name
+        self.boarded = boarded
+        self.batch = next(_batch_ids)
+        self.lane = self.tracer.lane(name)
+        self.rids = [request.rid for request in requests]
+        self.traced = [request for request in requests if request.trace is not None]
+        for request in self.traced:
+            if request.submit_time is not None:
+                request.trace.record(
+                    "queued", request.submit_time, boarded, batch=self.batch
+                )
+
+    @contextmanager
+    def step(self, name: str):
+        if self.tracer is None:
+            yield
+            return
+        start = now()
+        try:
+            yield
+        finally:
+            self.tracer.complete(
+                name, self.lane, start, now(), batch=self.batch, rids=self.rids
+            )
+
+    def finish(self):
+        if self.tracer is None:
+            return
+        end = now()
+        self.tracer.complete(
+            self.name, self.lane, self.boarded, end, batch=self.batch, rids=self.rids
+        )
+        for request in self.traced:
+            request.trace.record(self.name, self.boarded, end, batch=self.batch)
@@ -0,0 +1,16 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+from fastapi import APIRouter, Response
+
+from shortfin_apps.utilities.metrics import CONTENT_TYPE, REGISTRY
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics")
+async def metrics() -> Response:
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
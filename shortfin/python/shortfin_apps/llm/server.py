@@ -83,6 +83,32 @@ def add_service_args(parser: argparse.ArgumentParser):
         help="Parameter archives to load (supports: gguf, irpa, safetensors).",
         metavar="FILE",
     )
+    parser.add_argument(
+        "--draft_model_config",
+        type=Path,
+        default=None,
+        help="Path to the model config file of a draft model. Enables speculative decoding for greedy requests.",
+    )
+    parser.add_argument(
+        "--draft_vmfb",
+        type=Path,
+        default=None,
+        help="Draft model VMFB to load. Requires `--draft_model_config`.",
+    )
+    parser.add_argument(
+        "--draft_parameters",
+        type=Path,
+        nargs="*",
+        default=[],
+        help="Parameter archives of the draft model.",
+        metavar="FILE",
+    )
+    parser.add_argument(
+        "--num_speculative_tokens",
+        type=int,
+        default=None,
+        help="Number of tokens the draft model proposes per speculative decoding step.",
+    )
     parser.add_argument(
         "--program_isolation",
         type=str,
@@ -101,6 +127,18 @@ def add_service_args(parser: argparse.ArgumentParser):
         choices=["none", "trie"],
         help="Algorithm to use for prefix sharing in KV cache",
     )
+    parser.add_argument(
+        "--host_spill_page_count",
+        type=int,
+        default=None,
+        help="Number of KV cache pages to keep in host memory after eviction from the device. Requires `--prefix_sharing_algorithm=trie`.",
+    )
+    parser.add_argument(
+        "--prefix_cache_snapshot",
+        type=str,
+        default=None,
+        help="File to save the prefix cache to at shutdown and restore it from at startup. Requires `--prefix_sharing_algorithm=trie`.",
+    )
     parser.add_argument(
         "--num_beams",
         type=int,
@@ -113,12 +151,30 @@ def add_service_args(parser: argparse.ArgumentParser):
         default=False,
         help="Use native implementations for token selection.",
     )
+    parser.add_argument(
+        "--enable_preemption",
+        action="store_true",
+        default=None,
+        help="Admit requests without reserving KV cache pages for their whole completion, and preempt the most recent request when pages run out. Preempted requests resume from the prefix cache or by recomputing.",
+    )
     parser.add_argument(
         "--chunk_block_size",
         type=int,
         default=None,
         help="*Block-aligned* Chunk size to use for chunked prefill.",
     )
+    parser.add_argument(
+        "--token_budget",
+        type=int,
+        default=None,
+        help="Maximum tokens per model step. Enables continuous batching of decode steps and prefill chunks under this budget. Pair with `--chunk_block_size`.",
+    )
+    parser.add_argument(
+        "--trace_file",
+        type=str,
+        default=None,
+        help="Write a timeline of every request, in the Chrome trace event format, to this file. Open it in Perfetto or chrome://tracing.",
+    )
 
 
 def parse_args(argv):
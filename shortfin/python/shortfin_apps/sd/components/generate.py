@@ -5,7 +5,9 @@
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
 import asyncio
+import json
 import logging
+import threading
 
 from typing import (
     TypeVar,
@@ -18,7 +20,9 @@ from shortfin_apps.types.Base64CharacterEncodedByteSequence import (
     Base64CharacterEncodedByteSequence,
 )
 
-from shortfin_apps.utilities.image import png_from
+from PIL.Image import Image
+
+from shortfin_apps.utilities.image import encoded_from, encoder_pool
 from shortfin_apps.text_to_image.TextToImageInferenceOutput import (
     TextToImageInferenceOutput,
 )
@@ -32,6 +36,7 @@ from .io_struct import GenerateReqInput
 from .messages import SDXLInferenceExecRequest
 from .service import SDXLGenerateService
 from .metrics import measure
+from ...utils import run_in_executor
 
 logger = logging.getLogger("shortfin-sd.generate")
 
@@ -60,6 +65,11 @@ class GenerateImageProcess(sf.Process):
 
     async def run(self):
         exec = SDXLInferenceExecRequest.from_batch(self.gen_req, self.index)
+        if self.gen_req.stream and self.gen_req.preview_steps:
+            exec.preview_steps = self.gen_req.preview_steps
+            exec.on_preview = lambda step, image: self.client.stream_preview(
+                self.index, step, image
+            )
         self.client.batcher.submit(exec)
         await exec.done
 
@@ -87,6 +97,9 @@ class ClientGenerateBatchProcess(sf.Process):
         "complete_infeed",
         "gen_req",
         "responder",
+        "_preview_tasks",
+        "_stream_lock",
+        "_streamed_images",
     ]
 
     def __init__(
@@ -100,40 +113,95 @@ class ClientGenerateBatchProcess(sf.Process):
         self.responder = responder
         self.batcher = service.batcher
         self.complete_infeed = self.system.create_queue()
+        # Previews are written from executor workers. The lock orders them
+        # with the final images, and previews that lose the race are dropped.
+        self._preview_tasks: set[asyncio.Task] = set()
+        self._stream_lock = threading.Lock()
+        self._streamed_images: set[int] = set()
 
     async def run(self):
         logger.debug("Started ClientBatchGenerateProcess: %r", self)
         try:
-            # Launch all individual generate processes and wait for them to finish.
+            # Launch all individual generate processes.
             gen_processes: list[GenerateImageProcess] = []
             for index in range(self.gen_req.num_output_images):
                 gen_process = GenerateImageProcess(self, self.gen_req, index)
                 gen_processes.append(gen_process)
                 gen_process.launch()
 
-            await asyncio.gather(*gen_processes)
-
-            # TODO: stream image outputs
-            logging.debug("Responding to one shot batch")
-
-            png_images: list[Base64CharacterEncodedByteSequence] = []
+            if self.gen_req.stream:
+                self.responder.stream_start(media_type="text/event-stream")
 
-            for index_of_each_process, each_process in enumerate(gen_processes):
-                if each_process.output is None:
-                    raise Exception(
-                        f"Expected output for process {index_of_each_process} but got `None`"
-                    )
+            # Encode each image as soon as its process finishes.
+            images: list[Base64CharacterEncodedByteSequence] = await asyncio.gather(
+                *[
+                    self.encode_output(index, gen_process)
+                    for index, gen_process in enumerate(gen_processes)
+                ]
+            )
 
-                each_png_image = png_from(each_process.output.image)
-                png_images.append(each_png_image)
+            if self.gen_req.stream:
+                with self._stream_lock:
+                    self._streamed_images.update(range(len(images)))
+                    self.responder.stream_part(b"data: [DONE]\n\n")
+                    self.responder.stream_part(None)
+                return
 
+            logging.debug("Responding to one shot batch")
             self.responder.send_response(
                 JSONResponse(
                     content={
-                        "images": png_images,
+                        "images": images,
                     },
                     media_type="application/json",
                 )
             )
         finally:
+            # No previews after the response, also if generation failed.
+            with self._stream_lock:
+                self._streamed_images.update(range(self.gen_req.num_output_images))
             self.responder.ensure_response()
+
+    def stream_preview(self, index: int, step: int, image: Image):
+        """Send a latent preview of image `index`. Called from executor workers.
+
+        The preview is encoded on the encoder pool, so denoising continues
+        while it is encoded and sent.
+        """
+        task = asyncio.create_task(self._send_preview(index, step, image))
+        self._preview_tasks.add(task)
+        task.add_done_callback(self._preview_tasks.discard)
+
+    async def _send_preview(self, index: int, step: int, image: Image):
+        try:
+            preview = await run_in_executor(encoder_pool(), encoded_from, image, "jpeg")
+        except Exception:
+            logger.exception("Failed to encode preview of image %d", index)
+            return
+        chunk = {"index": index, "step": step, "preview": preview}
+        with self._stream_lock:
+            # The final image supersedes previews that are not sent yet.
+            if index in self._streamed_images:
+                return
+            self.responder.stream_part(f"data: {json.dumps(chunk)}\n\n".encode())
+
+    async def encode_output(
+        self, index: int, gen_process: GenerateImageProcess
+    ) -> Base64CharacterEncodedByteSequence:
+        """Waits for `gen_process` and encodes its image off the fiber thread."""
+        await gen_process
+        if gen_process.output is None:
+            raise Exception(f"Expected output for process {index} but got `None`")
+
+        image = await run_in_executor(
+            encoder_pool(),
+            encoded_from,
+            gen_process.output.image,
+            self.gen_req.output_format,
+        )
+        if self.gen_req.stream:
+            chunk = {"index": index, "image": image}
+            with self._stream_lock:
+                self._streamed_images.add(index)
+                self.responder.stream_part(f"data: {json.dumps(chunk)}\n\n".encode())
+        return image
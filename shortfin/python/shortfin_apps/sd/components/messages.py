@@ -7,6 +7,7 @@
 from enum import Enum
 
 from typing import (
+    Callable,
     Union,
 )
 
@@ -94,6 +95,11 @@ class SDXLInferenceExecRequest(InferenceExecRequest):
 
         self.response_image: Union[Image, None] = None
 
+        # Streaming previews, called from the executor with the number of
+        # finished steps and a preview of this request's latents.
+        self.preview_steps = 0
+        self.on_preview: Callable[[int, Image], None] | None = None
+
         self.done = sf.VoidFuture()
 
         # Response control.
@@ -104,34 +110,12 @@ class SDXLInferenceExecRequest(InferenceExecRequest):
         self.post_init()
 
     def set_command_buffer(self, cb):
-        # Input IDs for CLIP if they are used as inputs instead of prompts.
-        if self.input_ids is not None:
-            # Take a batch of sets of input ids as ndarrays and fill cb.input_ids
-            host_arrs = [None] * len(cb.input_ids)
-            for idx, arr in enumerate(cb.input_ids):
-                host_arrs[idx] = arr.for_transfer()
-                with host_arrs[idx].map(write=True, discard=True) as m:
-
-                    # TODO: fix this attr redundancy
-                    np_arr = self.input_ids[0][idx]
-
-                    m.fill(np_arr)
-                cb.input_ids[idx].copy_from(host_arrs[idx])
+        """Attaches `cb` and sets the denoise parameters of its batch.
 
-        # Same for noisy latents if they are explicitly provided as a numpy array.
-        if isinstance(self.sample, list):
-            sample_host = cb.sample.for_transfer()
-            for idx, i in enumerate(self.sample):
-                with sample_host.view(idx).map(discard=True) as m:
-                    m.fill(i.tobytes())
-            cb.sample.copy_from(sample_host)
-        elif self.sample is not None:
-            sample_host = cb.sample.for_transfer()
-            with sample_host.map(discard=True) as m:
-                m.fill(self.sample.tobytes())
-            cb.sample.copy_from(sample_host)
-
-        # Copy other inference parameters for denoise to device arrays.
+        Per row inputs, token ids and sample latents, are staged by the
+        executor, which may batch several requests into one command buffer.
+        """
+        # Copy inference parameters for denoise to device arrays.
         steps_arr = list(range(0, self.steps))
         steps_host = cb.steps_arr.for_transfer()
         steps_host.items = steps_arr
@@ -148,10 +132,21 @@ class SDXLInferenceExecRequest(InferenceExecRequest):
 
             m.fill(np_arr)
         cb.guidance_scale.copy_from(guidance_host)
-        cb.images_host.fill(np.array(0, dtype="float16"))
         self.command_buffer = cb
         return
 
+    def row_input_ids(self, row: int):
+        """Explicitly provided input ids of batch row `row` of this request."""
+        if isinstance(self.input_ids[0], list):
+            return self.input_ids[row]
+        return self.input_ids
+
+    def row_sample(self, row: int) -> np.ndarray:
+        """Explicitly provided sample latents of batch row `row` of this request."""
+        if isinstance(self.sample, list):
+            return self.sample[row]
+        return np.asarray(self.sample).reshape(self.batch_size, -1)[row]
+
     def post_init(self):
         """Determines necessary inference phases and tags them with static program parameters."""
         if self.prompt is not None:
@@ -182,12 +177,14 @@ class SDXLInferenceExecRequest(InferenceExecRequest):
                 meta = [self.width, self.height]
                 return required, meta
             case InferencePhase.DENOISE:
+                # Requests batched together share one guidance scale.
                 required = True
-                meta = [self.width, self.height, self.steps]
+                meta = [self.width, self.height, self.steps, self.guidance_scale]
                 return required, meta
             case InferencePhase.ENCODE:
                 required = True
-                return required, None
+                meta = [self.batch_size]
+                return required, meta
             case InferencePhase.PREPARE:
                 p_results = [self.sample, self.input_ids]
                 required = any([inp is None for inp in p_results])
@@ -19,16 +19,38 @@ import gc
 import shortfin as sf
 import shortfin.array as sfnp
 
-from ...utils import GenerateService, BatcherProcess
+from ...utils import (
+    GenerateService,
+    BatcherProcess,
+    HostStagingBuffers,
+    StagePipeline,
+    StepScheduler,
+    CommandBufferPool,
+    copy_to_host,
+)
 
 from .config_struct import ModelParams
 from .manager import SDXLSystemManager
 from .messages import SDXLInferenceExecRequest, InferencePhase
 from .tokenizer import Tokenizer
-from .metrics import measure, log_duration_str
+from .metrics import (
+    IDLE_FIBERS,
+    export_command_buffer_stats,
+    measure,
+    log_duration_str,
+)
+from shortfin_apps.utilities.embedding_cache import EmbeddingCache
+from shortfin_apps.utilities.image import images_from, latent_preview_from
 
 logger = logging.getLogger("shortfin-sd.service")
 
+# Stages of a pipelined batch, in order, and the phases each of them runs.
+PIPELINE_STAGES = {
+    InferencePhase.ENCODE: (InferencePhase.PREPARE, InferencePhase.ENCODE),
+    InferencePhase.DENOISE: (InferencePhase.DENOISE,),
+    InferencePhase.DECODE: (InferencePhase.DECODE, InferencePhase.POSTPROCESS),
+}
+
 
 class SDXLGenerateService(GenerateService):
     """Top level service interface for image generation."""
@@ -47,6 +69,11 @@ class SDXLGenerateService(GenerateService):
         trace_execution: bool = False,
         use_batcher: bool = True,
         splat: bool = False,
+        pipeline_stages: bool = False,
+        prompt_cache_bytes: int = 0,
+        prompt_cache_host_bytes: int = 0,
+        denoise_slots: int = 1,
+        command_buffers_per_shape: int = 4,
     ):
         super().__init__(sysman, fibers_per_device, workers_per_device)
         self.name = name
@@ -59,6 +86,30 @@ class SDXLGenerateService(GenerateService):
         self.trace_execution = trace_execution
         self.show_progress = show_progress
         self.splat_weights = splat
+        # Batches that can share a fiber, joining at denoise step boundaries.
+        self.denoise_slots = denoise_slots
+        # Cap on command buffers per fiber of each batch size and output size.
+        self.command_buffers_per_shape = command_buffers_per_shape
+        # CLIP outputs of recently seen prompts and negative prompts, by device index.
+        # Executors only reuse entries of their own device, so that cached
+        # arrays are never copied across devices.
+        self.prompt_caches: dict[int, EmbeddingCache] = {}
+        if prompt_cache_bytes > 0:
+            self.prompt_caches = {
+                device_index: EmbeddingCache(
+                    prompt_cache_bytes, max_host_bytes=prompt_cache_host_bytes
+                )
+                for device_index in range(len(sysman.ls.devices))
+            }
+        # With pipeline stages, every fiber runs one stage of each batch, so
+        # that encode, denoise and decode of different batches overlap.
+        self.pipeline: StagePipeline | None = None
+        if pipeline_stages:
+            self.pipeline = StagePipeline(
+                list(PIPELINE_STAGES),
+                launch=self.launch_stage,
+                on_first_stage_idle=lambda: self.batcher.wakeup(),
+            )
 
         # Finish initialization
         self.set_isolation(prog_isolation)
@@ -70,6 +121,13 @@ class SDXLGenerateService(GenerateService):
         self.workers = []
         self.meta_fibers = []
         self.idle_meta_fibers = []
+        IDLE_FIBERS.set_function(lambda: len(self.idle_meta_fibers), service=self.name)
+
+        if self.pipeline is not None and self.fibers_per_device < len(PIPELINE_STAGES):
+            raise ValueError(
+                f"Pipeline stages need at least {len(PIPELINE_STAGES)} fibers per device, "
+                f"got {self.fibers_per_device}."
+            )
 
         # For each worker index we create one on each device, and add their fibers to the idle set.
         # This roughly ensures that the first picked fibers are distributed across available devices.
@@ -85,7 +143,11 @@ class SDXLGenerateService(GenerateService):
                     raw_fiber, len(self.meta_fibers), worker_idx
                 )
                 self.meta_fibers.append(meta_fiber)
-                self.idle_meta_fibers.append(meta_fiber)
+                if self.pipeline is not None:
+                    stage = self.pipeline.stages[i % len(self.pipeline.stages)]
+                    self.pipeline.add_fiber(stage, meta_fiber, idx)
+                else:
+                    self.idle_meta_fibers.append(meta_fiber)
 
         # Initialize program and function containers
         for idx in range(len(self.workers)):
@@ -95,17 +157,46 @@ class SDXLGenerateService(GenerateService):
     def equip_fiber(self, fiber, idx: int, worker_idx: int):
         """Equip a fiber with additional metadata and command buffers."""
         MetaFiber = namedtuple(
-            "MetaFiber", ["fiber", "idx", "worker_idx", "device", "command_buffers"]
+            "MetaFiber",
+            [
+                "fiber",
+                "idx",
+                "worker_idx",
+                "device",
+                "command_buffer_pool",
+                "host_staging",
+                "step_scheduler",
+            ],
+        )
+        # Buffers for every batch size and output size are built up front, so
+        # that serving several resolutions does not allocate per batch.
+        pool = CommandBufferPool(
+            lambda key: initialize_command_buffer(fiber, self.model_params, *key),
+            max_per_key=self.command_buffers_per_shape,
+        )
+        for batch_size in self.model_params.all_batch_sizes:
+            for height, width in self.model_params.dims:
+                pool.preallocate((batch_size, height, width))
+        export_command_buffer_stats(pool.stats, service=self.name, fiber=idx)
+
+        return MetaFiber(
+            fiber,
+            idx,
+            worker_idx,
+            fiber.device(0),
+            pool,
+            {},
+            StepScheduler(self.denoise_slots),
         )
-        cbs_per_fiber = 1
-        cbs = []
-        for _ in range(cbs_per_fiber):
-            for batch_size in self.model_params.all_batch_sizes:
-                cbs.append(
-                    initialize_command_buffer(fiber, self.model_params, batch_size)
-                )
 
-        return MetaFiber(fiber, idx, worker_idx, fiber.device(0), cbs)
+    def launch_stage(self, batch: "InferenceExecutorProcess", stage, meta_fiber):
+        """Continue `batch` at pipeline `stage` on `meta_fiber`."""
+        exec_process = InferenceExecutorProcess(self, meta_fiber, stage=stage)
+        exec_process.exec_requests = batch.exec_requests
+        exec_process.batch_size = batch.batch_size
+        exec_process.device_index = batch.device_index
+        exec_process.cb_fiber = batch.cb_fiber
+        exec_process.launch()
 
     def load_inference_module(
         self, vmfb_path: Path, component: str = None, batch_size: int = None
@@ -205,22 +296,48 @@ class SDXLGenerateService(GenerateService):
 ########################################################################################
 
 
+def select_flight(
+    request_count: int, rows_per_request: int, batch_sizes: list[int]
+) -> tuple[int, int]:
+    """Picks the program batch size and request count of the next flight.
+
+    Takes as many requests as fit in the largest compiled batch size. If even
+    the smallest one that fits whole requests is larger than all of them, the
+    requests are padded up to it.
+
+    Returns:
+        The program batch size and the number of requests to take.
+    """
+    fitting = [bs for bs in batch_sizes if bs % rows_per_request == 0]
+    full = [bs for bs in fitting if bs // rows_per_request <= request_count]
+    if full:
+        batch_size = max(full)
+        return batch_size, batch_size // rows_per_request
+    if fitting:
+        return min(fitting), request_count
+    return rows_per_request, 1
+
+
 class SDXLBatcherProcess(BatcherProcess):
     """The batcher is a persistent process responsible for flighting incoming work
     into batches.
     """
 
-    STROBE_SHORT_DELAY = 0.5
-    STROBE_LONG_DELAY = 1
+    MAX_BATCH_WAIT = 1.0
 
     def __init__(self, service: SDXLGenerateService):
         super().__init__(fiber=service.meta_fibers[0].fiber)
         self.service = service
-        self.batcher_infeed = self.system.create_queue()
         self.pending_requests: set[InferenceExecRequest] = set()
-        self.strobe_enabled = True
-        self.strobes: int = 0
-        self.ideal_batch_size: int = max(service.model_params.batch_sizes["clip"])
+        # Batch sizes that CLIP and every denoise submodel are compiled for. VAE
+        # decode falls back to batch size 1 when needed.
+        batch_sizes = service.model_params.batch_sizes
+        self.batch_sizes: list[int] = sorted(
+            set.intersection(
+                *[set(sizes) for name, sizes in batch_sizes.items() if name != "vae"]
+            )
+        ) or sorted(batch_sizes["clip"])
+        self.ideal_batch_size: int = max(self.batch_sizes)
         self.num_fibers = len(service.meta_fibers)
 
     def handle_inference_request(self, request):
@@ -233,28 +350,61 @@ class SDXLBatcherProcess(BatcherProcess):
         waiting_count = len(self.pending_requests)
         if waiting_count == 0:
             return
-        if waiting_count < self.ideal_batch_size and self.strobes < 2:
+        if waiting_count < self.ideal_batch_size and not self.deadline_expired():
             logger.info("Waiting a bit longer to fill flight")
             return
-        self.strobes = 0
         batches = self.sort_batches()
         for batch in batches.values():
-            # Assign the batch to the next idle fiber.
-            if len(self.service.idle_meta_fibers) == 0:
-                logger.debug("Waiting for an idle fiber...")
-                return
-            meta_fiber = self.service.idle_meta_fibers.pop(0)
-            logger.debug(
-                f"Sending batch to fiber {meta_fiber.idx} (worker {meta_fiber.worker_idx})"
-            )
-            await self.board(batch["reqs"][0], meta_fiber=meta_fiber)
-            if self.service.prog_isolation != sf.ProgramIsolation.PER_FIBER:
-                self.service.idle_meta_fibers.append(meta_fiber)
-
-    async def board(self, request, meta_fiber):
-        exec_process = InferenceExecutorProcess(self.service, meta_fiber)
-        exec_process.exec_request = request
-        self.pending_requests.remove(request)
+            reqs = batch["reqs"]
+            while reqs:
+                # Assign the next flight to the next idle fiber.
+                pipeline = self.service.pipeline
+                if pipeline is not None:
+                    stage = pipeline.stages[0]
+                    acquired = pipeline.acquire(stage)
+                elif self.service.idle_meta_fibers:
+                    stage = None
+                    meta_fiber = self.service.idle_meta_fibers.pop(0)
+                    device_index = meta_fiber.idx // self.service.fibers_per_device
+                    acquired = (device_index, meta_fiber)
+                    meta_fiber.step_scheduler.join()
+                else:
+                    acquired = None
+                if acquired is None:
+                    logger.debug("Waiting for an idle fiber...")
+                    return
+                device_index, meta_fiber = acquired
+                batch_size, count = select_flight(
+                    len(reqs), reqs[0].batch_size, self.batch_sizes
+                )
+                flight, reqs = reqs[:count], reqs[count:]
+                logger.debug(
+                    f"Sending {len(flight)} requests at batch size {batch_size} to fiber {meta_fiber.idx} (worker {meta_fiber.worker_idx})"
+                )
+                await self.board(
+                    flight,
+                    batch_size,
+                    meta_fiber=meta_fiber,
+                    stage=stage,
+                    device_index=device_index,
+                )
+                if (
+                    pipeline is None
+                    and self.service.prog_isolation != sf.ProgramIsolation.PER_FIBER
+                ):
+                    self.service.idle_meta_fibers.append(meta_fiber)
+        if not self.pending_requests:
+            self.clear_deadline()
+
+    async def board(
+        self, requests, batch_size, meta_fiber, stage=None, device_index: int = 0
+    ):
+        exec_process = InferenceExecutorProcess(self.service, meta_fiber, stage=stage)
+        exec_process.exec_requests = requests
+        exec_process.batch_size = batch_size
+        exec_process.device_index = device_index
+        for request in requests:
+            self.pending_requests.remove(request)
         exec_process.launch()
 
 
@@ -264,118 +414,226 @@ class SDXLBatcherProcess(BatcherProcess):
 
 
 class InferenceExecutorProcess(sf.Process):
-    """Executes a stable diffusion inference batch"""
+    """Executes a stable diffusion inference batch.
+
+    A batch is one or more requests with the same image size, step count and
+    guidance scale. Their rows are stacked into one command buffer of a
+    compiled batch size, padded with rows of the first request if needed, and
+    the images are split back out per request after decode.
+
+    With a `stage`, only the phases of that pipeline stage run here, and the
+    batch is then handed to the service pipeline for its next stage. The
+    command buffer travels with the batch until the last stage returns it.
+    """
 
     def __init__(
         self,
         service: SDXLGenerateService,
         meta_fiber,
+        stage: InferencePhase | None = None,
     ):
         super().__init__(fiber=meta_fiber.fiber)
         self.service = service
         self.meta_fiber = meta_fiber
         self.worker_index = meta_fiber.worker_idx
-        self.exec_request: SDXLInferenceExecRequest = None
-
-    def assign_command_buffer(self, request: SDXLInferenceExecRequest):
-        for cb in self.meta_fiber.command_buffers:
-            if cb.batch_size == self.exec_request.batch_size:
-                self.exec_request.set_command_buffer(cb)
-                self.meta_fiber.command_buffers.remove(cb)
-                return
-        cb = initialize_command_buffer(
-            self.fiber, self.service.model_params, request.batch_size
-        )
-        self.exec_request.set_command_buffer(cb)
+        self.stage = stage
+        self.device_index = 0
+        # Fiber that the batch's command buffer is returned to.
+        self.cb_fiber = meta_fiber
+        self.exec_requests: list[SDXLInferenceExecRequest] = []
+        # Program batch size. Defaults to the number of rows of the requests.
+        self.batch_size: int | None = None
+        self._fiber_released = False
+        # Decoded `[bs, 3, H, W]` images of the whole batch.
+        self.images: np.ndarray | None = None
+        # Token ids of each batch row, prompt ids first, then negative prompt ids.
+        self.row_ids: list[list] = []
+
+    @property
+    def exec_request(self) -> SDXLInferenceExecRequest | None:
+        """The first request of the batch, which holds the command buffer."""
+        return self.exec_requests[0] if self.exec_requests else None
+
+    @exec_request.setter
+    def exec_request(self, request: SDXLInferenceExecRequest):
+        self.exec_requests = [request]
+
+    def rows(self) -> list[tuple[SDXLInferenceExecRequest, int]]:
+        """The request and request row of each batch row, padding included."""
+        rows = [
+            (request, row)
+            for request in self.exec_requests
+            for row in range(request.batch_size)
+        ]
+        padding = self.batch_size - len(rows)
+        return rows + [(self.exec_request, 0)] * padding
+
+    async def assign_command_buffer(self, request: SDXLInferenceExecRequest):
+        height, width = self.service.model_params.dims[0]
+        key = (self.batch_size, request.height or height, request.width or width)
+        cb = await self.meta_fiber.command_buffer_pool.lease(key)
+        request.set_command_buffer(cb)
         return
 
     @measure(type="exec", task="inference process")
     async def run(self):
+        if self.batch_size is None:
+            self.batch_size = sum(request.batch_size for request in self.exec_requests)
         try:
             device = self.fiber.device(0)
             if not self.exec_request.command_buffer:
-                self.assign_command_buffer(self.exec_request)
+                await self.assign_command_buffer(self.exec_request)
                 await device
 
-            phases = self.exec_request.phases
-            if phases[InferencePhase.PREPARE]["required"]:
+            # Explicitly provided inputs are staged here too.
+            if self._runs(InferencePhase.PREPARE):
                 await self._prepare(device=device)
-            if phases[InferencePhase.ENCODE]["required"]:
+            if self._required(InferencePhase.ENCODE):
                 await self._encode(device=device)
-            if phases[InferencePhase.DENOISE]["required"]:
+            if self._required(InferencePhase.DENOISE):
                 await self._denoise(device=device)
-            if phases[InferencePhase.DECODE]["required"]:
+            if self._required(InferencePhase.DECODE):
                 await self._decode(device=device)
-            if phases[InferencePhase.POSTPROCESS]["required"]:
+            if self._required(InferencePhase.POSTPROCESS):
                 await self._postprocess(device=device)
-            self.exec_request.done.set_success()
+
+            next_stage = None
+            if self.stage is not None:
+                next_stage = self.service.pipeline.next_stage(self.stage)
+            if next_stage is not None:
+                # The next stage reads this one's results from another fiber.
+                await device
+                self._release_fiber(handoff=True)
+                self.service.pipeline.handoff(next_stage, self, self.device_index)
+                return
 
         except Exception:
             logger.exception("Fatal error in image generation")
             # TODO: Cancel and set error correctly
-            self.exec_request.done.set_success()
 
-        self.meta_fiber.command_buffers.append(self.exec_request.command_buffer)
-        self.exec_request.command_buffer = None
-        if self.service.prog_isolation == sf.ProgramIsolation.PER_FIBER:
+        for request in self.exec_requests:
+            request.done.set_success()
+        self._release_fiber()
+
+    def _runs(self, phase: InferencePhase) -> bool:
+        return self.stage is None or phase in PIPELINE_STAGES[self.stage]
+
+    def _required(self, phase: InferencePhase) -> bool:
+        return self._runs(phase) and self.exec_request.phases[phase]["required"]
+
+    def _release_fiber(self, handoff: bool = False):
+        """Return the command buffer and fiber once no more device work is queued.
+
+        With `handoff`, the command buffer stays with the batch for its next stage.
+        """
+        if self._fiber_released:
+            return
+        self._fiber_released = True
+        if not handoff and self.exec_request.command_buffer is not None:
+            self.cb_fiber.command_buffer_pool.release(self.exec_request.command_buffer)
+            self.exec_request.command_buffer = None
+        if self.stage is not None:
+            self.service.pipeline.release(
+                self.stage, self.meta_fiber, self.device_index
+            )
+            return
+        offer = self.meta_fiber.step_scheduler.leave()
+        if offer and self.service.prog_isolation == sf.ProgramIsolation.PER_FIBER:
+            self.service.idle_meta_fibers.append(self.meta_fiber)
+            self.service.batcher.wakeup()
+
+    def _offer_fiber(self):
+        """Let the batcher board another batch here if the fiber has a free slot."""
+        if self.stage is not None:
+            return
+        if self.service.prog_isolation != sf.ProgramIsolation.PER_FIBER:
+            return
+        if self.meta_fiber.step_scheduler.offer():
             self.service.idle_meta_fibers.append(self.meta_fiber)
+            self.service.batcher.wakeup()
 
-    async def _prepare(self, device):
+    def _host_staging(self, shape) -> HostStagingBuffers:
+        staging = self.meta_fiber.host_staging.get(tuple(shape))
+        if staging is None:
+            staging = HostStagingBuffers(
+                self.fiber.device(0), shape, self.service.model_params.vae_dtype
+            )
+            self.meta_fiber.host_staging[tuple(shape)] = staging
+        return staging
+
+    def _tokenize(self, request: SDXLInferenceExecRequest, row: int):
         # Tokenize prompts and negative prompts. We tokenize in bs1 for now and join later.
-        # Tokenize the prompts if the request does not hold input_ids.
-        batch_ids_lists = []
+        if isinstance(request.prompt, str):
+            request.prompt = [request.prompt]
+        if isinstance(request.neg_prompt, str):
+            request.neg_prompt = [request.neg_prompt]
+        input_ids_list = []
+        neg_ids_list = []
+        for tokenizer in self.service.tokenizers:
+            input_ids = tokenizer.encode(request.prompt[row]).input_ids
+            input_ids_list.append(input_ids)
+            neg_ids = tokenizer.encode(request.neg_prompt[row]).input_ids
+            neg_ids_list.append(neg_ids)
+        return [*input_ids_list, *neg_ids_list]
+
+    @measure(type="phase", task="prepare")
+    async def _prepare(self, device):
+        # Stage token ids and sample latents of every row, tokenizing prompts
+        # and generating latents for requests that did not provide them.
         cb = self.exec_request.command_buffer
-        if isinstance(self.exec_request.prompt, str):
-            self.exec_request.prompt = [self.exec_request.prompt]
-        if isinstance(self.exec_request.neg_prompt, str):
-            self.exec_request.neg_prompt = [self.exec_request.neg_prompt]
-        for i in range(self.exec_request.batch_size):
-            input_ids_list = []
-            neg_ids_list = []
-            for tokenizer in self.service.tokenizers:
-                input_ids = tokenizer.encode(self.exec_request.prompt[i]).input_ids
-                input_ids_list.append(input_ids)
-                neg_ids = tokenizer.encode(self.exec_request.neg_prompt[i]).input_ids
-                neg_ids_list.append(neg_ids)
-            ids_list = [*input_ids_list, *neg_ids_list]
-            batch_ids_lists.append(ids_list)
-
-        # Prepare tokenized input ids for CLIP inference
-        host_arrs = [None] * len(cb.input_ids)
-        for idx, arr in enumerate(cb.input_ids):
-            host_arrs[idx] = arr.for_transfer()
-            for i in range(self.exec_request.batch_size):
-                with host_arrs[idx].view(i).map(write=True, discard=True) as m:
-
-                    # TODO: fix this attr redundancy
-                    np_arr = batch_ids_lists[i][idx]
-
-                    m.fill(np_arr)
-            cb.input_ids[idx].copy_from(host_arrs[idx])
-
-        # Generate random sample latents.
-        seed = self.exec_request.seed
-
-        # Create and populate sample device array.
-        generator = sfnp.RandomGenerator(seed)
-
+        ids_hosts = [arr.for_transfer() for arr in cb.input_ids]
         sample_host = cb.sample.for_transfer()
-        with sample_host.map(discard=True) as m:
-            m.fill(bytes(1))
-
-        sfnp.fill_randn(sample_host, generator=generator)
+        # Each request draws its rows' latents from its own seed.
+        generators = {}
+        self.row_ids = []
 
+        for batch_row, (request, row) in enumerate(self.rows()):
+            if request.input_ids is not None:
+                ids_list = request.row_input_ids(row)
+            else:
+                ids_list = self._tokenize(request, row)
+            self.row_ids.append(ids_list)
+            for ids_host, ids in zip(ids_hosts, ids_list):
+                with ids_host.view(batch_row).map(write=True, discard=True) as m:
+                    m.fill(ids)
+
+            sample_row = sample_host.view(batch_row)
+            if request.sample is not None:
+                with sample_row.map(discard=True) as m:
+                    m.fill(request.row_sample(row).tobytes())
+                continue
+
+            generator = generators.get(id(request))
+            if generator is None:
+                generator = sfnp.RandomGenerator(request.seed)
+                generators[id(request)] = generator
+            sfnp.fill_randn(sample_row, generator=generator)
+
+        for arr, ids_host in zip(cb.input_ids, ids_hosts):
+            arr.copy_from(ids_host)
         cb.sample.copy_from(sample_host)
         return
 
+    @measure(type="phase", task="encode")
     async def _encode(self, device):
-        req_bs = self.exec_request.batch_size
+        req_bs = self.batch_size
         entrypoints = self.service.inference_functions[self.worker_index]["encode"]
         assert req_bs in list(entrypoints.keys())
         for bs, fns in entrypoints.items():
             if bs == req_bs:
                 break
         cb = self.exec_request.command_buffer
+        cache = self.service.prompt_caches.get(self.device_index)
+        if cache is not None:
+            keys = self._prompt_keys()
+            cached = cache.get_all(keys)
+            if cached is not None:
+                # Every prompt was seen before, CLIP does not need to run.
+                for row, (prompt_embeds, text_embeds) in enumerate(cached):
+                    cb.prompt_embeds.view(row).copy_from(prompt_embeds)
+                    cb.text_embeds.view(row).copy_from(text_embeds)
+                return
+
         # Encode tokenized inputs.
         logger.debug(
             "INVOKE %r: %s",
@@ -385,10 +643,29 @@ class InferenceExecutorProcess(sf.Process):
         cb.prompt_embeds, cb.text_embeds = await fns["encode_prompts"](
             *cb.input_ids, fiber=self.fiber
         )
+        if cache is not None:
+            await cache.insert(
+                {
+                    key: (cb.prompt_embeds.view(row), cb.text_embeds.view(row))
+                    for row, key in enumerate(keys)
+                },
+                device,
+            )
         return
 
+    def _prompt_keys(self) -> list[tuple]:
+        """Cache keys of each row of the CLIP outputs.
+
+        CLIP stacks the negative prompt embeddings of all batch rows before the
+        prompt embeddings.
+        """
+        keys = [EmbeddingCache.key(*ids[2:]) for ids in self.row_ids]
+        keys += [EmbeddingCache.key(*ids[:2]) for ids in self.row_ids]
+        return keys
+
+    @measure(type="phase", task="denoise")
     async def _denoise(self, device):
-        req_bs = self.exec_request.batch_size
+        req_bs = self.batch_size
         entrypoints = self.service.inference_functions[self.worker_index]["denoise"]
         assert req_bs in list(entrypoints.keys())
         for bs, fns in entrypoints.items():
@@ -405,61 +682,96 @@ class InferenceExecutorProcess(sf.Process):
             "run_initialize"
         ](cb.sample, cb.num_steps, fiber=self.fiber)
 
+        scheduler = self.meta_fiber.step_scheduler
         for i, t in tqdm(
             enumerate(range(self.exec_request.steps)),
             disable=(not self.service.show_progress),
             desc=f"DENOISE (bs{req_bs})",
         ):
-            start = time.time()
-            step = cb.steps_arr.view(i)
-            if self.service.model_params.use_scheduled_unet:
-                logger.debug(
-                    "INVOKE %r",
-                    fns["run_forward"],
-                )
-                (cb.latents,) = await fns["run_forward"](
-                    cb.latents,
-                    cb.prompt_embeds,
-                    cb.text_embeds,
-                    cb.time_ids,
-                    cb.guidance_scale,
-                    step,
-                    cb.timesteps,
-                    cb.sigmas,
-                    fiber=self.fiber,
-                )
-            else:
-                logger.debug(
-                    "INVOKE %r",
-                    fns["run_scale"],
-                )
-                (cb.latent_model_input, cb.t, cb.sigma, cb.next_sigma,) = await fns[
-                    "run_scale"
-                ](cb.latents, step, cb.timesteps, cb.sigmas, fiber=self.fiber)
-                logger.debug(
-                    "INVOKE %r",
-                    fns["main"],
-                )
-                (cb.noise_pred,) = await fns["main"](
-                    cb.latent_model_input,
-                    cb.t,
-                    cb.prompt_embeds,
-                    cb.text_embeds,
-                    cb.time_ids,
-                    cb.guidance_scale,
-                    fiber=self.fiber,
-                )
-                logger.debug(
-                    "INVOKE %r",
-                    fns["run_step"],
-                )
-                (cb.latents,) = await fns["run_step"](
-                    cb.noise_pred, cb.latents, cb.sigma, cb.next_sigma, fiber=self.fiber
-                )
+            # Steps of all batches on this fiber take turns.
+            async with scheduler.turn():
+                await self._denoise_step(fns, cb, cb.steps_arr.view(i))
+            self._offer_fiber()
+            if i + 1 < self.exec_request.steps:
+                await self._send_previews(device, i + 1)
         return
 
+    async def _send_previews(self, device, step: int):
+        """Send latent previews to the requests that want one after `step` steps."""
+        due = []
+        row = 0
+        for request in self.exec_requests:
+            if request.on_preview is not None and step % request.preview_steps == 0:
+                due.append((row, request))
+            row += request.batch_size
+        if not due:
+            return
+
+        cb = self.exec_request.command_buffer
+        latents_host = cb.latents.for_transfer()
+        await copy_to_host(latents_host, cb.latents)
+        if latents_host.dtype != sfnp.float32:
+            converted = sfnp.device_array.for_host(
+                device, cb.latents.shape, sfnp.float32
+            )
+            sfnp.convert(latents_host, dtype=sfnp.float32, out=converted)
+            latents_host = converted
+        latents = np.frombuffer(latents_host.items, dtype=np.float32).reshape(
+            cb.latents.shape
+        )
+        for row, request in due:
+            request.on_preview(step, latent_preview_from(latents[row]))
+
+    async def _denoise_step(self, fns, cb, step):
+        if self.service.model_params.use_scheduled_unet:
+            logger.debug(
+                "INVOKE %r",
+                fns["run_forward"],
+            )
+            (cb.latents,) = await fns["run_forward"](
+                cb.latents,
+                cb.prompt_embeds,
+                cb.text_embeds,
+                cb.time_ids,
+                cb.guidance_scale,
+                step,
+                cb.timesteps,
+                cb.sigmas,
+                fiber=self.fiber,
+            )
+            return
+
+        logger.debug(
+            "INVOKE %r",
+            fns["run_scale"],
+        )
+        (cb.latent_model_input, cb.t, cb.sigma, cb.next_sigma,) = await fns[
+            "run_scale"
+        ](cb.latents, step, cb.timesteps, cb.sigmas, fiber=self.fiber)
+        logger.debug(
+            "INVOKE %r",
+            fns["main"],
+        )
+        (cb.noise_pred,) = await fns["main"](
+            cb.latent_model_input,
+            cb.t,
+            cb.prompt_embeds,
+            cb.text_embeds,
+            cb.time_ids,
+            cb.guidance_scale,
+            fiber=self.fiber,
+        )
+        logger.debug(
+            "INVOKE %r",
+            fns["run_step"],
+        )
+        (cb.latents,) = await fns["run_step"](
+            cb.noise_pred, cb.latents, cb.sigma, cb.next_sigma, fiber=self.fiber
+        )
+
+    @measure(type="phase", task="decode")
     async def _decode(self, device):
-        req_bs = self.exec_request.batch_size
+        req_bs = self.batch_size
         prog_bs = req_bs
         cb = self.exec_request.command_buffer
         # Decode latents to images
@@ -488,56 +800,58 @@ class InferenceExecutorProcess(sf.Process):
                 "".join([f"\n  0: {cb.latents.shape}"]),
             )
             (cb.images,) = await fns["decode"](cb.latents, fiber=self.fiber)
-        cb.images_host.copy_from(cb.images)
 
-        # Wait for the device-to-host transfer, so that we can read the
-        # data with .items.
-        if self.service.splat_weights:
-            await device
-        else:
-            check_host_array(cb.images_host)
+        staging = self._host_staging(cb.images.shape)
+        images_host = await staging.acquire()
+        try:
+            transfer = copy_to_host(images_host, cb.images)
+            # Nothing else is queued on the device for this batch, so the next
+            # one can start denoising while the images are read back.
+            self._release_fiber()
+            await transfer
+            image_array = images_host.items
+        finally:
+            staging.release(images_host)
 
-        image_array = cb.images_host.items
         dtype = image_array.typecode
-        if cb.images_host.dtype == sfnp.float16:
+        if images_host.dtype == sfnp.float16:
             dtype = np.float16
-        self.exec_request.image_array = np.frombuffer(image_array, dtype=dtype).reshape(
-            self.exec_request.batch_size,
+        images = np.frombuffer(image_array, dtype=dtype).reshape(
+            req_bs,
             3,
             self.exec_request.height,
             self.exec_request.width,
         )
+        # Split the batch back into requests, dropping padding rows.
+        self.images = images
+        start = 0
+        for request in self.exec_requests:
+            request.image_array = images[start : start + request.batch_size]
+            start += request.batch_size
         return
 
+    @measure(type="phase", task="postprocess")
     async def _postprocess(self, device):
-        # Process output images
-        # TODO: reimpl with sfnp
-        permuted = np.transpose(self.exec_request.image_array, (0, 2, 3, 1))[0]
-        cast_image = (permuted * 255).round().astype("uint8")
-        processed_image = Image.fromarray(cast_image)
-        self.exec_request.response_image = processed_image
+        # Convert the whole batch at once; encoding happens off the fiber.
+        rows = sum(request.batch_size for request in self.exec_requests)
+        processed_images = images_from(self.images[:rows])
+        start = 0
+        for request in self.exec_requests:
+            request.response_image = processed_images[start]
+            start += request.batch_size
         return
 
 
-def check_host_array(host_array):
-    waiting = True
-    while waiting:
-        array = host_array.items
-        if host_array.dtype == sfnp.float16:
-            dtype = np.float16
-        arr = np.frombuffer(array, dtype=dtype)
-        if not np.all(arr == 0):
-            check_1 = arr
-            check_2 = np.frombuffer(array, dtype=dtype)
-            if np.array_equal(check_1, check_2):
-                break
-    return
-
-
-def initialize_command_buffer(fiber, model_params: ModelParams, bs: int = 1):
+def initialize_command_buffer(
+    fiber,
+    model_params: ModelParams,
+    bs: int = 1,
+    height: int | None = None,
+    width: int | None = None,
+):
     device = fiber.device(0)
-    h = model_params.dims[0][0]
-    w = model_params.dims[0][1]
+    h = height or model_params.dims[0][0]
+    w = width or model_params.dims[0][1]
     c = model_params.num_latents_channels
     cfg_bs = bs * 2
     datas = {
@@ -594,9 +908,6 @@ def initialize_command_buffer(fiber, model_params: ModelParams, bs: int = 1):
         "images": sfnp.device_array.for_device(
             device, [bs, 3, h, w], model_params.vae_dtype
         ),
-        "images_host": sfnp.device_array.for_host(
-            device, [bs, 3, h, w], model_params.vae_dtype
-        ),
     }
 
     class ServiceCmdBuffer:
@@ -0,0 +1,199 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+"""
+LRU cache of text encoder outputs, keyed by tokenized prompts.
+
+Image serving traffic repeats a small set of prompts and negative prompts, and
+the text encoders are deterministic, so their outputs can be reused across
+requests. Entries are copies owned by the cache, so they stay valid after the
+command buffers they were read from are reused.
+
+Entries live on the device until `max_device_bytes` is exceeded. Least recently
+used entries are then spilled to host memory if `max_host_bytes` allows, and
+dropped otherwise. Readers copy entries into their own device arrays, which
+works the same for device and host entries.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+import logging
+import threading
+from typing import Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+import shortfin as sf
+import shortfin.array as sfnp
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EmbeddingCacheStats:
+    hits: int = 0
+    misses: int = 0
+    spills: int = 0
+    evictions: int = 0
+    device_bytes: int = 0
+    host_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def _nbytes(arrays: Sequence[sfnp.device_array]) -> int:
+    return sum(array.dtype.compute_dense_nd_size(array.shape) for array in arrays)
+
+
+class _Entry:
+    def __init__(self, arrays: Tuple[sfnp.device_array, ...]):
+        self.arrays = arrays
+        self.on_host = False
+        self.nbytes = _nbytes(arrays)
+
+
+class EmbeddingCache:
+    """LRU cache of encoder output arrays with byte based eviction.
+
+    Entries live on one device, so services keep a cache per device, shared
+    by the executors on all fibers of that device. Lookups and inserts only
+    hold a lock while touching the index, never across device waits.
+    """
+
+    def __init__(self, max_device_bytes: int, max_host_bytes: int = 0):
+        self.max_device_bytes = max_device_bytes
+        self.max_host_bytes = max_host_bytes
+        self.stats = EmbeddingCacheStats()
+        # Most recently used last.
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(*parts) -> Tuple:
+        """Build a key from names and token id sequences."""
+        return tuple(
+            part
+            if isinstance(part, str)
+            else np.asarray(part, dtype=np.int64).tobytes()
+            for part in parts
+        )
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def get(self, key) -> Optional[Tuple[sfnp.device_array, ...]]:
+        """Look up `key`, marking it as recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry.arrays
+
+    def get_all(self, keys) -> Optional[list[Tuple[sfnp.device_array, ...]]]:
+        """Look up every key, or return None if any of them is missing."""
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            if not all(key in self._entries for key in unique):
+                self.stats.misses += sum(key not in self._entries for key in unique)
+                return None
+            for key in unique:
+                self._entries.move_to_end(key)
+            self.stats.hits += len(unique)
+            return [self._entries[key].arrays for key in keys]
+
+    async def insert(
+        self,
+        entries: Dict[Hashable, Sequence[sfnp.device_array]],
+        device: sf.ScopedDevice,
+    ):
+        """Copy `entries` into the cache.
+
+        The arrays are usually views into encoder outputs. They are copied on
+        `device`, which must be the device the cache belongs to, and the
+        entries are only published once the copies are done, so that executors
+        on other fibers can read them right away.
+        """
+        copies = {}
+        for key, arrays in entries.items():
+            if key in self._entries or key in copies:
+                continue
+            if _nbytes(arrays) > self.max_device_bytes:
+                continue
+            copy = []
+            for array in arrays:
+                cached = sfnp.device_array.for_device(device, array.shape, array.dtype)
+                cached.copy_from(array)
+                copy.append(cached)
+            copies[key] = _Entry(tuple(copy))
+        if not copies:
+            return
+        await device
+
+        with self._lock:
+            for key, entry in copies.items():
+                if key in self._entries:
+                    continue
+                self._entries[key] = entry
+                self.stats.device_bytes += entry.nbytes
+            spilled = self._evict()
+
+        if spilled:
+            await self._spill(spilled, device)
+
+    def _evict(self) -> list[Tuple[Hashable, _Entry]]:
+        """Bring the cache within budget, returning entries to move to the host."""
+        spilled = []
+        for key, entry in list(self._entries.items()):
+            if self.stats.device_bytes <= self.max_device_bytes:
+                break
+            if entry.on_host:
+                continue
+            self.stats.device_bytes -= entry.nbytes
+            if entry.nbytes <= self.max_host_bytes:
+                # Keeps its device arrays until the host copy is ready.
+                entry.on_host = True
+                self.stats.host_bytes += entry.nbytes
+                spilled.append((key, entry))
+            else:
+                del self._entries[key]
+                self.stats.evictions += 1
+
+        for key, entry in list(self._entries.items()):
+            if self.stats.host_bytes <= self.max_host_bytes:
+                break
+            if entry.on_host:
+                del self._entries[key]
+                self.stats.host_bytes -= entry.nbytes
+                self.stats.evictions += 1
+        return spilled
+
+    async def _spill(self, spilled: list[Tuple[Hashable, _Entry]], device):
+        host_arrays = []
+        for _, entry in spilled:
+            arrays = []
+            for array in entry.arrays:
+                host = sfnp.device_array.for_host(device, array.shape, array.dtype)
+                host.copy_from(array)
+                arrays.append(host)
+            host_arrays.append(tuple(arrays))
+        await device
+
+        with self._lock:
+            for (key, entry), arrays in zip(spilled, host_arrays):
+                entry.arrays = arrays
+                self.stats.spills += 1
+        logger.debug(
+            "Spilled %d embeddings to host, %d cached", len(spilled), len(self)
+        )
@@ -1,9 +1,12 @@
 import os
+import threading
 
+from concurrent.futures import ThreadPoolExecutor
 from io import (
     BytesIO,
 )
 
+import numpy as np
 from PIL import Image
 
 from shortfin_apps.types.Base64CharacterEncodedByteSequence import (
@@ -23,11 +26,79 @@ def save_to_file(
     return derived_file_path
 
 
+# Output formats accepted in requests, and their PIL names.
+IMAGE_FORMATS = {
+    "png": "PNG",
+    "jpeg": "JPEG",
+    "jpg": "JPEG",
+    "webp": "WEBP",
+}
+
+_encoder_pool: ThreadPoolExecutor | None = None
+_encoder_pool_lock = threading.Lock()
+
+
+def encoder_pool() -> ThreadPoolExecutor:
+    """Thread pool shared by image encoding. PIL encoders release the GIL."""
+    global _encoder_pool
+    with _encoder_pool_lock:
+        if _encoder_pool is None:
+            _encoder_pool = ThreadPoolExecutor(
+                max_workers=min(8, os.cpu_count() or 1),
+                thread_name_prefix="image-encoder",
+            )
+        return _encoder_pool
+
+
+def images_from(given_batch: np.ndarray) -> list[Image.Image]:
+    """Convert a `[bs, 3, H, W]` batch in `[0, 1]` to RGB images.
+
+    The whole batch is converted to `uint8` in one pass; each image then wraps
+    its rows of the result without another copy.
+    """
+    derived_pixels = (np.transpose(given_batch, (0, 2, 3, 1)) * 255).round()
+    derived_pixels = derived_pixels.astype(np.uint8, order="C")
+    return [Image.fromarray(each_pixels) for each_pixels in derived_pixels]
+
+
+# Linear map from the 4 SDXL latent channels to RGB, and its bias. Good enough
+# for previews without running the VAE.
+SDXL_LATENT_RGB_FACTORS = np.array(
+    [
+        [0.3651, 0.4232, 0.4341],
+        [-0.2533, -0.0042, 0.1068],
+        [0.1076, 0.1111, -0.0362],
+        [-0.3165, -0.2492, -0.2188],
+    ],
+    dtype=np.float32,
+)
+SDXL_LATENT_RGB_BIAS = np.array([0.1084, -0.0175, -0.0011], dtype=np.float32)
+
+
+def latent_preview_from(
+    given_latents: np.ndarray,
+    given_factors: np.ndarray = SDXL_LATENT_RGB_FACTORS,
+    given_bias: np.ndarray = SDXL_LATENT_RGB_BIAS,
+) -> Image.Image:
+    """Approximate a `[C, h, w]` latent as an RGB image at latent resolution."""
+    derived_rgb = np.einsum(
+        "chw,cr->hwr", given_latents.astype(np.float32), given_factors
+    )
+    derived_rgb = ((derived_rgb + given_bias + 1.0) / 2.0).clip(0.0, 1.0)
+    return Image.fromarray((derived_rgb * 255).round().astype(np.uint8))
+
+
+def encoded_from(
+    given_image: Image.Image, given_format: str = "png"
+) -> Base64CharacterEncodedByteSequence:
+    memory_for_image = BytesIO()
+    given_image.save(memory_for_image, format=IMAGE_FORMATS[given_format.lower()])
+    image_from_memory = memory_for_image.getvalue()
+    return Base64CharacterEncodedByteSequence.decoded_from(image_from_memory)
+
+
 def png_from(given_image: Image.Image) -> Base64CharacterEncodedByteSequence:
-    memory_for_png = BytesIO()
-    given_image.save(memory_for_png, format="PNG")
-    png_from_memory = memory_for_png.getvalue()
-    return Base64CharacterEncodedByteSequence.decoded_from(png_from_memory)
+    return encoded_from(given_image, "png")
 
 
 def image_from(given_png: Base64CharacterEncodedByteSequence) -> Image.Image:
@@ -4,18 +4,24 @@ import re
 import urllib
 import logging
 import asyncio
+import concurrent.futures
 import struct
 import threading
+import time
+
+from dataclasses import dataclass
 
 from iree.build.executor import FileNamespace, BuildAction, BuildContext, BuildFile
 from pathlib import Path
-from typing import Any, List, Optional, Union
+from typing import Any, Callable, List, Optional, Union
 
 import shortfin.array as sfnp
 import shortfin as sf
 
 from shortfin.interop.support.device_setup import get_selected_devices
 
+logger = logging.getLogger(__name__)
+
 
 def get_system_args(parser):
     parser.add_argument(
@@ -364,9 +370,131 @@ class InferenceExecRequest(sf.Message):
 
 
 class StrobeMessage(sf.Message):
-    """Sent to strobe a queue with fake activity (generate a wakeup)."""
+    """Sent to strobe a queue with fake activity (generate a wakeup).
+
+    A `ready` strobe announces work that should not wait for a batch to fill.
+    """
+
+    def __init__(self, ready: bool = False):
+        super().__init__()
+        self.ready = ready
+
+
+class _FiberCallProcess(sf.Process):
+    def __init__(self, fiber: sf.Fiber, call):
+        super().__init__(fiber=fiber)
+        self._call = call
+        self.finished = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+    async def run(self):
+        try:
+            self.result = await self._call()
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.finished.set()
+
+
+def run_on_fiber(fiber: sf.Fiber, fn, *args, **kwargs):
+    """Run the coroutine function `fn` on `fiber` and block until it returns.
+
+    For use from threads outside the shortfin system, such as service start up
+    and shutdown, where there is no event loop to await on.
+    """
+    process = _FiberCallProcess(fiber, lambda: fn(*args, **kwargs))
+    process.launch()
+    process.finished.wait()
+    if process.error is not None:
+        raise process.error
+    return process.result
+
+
+async def run_in_executor(executor: concurrent.futures.Executor, fn, *args):
+    """Run `fn(*args)` on `executor` and await its result from a worker.
+
+    Shortfin worker loops do not implement `loop.run_in_executor`, so the
+    result is handed back with `call_soon_threadsafe`.
+    """
+    loop = asyncio.get_running_loop()
+    result = loop.create_future()
+
+    def _set_result(future: concurrent.futures.Future):
+        if result.cancelled():
+            return
+        exception = future.exception()
+        if exception is not None:
+            result.set_exception(exception)
+        else:
+            result.set_result(future.result())
+
+    executor.submit(fn, *args).add_done_callback(
+        lambda future: loop.call_soon_threadsafe(_set_result, future)
+    )
+    return await result
+
+
+class TransferFuture:
+    """Awaitable completion of the device work queued so far on a fiber.
 
-    ...
+    The fiber's device timeline is captured on construction, so create it
+    right after queuing a `device_array.copy_from` or `copy_to`: awaiting it
+    waits for that copy and anything queued before it, but not for work queued
+    on the fiber afterwards. Construct it on the fiber's worker and await it
+    at most once.
+    """
+
+    def __init__(self, device: sf.ScopedDevice):
+        self._wait = device.__await__()
+
+    def __await__(self):
+        return self._wait
+
+
+def copy_to_host(
+    host_array: sfnp.device_array, device_array: sfnp.device_array
+) -> TransferFuture:
+    """Queue a copy of `device_array` into `host_array`, returning its completion."""
+    host_array.copy_from(device_array)
+    return TransferFuture(device_array.device)
+
+
+class HostStagingBuffers:
+    """Host buffers that device results are read back through, in turn.
+
+    With two buffers, one batch's results can be read on the host while the
+    next batch's results are already being copied into the other. Buffers are
+    handed out on one fiber's worker and must be released after reading.
+    """
+
+    def __init__(self, device: sf.ScopedDevice, shape, dtype, count: int = 2):
+        self._device = device
+        self._shape = shape
+        self._dtype = dtype
+        self._free = [
+            sfnp.device_array.for_host(device, shape, dtype) for _ in range(count)
+        ]
+        self._waiters: List[asyncio.Future] = []
+
+    async def acquire(self) -> sfnp.device_array:
+        while not self._free:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            await waiter
+        return self._free.pop()
+
+    def release(self, buffer: sfnp.device_array):
+        self._free.append(buffer)
+        while self._waiters:
+            waiter = self._waiters.pop(0)
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    def detach(self, buffer: sfnp.device_array):
+        """Hand `buffer` over to the caller for good, replacing it with a new one."""
+        self.release(sfnp.device_array.for_host(self._device, self._shape, self._dtype))
 
 
 class GenerateService:
@@ -586,20 +714,66 @@ class GenerateService:
         )
 
 
+class BatchWaitBudget:
+    """Adaptive bound on how long a request may wait for its batch to fill.
+
+    Waiting only pays off if more requests are likely to arrive soon. The budget
+    tracks a moving average of the time between arrivals and allows waiting for
+    `arrivals_to_wait` more of them, capped at `max_wait`. When arrivals are
+    sparser than that the budget drops to zero and requests are flushed as soon
+    as they arrive.
+    """
+
+    def __init__(
+        self, max_wait: float, arrivals_to_wait: float = 2.0, smoothing: float = 0.2
+    ):
+        self.max_wait = max_wait
+        self.arrivals_to_wait = arrivals_to_wait
+        self.smoothing = smoothing
+        self._last_arrival: Optional[float] = None
+        self._interarrival: Optional[float] = None
+
+    def record_arrival(self, now: float):
+        if self._last_arrival is not None:
+            interarrival = now - self._last_arrival
+            if self._interarrival is None:
+                self._interarrival = interarrival
+            else:
+                self._interarrival += self.smoothing * (
+                    interarrival - self._interarrival
+                )
+        self._last_arrival = now
+
+    @property
+    def wait(self) -> float:
+        if self._interarrival is None:
+            return 0.0
+        wait = self.arrivals_to_wait * self._interarrival
+        return wait if wait <= self.max_wait else 0.0
+
+
 class BatcherProcess(sf.Process):
     """The batcher is a persistent process responsible for flighting incoming work
-    into batches."""
+    into batches.
+
+    Each arriving request sets a deadline of `now + wait_budget.wait`. The
+    batcher is woken by every message, and by a timer at the earliest pending
+    deadline; subclasses flush partial batches once `deadline_expired()`.
+    """
 
-    STROBE_SHORT_DELAY = 0.5
-    STROBE_LONG_DELAY = 1.0
+    # Upper bound on how long a request waits for its batch to fill.
+    MAX_BATCH_WAIT = 1.0
 
     def __init__(self, fiber, name="batcher"):
         super().__init__(fiber=fiber)
         self.batcher_infeed = self.system.create_queue()
-        self.strobe_enabled = True
         self.strobes = 0
         self.pending_requests = set()
+        self.wait_budget = BatchWaitBudget(self.MAX_BATCH_WAIT)
         self.logger = logging.getLogger("batcher")
+        self._deadline: Optional[float] = None
+        self._timer: Optional[asyncio.Task] = None
+        self._timer_deadline: Optional[float] = None
 
     def shutdown(self):
         """Shutdown the batcher process."""
@@ -609,37 +783,69 @@ class BatcherProcess(sf.Process):
         """Submit a request to the batcher."""
         self.batcher_infeed.write_nodelay(request)
 
-    async def _background_strober(self):
-        """Background strober task that monitors pending requests."""
-        while not self.batcher_infeed.closed:
-            await asyncio.sleep(
-                self.STROBE_SHORT_DELAY
-                if len(self.pending_requests) > 0
-                else self.STROBE_LONG_DELAY
-            )
-            if self.strobe_enabled:
-                self.submit(StrobeMessage())
+    def wakeup(self, ready: bool = False):
+        """Wake the batcher to reconsider pending work, e.g. when capacity frees up.
 
-    def custom_message(self, msg):
-        self.logger.error("Illegal message received by batcher: %r", msg)
-        exit(1)
+        With `ready`, the woken work is dispatched without waiting for a batch
+        to fill, e.g. the next prefill chunk of a request already in flight.
+        """
+        if not self.batcher_infeed.closed:
+            self.submit(StrobeMessage(ready=ready))
+
+    def deadline_expired(self) -> bool:
+        """Whether the earliest pending request has waited out its budget."""
+        return self._deadline is not None and time.monotonic() >= self._deadline
+
+    def clear_deadline(self):
+        """Forget pending deadlines once all waiting requests have been flushed."""
+        self._deadline = None
+
+    def _note_arrival(self):
+        now = time.monotonic()
+        self.wait_budget.record_arrival(now)
+        deadline = now + self.wait_budget.wait
+        if self._deadline is None or deadline < self._deadline:
+            self._deadline = deadline
+
+    def _arm_timer(self):
+        deadline = self._deadline
+        if deadline is None or time.monotonic() >= deadline:
+            return
+        if self._timer_deadline is not None and self._timer_deadline <= deadline:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_deadline = deadline
+        self._timer = asyncio.create_task(self._wake_at(deadline))
+
+    async def _wake_at(self, deadline: float):
+        await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+        self._timer_deadline = None
+        self._timer = None
+        self.wakeup()
 
     async def run(self):
         """Main run loop for the batcher process."""
-        strober_task = asyncio.create_task(self._background_strober())
         reader = self.batcher_infeed.reader()
         while item := await reader():
-            self.strobe_enabled = False
             if isinstance(item, InferenceExecRequest):
+                self._note_arrival()
                 self.handle_inference_request(item)
             elif isinstance(item, StrobeMessage):
                 self.strobes += 1
+                if item.ready:
+                    self._deadline = time.monotonic()
             else:
                 self.custom_message(item)
             await self.process_batches()
+            self._arm_timer()
 
-            self.strobe_enabled = True
-        await strober_task
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def custom_message(self, msg):
+        self.logger.error("Illegal message received by batcher: %r", msg)
+        exit(1)
 
     def handle_inference_request(self, request):
         """Handle an inference request. To be implemented by subclasses."""
@@ -685,3 +891,297 @@ class BatcherProcess(sf.Process):
                     "meta": req_metas,
                 }
         return batches
+
+
+@dataclass
+class CommandBufferPoolStats:
+    leases: int = 0
+    allocations: int = 0
+    waits: int = 0
+    in_use: int = 0
+    idle: int = 0
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class CommandBufferPool:
+    """Command buffers of one fiber, by shape key, leased per batch.
+
+    Buffers are built with `factory(key)`, ahead of time with `preallocate` or
+    on a miss, and at most `max_per_key` buffers of a key exist at a time. Once
+    a key is at its cap, `lease` waits for a buffer of that key to be released.
+    Buffers may be released from other workers, e.g. by the last stage of a
+    pipelined batch.
+    """
+
+    def __init__(self, factory: Callable[[Any], Any], max_per_key: int = 4):
+        self._factory = factory
+        self.max_per_key = max_per_key
+        self.stats = CommandBufferPoolStats()
+        self._idle: dict[Any, list] = {}
+        self._counts: dict[Any, int] = {}
+        self._keys: dict[int, Any] = {}
+        self._waiters: dict[
+            Any, list[tuple[asyncio.AbstractEventLoop, asyncio.Future]]
+        ] = {}
+        self._lock = threading.Lock()
+
+    def preallocate(self, key, count: int = 1):
+        """Build up to `count` idle buffers of `key` ahead of time."""
+        for _ in range(count):
+            if not self._reserve(key):
+                return
+            buffer = self._allocate(key)
+            with self._lock:
+                self._idle.setdefault(key, []).append(buffer)
+                self.stats.idle += 1
+
+    async def lease(self, key):
+        """Take an idle buffer of `key`, allocating one if under the cap."""
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if idle:
+                    self.stats.leases += 1
+                    self.stats.idle -= 1
+                    self.stats.in_use += 1
+                    return idle.pop()
+                if self._counts.get(key, 0) >= self.max_per_key:
+                    loop = asyncio.get_running_loop()
+                    waiter = loop.create_future()
+                    self._waiters.setdefault(key, []).append((loop, waiter))
+                    self.stats.waits += 1
+                else:
+                    waiter = None
+            if waiter is not None:
+                await waiter
+                continue
+            if not self._reserve(key):
+                continue
+            buffer = self._allocate(key)
+            with self._lock:
+                self.stats.leases += 1
+                self.stats.in_use += 1
+            return buffer
+
+    def _reserve(self, key) -> bool:
+        """Count a buffer of `key` against the cap before building it."""
+        with self._lock:
+            if self._counts.get(key, 0) >= self.max_per_key:
+                return False
+            self._counts[key] = self._counts.get(key, 0) + 1
+            return True
+
+    def _allocate(self, key):
+        buffer = self._factory(key)
+        with self._lock:
+            self._keys[id(buffer)] = key
+            self.stats.allocations += 1
+        return buffer
+
+    def release(self, buffer):
+        with self._lock:
+            key = self._keys[id(buffer)]
+            self._idle.setdefault(key, []).append(buffer)
+            self.stats.in_use -= 1
+            self.stats.idle += 1
+            waiters = self._waiters.get(key)
+            waiter = waiters.pop(0) if waiters else None
+        if waiter is not None:
+            loop, future = waiter
+            loop.call_soon_threadsafe(_wake, future)
+
+
+class StepScheduler:
+    """Shares one fiber between several denoise loops at step granularity.
+
+    A fiber holds up to `max_slots` batches. Instead of waiting for a running
+    denoise loop to finish, the fiber is offered to the batcher again at the
+    loop's next step boundary while a slot is free, and the steps of all loops
+    on the fiber then take turns in arrival order. A batch arriving mid-loop
+    starts after at most one step of each batch ahead of it.
+
+    The fiber starts out offered; the batcher calls `join` when it boards a
+    batch, and executors call `offer` at step boundaries and `leave` when done.
+    Both return whether the caller should hand the fiber back to the batcher.
+    """
+
+    def __init__(self, max_slots: int = 1):
+        self.max_slots = max_slots
+        self.active = 0
+        self._offered = True
+        self._lock = threading.Lock()
+        self._turn: Optional[asyncio.Lock] = None
+
+    def join(self):
+        with self._lock:
+            self.active += 1
+            self._offered = False
+
+    def offer(self) -> bool:
+        with self._lock:
+            return self._offer()
+
+    def leave(self) -> bool:
+        with self._lock:
+            self.active -= 1
+            return self._offer()
+
+    def _offer(self) -> bool:
+        if self._offered or self.active >= self.max_slots:
+            return False
+        self._offered = True
+        return True
+
+    def turn(self) -> asyncio.Lock:
+        """Lock held for the duration of one denoise step."""
+        if self._turn is None:
+            self._turn = asyncio.Lock()
+        return self._turn
+
+
+class StageOccupancy:
+    """How busy one pipeline stage has been, and how long batches queued for it.
+
+    Occupancy is the fraction of the stage's fiber time spent running batches
+    since its first batch started. The stage close to 100% is the bottleneck
+    of the pipeline; the others are waiting on it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.fibers = 0
+        self.batches = 0
+        self.busy_time = 0.0
+        self.wait_time = 0.0
+        self.queued = 0
+        self._start: Optional[float] = None
+
+    def record_busy(self, started: float, finished: float):
+        if self._start is None or started < self._start:
+            self._start = started
+        self.batches += 1
+        self.busy_time += finished - started
+
+    def record_wait(self, seconds: float):
+        self.wait_time += seconds
+
+    @property
+    def occupancy(self) -> float:
+        if self._start is None or self.fibers == 0:
+            return 0.0
+        elapsed = (time.monotonic() - self._start) * self.fibers
+        return min(1.0, self.busy_time / elapsed) if elapsed > 0 else 0.0
+
+    @property
+    def mean_wait(self) -> float:
+        return self.wait_time / self.batches if self.batches else 0.0
+
+    def __repr__(self):
+        return (
+            f"{self.name}: {self.occupancy:.0%} busy, {self.batches} batches, "
+            f"{self.queued} queued, {self.mean_wait * 1000:.1f}ms mean wait"
+        )
+
+
+class StagePipeline:
+    """Hands batches between the fibers of consecutive inference stages.
+
+    Every stage owns its own fibers. A batch runs one stage at a time on one of
+    that stage's fibers and is then handed to the next stage on the same device,
+    so that different batches occupy different stages concurrently. Batches
+    that find no idle fiber of their next stage wait in that stage's queue, in
+    arrival order, and are dispatched as fibers are released.
+
+    The first stage is fed by the batcher with `acquire`; later stages are fed
+    with `handoff`. `launch(batch, stage, fiber)` starts a batch on a fiber and
+    may be called from any worker.
+    """
+
+    # Seconds between occupancy reports in the log.
+    REPORT_INTERVAL = 30.0
+
+    def __init__(
+        self,
+        stages: list,
+        launch: Callable[[Any, Any, Any], None],
+        on_first_stage_idle: Optional[Callable[[], None]] = None,
+    ):
+        self.stages = list(stages)
+        self._launch = launch
+        self._on_first_stage_idle = on_first_stage_idle
+        self._idle: dict[Any, list[tuple[int, Any]]] = {s: [] for s in self.stages}
+        self._queued: dict[Any, list[tuple[int, Any, float]]] = {
+            s: [] for s in self.stages
+        }
+        self._busy_since: dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._last_report = time.monotonic()
+        self.occupancy = {s: StageOccupancy(str(s)) for s in self.stages}
+
+    def add_fiber(self, stage, fiber, device_index: int):
+        self._idle[stage].append((device_index, fiber))
+        self.occupancy[stage].fibers += 1
+
+    def next_stage(self, stage):
+        """The stage after `stage`, or None if it is the last one."""
+        index = self.stages.index(stage) + 1
+        return self.stages[index] if index < len(self.stages) else None
+
+    def acquire(self, stage) -> Optional[tuple[int, Any]]:
+        """Take an idle fiber of `stage`, returning its device index and the fiber."""
+        with self._lock:
+            if not self._idle[stage]:
+                return None
+            device_index, fiber = self._idle[stage].pop(0)
+            self._busy_since[id(fiber)] = time.monotonic()
+            return device_index, fiber
+
+    def handoff(self, stage, batch, device_index: int):
+        """Run `batch` at `stage` on `device_index` once one of its fibers is idle."""
+        with self._lock:
+            for i, (idle_device, fiber) in enumerate(self._idle[stage]):
+                if idle_device == device_index:
+                    del self._idle[stage][i]
+                    self._busy_since[id(fiber)] = time.monotonic()
+                    break
+            else:
+                self._queued[stage].append((device_index, batch, time.monotonic()))
+                self.occupancy[stage].queued += 1
+                return
+        self._launch(batch, stage, fiber)
+
+    def release(self, stage, fiber, device_index: int):
+        """Return `fiber` to `stage`, dispatching the next queued batch onto it."""
+        now = time.monotonic()
+        occupancy = self.occupancy[stage]
+        batch = None
+        with self._lock:
+            occupancy.record_busy(self._busy_since.pop(id(fiber), now), now)
+            queue = self._queued[stage]
+            for i, (queued_device, queued_batch, queued_at) in enumerate(queue):
+                if queued_device == device_index:
+                    del queue[i]
+                    occupancy.queued -= 1
+                    occupancy.record_wait(now - queued_at)
+                    self._busy_since[id(fiber)] = now
+                    batch = queued_batch
+                    break
+            else:
+                self._idle[stage].append((device_index, fiber))
+            report = now - self._last_report >= self.REPORT_INTERVAL
+            if report:
+                self._last_report = now
+
+        if report:
+            logger.info("Pipeline stage occupancy: %s", self.report())
+        if batch is not None:
+            self._launch(batch, stage, fiber)
+        elif stage == self.stages[0] and self._on_first_stage_idle is not None:
+            self._on_first_stage_idle()
+
+    def report(self) -> str:
+        return "; ".join(repr(self.occupancy[stage]) for stage in self.stages)
@@ -1,6 +1,7 @@
 import asyncio
 import math
 import pytest
+import time
 
 import shortfin.array as sfnp
 
@@ -15,6 +16,9 @@ from shortfin_apps.llm.components.batching.modes.default import (
     PrefillBatcherProcess,
     PrefillTaskResponder,
 )
+from shortfin_apps.llm.components.batching.modes.token_budget import (
+    TokenBudgetBatcherProcess,
+)
 from shortfin_apps.llm.components.config_struct import ModelParams, PagedKVCacheParams
 from shortfin_apps.llm.components.invocation import (
     LlmInvocationProcess,
@@ -32,6 +36,7 @@ from shortfin_apps.llm.components.messages import (
     InferencePhase,
 )
 from shortfin_apps.llm.components.scheduler import Scheduler
+from shortfin_apps.utils import BatchWaitBudget
 
 
 @pytest.fixture
@@ -95,6 +100,21 @@ def prefill_batcher_process_chunked(model_params, fiber, cache):
     )
 
 
+@pytest.fixture(scope="function")
+def token_budget_batcher_process(model_params, fiber, cache):
+    ideal_batch_size = 4
+    return TokenBudgetBatcherProcess(
+        fiber=fiber,
+        page_cache=cache,
+        model_params=model_params,
+        prefill_functions={ideal_batch_size: AsyncMock()},
+        decode_functions={ideal_batch_size: AsyncMock()},
+        program_isolation=ProgramIsolation.PER_CALL.value,
+        chunk_block_size=2,
+        token_budget=6,
+    )
+
+
 class MockVoidFuture:
     def __init__(self):
         self._event = asyncio.Event()
@@ -187,8 +207,11 @@ class TestLlmBatcherProcess:
             task_inputs.append(task_input)
             llm_batcher_process.scheduler.schedule_job(task_input)
 
+        # A full batch goes out before the deadline, which is then cleared.
+        llm_batcher_process._deadline = time.monotonic() + 60
         await llm_batcher_process.board_flights()
 
+        assert llm_batcher_process._deadline is None
         assert llm_batcher_process.board.call_count == 1
         call_args = llm_batcher_process.board.call_args.args
         assert len(call_args) == 3
@@ -196,6 +219,65 @@ class TestLlmBatcherProcess:
         assert call_args[1] == llm_batcher_process.fiber
         assert set(call_args[2]) == set(task_inputs)
 
+    def test_chunked_prefill_without_other_traffic(
+        self, lsys, prefill_batcher_process_chunked, exec_req_list
+    ):
+        """Every chunk of a lone request is dispatched without another message."""
+        batcher = prefill_batcher_process_chunked
+        scheduler = batcher.scheduler
+        boarded = []
+
+        def board(page_cache, fiber, task_inputs):
+            boarded.append(task_inputs)
+            # Complete the chunk like `PrefillTaskResponder.set_success`.
+            for task_input in task_inputs:
+                if not scheduler.handle_completed(task_input.rid):
+                    batcher._llm_task_responder._notify_ready()
+
+        batcher.board = board
+        req = exec_req_list[0]
+        req.input_token_ids = list(range(12))
+        req.page_ids = list(range(6))
+
+        async def _test():
+            batcher.launch()
+            batcher.submit(req)
+            # Below MAX_BATCH_WAIT, so a stalled chunk is not saved by a timer.
+            give_up = time.monotonic() + 0.5
+            while len(boarded) < 3 and time.monotonic() < give_up:
+                await asyncio.sleep(0.001)
+            batcher.shutdown()
+
+        lsys.run(_test())
+        assert [[t.start_position for t in job] for job in boarded] == [[0], [4], [8]]
+        assert batcher._deadline is None
+
+
+class TestBatchWaitBudget:
+    def test_first_arrival_does_not_wait(self):
+        budget = BatchWaitBudget(max_wait=0.1)
+        budget.record_arrival(0.0)
+        assert budget.wait == 0.0
+
+    def test_wait_tracks_arrival_rate(self):
+        budget = BatchWaitBudget(max_wait=0.1, arrivals_to_wait=2.0)
+        for i in range(20):
+            budget.record_arrival(i * 0.01)
+        assert budget.wait == pytest.approx(0.02)
+
+        # Arrivals slow down; the budget follows.
+        now = 0.19
+        for _ in range(20):
+            now += 0.04
+            budget.record_arrival(now)
+        assert 0.04 < budget.wait <= 0.08
+
+    def test_sparse_arrivals_do_not_wait(self):
+        budget = BatchWaitBudget(max_wait=0.1)
+        for i in range(5):
+            budget.record_arrival(i * 1.0)
+        assert budget.wait == 0.0
+
 
 class TestPrefillBatcherProcess:
     def test_handle_inference_request(
@@ -384,3 +466,57 @@ class TestPrefillBatcherProcess:
                 start_position=6,
             ),
         ]
+
+
+class MockInvocation:
+    def __init__(self, task_inputs):
+        self.task_inputs = task_inputs
+        self.launched = False
+
+    def launch(self):
+        self.launched = True
+
+    def __await__(self):
+        return asyncio.sleep(0).__await__()
+
+
+class TestTokenBudgetBatcherProcess:
+    @pytest.mark.asyncio
+    async def test_board_flights(
+        self, token_budget_batcher_process: TokenBudgetBatcherProcess, exec_req_list
+    ):
+        batcher = token_budget_batcher_process
+        invocations = {}
+
+        def make_invoker(name):
+            def _make(page_cache, fiber, task_inputs):
+                invocations[name] = MockInvocation(task_inputs)
+                return invocations[name]
+
+            return _make
+
+        batcher.make_invoker = make_invoker("prefill")
+        batcher.make_decode_invoker = make_invoker("decode")
+
+        ## Empty
+        await batcher.board_flights()
+        assert invocations == {}
+
+        # Two prompts of 8 tokens, split into 4 token chunks.
+        for req in exec_req_list[:2]:
+            batcher.handle_inference_request(req)
+        decode_req = exec_req_list[2]
+        decode_req.phase = InferencePhase.DECODE
+        decode_req.start_position = len(decode_req.input_token_ids) - 1
+        batcher.handle_inference_request(decode_req)
+
+        await batcher.board_flights()
+        assert invocations["decode"].launched
+        assert [t.instance_id for t in invocations["decode"].task_inputs] == [
+            decode_req.instance_id
+        ]
+        # One decode token leaves room for one 4 token chunk.
+        assert invocations["prefill"].launched
+        assert [t.instance_id for t in invocations["prefill"].task_inputs] == [
+            exec_req_list[0].instance_id
+        ]
@@ -4,7 +4,11 @@
 # See https://llvm.org/LICENSE.txt for license information.
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
-from shortfin_apps.llm.components.device_array_cache import DeviceArrayCache
+from shortfin_apps.llm.components.device_array_cache import (
+    DeviceArrayCache,
+    MIN_SIZE_CLASS,
+    StagingRing,
+)
 
 import shortfin.array as sfnp
 
@@ -104,8 +108,8 @@ def test_release_allocate_limit(generic_device):
     cache.release(allocation0)
     cache.release(allocation1)
 
-    # An uncached allocation is used to flush the cache.
-    flush = cache.allocate((1, 2, 4), sfnp.int64)
+    # An allocation of an uncached size class is used to flush the cache.
+    flush = cache.allocate((1, 2, 40), sfnp.int64)
 
     allocation2 = cache.allocate((1, 2, 3), sfnp.int64)
     allocation3 = cache.allocate((1, 2, 3), sfnp.int64)
@@ -115,3 +119,63 @@ def test_release_allocate_limit(generic_device):
 
     assert allocation1.device == allocation2.device
     assert allocation1.host == allocation2.host
+
+
+def test_size_class_reuse(generic_device):
+    cache = DeviceArrayCache(generic_device)
+    allocation0 = cache.allocate((2, MIN_SIZE_CLASS), sfnp.int64)
+    cache.release(allocation0)
+
+    # A smaller shape of the same size class reuses the buffer.
+    allocation1 = cache.allocate((3, MIN_SIZE_CLASS // 2), sfnp.int64)
+    assert allocation1.buffer is allocation0.buffer
+    assert list(allocation1.device.shape) == [3, MIN_SIZE_CLASS // 2]
+    assert list(allocation1.host.shape) == [3, MIN_SIZE_CLASS // 2]
+    assert len(allocation1.host.storage) == 3 * MIN_SIZE_CLASS // 2 * 8
+
+    # A larger one or another dtype does not.
+    allocation2 = cache.allocate((3, MIN_SIZE_CLASS), sfnp.int64)
+    allocation3 = cache.allocate((2, MIN_SIZE_CLASS), sfnp.int32)
+    assert allocation2.buffer is not allocation0.buffer
+    assert allocation3.buffer is not allocation0.buffer
+
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 3
+
+
+def test_staging_ring_allocation(generic_device):
+    cache = DeviceArrayCache(generic_device, staging_ring_bytes=512)
+    allocation0 = cache.allocate((4, 8), sfnp.int64)
+    allocation1 = cache.allocate((4, 8), sfnp.int64)
+    assert allocation0.staging is not None
+    assert allocation1.staging is not None
+
+    # Host staging comes from the ring, not the buffer.
+    with allocation0.host.map(discard=True) as m:
+        m.items = list(range(32))
+    assert allocation0.host.items.tolist() == list(range(32))
+    assert allocation1.host.storage != allocation0.host.storage
+
+    # The ring is full until the oldest allocation is released.
+    allocation2 = cache.allocate((4, 8), sfnp.int64)
+    assert allocation2.staging is None
+    assert cache.stats.staging_ring_misses == 1
+    cache.release(allocation1)
+    cache.release(allocation2)
+    assert cache.allocate((4, 8), sfnp.int64).staging is None
+    cache.release(allocation0)
+    assert cache.allocate((4, 8), sfnp.int64).staging is not None
+
+
+def test_staging_ring_wraps(generic_device):
+    ring = StagingRing(generic_device, 1024)
+    _, first = ring.allocate([48], sfnp.int64)
+    _, second = ring.allocate([48], sfnp.int64)
+    assert (first.start, second.start) == (0, 384)
+
+    # Not enough room at the end, and the start is still in use.
+    assert ring.allocate([48], sfnp.int64) is None
+
+    ring.release(first)
+    _, third = ring.allocate([40], sfnp.int64)
+    assert third.start == 0
@@ -16,6 +16,7 @@ from shortfin_apps.llm.components.batching.modes.default import (
     PrefillTaskResponder,
 )
 from shortfin_apps.llm.components.config_struct import ModelParams, PagedKVCacheParams
+from shortfin_apps.llm.components.decoder.sampling import SelectionParams
 from shortfin_apps.llm.components.device_array_cache import (
     Allocation,
     WrappedAllocation,
@@ -522,6 +523,8 @@ class TestPrefillTask:
                 device0=device0,
             )
 
+            for req in staggered_exec_req_list:
+                req.selection_params = SelectionParams(num_candidates=2)
             prefill_task_responder.set_success(prefill_task, logits, indices)
 
             # Verify that the logits were processed correctly
@@ -533,6 +536,43 @@ class TestPrefillTask:
                     12 + i,
                     13 + i,
                 ]
+                assert req.result_candidates.tokens.tolist() == [13 + i, 12 + i]
+
+        lsys.run(_test())
+
+    def test_process_results_return_all_logits(
+        self,
+        fiber,
+        lsys,
+        prefill_task: PrefillTask,
+        prefill_task_responder: PrefillTaskResponder,
+        result_logits_none_indices,
+        staggered_exec_req_list,
+    ):
+        async def _test():
+            device0 = fiber.device(0)
+            for req in staggered_exec_req_list:
+                prefill_task_responder.add_request(req)
+            args = await prefill_task.prepare_args(
+                batch_size=prefill_task.req_count,
+            )
+
+            logits, _ = result_logits_none_indices
+            logits, indices = await prefill_task.process_results(
+                args=args,
+                logits=logits,
+                indices=None,
+                device0=device0,
+            )
+
+            staggered_exec_req_list[0].return_all_logits = True
+            prefill_task_responder.set_success(prefill_task, logits, indices)
+
+            # The request keeps every position, the others only their last.
+            all_logits = staggered_exec_req_list[0].result_logits
+            assert list(all_logits.shape) == [1] + list(logits.shape[1:])
+            for req in staggered_exec_req_list[1:]:
+                assert list(req.result_logits.shape) == [1, 1, logits.shape[-1]]
 
         lsys.run(_test())
 
@@ -892,6 +932,7 @@ class TestDecodeTask:
                 device0=device0,
             )
 
+            staggered_exec_req_list[0].selection_params = SelectionParams()
             decode_task_responder.set_success(decode_task, logits, indices)
 
             # Verify get_result picked the exact [i, sl, :] vectors
@@ -904,6 +945,12 @@ class TestDecodeTask:
                     13 + i,
                 ]
 
+            # Only requests that ask for candidates get them.
+            assert staggered_exec_req_list[0].result_candidates.tokens.tolist() == [13]
+            assert all(
+                req.result_candidates is None for req in staggered_exec_req_list[1:]
+            )
+
         lsys.run(_test())
 
 
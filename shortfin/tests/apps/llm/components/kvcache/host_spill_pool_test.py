@@ -0,0 +1,125 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import pytest
+from typing import List
+
+import shortfin.array as sfnp
+
+from shortfin_apps.llm.components.kvcache.host_spill_pool import HostSpillPool
+from shortfin_apps.llm.components.kvcache.page_pool import PagePool, PagePoolConfig
+from shortfin_apps.llm.components.kvcache.trie_attention_cache import (
+    TriePagedAttentionCache,
+)
+
+TOKENS_PER_PAGE = 4
+BLOCK_ELEMENTS = 8
+POOL_CAPACITY = 4
+SPILL_CAPACITY = 4
+
+
+@pytest.fixture
+def page_pool(device):
+    return PagePool(
+        devices=[device],
+        config=PagePoolConfig(
+            dtype=sfnp.float32,
+            alloc_page_count=POOL_CAPACITY,
+            paged_kv_block_size_elements_per_device=[BLOCK_ELEMENTS],
+        ),
+    )
+
+
+@pytest.fixture
+def spill_cache(page_pool):
+    cache = TriePagedAttentionCache(
+        page_pool=page_pool,
+        tokens_per_page=TOKENS_PER_PAGE,
+        spill_pool=HostSpillPool(page_pool, SPILL_CAPACITY),
+    )
+    yield cache
+    cache.shutdown()
+
+
+async def _write_page(device, page_pool: PagePool, index: int, value: float):
+    page_table = page_pool.page_tables[0]
+    host = page_table.for_transfer()
+    host.copy_from(page_table)
+    await device
+    host.view(index).items = [value] * BLOCK_ELEMENTS
+    host.copy_to(page_table)
+    await device
+
+
+async def _read_page(device, page_pool: PagePool, index: int) -> List[float]:
+    page_table = page_pool.page_tables[0]
+    host = page_table.for_transfer()
+    host.copy_from(page_table)
+    await device
+    return host.view(index).items.tolist()
+
+
+async def _publish(device, cache: TriePagedAttentionCache, tokens: List[int], value):
+    cached = cache.lookup(tokens)
+    allocation = cache.allocate(tokens[cached.num_tokens :], cached)
+    for page in allocation.pages[len(cached.pages) :]:
+        await _write_page(device, cache.page_pool, page.index, value)
+    allocation = cache.publish_pages_for_tokens(allocation)
+    cache.release_pages(allocation)
+
+
+def test_evicted_prefix_is_restored(lsys, device, spill_cache):
+    system_prompt = list(range(2 * TOKENS_PER_PAGE))
+
+    async def _run():
+        await _publish(device, spill_cache, system_prompt, 7.0)
+        # Fill the device pool with other prefixes so the system prompt is evicted.
+        for i in range(POOL_CAPACITY):
+            await _publish(device, spill_cache, [1000 + i] * TOKENS_PER_PAGE, float(i))
+        # Spills are queued on the device too.
+        await device
+        assert spill_cache.match(system_prompt)[1] == []
+        # Spilled pages are keyed by their parent's identity and their tokens.
+        first_block = tuple(system_prompt[:TOKENS_PER_PAGE])
+        assert (spill_cache.root.node_id, first_block) in spill_cache.spill_pool
+
+        cached = spill_cache.lookup(system_prompt)
+        pages = [
+            await _read_page(device, spill_cache.page_pool, page.index)
+            for page in cached.pages
+        ]
+        return cached, pages
+
+    cached, pages = lsys.run(_run())
+    stats = spill_cache.spill_pool.stats
+    assert stats.spilled_pages >= 2
+    assert cached.num_tokens == len(system_prompt)
+    assert stats.restored_pages == 2
+    assert pages == [[7.0] * BLOCK_ELEMENTS] * 2
+
+    # Restored pages are back in the trie.
+    assert len(spill_cache.match(system_prompt)[1]) == 2
+
+
+def test_spill_miss_is_counted(spill_cache):
+    cached = spill_cache.lookup(list(range(TOKENS_PER_PAGE)))
+    assert cached.num_tokens == 0
+    assert spill_cache.spill_pool.stats.misses == 1
+    assert spill_cache.spill_pool.stats.hit_rate == 0.0
+
+
+def test_spill_pool_drops_least_recently_used(page_pool):
+    spill_pool = HostSpillPool(page_pool, page_count=2)
+    pages = page_pool.acquire_free_pages(3)
+    for i, page in enumerate(pages):
+        spill_pool.spill(("key", i), page)
+
+    assert len(spill_pool) == 2
+    assert ("key", 0) not in spill_pool
+    assert spill_pool.stats.dropped_pages == 1
+    assert spill_pool.restore(("key", 2), pages[0])
+    assert not spill_pool.restore(("key", 0), pages[0])
+    page_pool.free_pages(pages)
@@ -0,0 +1,124 @@
+"""
+Replay benchmark for the trie attention cache.
+
+Replays a stream of requests that share a small set of long prefixes against a
+page pool that is too small to hold them all, so nearly every allocation has to
+evict. Only trie bookkeeping is measured; the pool is a plain free list.
+
+The full 100k request replay is marked `slow`.
+"""
+
+import logging
+import random
+import time
+
+import pytest
+
+from shortfin_apps.llm.components.kvcache.page_pool import PageInfo
+from shortfin_apps.llm.components.kvcache.trie_attention_cache import (
+    TriePagedAttentionCache,
+)
+
+logger = logging.getLogger(__name__)
+
+TOKENS_PER_PAGE = 16
+POOL_CAPACITY = 2048
+NUM_PREFIXES = 64
+PREFIX_PAGES = 8
+MAX_SUFFIX_PAGES = 4
+
+
+class FreeListPagePool:
+    """Minimal stand-in for `PagePool` with O(1) acquire and free."""
+
+    def __init__(self, total_pages: int):
+        self.attn_page_entries = [
+            PageInfo(index=i, pool=self) for i in range(total_pages)
+        ]
+        self.available_pages = list(self.attn_page_entries)
+        self._free = set(range(total_pages))
+
+    def available_page_count(self):
+        return len(self.available_pages)
+
+    def total_page_count(self):
+        return len(self.attn_page_entries)
+
+    def acquire_free_pages(self, count: int):
+        if count > len(self.available_pages):
+            return None
+        pages = [self.available_pages.pop() for _ in range(count)]
+        for page in pages:
+            self._free.remove(page.index)
+        return pages
+
+    def free_pages(self, pages):
+        for page in pages:
+            if page.index not in self._free:
+                self._free.add(page.index)
+                self.available_pages.append(page)
+
+
+def _make_requests(num_requests: int, seed: int = 0):
+    rng = random.Random(seed)
+    prefix_len = PREFIX_PAGES * TOKENS_PER_PAGE
+    prefixes = [
+        [p * 100_000 + t for t in range(prefix_len)] for p in range(NUM_PREFIXES)
+    ]
+    for r in range(num_requests):
+        # Skew towards a few popular prefixes.
+        prefix = prefixes[min(int(rng.expovariate(0.2)), NUM_PREFIXES - 1)]
+        suffix_len = rng.randint(1, MAX_SUFFIX_PAGES * TOKENS_PER_PAGE)
+        yield prefix + [10_000_000 + r * 1_000 + t for t in range(suffix_len)]
+
+
+def _replay(num_requests: int):
+    pool = FreeListPagePool(POOL_CAPACITY)
+    cache = TriePagedAttentionCache(page_pool=pool, tokens_per_page=TOKENS_PER_PAGE)
+
+    matched_tokens = 0
+    total_tokens = 0
+    start = time.perf_counter()
+    for tokens in _make_requests(num_requests):
+        cached = cache.lookup(tokens)
+        allocation = cache.allocate(tokens[cached.num_tokens :], cached)
+        allocation = cache.publish_pages_for_tokens(
+            allocation, publish_incomplete_page=True
+        )
+        cache.release_pages(allocation)
+        matched_tokens += cached.num_tokens
+        total_tokens += len(tokens)
+    elapsed = time.perf_counter() - start
+
+    logger.info(
+        "Replayed %d requests in %.3fs (%.1f us/request, %.1f%% prefix hit rate)",
+        num_requests,
+        elapsed,
+        1e6 * elapsed / num_requests,
+        100.0 * matched_tokens / total_tokens,
+    )
+    return cache, pool, matched_tokens / total_tokens
+
+
+def _check_consistent(cache: TriePagedAttentionCache):
+    evictable = list(cache.evictable)
+    assert len(evictable) == len(cache.evictable)
+    assert all(node.is_evictable() for node in evictable)
+    assert all(node in cache.leaves for node in evictable)
+    assert all(a.access_time <= b.access_time for a, b in zip(evictable, evictable[1:]))
+
+
+def test_trie_replay_smoke():
+    cache, pool, hit_rate = _replay(2_000)
+    _check_consistent(cache)
+    assert hit_rate > 0.5
+    cache.shutdown()
+    assert pool.available_page_count() == POOL_CAPACITY
+
+
+@pytest.mark.slow
+def test_trie_replay_100k():
+    cache, pool, _ = _replay(100_000)
+    _check_consistent(cache)
+    cache.shutdown()
+    assert pool.available_page_count() == POOL_CAPACITY
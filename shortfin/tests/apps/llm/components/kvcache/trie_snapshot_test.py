@@ -0,0 +1,130 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import pytest
+from typing import List
+
+import shortfin.array as sfnp
+
+from shortfin_apps.llm.components.kvcache.page_pool import PagePool, PagePoolConfig
+from shortfin_apps.llm.components.kvcache.trie_attention_cache import (
+    TriePagedAttentionCache,
+)
+from shortfin_apps.llm.components.kvcache.trie_snapshot import (
+    SnapshotMismatch,
+    load_trie_snapshot,
+    save_trie_snapshot,
+)
+
+TOKENS_PER_PAGE = 4
+BLOCK_ELEMENTS = 8
+POOL_CAPACITY = 8
+
+
+def _make_cache(device, capacity: int = POOL_CAPACITY) -> TriePagedAttentionCache:
+    page_pool = PagePool(
+        devices=[device],
+        config=PagePoolConfig(
+            dtype=sfnp.float32,
+            alloc_page_count=capacity,
+            paged_kv_block_size_elements_per_device=[BLOCK_ELEMENTS],
+        ),
+    )
+    return TriePagedAttentionCache(page_pool=page_pool, tokens_per_page=TOKENS_PER_PAGE)
+
+
+async def _write_page(device, page_pool: PagePool, index: int, value: float):
+    page_table = page_pool.page_tables[0]
+    host = page_table.for_transfer()
+    host.copy_from(page_table)
+    await device
+    host.view(index).items = [value] * BLOCK_ELEMENTS
+    host.copy_to(page_table)
+    await device
+
+
+async def _read_pages(device, page_pool: PagePool) -> List[List[float]]:
+    page_table = page_pool.page_tables[0]
+    host = page_table.for_transfer()
+    host.copy_from(page_table)
+    await device
+    return [host.view(i).items.tolist() for i in range(page_table.shape[0])]
+
+
+async def _publish(device, cache: TriePagedAttentionCache, tokens: List[int], value):
+    cached = cache.lookup(tokens)
+    allocation = cache.allocate(tokens[cached.num_tokens :], cached)
+    for page in allocation.pages[len(cached.pages) :]:
+        await _write_page(device, cache.page_pool, page.index, value)
+    allocation = cache.publish_pages_for_tokens(allocation)
+    cache.release_pages(allocation)
+
+
+# Two prompts sharing their first page, plus a trailing partial page that is
+# never written to the snapshot.
+PROMPT_A = list(range(3 * TOKENS_PER_PAGE))
+PROMPT_B = list(range(TOKENS_PER_PAGE)) + [100 + t for t in range(TOKENS_PER_PAGE + 2)]
+
+
+def _save_and_load(
+    lsys, device, path, fingerprint: str, capacity: int = POOL_CAPACITY, **kwargs
+):
+    """Snapshot a populated cache to `path` and load it into a fresh cache.
+
+    Returns the new cache, the number of restored pages and its page contents.
+    """
+    source = _make_cache(device)
+    target = _make_cache(device, capacity)
+
+    async def _run():
+        await _publish(device, source, PROMPT_A, 1.0)
+        await _publish(device, source, PROMPT_B, 2.0)
+        saved = await save_trie_snapshot(source, path, fingerprint="model-a")
+        assert saved == 4
+        restored = await load_trie_snapshot(
+            target, path, fingerprint=fingerprint, **kwargs
+        )
+        return restored, await _read_pages(device, target.page_pool)
+
+    try:
+        return (target, *lsys.run(_run()))
+    finally:
+        source.shutdown()
+
+
+def test_snapshot_round_trip(lsys, device, tmp_path):
+    cache, restored, pages = _save_and_load(
+        lsys, device, tmp_path / "cache.bin", "model-a"
+    )
+    assert restored == 4
+
+    cached = cache.lookup(PROMPT_A)
+    assert cached.num_tokens == len(PROMPT_A)
+    assert [pages[p.index][0] for p in cached.pages] == [1.0, 1.0, 1.0]
+
+    cached = cache.lookup(PROMPT_B)
+    assert cached.num_tokens == 2 * TOKENS_PER_PAGE
+    assert cached.pages[0] == cache.lookup(PROMPT_A).pages[0]
+    assert pages[cached.pages[1].index] == [2.0] * BLOCK_ELEMENTS
+
+    # Restored pages are unreferenced and can be evicted.
+    assert len(cache.evictable) == 2
+    cache.shutdown()
+
+
+def test_snapshot_fingerprint_mismatch(lsys, device, tmp_path):
+    with pytest.raises(SnapshotMismatch):
+        _save_and_load(lsys, device, tmp_path / "cache.bin", "model-b")
+
+
+def test_snapshot_load_stops_when_pool_full(lsys, device, tmp_path):
+    cache, restored, _ = _save_and_load(
+        lsys, device, tmp_path / "cache.bin", "model-a", capacity=2, staging_pages=3
+    )
+    assert restored == 2
+    assert cache.page_pool.available_page_count() == 0
+    assert cache.lookup(PROMPT_A).num_tokens == 2 * TOKENS_PER_PAGE
+    cache.shutdown()
@@ -0,0 +1,97 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+from unittest.mock import MagicMock
+
+import pytest
+
+import shortfin.array as sfnp
+from shortfin_apps.llm.components.config_struct import ModelParams, PagedKVCacheParams
+from shortfin_apps.llm.components.decode_config import DecodeConfig
+from shortfin_apps.llm.components.metrics import REJECTED_REQUESTS
+from shortfin_apps.llm.components.request_queue_manager import RequestQueueManager
+from shortfin_apps.utilities.metrics import MetricsRegistry
+
+
+def test_render_counter_and_gauge():
+    registry = MetricsRegistry()
+    hits = registry.counter("test_hits", "Cache hits.", ["cache"])
+    hits.inc(cache="prefix")
+    hits.inc(2, cache="prefix")
+    free = []
+    gauge = registry.gauge("test_free_pages", "Free pages.")
+    gauge.set_function(lambda: len(free))
+    free.extend([1, 2, 3])
+
+    assert registry.render() == (
+        "# HELP test_free_pages Free pages.\n"
+        "# TYPE test_free_pages gauge\n"
+        "test_free_pages 3\n"
+        "# HELP test_hits Cache hits.\n"
+        "# TYPE test_hits counter\n"
+        'test_hits_total{cache="prefix"} 3\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram(
+        "test_latency_seconds", "Latency.", ["phase"], buckets=(0.1, 1.0)
+    )
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.observe(value, phase="decode")
+
+    assert latency.count(phase="decode") == 4
+    assert latency.sum(phase="decode") == pytest.approx(2.65)
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'test_latency_seconds_bucket{phase="decode",le="0.1"} 2',
+        'test_latency_seconds_bucket{phase="decode",le="1"} 3',
+        'test_latency_seconds_bucket{phase="decode",le="+Inf"} 4',
+        'test_latency_seconds_sum{phase="decode"} 2.65',
+        'test_latency_seconds_count{phase="decode"} 4',
+    ]
+
+
+def test_register_twice():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_requests", "Requests.")
+    assert registry.counter("test_requests", "Requests.") is counter
+    with pytest.raises(ValueError):
+        registry.gauge("test_requests", "Requests.")
+    with pytest.raises(ValueError):
+        counter.inc(reason="unknown")
+
+
+def test_rejections_are_counted():
+    model_params = ModelParams(
+        max_seq_len=512,
+        transformer_block_count=42,
+        attn_head_dim=42,
+        prefill_batch_sizes=[4],
+        decode_batch_sizes=[1],
+        paged_kv_cache=PagedKVCacheParams(
+            block_seq_stride=2,
+            attention_head_count_kv=42,
+            device_block_count=100,
+            kv_cache_dtype=sfnp.float16,
+        ),
+        has_prefill_position=False,
+    )
+    manager = RequestQueueManager(model_params=model_params)
+    before = REJECTED_REQUESTS.value(reason="queue_full")
+
+    def add():
+        return manager.add_to_queue(
+            decode_configs=[DecodeConfig(max_completion_tokens=4)],
+            input_batch=[[1, 2]],
+            is_pretokenized=True,
+            responder=MagicMock(),
+        )
+
+    assert add() is not None
+    assert add() is None
+    assert REJECTED_REQUESTS.value(reason="queue_full") == before + 1
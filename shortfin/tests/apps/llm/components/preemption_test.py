@@ -0,0 +1,71 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import asyncio
+
+import pytest
+
+from shortfin_apps.llm.components.preemption import PreemptionManager
+
+
+@pytest.fixture
+def manager():
+    manager = PreemptionManager()
+    for name in ["a", "b", "c"]:
+        manager.register(name)
+        manager.mark_running(name, preemptible=True)
+    return manager
+
+
+def test_select_victim_picks_newest(manager):
+    assert manager.select_victim("a", include_self=False) == "c"
+    assert manager.preemption_requested("c")
+    assert not manager.preemption_requested("a")
+
+    # The newest request can only preempt itself.
+    assert manager.select_victim("c", include_self=False) is None
+    assert manager.select_victim("c", include_self=True) == "c"
+
+
+def test_select_victim_skips_preempted_and_non_preemptible(manager):
+    manager.mark_preempted("c")
+    assert not manager.preemption_requested("c")
+    assert manager.has_preempted()
+    assert manager.select_victim("a", include_self=False) == "b"
+
+    manager.register("d")
+    manager.mark_running("d", preemptible=False)
+    assert manager.select_victim("a", include_self=False) == "b"
+
+    manager.mark_running("c", preemptible=True)
+    assert not manager.has_preempted()
+    assert manager.stats.preemptions == 1
+    assert manager.stats.resumptions == 1
+
+
+def test_has_running_peers(manager):
+    assert manager.has_running_peers("a")
+    manager.unregister("b")
+    manager.mark_preempted("c")
+    assert not manager.has_running_peers("a")
+    assert manager.has_running_peers("c")
+
+
+def test_wait_for_pages(lsys, manager):
+    async def _run():
+        generation = manager.generation
+        waiter = asyncio.create_task(manager.wait_for_pages(generation))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        manager.mark_preempted("c")
+        await waiter
+
+        # A release since `generation` returns immediately.
+        await manager.wait_for_pages(generation)
+        return manager.generation
+
+    assert lsys.run(_run()) > 0
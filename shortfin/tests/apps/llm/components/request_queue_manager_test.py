@@ -7,7 +7,9 @@
 import shortfin.array as sfnp
 from shortfin_apps.llm.components.config_struct import ModelParams, PagedKVCacheParams
 from shortfin_apps.llm.components.decode_config import DecodeConfig
+from shortfin_apps.llm.components.preemption import PreemptionManager
 from shortfin_apps.llm.components.request_queue_manager import RequestQueueManager
+from shortfin.support.responder import ResponderErrorCodes
 import pytest
 from unittest.mock import MagicMock
 
@@ -217,3 +219,54 @@ def test_add_to_queue(
         assert request_id in manager.current_tasks()
     else:
         assert request_id is None
+
+
+def test_preemption_reserves_prompt_pages_only(mock_model_params, responder):
+    preemption_manager = PreemptionManager()
+    manager = RequestQueueManager(
+        model_params=mock_model_params, preemption_manager=preemption_manager
+    )
+    greedy = DecodeConfig(num_beams=1, top_k=5, max_completion_tokens=512)
+    request_id = manager.add_to_queue(
+        decode_configs=[greedy],
+        input_batch=[[1] * 40],
+        is_pretokenized=True,
+        responder=responder,
+    )
+    # 3 prompt pages plus one page of headroom instead of the 32 for the output.
+    assert manager._request_pages[request_id] == 4
+
+    manager.remove_from_queue(request_id)
+
+    # Beam search still reserves for its whole completion.
+    beams = DecodeConfig(num_beams=2, top_k=5, max_completion_tokens=64)
+    request_id = manager.add_to_queue(
+        decode_configs=[beams],
+        input_batch=[[1] * 40],
+        is_pretokenized=True,
+        responder=responder,
+    )
+    assert manager._request_pages[request_id] == 3 + 1 + 2 * 4
+
+
+def test_preemption_rejects_while_preempted(mock_model_params, responder):
+    preemption_manager = PreemptionManager()
+    manager = RequestQueueManager(
+        model_params=mock_model_params, preemption_manager=preemption_manager
+    )
+    preemption_manager.register("running")
+    preemption_manager.mark_running("running", preemptible=True)
+    preemption_manager.mark_preempted("running")
+
+    decode_config = DecodeConfig(num_beams=1, top_k=5, max_completion_tokens=32)
+    request_id = manager.add_to_queue(
+        decode_configs=[decode_config],
+        input_batch=[[1, 2]],
+        is_pretokenized=True,
+        responder=responder,
+    )
+    assert request_id is None
+    assert (
+        responder.send_error.call_args.kwargs["code"]
+        == ResponderErrorCodes.KVCACHE_PAGES_FULL
+    )
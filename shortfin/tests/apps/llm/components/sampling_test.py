@@ -0,0 +1,91 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import numpy as np
+import pytest
+
+from shortfin_apps.llm.components.decode_config import (
+    DecodeConfig,
+    LogitsNormalization,
+)
+from shortfin_apps.llm.components.decoder.decoder import TokenSelector
+from shortfin_apps.llm.components.decoder.sampling import (
+    SelectionParams,
+    select_candidates,
+)
+
+VOCAB = 50
+
+
+def test_select_candidates_mixed_batch():
+    rng = np.random.default_rng(0)
+    logits = rng.standard_normal((3, VOCAB)).astype(np.float16)
+    params = [
+        SelectionParams(num_candidates=1),
+        SelectionParams(num_candidates=3, temperature=0.5, log_softmax=True),
+        SelectionParams(num_candidates=2),
+    ]
+    candidates = select_candidates(logits, None, params)
+
+    assert [len(c.tokens) for c in candidates] == [1, 3, 2]
+    for row, c in zip(logits, candidates):
+        assert c.tokens[0] == np.argmax(row)
+    assert list(candidates[2].tokens) == list(np.argsort(-logits[2])[:2])
+
+    # Normalized rows hold log probabilities of the tempered logits.
+    tempered = logits[1].astype(np.float64) / 0.5
+    expected = tempered - np.log(np.sum(np.exp(tempered)))
+    np.testing.assert_allclose(
+        candidates[1].scores, expected[candidates[1].tokens], rtol=1e-4
+    )
+
+
+def test_select_candidates_with_indices():
+    logits = np.array([[0.1, 0.7, 0.2], [0.5, 0.3, 0.2]], dtype=np.float32)
+    indices = np.array([[10, 11, 12], [20, 21, 22]])
+    candidates = select_candidates(
+        logits, indices, [SelectionParams(num_candidates=2)] * 2
+    )
+    assert list(candidates[0].tokens) == [11, 12]
+    assert list(candidates[1].tokens) == [20, 21]
+
+
+@pytest.mark.parametrize("num_beams", [1, 3])
+@pytest.mark.parametrize(
+    "normalization", [LogitsNormalization.NONE, LogitsNormalization.LOG_SOFTMAX]
+)
+def test_step_candidates_matches_step(num_beams, normalization):
+    decode_config = DecodeConfig(
+        eos_token_id=0,
+        num_beams=num_beams,
+        logits_normalization=normalization,
+        temperature=0.7,
+    )
+    params = SelectionParams.from_decode_config(decode_config)
+    reference = TokenSelector(decode_config)
+    batched = TokenSelector(decode_config)
+
+    rng = np.random.default_rng(1)
+    beams = 1
+    for _ in range(6):
+        logits = rng.standard_normal((beams, VOCAB)).astype(np.float32)
+        logits[:, 0] = -100.0
+        if normalization == LogitsNormalization.LOG_SOFTMAX:
+            logits = logits - np.log(np.sum(np.exp(logits), axis=1, keepdims=True))
+
+        expected = reference.step([l[None, None, :] for l in logits], [None] * beams)
+        actual = batched.step_candidates(
+            select_candidates(logits, None, [params] * beams)
+        )
+        assert sorted(zip(*expected)) == sorted(zip(*actual))
+
+        # Keep both selectors on the same beam order.
+        batched._selected_beams[-1] = reference._selected_beams[-1]
+        batched._selected_tokens[-1] = reference._selected_tokens[-1]
+        batched._scores = reference._scores
+        beams = len(expected[0])
+
+    assert reference.results() == batched.results()
@@ -81,6 +81,22 @@ def test_scheduler_unreserved_strobed():
     assert to_schedule[0] == workload[0]
 
 
+# Check that an expired batch deadline flushes a partial workload immediately
+def test_scheduler_unreserved_flush():
+    ideal_batch_size = 32
+    scheduler = Scheduler(ideal_batch_size=ideal_batch_size)
+
+    workload = make_workload({0: 4})
+    schedule_workload(scheduler, workload)
+
+    to_schedule = scheduler.should_execute(strobe=0, flush=True)
+    assert len(to_schedule) == 1
+    assert to_schedule[0] == workload[0]
+
+    to_schedule = scheduler.should_execute(strobe=0, flush=True)
+    assert len(to_schedule) == 0
+
+
 # Check that a full ideal set is returned
 def test_scheduler_unreserved_full():
     ideal_batch_size = 4
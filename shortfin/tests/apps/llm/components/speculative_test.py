@@ -0,0 +1,48 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import pytest
+
+from shortfin_apps.llm.components.decoder.speculative import (
+    _extend_pages,
+    _trim_pages,
+    count_accepted,
+)
+
+
+@pytest.mark.parametrize(
+    "proposals,target_tokens,expected",
+    [
+        ([], [5], 0),
+        ([1, 2, 3], [1, 2, 3, 4], 3),
+        ([1, 2, 3], [1, 7, 3, 4], 1),
+        ([1, 2, 3], [9, 2, 3, 4], 0),
+    ],
+)
+def test_count_accepted(proposals, target_tokens, expected):
+    assert count_accepted(proposals, target_tokens) == expected
+
+
+def test_extend_and_trim_pages(cache, page_pool):
+    page_size = cache.tokens_per_page
+    free_pages = page_pool._queue.qsize()
+    tokens = list(range(page_size + 1))
+    cache_info = cache.allocate(tokens)
+    assert len(cache_info.pages) == 2
+
+    # Already large enough.
+    assert _extend_pages(cache, cache_info, 2 * page_size) is cache_info
+
+    extended = _extend_pages(cache, cache_info, 3 * page_size + 1)
+    assert len(extended.pages) == 4
+    assert extended.pages[:2] == cache_info.pages
+    assert extended.tokens == tokens
+    assert extended.num_tokens == len(tokens)
+    assert page_pool._queue.qsize() == free_pages - 4
+
+    _trim_pages(cache, extended, page_size + 2)
+    assert extended.pages == cache_info.pages
+    assert page_pool._queue.qsize() == free_pages - 2
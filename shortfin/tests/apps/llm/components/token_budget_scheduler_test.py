@@ -0,0 +1,216 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+"""
+Tests for `TokenBudgetScheduler`, including a step-level simulator that
+replays a mixed workload and reports p50/p99 inter-token latency.
+"""
+
+import logging
+import random
+from dataclasses import dataclass
+from typing import Dict, List
+
+import numpy as np
+import pytest
+
+from shortfin_apps.llm.components.invocation import LlmTaskInput
+from shortfin_apps.llm.components.scheduler import TokenBudgetScheduler
+
+
+logger = logging.getLogger(__name__)
+
+
+def make_task(rid: str, index: int, num_tokens: int, start_position: int = 0):
+    return LlmTaskInput(
+        rid=rid,
+        instance_id=f"{rid}-{index}",
+        block_count=0,
+        seq_len=start_position + num_tokens,
+        input_tokens=tuple(range(num_tokens)),
+        start_position=start_position,
+    )
+
+
+def make_prefill_chunks(rid: str, prompt_len: int, chunk_tokens: int):
+    return [
+        make_task(rid, i, min(chunk_tokens, prompt_len - start), start)
+        for i, start in enumerate(range(0, prompt_len, chunk_tokens))
+    ]
+
+
+def make_scheduler(token_budget: int, decode_batch_size=8, prefill_batch_size=4):
+    return TokenBudgetScheduler(
+        token_budget=token_budget,
+        decode_batch_size=decode_batch_size,
+        prefill_batch_size=prefill_batch_size,
+    )
+
+
+def test_decode_is_scheduled_before_prefill():
+    scheduler = make_scheduler(token_budget=10)
+    prefill = make_task("p", 0, 8)
+    scheduler.schedule_job(prefill)
+    decodes = [make_task(f"d{i}", 0, 1) for i in range(4)]
+    for task in decodes:
+        scheduler.schedule_decode(task)
+
+    # 4 decode tokens leave 6, which the 8 token chunk does not fit in, but it
+    # is admitted alone so that it cannot starve.
+    step = scheduler.should_execute()
+    assert step.decode == decodes
+    assert step.prefill == [prefill]
+
+    small = [make_task(f"s{i}", 0, 3) for i in range(3)]
+    for task in small:
+        scheduler.schedule_job(task)
+    for task in decodes:
+        scheduler.schedule_decode(task)
+    step = scheduler.should_execute()
+    assert step.decode == decodes
+    assert step.prefill == small[:2]
+    assert step.token_count == 10
+
+    step = scheduler.should_execute()
+    assert step.decode == []
+    assert step.prefill == small[2:]
+    assert scheduler.should_execute().is_empty()
+
+
+def test_decode_batch_size_limit():
+    scheduler = make_scheduler(token_budget=100, decode_batch_size=2)
+    decodes = [make_task(f"d{i}", 0, 1) for i in range(3)]
+    for task in decodes:
+        scheduler.schedule_decode(task)
+    assert scheduler.should_execute().decode == decodes[:2]
+    assert scheduler.should_execute().decode == decodes[2:]
+
+
+def test_prefill_chunks_run_in_sequence():
+    scheduler = make_scheduler(token_budget=100)
+    chunks = make_prefill_chunks("p", prompt_len=20, chunk_tokens=8)
+    for chunk in chunks:
+        scheduler.schedule_job(chunk)
+
+    for i, chunk in enumerate(chunks):
+        step = scheduler.should_execute()
+        assert step.prefill == [chunk]
+        # Nothing else until the chunk completes.
+        assert scheduler.should_execute().is_empty()
+        assert scheduler.handle_completed("p") == (i == len(chunks) - 1)
+
+    # Once prefill is done the request is treated as decode.
+    assert scheduler.handle_completed("p")
+
+
+@dataclass
+class SimRequest:
+    rid: str
+    arrival: float
+    prompt_len: int
+    output_len: int
+
+
+def simulate(
+    requests: List[SimRequest],
+    token_budget: int,
+    chunk_tokens: int,
+    step_overhead: float = 5e-3,
+    time_per_token: float = 5e-5,
+) -> np.ndarray:
+    """Replay `requests` one step at a time and return inter-token latencies.
+
+    A step's duration is modelled as a fixed launch overhead plus a cost per
+    token in the step.
+    """
+    scheduler = make_scheduler(token_budget, decode_batch_size=64)
+    pending = sorted(requests, key=lambda r: r.arrival)
+    by_rid = {r.rid: r for r in requests}
+    prefilling = set()
+    remaining: Dict[str, int] = {}
+    last_token: Dict[str, float] = {}
+    latencies = []
+
+    now = 0.0
+    while pending or prefilling or remaining:
+        while pending and pending[0].arrival <= now:
+            request = pending.pop(0)
+            prefilling.add(request.rid)
+            for chunk in make_prefill_chunks(
+                request.rid, request.prompt_len, chunk_tokens
+            ):
+                scheduler.schedule_job(chunk)
+
+        step = scheduler.should_execute()
+        if step.is_empty():
+            now = pending[0].arrival
+            continue
+        now += step_overhead + time_per_token * step.token_count
+
+        for task in step.prefill:
+            if scheduler.handle_completed(task.rid):
+                # Prefill produces the first token.
+                prefilling.remove(task.rid)
+                last_token[task.rid] = now
+                remaining[task.rid] = by_rid[task.rid].output_len - 1
+                scheduler.schedule_decode(make_task(task.rid, 0, 1))
+
+        for task in step.decode:
+            assert scheduler.handle_completed(task.rid)
+            latencies.append(now - last_token[task.rid])
+            last_token[task.rid] = now
+            remaining[task.rid] -= 1
+            if remaining[task.rid] > 0:
+                scheduler.schedule_decode(make_task(task.rid, 0, 1))
+            else:
+                del remaining[task.rid]
+
+    return np.array(latencies)
+
+
+def make_workload(num_requests: int, seed: int = 0) -> List[SimRequest]:
+    """Mostly short chat turns with occasional very long prompts."""
+    rng = random.Random(seed)
+    requests = []
+    arrival = 0.0
+    for i in range(num_requests):
+        arrival += rng.expovariate(40.0)
+        long_prompt = rng.random() < 0.1
+        requests.append(
+            SimRequest(
+                rid=f"r{i}",
+                arrival=arrival,
+                prompt_len=rng.randint(4096, 8192)
+                if long_prompt
+                else rng.randint(32, 256),
+                output_len=rng.randint(16, 128),
+            )
+        )
+    return requests
+
+
+@pytest.mark.parametrize("num_requests", [200])
+def test_token_budget_bounds_inter_token_latency(num_requests):
+    requests = make_workload(num_requests)
+
+    # Whole prompts in one step, as if there were no budget.
+    unbounded = simulate(requests, token_budget=1 << 20, chunk_tokens=1 << 20)
+    budgeted = simulate(requests, token_budget=512, chunk_tokens=256)
+
+    results = {}
+    for name, latencies in [("unbounded", unbounded), ("budget=512", budgeted)]:
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1e3
+        results[name] = (p50, p99)
+        logger.info(
+            "%s: %d tokens, inter-token latency p50=%.2fms p99=%.2fms",
+            name,
+            len(latencies),
+            p50,
+            p99,
+        )
+
+    assert len(budgeted) == len(unbounded)
+    assert results["budget=512"][1] < results["unbounded"][1]
@@ -68,3 +68,37 @@ def test_tokenizer_to_array(cpu_fiber, bert_tokenizer):
     print(masks)
     assert masks.view(0).items.tolist() == [1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0]
     assert masks.view(1).items.tolist() == [1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0]
+
+
+@pytest.fixture
+def byte_level_tokenizer():
+    import tokenizers
+    from tokenizers import decoders, models, pre_tokenizers, trainers
+
+    import shortfin_apps.llm.components.tokenizer as tokenizer
+
+    raw_tk = tokenizers.Tokenizer(models.BPE())
+    raw_tk.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    raw_tk.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=300,
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+    )
+    raw_tk.train_from_iterator(["hello world", "hello there world"], trainer)
+    return tokenizer.Tokenizer(raw_tk)
+
+
+def test_incremental_detokenizer(byte_level_tokenizer):
+    from shortfin_apps.llm.components.tokenizer import IncrementalDetokenizer
+
+    text = "hello world, héllo 🌍 there"
+    ids = byte_level_tokenizer.encode([text])[0].ids
+
+    detokenizer = IncrementalDetokenizer(byte_level_tokenizer)
+    pieces = [detokenizer.add_tokens([token]) for token in ids]
+    pieces.append(detokenizer.flush())
+
+    assert "".join(pieces) == text
+    # Multi-byte characters are held back rather than emitted as partial bytes.
+    assert all("�" not in piece for piece in pieces)
+    assert "" in pieces
@@ -0,0 +1,91 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from shortfin_apps.llm.components.tracing import (
+    BatchTrace,
+    SpanContext,
+    disable_tracing,
+    enable_tracing,
+    get_tracer,
+    maybe_span,
+    now,
+)
+
+
+@pytest.fixture
+def trace_path(tmp_path):
+    path = tmp_path / "trace.json"
+    enable_tracing(path)
+    yield path
+    disable_tracing()
+
+
+def _events(path):
+    disable_tracing()
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_disabled_tracing_is_a_no_op():
+    assert SpanContext.start("request") is None
+    with maybe_span(None, "prefill"):
+        pass
+    trace = BatchTrace("prefill_invocation", [], now())
+    with trace.step("invoke"):
+        pass
+    trace.finish()
+
+
+def test_request_and_batch_spans(trace_path):
+    context = SpanContext.start("request r0")
+    # Stand-ins for `LlmInferenceExecRequest`, which needs a worker.
+    request = SimpleNamespace(rid="r0", trace=context, submit_time=None)
+    untraced = SimpleNamespace(rid="r1", trace=None, submit_time=None)
+
+    with maybe_span(context, "prefill"):
+        request.submit_time = now()
+        trace = BatchTrace("prefill_invocation", [request, untraced], now())
+        for step in ("prepare_args", "invoke", "copy_buffers_to_host"):
+            with trace.step(step):
+                pass
+        trace.finish()
+
+    events = _events(trace_path)
+    lanes = {e["args"]["name"]: e["tid"] for e in events if e["ph"] == "M"}
+    assert set(lanes) == {"request r0", "prefill_invocation"}
+
+    spans = [(e["tid"], e["name"]) for e in events if e["ph"] == "X"]
+    request_lane, batch_lane = lanes["request r0"], lanes["prefill_invocation"]
+    assert spans == [
+        (request_lane, "queued"),
+        (batch_lane, "prepare_args"),
+        (batch_lane, "invoke"),
+        (batch_lane, "copy_buffers_to_host"),
+        (batch_lane, "prefill_invocation"),
+        (request_lane, "prefill_invocation"),
+        (request_lane, "prefill"),
+    ]
+    batch = [e for e in events if e["name"] == "invoke"][0]
+    assert batch["args"]["rids"] == ["r0", "r1"]
+    for event in events:
+        if event["ph"] == "X":
+            assert event["dur"] >= 0
+
+
+def test_request_lanes_are_not_retained(trace_path):
+    tracer = get_tracer()
+    contexts = [SpanContext.start(f"request r{i}") for i in range(3)]
+    BatchTrace("decode_invocation", [], now())
+    BatchTrace("decode_invocation", [], now())
+
+    assert len({context.lane for context in contexts}) == 3
+    # Only the shared invocation track is kept.
+    assert list(tracer._lanes) == ["decode_invocation"]
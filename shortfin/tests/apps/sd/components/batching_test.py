@@ -0,0 +1,62 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize(
+    "request_count,rows_per_request,batch_sizes,expected",
+    [
+        (8, 1, [1, 2, 4], (4, 4)),
+        (3, 1, [1, 2, 4], (2, 2)),
+        (3, 1, [4, 8], (4, 3)),
+        (3, 2, [1, 4], (4, 2)),
+        (2, 3, [1, 4], (3, 1)),
+    ],
+)
+def test_select_flight(request_count, rows_per_request, batch_sizes, expected):
+    from shortfin_apps.sd.components.service import select_flight
+
+    assert select_flight(request_count, rows_per_request, batch_sizes) == expected
+
+
+@patch("shortfin_apps.sd.components.messages.sf.VoidFuture", new=MagicMock)
+def test_batch_metadata():
+    from shortfin_apps.sd.components.messages import (
+        InferencePhase,
+        SDXLInferenceExecRequest,
+    )
+
+    def metas(**kwargs):
+        params = dict(
+            prompt="a cat",
+            neg_prompt="",
+            height=1024,
+            width=1024,
+            steps=20,
+            guidance_scale=7.5,
+            seed=0,
+        )
+        request = SDXLInferenceExecRequest(**{**params, **kwargs})
+        return [request.phases[phase]["metadata"] for phase in request.phases]
+
+    base = metas()
+    assert metas(seed=1) == base
+    assert metas(guidance_scale=5.0) != base
+
+    request = SDXLInferenceExecRequest(
+        input_ids=[[np.full([1, 4], row)] * 4 for row in range(2)],
+        sample=np.arange(8, dtype=np.float16).reshape(2, 1, 2, 2),
+        steps=20,
+        guidance_scale=7.5,
+    )
+    assert request.batch_size == 2
+    assert request.phases[InferencePhase.ENCODE]["metadata"] == [2]
+    assert request.row_input_ids(1)[0].tolist() == [[1, 1, 1, 1]]
+    assert request.row_sample(1).tolist() == [4, 5, 6, 7]
@@ -0,0 +1,83 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import asyncio
+
+from shortfin_apps.sd.components.metrics import (
+    COMMAND_BUFFER_ALLOCATIONS,
+    COMMAND_BUFFERS_IDLE,
+    COMMAND_BUFFERS_IN_USE,
+    export_command_buffer_stats,
+)
+from shortfin_apps.utils import CommandBufferPool
+
+
+class _Buffer:
+    def __init__(self, key):
+        self.key = key
+
+
+def test_preallocated_buffers_are_reused(cpu_lsys):
+    built = []
+
+    def factory(key):
+        built.append(key)
+        return _Buffer(key)
+
+    pool = CommandBufferPool(factory, max_per_key=2)
+    pool.preallocate((1, 1024, 1024))
+    assert built == [(1, 1024, 1024)]
+    assert pool.stats.idle == 1
+
+    async def _run():
+        first = await pool.lease((1, 1024, 1024))
+        pool.release(first)
+        second = await pool.lease((1, 1024, 1024))
+        # Other shapes get their own buffers.
+        other = await pool.lease((2, 1024, 1024))
+        return first, second, other
+
+    first, second, other = cpu_lsys.run(_run())
+    assert first is second
+    assert other.key == (2, 1024, 1024)
+    assert built == [(1, 1024, 1024), (2, 1024, 1024)]
+    assert pool.stats.leases == 3
+    assert pool.stats.allocations == 2
+    assert pool.stats.in_use == 2
+    assert pool.stats.idle == 0
+
+
+def test_lease_waits_at_cap(cpu_lsys):
+    pool = CommandBufferPool(_Buffer, max_per_key=1)
+    pool.preallocate("key", count=3)
+    assert pool.stats.allocations == 1
+
+    async def _run():
+        held = await pool.lease("key")
+        waiting = asyncio.create_task(pool.lease("key"))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        pool.release(held)
+        return held, await waiting
+
+    held, leased = cpu_lsys.run(_run())
+    assert leased is held
+    assert pool.stats.waits == 1
+    assert pool.stats.allocations == 1
+
+
+def test_stats_are_exported(cpu_lsys):
+    pool = CommandBufferPool(_Buffer, max_per_key=2)
+    pool.preallocate((1, 1024, 1024))
+    export_command_buffer_stats(pool.stats, service="test", fiber=0)
+
+    async def _run():
+        return await pool.lease((1, 1024, 1024))
+
+    cpu_lsys.run(_run())
+    assert COMMAND_BUFFERS_IN_USE.value(service="test", fiber=0) == 1
+    assert COMMAND_BUFFERS_IDLE.value(service="test", fiber=0) == 0
+    assert COMMAND_BUFFER_ALLOCATIONS.value(service="test", fiber=0) == 1
@@ -0,0 +1,97 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import shortfin.array as sfnp
+
+from shortfin_apps.utilities.embedding_cache import EmbeddingCache
+
+# Bytes of one cached [1, 4] float32 row.
+ROW_BYTES = 16
+
+
+def _rows(device, count):
+    """A [count, 4] device array with row i filled with i."""
+    array = sfnp.device_array.for_device(device, [count, 4], sfnp.float32)
+    host = array.for_transfer()
+    host.items = [float(i) for i in range(count) for _ in range(4)]
+    array.copy_from(host)
+    return array
+
+
+async def _read(device, array):
+    host = sfnp.device_array.for_host(device, array.shape, array.dtype)
+    host.copy_from(array)
+    await device
+    return host.items.tolist()
+
+
+def test_key():
+    assert EmbeddingCache.key("clip", [1, 2]) == EmbeddingCache.key("clip", (1, 2))
+    assert EmbeddingCache.key("clip", [1, 2]) != EmbeddingCache.key("t5xxl", [1, 2])
+    assert EmbeddingCache.key([1, 2], [3]) != EmbeddingCache.key([1], [2, 3])
+
+
+def test_insert_and_hit(cpu_lsys, cpu_device):
+    async def _run():
+        cache = EmbeddingCache(max_device_bytes=4 * ROW_BYTES)
+        rows = _rows(cpu_device, 2)
+        keys = [EmbeddingCache.key([0]), EmbeddingCache.key([1])]
+        assert cache.get_all(keys) is None
+
+        await cache.insert(
+            {key: (rows.view(i),) for i, key in enumerate(keys)}, cpu_device
+        )
+        # Entries are copies, independent of the encoder outputs.
+        rows.view(0).copy_from(rows.view(1))
+        cached = cache.get_all(keys + keys[:1])
+        assert len(cached) == 3
+        assert await _read(cpu_device, cached[0][0]) == [0.0] * 4
+        assert await _read(cpu_device, cached[1][0]) == [1.0] * 4
+        assert cache.stats.device_bytes == 2 * ROW_BYTES
+        return cache.stats
+
+    stats = cpu_lsys.run(_run())
+    assert stats.hits == 2
+    assert stats.misses == 2
+
+
+def test_evicts_least_recently_used(cpu_lsys, cpu_device):
+    async def _run():
+        cache = EmbeddingCache(max_device_bytes=2 * ROW_BYTES)
+        rows = _rows(cpu_device, 3)
+        keys = [EmbeddingCache.key([i]) for i in range(3)]
+        await cache.insert({keys[0]: (rows.view(0),)}, cpu_device)
+        await cache.insert({keys[1]: (rows.view(1),)}, cpu_device)
+        assert cache.get(keys[0]) is not None
+        await cache.insert({keys[2]: (rows.view(2),)}, cpu_device)
+        return cache
+
+    cache = cpu_lsys.run(_run())
+    assert list(cache._entries) == [EmbeddingCache.key([0]), EmbeddingCache.key([2])]
+    assert cache.stats.evictions == 1
+    assert cache.stats.device_bytes == 2 * ROW_BYTES
+
+
+def test_spills_to_host(cpu_lsys, cpu_device):
+    async def _run():
+        cache = EmbeddingCache(max_device_bytes=ROW_BYTES, max_host_bytes=ROW_BYTES)
+        rows = _rows(cpu_device, 3)
+        keys = [EmbeddingCache.key([i]) for i in range(3)]
+        for i, key in enumerate(keys):
+            await cache.insert({key: (rows.view(i),)}, cpu_device)
+
+        # The oldest entry was dropped, the next one moved to the host.
+        assert keys[0] not in cache
+        spilled = cache.get(keys[1])
+        assert await _read(cpu_device, spilled[0]) == [1.0] * 4
+        assert await _read(cpu_device, cache.get(keys[2])[0]) == [2.0] * 4
+        return cache.stats
+
+    stats = cpu_lsys.run(_run())
+    assert stats.spills == 2
+    assert stats.evictions == 1
+    assert stats.device_bytes == ROW_BYTES
+    assert stats.host_bytes == ROW_BYTES
@@ -0,0 +1,48 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import asyncio
+
+import shortfin.array as sfnp
+
+from shortfin_apps.utils import HostStagingBuffers, copy_to_host
+
+
+def test_copy_to_host(cpu_lsys, cpu_device):
+    async def _run():
+        src = sfnp.device_array.for_device(cpu_device, [4], sfnp.float32)
+        src_host = src.for_transfer()
+        src_host.items = [1.0, 2.0, 3.0, 4.0]
+        src.copy_from(src_host)
+
+        dst = sfnp.device_array.for_host(cpu_device, [4], sfnp.float32)
+        await copy_to_host(dst, src)
+        return dst.items.tolist()
+
+    assert cpu_lsys.run(_run()) == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_host_staging_buffers(cpu_lsys, cpu_device):
+    async def _run():
+        staging = HostStagingBuffers(cpu_device, [2], sfnp.float32)
+        first = await staging.acquire()
+        second = await staging.acquire()
+        assert first is not second
+
+        # A third reader waits for a buffer to be released.
+        third = asyncio.create_task(staging.acquire())
+        await asyncio.sleep(0)
+        assert not third.done()
+        staging.release(first)
+        assert await third is first
+
+        # A detached buffer is replaced.
+        staging.detach(second)
+        replacement = await staging.acquire()
+        assert replacement is not second
+        assert list(replacement.shape) == [2]
+
+    cpu_lsys.run(_run())
@@ -0,0 +1,77 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import base64
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from shortfin_apps.utilities.image import (
+    SDXL_LATENT_RGB_BIAS,
+    SDXL_LATENT_RGB_FACTORS,
+    encoded_from,
+    encoder_pool,
+    images_from,
+    latent_preview_from,
+)
+from shortfin_apps.utils import run_in_executor
+
+
+def test_images_from_batch():
+    rng = np.random.default_rng(0)
+    batch = rng.random((2, 3, 4, 5), dtype=np.float32)
+    images = images_from(batch)
+
+    assert len(images) == 2
+    for image, expected in zip(images, batch):
+        assert image.size == (5, 4)
+        expected = (np.transpose(expected, (1, 2, 0)) * 255).round().astype(np.uint8)
+        np.testing.assert_array_equal(np.asarray(image), expected)
+
+
+@pytest.mark.parametrize("output_format", ["png", "jpeg", "WEBP"])
+def test_encoded_from_formats(output_format):
+    image = images_from(np.zeros((1, 3, 8, 8), dtype=np.float32))[0]
+    encoded = encoded_from(image, output_format)
+    decoded = Image.open(BytesIO(base64.b64decode(encoded)))
+    assert (
+        decoded.format
+        == {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP"}[output_format.lower()]
+    )
+    assert decoded.size == (8, 8)
+
+
+def test_run_in_executor(cpu_lsys):
+    async def _run():
+        return await run_in_executor(encoder_pool(), sum, [1, 2, 3])
+
+    assert cpu_lsys.run(_run()) == 6
+
+
+def test_run_in_executor_raises(cpu_lsys):
+    def _fail():
+        raise ValueError("boom")
+
+    async def _run():
+        with pytest.raises(ValueError, match="boom"):
+            await run_in_executor(encoder_pool(), _fail)
+
+    cpu_lsys.run(_run())
+
+
+def test_latent_preview_from():
+    latents = np.zeros((4, 3, 2), dtype=np.float16)
+    latents[0] = 1.0
+    preview = latent_preview_from(latents)
+    assert preview.size == (2, 3)
+
+    expected = (SDXL_LATENT_RGB_FACTORS[0] + SDXL_LATENT_RGB_BIAS + 1.0) / 2.0
+    expected = (expected.clip(0.0, 1.0) * 255).round().astype(np.uint8)
+    pixels = np.asarray(preview)
+    assert pixels.shape == (3, 2, 3)
+    assert (pixels == expected).all()
@@ -0,0 +1,87 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+from shortfin_apps.sd.components.messages import InferencePhase
+from shortfin_apps.sd.components.service import PIPELINE_STAGES
+from shortfin_apps.utils import StagePipeline
+
+ENCODE, DENOISE, DECODE = list(PIPELINE_STAGES)
+
+
+def make_pipeline(devices: int = 1):
+    launched = []
+    wakeups = []
+    pipeline = StagePipeline(
+        list(PIPELINE_STAGES),
+        launch=lambda batch, stage, fiber: launched.append((batch, stage, fiber)),
+        on_first_stage_idle=lambda: wakeups.append(True),
+    )
+    for device in range(devices):
+        for stage in pipeline.stages:
+            pipeline.add_fiber(stage, f"{stage.name.lower()}{device}", device)
+    return pipeline, launched, wakeups
+
+
+def test_stage_order():
+    assert [ENCODE, DENOISE, DECODE] == [
+        InferencePhase.ENCODE,
+        InferencePhase.DENOISE,
+        InferencePhase.DECODE,
+    ]
+    pipeline, _, _ = make_pipeline()
+    assert pipeline.next_stage(ENCODE) == DENOISE
+    assert pipeline.next_stage(DENOISE) == DECODE
+    assert pipeline.next_stage(DECODE) is None
+
+
+def test_batches_overlap_stages():
+    pipeline, launched, wakeups = make_pipeline()
+
+    # Batch "a" finishes encode and moves on; "b" can start encoding.
+    assert pipeline.acquire(ENCODE) == (0, "encode0")
+    assert pipeline.acquire(ENCODE) is None
+    pipeline.release(ENCODE, "encode0", 0)
+    assert wakeups == [True]
+    pipeline.handoff(DENOISE, "a", 0)
+    assert launched == [("a", DENOISE, "denoise0")]
+    assert pipeline.acquire(ENCODE) == (0, "encode0")
+
+    # "b" waits for denoise while "a" still holds its only fiber.
+    pipeline.release(ENCODE, "encode0", 0)
+    pipeline.handoff(DENOISE, "b", 0)
+    assert len(launched) == 1
+    assert pipeline.occupancy[DENOISE].queued == 1
+
+    # Releasing the denoise fiber dispatches "b" onto it right away.
+    pipeline.release(DENOISE, "denoise0", 0)
+    pipeline.handoff(DECODE, "a", 0)
+    assert launched[1:] == [("b", DENOISE, "denoise0"), ("a", DECODE, "decode0")]
+    assert pipeline.occupancy[DENOISE].queued == 0
+    assert pipeline.occupancy[DENOISE].batches == 1
+
+
+def test_handoff_stays_on_device():
+    pipeline, launched, _ = make_pipeline(devices=2)
+    assert pipeline.acquire(DENOISE) == (0, "denoise0")
+    pipeline.handoff(DENOISE, "a", 0)
+    assert launched == []
+
+    pipeline.handoff(DENOISE, "b", 1)
+    assert launched == [("b", DENOISE, "denoise1")]
+
+    pipeline.release(DENOISE, "denoise0", 0)
+    assert launched[-1] == ("a", DENOISE, "denoise0")
+
+
+def test_occupancy_report():
+    pipeline, _, _ = make_pipeline()
+    assert pipeline.occupancy[ENCODE].occupancy == 0.0
+    pipeline.acquire(ENCODE)
+    pipeline.release(ENCODE, "encode0", 0)
+    occupancy = pipeline.occupancy[ENCODE]
+    assert occupancy.batches == 1
+    assert 0.0 <= occupancy.occupancy <= 1.0
+    assert "InferencePhase.ENCODE" in pipeline.report()
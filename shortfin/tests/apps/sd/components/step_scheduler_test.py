@@ -0,0 +1,55 @@
+# Copyright 2025 Advanced Micro Devices, Inc.
+#
+# Licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+import asyncio
+
+from shortfin_apps.utils import StepScheduler
+
+
+def test_single_slot_matches_exclusive_fiber():
+    scheduler = StepScheduler(max_slots=1)
+    scheduler.join()
+    # A full fiber is not offered at step boundaries, only once it is done.
+    assert not scheduler.offer()
+    assert scheduler.leave()
+    assert not scheduler.offer()
+
+
+def test_free_slot_offered_once_per_boarding():
+    scheduler = StepScheduler(max_slots=2)
+    scheduler.join()
+    assert scheduler.offer()
+    # Already offered, later step boundaries do not offer it again.
+    assert not scheduler.offer()
+
+    scheduler.join()
+    assert not scheduler.offer()
+    assert scheduler.leave()
+    assert not scheduler.leave()
+    assert scheduler.active == 0
+
+
+def test_steps_take_turns(cpu_lsys):
+    async def _run():
+        scheduler = StepScheduler(max_slots=2)
+        order = []
+
+        async def loop(name, steps):
+            for i in range(steps):
+                async with scheduler.turn():
+                    order.append((name, i))
+                    # Stands in for the step's invocations.
+                    for _ in range(3):
+                        await asyncio.sleep(0)
+
+        first = asyncio.create_task(loop("a", 3))
+        await asyncio.sleep(0)
+        # A second batch joining mid-loop runs its first step next.
+        await asyncio.gather(first, loop("b", 2))
+        return order
+
+    order = cpu_lsys.run(_run())
+    assert order == [("a", 0), ("b", 0), ("a", 1), ("b", 1), ("a", 2)]